@@ -20,9 +20,13 @@
 ..  moduleauthor:: Stephen Gran <stephen.gran@piksel.com>
 """
 
-from pmcf.audit.base_audit import BaseAudit
-from pmcf.audit.noop_audit import NoopAudit
-from pmcf.audit.s3_audit import S3Audit
+from pmcf.utils import lazy_package
+
+lazy_package(__name__, {
+    'BaseAudit': 'pmcf.audit.base_audit',
+    'NoopAudit': 'pmcf.audit.noop_audit',
+    'S3Audit': 'pmcf.audit.s3_audit',
+})
 
 __all__ = [
     'BaseAudit',
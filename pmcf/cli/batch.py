@@ -0,0 +1,281 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+..  module:: pmcf.cli.batch
+    :platform: Unix
+    :synopsis: module for PMCF CLI programs - rendering many stacks at once
+
+..  moduleauthor:: Stephen Gran <stephen.gran@piksel.com>
+"""
+
+import argparse
+import copy
+import errno
+import glob
+import logging
+import multiprocessing
+import os
+import sys
+
+from pmcf.cli.cli import add_common_arguments, setup_logging
+from pmcf.cli.cmd import PMCFCLI
+from pmcf.config import PMCFConfig
+from pmcf.exceptions import PMCFException
+from pmcf.utils import import_from_string
+
+LOG = logging.getLogger(__name__)
+
+
+def expand_stackfiles(patterns):
+    """
+    Expands a list of stack file names and glob patterns into a sorted list
+    of stack files.  Names that match nothing are passed through unchanged
+    so that the failure is reported against them later.
+
+    :param patterns: File names or glob patterns
+    :type patterns: list.
+    :returns: list.
+    """
+
+    stackfiles = []
+    for pattern in patterns:
+        for fname in sorted(glob.glob(pattern)) or [pattern]:
+            if fname not in stackfiles:
+                stackfiles.append(fname)
+    return stackfiles
+
+
+def common_root(stackfiles):
+    """
+    Finds the deepest directory holding every one of the stack files
+
+    :param stackfiles: Stack definition files
+    :type stackfiles: list.
+    :returns: str.
+    """
+
+    dirs = [os.path.dirname(os.path.abspath(fname)).split(os.sep)
+            for fname in stackfiles]
+    # commonprefix compares lists an item, so here a directory, at a time
+    return os.sep.join(os.path.commonprefix(dirs)) or os.sep
+
+
+def output_path(outdir, stackfile, environment, suffix, root=None):
+    """
+    Builds the name of the file that rendered output for one stack file and
+    environment is written to.  The stack file's directory below ``root`` is
+    kept under the output directory, so that stacks of the same name in
+    different directories do not overwrite each other.
+
+    :param outdir: Output directory
+    :type outdir: str.
+    :param stackfile: Path to stack definition file
+    :type stackfile: str.
+    :param environment: Environment name
+    :type environment: str.
+    :param suffix: File name suffix
+    :type suffix: str.
+    :param root: Directory the stack file's path is kept relative to, or
+                 None for the stack file's own directory
+    :type root: str.
+    :returns: str.
+    """
+
+    name = os.path.splitext(os.path.basename(stackfile))[0]
+    subdir = ''
+    if root:
+        subdir = os.path.relpath(os.path.dirname(os.path.abspath(stackfile)),
+                                 root)
+    return os.path.normpath(os.path.join(
+        outdir, subdir, '%s-%s.%s' % (name, environment, suffix)))
+
+
+def _makedirs(dirname):
+    """
+    Creates a directory and its parents, if they do not already exist
+
+    :param dirname: Directory name
+    :type dirname: str.
+    :raises: :class:`OSError`
+    """
+
+    if not dirname:
+        return
+    try:
+        os.makedirs(dirname)
+    except OSError, exc:
+        # Other workers may be writing to the same directory
+        if exc.errno != errno.EEXIST:
+            raise
+
+
+def render_stack(job):
+    """
+    Runs the pmcf pipeline for a single stack file and environment, writing
+    anything the output layer prints to the job's destination file.  This is
+    the unit of work handed to the worker pool.
+
+    :param job: Tuple of (stackfile, environment, args, destination)
+    :type job: tuple.
+    :returns: tuple of (stackfile, environment, failed)
+    """
+
+    stackfile, environment, args, dest = job
+    args = copy.copy(args)
+    args.stackfile = stackfile
+    args.environment = environment
+
+    stdout = sys.stdout
+    try:
+        _makedirs(os.path.dirname(dest))
+        with open(dest, 'w') as fld:
+            sys.stdout = fld
+            cfg = PMCFConfig(args.configfile, args.profile, args)
+            failed = PMCFCLI(cfg.get_config()).run()
+    except (IOError, OSError), exc:
+        LOG.error('%s (%s): %s', stackfile, environment, exc)
+        failed = True
+    except PMCFException, exc:
+        LOG.error('%s (%s): %s', stackfile, environment, exc.message)
+        failed = True
+    except Exception:
+        # One broken stack must not lose the results of all the others
+        LOG.exception('%s (%s): unexpected error', stackfile, environment)
+        failed = True
+    finally:
+        sys.stdout = stdout
+    return stackfile, environment, bool(failed)
+
+
+def _preload(args):
+    """
+    Imports the parser, policy and output implementations named by the
+    configuration so that forked workers start with them already loaded.
+
+    :param args: Parsed command line arguments
+    :type args: :class:`argparse.Namespace`
+    """
+
+    try:
+        options = PMCFConfig(args.configfile, args.profile, args).get_config()
+        import_from_string('pmcf.parsers', options['parser'])
+        import_from_string('pmcf.policy', options['policy'])
+        import_from_string('pmcf.outputs', options['output'])
+    except PMCFException, exc:
+        # Each job will report this for itself
+        LOG.debug('Unable to preload implementation classes: %s', exc)
+
+
+def run_batch(args, stackfiles, environments):
+    """
+    Runs every combination of stack file and environment through the pmcf
+    pipeline, using a bounded pool of worker processes.
+
+    :param args: Parsed command line arguments
+    :type args: :class:`argparse.Namespace`
+    :param stackfiles: Stack definition files
+    :type stackfiles: list.
+    :param environments: Environment names
+    :type environments: list.
+    :returns: dict mapping each stack file to a list of failed environments
+    """
+
+    jobs = []
+    root = common_root(stackfiles)
+    for stackfile in stackfiles:
+        for environment in environments:
+            dest = output_path(args.output_dir, stackfile,
+                               environment, args.suffix, root)
+            jobs.append((stackfile, environment, args, dest))
+
+    LOG.info('Running %d jobs with %d workers', len(jobs), args.jobs)
+    if args.jobs > 1 and len(jobs) > 1:
+        _preload(args)
+        pool = multiprocessing.Pool(processes=min(args.jobs, len(jobs)))
+        try:
+            results = pool.map(render_stack, jobs)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [render_stack(job) for job in jobs]
+
+    failures = {}
+    for stackfile, environment, failed in results:
+        failures.setdefault(stackfile, [])
+        if failed:
+            failures[stackfile].append(environment)
+    return failures
+
+
+def main(argv=None):
+    """
+    Reads command line arguments for batch mode and renders every requested
+    stack file in every requested environment.
+
+    :param argv: Command line arguments, excluding the command name
+    :type argv: list.
+    :returns:  boolean
+    """
+
+    parser = add_common_arguments(argparse.ArgumentParser(prog='pmcf batch'))
+    parser.add_argument("-e", "--environment",
+                        dest='environments',
+                        action='append',
+                        help="run config for this environment (repeatable)")
+    parser.add_argument("-j", "--jobs",
+                        type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="number of worker processes")
+    parser.add_argument("-o", "--output-dir",
+                        default='.',
+                        help="directory to write rendered output to")
+    parser.add_argument("--suffix",
+                        default='json',
+                        help="file name suffix for rendered output")
+    parser.add_argument("stackfiles",
+                        nargs='+',
+                        help="paths or glob patterns of stack definitions")
+    args = parser.parse_args(argv)
+    args.jobs = max(args.jobs, 1)
+
+    setup_logging(args)
+
+    if not os.path.isdir(args.output_dir):
+        LOG.error('Output directory %s does not exist', args.output_dir)
+        return True
+
+    stackfiles = expand_stackfiles(args.stackfiles)
+    failures = run_batch(args, stackfiles, args.environments or ['dev'])
+
+    failed = False
+    for stackfile in stackfiles:
+        if failures[stackfile]:
+            failed = True
+            LOG.error('%s: failed in %s', stackfile,
+                      ', '.join(failures[stackfile]))
+        else:
+            LOG.info('%s: ok', stackfile)
+    return failed
+
+
+__all__ = [
+    'common_root',
+    'expand_stackfiles',
+    'main',
+    'output_path',
+    'render_stack',
+    'run_batch',
+]
@@ -21,26 +21,38 @@
 """
 
 import argparse
+import copy
 import logging
 import sys
 
 from pmcf.cli import PMCFCLI
+from pmcf.cli.watch import PMCFWatcher
 from pmcf.config import PMCFConfig
 from pmcf.exceptions import PMCFException
-from pmcf.utils import colourise_output
+from pmcf.utils import colourise_output, import_from_string
+from pmcf.utils.profiling import PHASES, Profiler
+from pmcf.utils.timing import TIMINGS, timed
 
 # pylint: disable=invalid-name
 
+# Sub-commands, dispatched on the first command line argument.  Each module
+# provides a main(argv) function.
+COMMANDS = {
+    'batch': 'pmcf.cli.batch',
+    'convert': 'pmcf.cli.convert',
+    'serve': 'pmcf.cli.serve',
+}
 
-def main():
+
+def add_common_arguments(parser):
     """
-    Reads command line arguments, calls into other modules for parsing,
-    validation and building output.  Exits with appropriate return code.
+    Adds the arguments shared by all pmcf commands to an argument parser.
 
-    :returns:  boolean
+    :param parser: Argument parser
+    :type parser: :class:`argparse.ArgumentParser`
+    :returns: :class:`argparse.ArgumentParser`
     """
 
-    parser = argparse.ArgumentParser()
     output_group = parser.add_mutually_exclusive_group()
     output_group.add_argument("-v", "--verbose",
                               help="set loglevel to verbose",
@@ -54,9 +66,6 @@ def main():
                               help="set loglevel to quiet",
                               default=False,
                               action="store_true")
-    parser.add_argument("-e", "--environment",
-                        default='dev',
-                        help="run config for this environment")
     parser.add_argument("-p", "--profile",
                         default='default',
                         help="use config profile")
@@ -74,23 +83,48 @@ def main():
                         default=False,
                         action="store_true",
                         help="poll until completion")
-    parser.add_argument("stackfile",
-                        help="path to stack (farm) definition file")
-    args = parser.parse_args()
+    parser.add_argument("--no-cache",
+                        default=False,
+                        action="store_true",
+                        help="always parse the stack rather than using the "
+                             "cache")
+    return parser
+
+
+class ColourFormatter(logging.Formatter):
+    """
+    Log formatter that colourises level names.  The colours are looked up
+    when a record is formatted, so the terminal is only set up once there is
+    something to log.
+    """
+
+    COLOURS = {
+        logging.DEBUG: ('green', " %s "),
+        logging.INFO: ('cyan', " %s  "),
+        logging.WARNING: ('yellow', "%s"),
+        logging.ERROR: ('red', " %s "),
+    }
+
+    def format(self, record):
+        if record.levelno in self.COLOURS:
+            colour, fmt = self.COLOURS[record.levelno]
+            record = copy.copy(record)
+            record.levelname = colourise_output(colour,
+                                                fmt % record.levelname)
+        return logging.Formatter.format(self, record)
+
+
+def setup_logging(args):
+    """
+    Configures logging to stderr at the level requested on the command line.
+
+    :param args: Parsed command line arguments
+    :type args: :class:`argparse.Namespace`
+    """
 
     # Log everything, and send it to stderr.
     fmt = "[%(asctime)-15s] [%(levelname)s] %(name)s: %(message)s"
 
-    # Simple coloured output
-    logging.addLevelName(logging.DEBUG, colourise_output(
-        'green', " %s " % logging.getLevelName(logging.DEBUG)))
-    logging.addLevelName(logging.INFO, colourise_output(
-        'cyan', " %s  " % logging.getLevelName(logging.INFO)))
-    logging.addLevelName(logging.WARNING, colourise_output(
-        'yellow', "%s" % logging.getLevelName(logging.WARNING)))
-    logging.addLevelName(logging.ERROR, colourise_output(
-        'red', " %s " % logging.getLevelName(logging.ERROR)))
-
     if args.debug:
         lvl = logging.DEBUG
     elif args.verbose:
@@ -100,19 +134,127 @@ def main():
     else:
         lvl = logging.WARNING
 
-    logging.basicConfig(format=fmt, level=lvl)
+    root = logging.getLogger()
+    if not root.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(ColourFormatter(fmt))
+        root.addHandler(handler)
+        root.setLevel(lvl)
     logging.getLogger('boto').setLevel(logging.CRITICAL)
 
+
+def main():
+    """
+    Reads command line arguments, calls into other modules for parsing,
+    validation and building output.  Exits with appropriate return code.
+
+    If the first argument names a sub-command (see :data:`COMMANDS`), the
+    remaining arguments are handed to that command instead.
+
+    :returns:  boolean
+    """
+
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        command = import_from_string(COMMANDS[sys.argv[1]], 'main')
+        return command(sys.argv[2:])
+
+    parser = add_common_arguments(argparse.ArgumentParser())
+    parser.add_argument("-e", "--environment",
+                        default='dev',
+                        help="run config for this environment")
+    parser.add_argument("-r", "--region",
+                        default=None,
+                        help="region, or comma-separated list of regions, "
+                             "to run in")
+    parser.add_argument("--max-regions",
+                        type=int,
+                        default=None,
+                        help="number of regions to run in at once")
+    parser.add_argument("--render-jobs",
+                        type=int,
+                        default=None,
+                        help="number of worker processes building instance "
+                             "groups")
+    parser.add_argument("--all-environments",
+                        default=False,
+                        action="store_true",
+                        help="render every environment the stack declares "
+                             "and report drift between them")
+    parser.add_argument("-o", "--output-dir",
+                        default='.',
+                        help="directory to write templates to with "
+                             "--all-environments")
+    parser.add_argument("--check",
+                        nargs='?',
+                        const='text',
+                        choices=['text', 'json'],
+                        help="report every policy and schema violation in "
+                             "the stack instead of running it")
+    parser.add_argument("-w", "--watch",
+                        default=False,
+                        action="store_true",
+                        help="re-render whenever the stack, policy or "
+                             "provisioner files change")
+    parser.add_argument("--timings",
+                        nargs='?',
+                        const='table',
+                        choices=['table', 'json'],
+                        help="report time spent in each phase on stderr")
+    parser.add_argument("--profile-out",
+                        default=None,
+                        metavar='FILE',
+                        help="profile the run and write the result to FILE")
+    parser.add_argument("--profile-format",
+                        default='pstats',
+                        choices=['pstats', 'callgrind'],
+                        help="format of the profile written")
+    parser.add_argument("--profile-phase",
+                        default=None,
+                        choices=PHASES,
+                        help="only profile this phase of the run")
+    parser.add_argument("stackfile",
+                        help="path to stack (farm) definition file")
+    args = parser.parse_args()
+
+    setup_logging(args)
+
     LOG = logging.getLogger(__name__)
 
     try:
         cfg = PMCFConfig(args.configfile, args.profile, args)
         options = cfg.get_config()
         cli = PMCFCLI(options)
-        return cli.run()
+        if args.watch:
+            return PMCFWatcher(cli).watch()
+        profiler = None
+        if args.profile_out:
+            profiler = Profiler(args.profile_phase)
+            profiler.start()
+        try:
+            with timed('total'):
+                if args.check:
+                    failed = cli.run_check(args.check)
+                elif args.all_environments:
+                    failed = cli.run_environments(args.output_dir)
+                else:
+                    failed = cli.run()
+        finally:
+            if profiler:
+                profiler.stop()
     except PMCFException, exc:
         LOG.error(exc.message)
         return True
 
+    if profiler:
+        try:
+            profiler.save(args.profile_out, args.profile_format)
+        except IOError, exc:
+            LOG.error('Unable to write profile: %s', exc)
+            return True
+
+    if options.get('timings'):
+        sys.stderr.write(TIMINGS.report(options['timings']))
+    return failed
+
 if __name__ == '__main__':
     sys.exit(main())
@@ -20,13 +20,56 @@
 ..  moduleauthor:: Stephen Gran <stephen.gran@piksel.com>
 """
 
+import copy
+import hashlib
 import logging
+import os
+import sys
 
 from pmcf.exceptions import ParserFailure, PMCFException
-from pmcf.utils import import_from_string
+from pmcf.utils import environment_drift, import_from_string
+from pmcf.utils.cache import DiskCache, file_signature
+from pmcf.utils.timing import TIMINGS, timed
+from pmcf.utils.violations import format_violations, policy_violations,\
+    schema_violations
 
 LOG = logging.getLogger(__name__)
 
+# Arguments that change what the parsers build, so are part of the cache key
+CACHE_ARGS = [
+    'environment',
+    'action',
+    'accesskey',
+    'secretkey',
+    'instance_accesskey',
+    'instance_secretkey',
+    # Included files are found relative to these
+    'stackfile',
+    'include_path',
+    # A stack cached without validation must not be used when it is on
+    'xsdfile',
+]
+
+
+def load_policy(args):
+    """
+    Loads the configured policy class with its policy file and overlays
+
+    :param args: Configuration parameters
+    :type args: dict.
+    :raises: :class:`pmcf.exceptions.PMCFException`
+    :returns: :class:`pmcf.policy.BasePolicy`
+    """
+
+    cachedir = None
+    if not args.get('no_cache'):
+        cachedir = args.get('cachedir')
+    return import_from_string('pmcf.policy', args['policy'])(
+        json_file=args['policyfile'],
+        overlays=args.get('policy_overlays'),
+        cachedir=cachedir
+    )
+
 
 class PMCFCLI(object):
     """
@@ -34,54 +77,274 @@ class PMCFCLI(object):
     enforcement, and output.
     """
 
-    def __init__(self, args):
+    def __init__(self, args, policy=None, validation_cache=None):
+        """
+        Constructor
+
+        :param args: Configuration parameters
+        :type args: dict.
+        :param policy: Already loaded policy object to use instead of loading
+                       the configured policy class
+        :type policy: :class:`pmcf.policy.BasePolicy`
+        :param validation_cache: Resources that passed validation in earlier
+                                 runs, which are not validated again
+        :type validation_cache:
+            :class:`pmcf.utils.validation_cache.ValidationCache`
+        """
 
         self.parser = import_from_string('pmcf.parsers', args['parser'])()
-        self.policy = import_from_string('pmcf.policy', args['policy'])(
-            json_file=args['policyfile']
-        )
+        if policy is None:
+            policy = load_policy(args)
+        self.policy = policy
         self.output = import_from_string('pmcf.outputs',
                                          args['output'])()
+        if args.get('render_jobs'):
+            try:
+                self.output.render_jobs = int(args['render_jobs'])
+            except ValueError:
+                raise ParserFailure('render_jobs must be a number, not %s' %
+                                    args['render_jobs'])
+        self.validation_cache = validation_cache
         self.args = args
 
-    def run(self):
+    def parse(self, config=None):
         """
-        Parses stack file, validates data, runs output layer
+        Parses the configured stack file, or a stack definition passed in
+        directly.
 
-        :returns:  boolean
+        :param config: String representation of stack definition
+        :type config: str.
+        :raises: :class:`pmcf.exceptions.ParserFailure`
+        :returns:  dict
         """
+
+        with timed('parse'):
+            cache = self._cache()
+            if cache is None:
+                if config is None:
+                    return self.parser.parse_file(self.args['stackfile'],
+                                                  self.args)
+                return self.parser.parse(config, self.args)
+
+            if config is None:
+                config = self.parser.read_file(self.args['stackfile'])
+            key = self._cache_key(config)
+            cached = cache.get(key)
+            if cached is not None:
+                TIMINGS.annotations['cache'] = 'hit'
+                stack, dependencies = cached
+                self.parser.set_stack(stack, dependencies)
+                return stack
+            TIMINGS.annotations['cache'] = 'miss'
+            stack = self.parser.parse(config, self.args)
+            dependencies = self.parser.dependencies()
+            cache.set(key, (stack, dependencies), dependencies)
+            return stack
+
+    def _cache(self):
+        """
+        Builds the cache of parsed stacks, unless it is turned off
+
+        :raises: :class:`pmcf.exceptions.ParserFailure`
+        :returns: :class:`pmcf.utils.cache.DiskCache` or None
+        """
+
+        if self.args.get('no_cache') or not self.args.get('cachedir'):
+            return None
         try:
-            stack = self.parser.parse_file(self.args['stackfile'], self.args)
-            for key, val in stack['resources'].iteritems():
-                for idx in range(0, len(val)):
-                    data = stack['resources'][key][idx]
-                    self.policy.validate_resource(key, data)
+            size = int(self.args.get('cache_size', None) or 100)
+        except ValueError:
+            raise ParserFailure('cache_size must be a number of megabytes, '
+                                'not %s' % self.args['cache_size'])
+        return DiskCache(self.args['cachedir'], size * 1024 * 1024)
+
+    def _cache_key(self, config):
+        """
+        Builds the cache key for a stack definition, from its contents, the
+        parser, and the arguments the parser uses
+
+        :param config: String representation of stack definition
+        :type config: str.
+        :returns: str.
+        """
+
+        if isinstance(config, unicode):
+            config = config.encode('utf-8')
+        klass = self.parser.__class__
+        module = sys.modules.get(klass.__module__)
+        return DiskCache.key(
+            hashlib.sha256(config).hexdigest(),
+            '%s.%s' % (klass.__module__, klass.__name__),
+            # Changes to the parser itself invalidate what it built
+            file_signature(getattr(module, '__file__', '')),
+            [self.args.get(arg, None) for arg in CACHE_ARGS],
+        )
+
+    def validate(self, stack):
+        """
+        Applies policy to every resource in the stack, then validates the
+        result against the schema.
+
+        :param stack: Parsed stack
+        :type stack: dict.
+        :raises: :class:`pmcf.exceptions.PMCFException`
+        """
+
+        if self.validation_cache is not None:
+            policy_version = self.policy.version()
+            if policy_version is not None:
+                return self._validate_incremental(stack, policy_version)
+
+        with timed('policy'):
+            self.policy.validate_stack(stack)
+        with timed('validate'):
             self.parser.validate()
-            try:
+
+    def _validate_incremental(self, stack, policy_version):
+        """
+        Validates a stack like :py:meth:`validate`, but only applies policy to
+        and schema validates resources that have not passed validation
+        before.  Cached resources get the defaults policy gave them last
+        time.  The rest of the stack is always validated.
+
+        :param stack: Parsed stack
+        :type stack: dict.
+        :param policy_version: Version of the policy in force
+        :type policy_version: str.
+        :raises: :class:`pmcf.exceptions.PMCFException`
+        """
+
+        # Imported here, as building the validators is slow and only
+        # needed once a stack is validated
+        from pmcf.schema.validator import SCHEMA_VERSION
+
+        cache = self.validation_cache
+        environment = stack['config'].get('environment')
+        # Policy may differ between environments
+        policy_version = '%s:%s' % (policy_version, environment)
+        known = set()
+        checked = []
+        with timed('policy'):
+            for key, val in stack['resources'].iteritems():
+                for data in val:
+                    ckey = cache.key(key, data, SCHEMA_VERSION,
+                                     policy_version)
+                    defaults = cache.get(ckey)
+                    if defaults is not None:
+                        data.update(defaults)
+                        known.add(id(data))
+                        continue
+                    before = set(field for field in data
+                                 if data[field] is not None)
+                    self.policy.validate_resource(key, data,
+                                                  environment=environment)
+                    checked.append((ckey, dict(
+                        (field, copy.deepcopy(data[field]))
+                        for field in data if field not in before)))
+        LOG.debug('%d resources already validated, %d to check',
+                  len(known), len(checked))
+        with timed('validate'):
+            self.parser.validate(known)
+        for ckey, defaults in checked:
+            cache.set(ckey, defaults)
+
+    def check(self, stack):
+        """
+        Applies policy to every resource in the stack and validates the result
+        against the schema like :py:meth:`validate`, but carries on past the
+        first problem and returns them all.
+
+        :param stack: Parsed stack
+        :type stack: dict.
+        :returns: list of violations, as described in
+                  :mod:`pmcf.utils.violations`
+        """
+
+        with timed('policy'):
+            violations = policy_violations(self.policy, stack)
+        with timed('validate'):
+            violations.extend(schema_violations(stack, self.parser.errors()))
+        return violations
+
+    def run_check(self, fmt='text', config=None):
+        """
+        Parses the stack file and prints every policy and schema violation in
+        it.  Nothing is rendered and the output layer is not run.
+
+        :param fmt: One of 'text' or 'json'
+        :type fmt: str.
+        :param config: String representation of stack definition, used
+                       instead of reading the configured stack file
+        :type config: str.
+        :returns:  boolean, True if there were violations
+        """
+
+        try:
+            violations = self.check(self.parse(config))
+        except PMCFException, exc:
+            if self.args.get('debug', False):
+                LOG.exception(exc.message)
+            else:
+                LOG.error(exc.message)
+            return True
+        sys.stdout.write(format_violations(violations, fmt))
+        return len(violations) > 0
+
+    def render(self, stack):
+        """
+        Builds output from a validated stack, along with the metadata the
+        output layer needs to run it.
+
+        :param stack: Parsed and validated stack
+        :type stack: dict.
+        :raises: :class:`pmcf.exceptions.PMCFException`
+        :returns:  tuple of (data, metadata)
+        """
+
+        try:
+            with timed('render'):
                 data = self.output.add_resources(stack['resources'],
                                                  stack['config'])
 
-                metadata = {
-                    'access': self.args['accesskey'],
-                    'secret': self.args['secretkey'],
-                    'region': self.args['region'],
-                    'name': stack['config']['name'],
-                    'environment': stack['config']['environment'],
-                }
-            except KeyError, exc:
-                if self.args.get('debug', False):
-                    LOG.exception(exc.message)
-                raise ParserFailure(str(exc))
-
-            for key in ['owner', 'version', 'strategy']:
-                if stack['config'].get(key):
-                    metadata[key] = stack['config'][key]
-            metadata['audit'] = self.args.get('audit', 'NoopAudit')
-            if self.args.get('audit_output', None):
-                metadata['audit_output'] = self.args['audit_output']
-
-            return not self.output.run(data, metadata,
-                                       self.args['poll'], self.args['action'])
+            metadata = {
+                'access': self.args['accesskey'],
+                'secret': self.args['secretkey'],
+                'region': self.args['region'],
+                'name': stack['config']['name'],
+                'environment': stack['config']['environment'],
+            }
+        except KeyError, exc:
+            if self.args.get('debug', False):
+                LOG.exception(exc.message)
+            raise ParserFailure(str(exc))
+
+        for key in ['owner', 'version', 'strategy']:
+            if stack['config'].get(key):
+                metadata[key] = stack['config'][key]
+        for key in ['max_regions', 'region_credentials']:
+            if self.args.get(key):
+                metadata[key] = self.args[key]
+        metadata['audit'] = self.args.get('audit', 'NoopAudit')
+        if self.args.get('audit_output', None):
+            metadata['audit_output'] = self.args['audit_output']
+        return data, metadata
+
+    def run(self, config=None):
+        """
+        Parses stack file, validates data, runs output layer
+
+        :param config: String representation of stack definition, used
+                       instead of reading the configured stack file
+        :type config: str.
+        :returns:  boolean
+        """
+        try:
+            stack = self.parse(config)
+            self.validate(stack)
+            data, metadata = self.render(stack)
+            with timed('run'):
+                return not self.output.run(data, metadata, self.args['poll'],
+                                           self.args['action'])
         except PMCFException, exc:
             if self.args.get('debug', False):
                 LOG.exception(exc.message)
@@ -89,7 +352,105 @@ class PMCFCLI(object):
                 LOG.error(exc.message)
             return True
 
+    def render_environments(self, config=None):
+        """
+        Loads the configured stack file, or a stack definition passed in
+        directly, once, then resolves, validates and renders it for every
+        environment it declares.  Stacks that declare no environments are
+        rendered for the configured environment only.
+
+        :param config: String representation of stack definition
+        :type config: str.
+        :raises: :class:`pmcf.exceptions.PMCFException`
+        :returns:  list of (environment, data, metadata) tuples
+        """
+
+        with timed('parse'):
+            if config is None:
+                config = self.parser.read_file(self.args['stackfile'])
+            raw = self.parser.load(config, self.args)
+        environments = self.parser.environments(raw) or\
+            [self.args['environment']]
+
+        results = []
+        for environment in environments:
+            LOG.info('Rendering for %s', environment)
+            args = dict(self.args)
+            args['environment'] = environment
+            with timed('parse'):
+                stack = self.parser.resolve(raw, args)
+            self.validate(stack)
+            data, metadata = self.render(stack)
+            results.append((environment, data, metadata))
+        return results
+
+    def run_environments(self, outdir, suffix='json', config=None):
+        """
+        Renders the stack for every environment it declares, writes each
+        template to ``<name>-<environment>.<suffix>`` in outdir, and prints
+        the resources that differ between environments.  The output layer's
+        action is not run.
+
+        :param outdir: Directory to write templates to
+        :type outdir: str.
+        :param suffix: File name suffix
+        :type suffix: str.
+        :param config: String representation of stack definition, used
+                       instead of reading the configured stack file
+        :type config: str.
+        :returns:  boolean
+        """
+
+        try:
+            results = self.render_environments(config)
+            templates = {}
+            for environment, data, metadata in results:
+                fname = os.path.join(outdir, '%s-%s.%s' % (
+                    metadata['name'], environment, suffix))
+                with open(fname, 'w') as fld:
+                    fld.write(data)
+                LOG.info('Wrote %s', fname)
+                templates[environment] = data
+        except PMCFException, exc:
+            if self.args.get('debug', False):
+                LOG.exception(exc.message)
+            else:
+                LOG.error(exc.message)
+            return True
+        except IOError, exc:
+            LOG.error(exc)
+            return True
+
+        if len(templates) > 1:
+            self.report_drift(templates)
+        return False
+
+    def report_drift(self, templates):
+        """
+        Prints the resources that differ between environments
+
+        :param templates: Mapping of environment name to template
+        :type templates: dict.
+        """
+
+        try:
+            drift = environment_drift(templates)
+        except ValueError:
+            LOG.warning('Output is not JSON, unable to compare environments')
+            return
+        if not drift:
+            print 'No drift between %s' % ', '.join(sorted(templates))
+            return
+        for name in sorted(drift):
+            if drift[name]['missing']:
+                print '%s: missing in %s' % (
+                    name, ', '.join(drift[name]['missing']))
+            if drift[name]['properties']:
+                print '%s: differs in %s' % (
+                    name, ', '.join(drift[name]['properties']))
+
 
 __all__ = [
+    'load_policy',
     'PMCFCLI',
 ]
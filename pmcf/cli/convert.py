@@ -0,0 +1,433 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+..  module:: pmcf.cli.convert
+    :platform: Unix
+    :synopsis: module for PMCF CLI programs - converting AWSFW farms to YAML
+
+..  moduleauthor:: Stephen Gran <stephen.gran@piksel.com>
+"""
+
+import argparse
+import errno
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import yaml
+
+from pmcf.cli.cli import add_common_arguments, setup_logging
+from pmcf.cli.cmd import load_policy
+from pmcf.config import PMCFConfig
+from pmcf.exceptions import PMCFException
+from pmcf.outputs.json_output import JSONOutput
+from pmcf.parsers.awsfw_parser import AWSFWParser
+from pmcf.parsers.yaml_parser import YamlParser
+
+LOG = logging.getLogger(__name__)
+
+# The only configuration workers are given.  Credentials stay behind, so
+# they can not end up in converted stacks.
+WORKER_ARGS = [
+    'cachedir',
+    'no_cache',
+    'policy',
+    'policyfile',
+    'policy_overlays',
+    'xsdfile',
+]
+
+# Never written to converted stacks, wherever they come from
+CONFIG_CREDENTIALS = [
+    'access',
+    'secret',
+    'instance_access',
+    'instance_secret',
+    'instance_accesskey',
+    'instance_secretkey',
+]
+PROVISIONER_CREDENTIALS = [
+    'AWS_ACCESS_KEY_ID',
+    'AWS_SECRET_ACCESS_KEY',
+]
+
+# The AWSFW parser and the output layer do not check everything they read,
+# so a farm they can not handle fails with one of these
+FARM_ERRORS = (
+    AttributeError,
+    IndexError,
+    KeyError,
+    TypeError,
+    ValueError,
+)
+
+# Set by _init_worker, and inherited by forked workers
+_POLICY = {}
+
+
+def find_farms(paths):
+    """
+    Finds AWSFW farm files.  Directories are searched for ``.xml`` files,
+    and anything else is taken to be a farm file.
+
+    :param paths: Farm files and directories
+    :type paths: list.
+    :returns: list of (farm file, output file name relative to the output
+              directory) tuples
+    """
+
+    farms = []
+    for path in paths:
+        if not os.path.isdir(path):
+            farms.append((path, os.path.basename(path)))
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for fname in sorted(filenames):
+                if fname.endswith('.xml'):
+                    farm = os.path.join(dirpath, fname)
+                    farms.append((farm, os.path.relpath(farm, path)))
+    return [(farm, os.path.splitext(name)[0] + '.yaml')
+            for farm, name in farms]
+
+
+def _log_prefix(ldb, policy, environment):
+    """
+    Writes an AWSFW load balancer's log policy so that
+    :class:`pmcf.parsers.yaml_parser.YamlParser` gives the same S3 prefix.
+    YamlParser places the prefix under the environment and follows it with
+    the load balancer's scheme, so those are taken off where present, and
+    the prefix is marked to be used as written where not.
+
+    :param ldb: Load balancer
+    :type ldb: dict.
+    :param policy: Log policy, which is not modified
+    :type policy: dict.
+    :param environment: Environment of the farm
+    :type environment: str.
+    :returns: dict.
+    """
+
+    policy = dict(policy)
+    policy['policy'] = dict(policy['policy'])
+    prefix = policy['policy']['s3prefix']
+    head = '%s/' % environment
+    tail = '/%s' % ('internal' if ldb.get('internal') else 'external')
+    if prefix.startswith(head) and prefix.endswith(tail) and\
+            len(prefix) > len(head) + len(tail):
+        policy['policy']['s3prefix'] = prefix[len(head):-len(tail)]
+    else:
+        policy['policy']['fullprefix'] = True
+    return policy
+
+
+def stack_to_yaml(stack):
+    """
+    Writes a stack built by :class:`pmcf.parsers.awsfw_parser.AWSFWParser`
+    as a YAML stack definition that
+    :class:`pmcf.parsers.yaml_parser.YamlParser` builds the same stack from.
+    Credentials are left out.
+
+    :param stack: Stack, which is not modified
+    :type stack: dict.
+    :returns: tuple of (environment, YAML text)
+    """
+
+    config = dict(stack['config'])
+    environment = config.pop('environment')
+    for field in CONFIG_CREDENTIALS:
+        config.pop(field, None)
+    config['environments'] = [environment]
+    # AWSFW farms already name the default security group where it is used
+    config['nodefaultsg'] = True
+
+    resources = {}
+    for rtype, items in stack['resources'].items():
+        if not items:
+            continue
+        resources[rtype] = items
+        if rtype == 'load_balancer':
+            resources[rtype] = []
+            for ldb in items:
+                if ldb.get('policy'):
+                    ldb = dict(ldb)
+                    ldb['policy'] = [
+                        _log_prefix(ldb, policy, environment)
+                        if policy.get('type') == 'log_policy' else policy
+                        for policy in ldb['policy']]
+                resources[rtype].append(ldb)
+            continue
+        if rtype != 'instance':
+            continue
+        resources[rtype] = []
+        for inst in items:
+            inst = dict(inst)
+            if inst.get('provisioner'):
+                inst['provisioner'] = dict(inst['provisioner'])
+                args = dict(inst['provisioner'].get('args') or {})
+                for field in PROVISIONER_CREDENTIALS:
+                    args.pop(field, None)
+                inst['provisioner']['args'] = args
+            resources[rtype].append(inst)
+
+    return environment, yaml.safe_dump({
+        'config': config,
+        'resources': resources,
+    }, default_flow_style=False)
+
+
+def differences(left, right):
+    """
+    Compares two rendered templates
+
+    :param left: Rendered template
+    :type left: dict.
+    :param right: Rendered template
+    :type right: dict.
+    :returns: sorted list of the resources, and other top level sections,
+              that differ
+    """
+
+    diffs = []
+    for section in set(left.keys()) | set(right.keys()):
+        if section != 'Resources' and left.get(section) != right.get(section):
+            diffs.append(section)
+    lres = left.get('Resources', {})
+    rres = right.get('Resources', {})
+    for name in set(lres.keys()) | set(rres.keys()):
+        if lres.get(name) != rres.get(name):
+            diffs.append(name)
+    return sorted(diffs)
+
+
+def _render(stack):
+    """
+    Applies policy to a stack and renders it with
+    :class:`pmcf.outputs.json_output.JSONOutput`
+
+    :param stack: Parsed stack, modified in place by policy
+    :type stack: dict.
+    :raises: :class:`pmcf.exceptions.PMCFException`
+    :returns: dict.
+    """
+
+    _POLICY['policy'].validate_stack(stack)
+    return JSONOutput().add_resources(stack['resources'],
+                                      stack['config']).data
+
+
+def _init_worker(options):
+    """
+    Loads the policy, once for all workers
+
+    :param options: Configuration parameters listed in :data:`WORKER_ARGS`
+    :type options: dict.
+    :raises: :class:`pmcf.exceptions.PMCFException`
+    """
+
+    _POLICY['policy'] = load_policy(options)
+    _POLICY['xsdfile'] = options.get('xsdfile')
+
+
+def _write(dest, text):
+    """
+    Writes a converted stack, creating its directory if needed
+
+    :param dest: File name
+    :type dest: str.
+    :param text: File contents
+    :type text: str.
+    :raises: :class:`IOError`, :class:`OSError`
+    """
+
+    dirname = os.path.dirname(dest)
+    if dirname:
+        try:
+            os.makedirs(dirname)
+        except OSError, exc:
+            # Other workers may be writing to the same directory
+            if exc.errno != errno.EEXIST:
+                raise
+    with open(dest, 'w') as fld:
+        fld.write(text)
+
+
+def convert_farm(job):
+    """
+    Converts one AWSFW farm to a YAML stack, then renders the stacks that
+    the AWSFW and YAML parsers build from the two files and compares them.
+    This is the unit of work handed to the worker pool.
+
+    :param job: Tuple of (farm file, destination)
+    :type job: tuple.
+    :returns: dict with the farm, output file, ``status`` of 'equivalent',
+              'different' or 'failed', the ``differences`` in the rendered
+              templates, and any ``error``
+    """
+
+    farm, dest = job
+    result = {
+        'farm': farm,
+        'output': None,
+        'status': 'failed',
+        'differences': [],
+        'error': None,
+    }
+    try:
+        awsfw = AWSFWParser()
+        stack = awsfw.parse(awsfw.read_file(farm),
+                            {'xsdfile': _POLICY.get('xsdfile')})
+        environment, text = stack_to_yaml(stack)
+        _write(dest, text)
+        result['output'] = dest
+
+        converted = YamlParser().parse(text, {
+            'environment': environment,
+            'action': 'create',
+        })
+        diffs = differences(_render(stack), _render(converted))
+    except PMCFException, exc:
+        result['error'] = exc.message
+    except (IOError, OSError), exc:
+        result['error'] = str(exc)
+    except FARM_ERRORS, exc:
+        result['error'] = '%s: %s' % (exc.__class__.__name__, exc)
+    else:
+        result['differences'] = diffs
+        result['status'] = 'different' if diffs else 'equivalent'
+    if result['error']:
+        LOG.error('%s: %s', farm, result['error'])
+    return result
+
+
+def run_convert(options, farms, outdir, jobs=1):
+    """
+    Converts every farm, using a bounded pool of worker processes
+
+    :param options: Configuration parameters
+    :type options: dict.
+    :param farms: Output of :py:func:`find_farms`
+    :type farms: list.
+    :param outdir: Directory to write converted stacks to
+    :type outdir: str.
+    :param jobs: Number of worker processes
+    :type jobs: int.
+    :raises: :class:`pmcf.exceptions.PMCFException`
+    :returns: list of results from :py:func:`convert_farm`, in the order
+              of farms
+    """
+
+    _init_worker(dict((arg, options.get(arg)) for arg in WORKER_ARGS))
+    work = [(farm, os.path.join(outdir, name)) for farm, name in farms]
+
+    LOG.info('Converting %d farms with %d workers', len(work), jobs)
+    if jobs > 1 and len(work) > 1:
+        pool = multiprocessing.Pool(processes=min(jobs, len(work)))
+        try:
+            return pool.map(convert_farm, work)
+        finally:
+            pool.close()
+            pool.join()
+    return [convert_farm(job) for job in work]
+
+
+def format_report(results, fmt='text'):
+    """
+    Formats the results of a conversion
+
+    :param results: Output of :py:func:`run_convert`
+    :type results: list.
+    :param fmt: One of 'text' or 'json'
+    :type fmt: str.
+    :returns: str.
+    """
+
+    if fmt == 'json':
+        return json.dumps(results, indent=4, sort_keys=True) + '\n'
+
+    lines = []
+    counts = {'equivalent': 0, 'different': 0, 'failed': 0}
+    for result in results:
+        counts[result['status']] += 1
+        if result['status'] == 'failed':
+            line = '%s: failed: %s' % (result['farm'], result['error'])
+        else:
+            line = '%s -> %s: %s' % (result['farm'], result['output'],
+                                     result['status'])
+            if result['differences']:
+                line += ' (%s)' % ', '.join(result['differences'])
+        lines.append(line)
+    lines.append('%d farms: %d equivalent, %d different, %d failed' % (
+        len(results), counts['equivalent'], counts['different'],
+        counts['failed']))
+    return '\n'.join(lines) + '\n'
+
+
+def main(argv=None):
+    """
+    Reads command line arguments for convert mode, converts every farm
+    found and prints a report.
+
+    :param argv: Command line arguments, excluding the command name
+    :type argv: list.
+    :returns:  boolean, True unless every farm converted to an equivalent
+               stack
+    """
+
+    parser = add_common_arguments(
+        argparse.ArgumentParser(prog='pmcf convert'))
+    parser.add_argument("-j", "--jobs",
+                        type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="number of worker processes")
+    parser.add_argument("-o", "--output-dir",
+                        default='.',
+                        help="directory to write YAML stacks to")
+    parser.add_argument("--report",
+                        default='text',
+                        choices=['text', 'json'],
+                        help="format of the per-farm report")
+    parser.add_argument("paths",
+                        nargs='+',
+                        help="AWSFW farm files, or directories to search "
+                             "for them")
+    args = parser.parse_args(argv)
+
+    setup_logging(args)
+
+    try:
+        options = PMCFConfig(args.configfile, args.profile,
+                             args).get_config()
+        results = run_convert(options, find_farms(args.paths),
+                              args.output_dir, max(args.jobs, 1))
+    except PMCFException, exc:
+        LOG.error(exc.message)
+        return True
+
+    sys.stdout.write(format_report(results, args.report))
+    return not results or\
+        any(result['status'] != 'equivalent' for result in results)
+
+
+__all__ = [
+    'convert_farm',
+    'differences',
+    'find_farms',
+    'format_report',
+    'main',
+    'run_convert',
+    'stack_to_yaml',
+]
@@ -0,0 +1,375 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+..  module:: pmcf.cli.serve
+    :platform: Unix
+    :synopsis: module for PMCF CLI programs - long running render server
+
+..  moduleauthor:: Stephen Gran <stephen.gran@piksel.com>
+"""
+
+import argparse
+import BaseHTTPServer
+import json
+import logging
+import os
+import socket
+import SocketServer
+import StringIO
+import sys
+import urlparse
+
+from pmcf.cli.cli import add_common_arguments, setup_logging
+from pmcf.cli.cmd import load_policy, PMCFCLI
+from pmcf.config import PMCFConfig
+from pmcf.exceptions import PMCFException
+from pmcf.utils import import_from_string
+from pmcf.utils.validation_cache import ValidationCache
+
+LOG = logging.getLogger(__name__)
+
+
+def _mtime(fname):
+    """
+    Returns the modification time of a file, or None if it can't be read
+
+    :param fname: File name
+    :type fname: str.
+    :returns: float or None
+    """
+
+    try:
+        return os.stat(fname).st_mtime
+    except (OSError, TypeError):
+        return None
+
+
+class PMCFService(object):
+    """
+    Holds a warm configuration and policy, and the parser and output classes
+    they name, for rendering many stack definitions from one process.  The
+    configuration and policy are reloaded when their files change on disk.
+    Resources that passed validation are remembered between requests.
+    """
+
+    def __init__(self, args):
+        """
+        Constructor
+
+        :param args: Parsed command line arguments
+        :type args: :class:`argparse.Namespace`
+        """
+
+        self.args = args
+        self.options = None
+        self.policy = None
+        self.validation_cache = ValidationCache()
+        self._mtimes = {}
+        self.reload()
+
+    def _watched_files(self):
+        """
+        Files whose modification should trigger a reload
+
+        :returns: list.
+        """
+
+        return [self.args.configfile, self.options['policyfile']] +\
+            self.policy.input_files()
+
+    def reload(self):
+        """
+        (Re)reads configuration and policy, and imports the implementation
+        classes they name.
+
+        :raises: :class:`pmcf.exceptions.PMCFException`
+        """
+
+        LOG.info('Loading config from %s', self.args.configfile)
+        options = PMCFConfig(self.args.configfile, self.args.profile,
+                             self.args).get_config()
+        import_from_string('pmcf.parsers', options['parser'])
+        import_from_string('pmcf.outputs', options['output'])
+        policy = load_policy(options)
+        if self.policy is not None and\
+                self.policy.version() != policy.version():
+            # Nothing remembered can be used with the new policy
+            self.validation_cache.clear()
+        self.options = options
+        self.policy = policy
+        self._mtimes = dict((fname, _mtime(fname))
+                            for fname in self._watched_files())
+
+    def refresh(self):
+        """
+        Reloads configuration and policy if any of their files have changed
+        since they were last read.
+
+        :raises: :class:`pmcf.exceptions.PMCFException`
+        """
+
+        for fname, mtime in self._mtimes.items():
+            if _mtime(fname) != mtime:
+                LOG.info('%s changed, reloading', fname)
+                self.reload()
+                return
+
+    def cli(self, params=None):
+        """
+        Builds a :class:`pmcf.cli.cmd.PMCFCLI` for one request, sharing the
+        loaded policy.  Request parameters override the configured options.
+
+        :param params: Per-request options (environment, action, poll)
+        :type params: dict.
+        :returns: :class:`pmcf.cli.cmd.PMCFCLI`
+        """
+
+        self.refresh()
+        params = params or {}
+        options = dict(self.options)
+        options['environment'] = params.get('environment',
+                                            self.args.environment)
+        options['action'] = params.get('action', options['action'])
+        options['poll'] = params.get('poll', options['poll'])
+        return PMCFCLI(options, policy=self.policy,
+                       validation_cache=self.validation_cache)
+
+    def render(self, config, params=None):
+        """
+        Parses, validates and renders a stack definition
+
+        :param config: String representation of stack definition
+        :type config: str.
+        :param params: Per-request options (environment, action, poll)
+        :type params: dict.
+        :raises: :class:`pmcf.exceptions.PMCFException`
+        :returns: str.
+        """
+
+        cli = self.cli(params)
+        stack = cli.parse(config)
+        cli.validate(stack)
+        return cli.render(stack)[0]
+
+    def run(self, config, params=None):
+        """
+        Runs the full pipeline, including the output layer's action, for a
+        stack definition.
+
+        :param config: String representation of stack definition
+        :type config: str.
+        :param params: Per-request options (environment, action, poll)
+        :type params: dict.
+        :raises: :class:`pmcf.exceptions.PMCFException`
+        :returns: tuple of (success, anything printed by the output layer)
+        """
+
+        cli = self.cli(params)
+        stdout = sys.stdout
+        sys.stdout = StringIO.StringIO()
+        try:
+            failed = cli.run(config)
+            printed = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        return not failed, printed
+
+
+class PMCFRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    HTTP interface to :class:`PMCFService`.
+
+    ``POST /render`` returns the rendered stack.  ``POST /run`` runs the
+    configured action and returns a JSON status document.  Both take the
+    stack definition as the request body, and ``environment``, ``action``
+    and ``poll`` as query parameters.  ``GET /status`` reports what is
+    loaded.
+    """
+
+    def address_string(self):
+        if isinstance(self.client_address, tuple):
+            return BaseHTTPServer.BaseHTTPRequestHandler.address_string(self)
+        return 'unix'
+
+    def log_message(self, fmt, *args):
+        LOG.info('%s %s', self.address_string(), fmt % args)
+
+    def _reply(self, code, body, ctype='text/plain'):
+        """
+        Sends a complete response
+
+        :param code: HTTP status code
+        :type code: int.
+        :param body: Response body
+        :type body: str.
+        :param ctype: Content type
+        :type ctype: str.
+        """
+
+        self.send_response(code)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _params(self):
+        """
+        Reads per-request options from the query string
+
+        :returns: dict.
+        """
+
+        query = urlparse.parse_qs(urlparse.urlparse(self.path).query)
+        params = {}
+        for key in ['environment', 'action']:
+            if query.get(key):
+                params[key] = query[key][0]
+        if query.get('poll'):
+            params['poll'] = query['poll'][0].lower() in ['1', 'true', 'yes']
+        return params
+
+    def do_GET(self):
+        if urlparse.urlparse(self.path).path != '/status':
+            return self._reply(404, 'Not found\n')
+        service = self.server.service
+        status = {
+            'configfile': service.args.configfile,
+            'policyfile': service.options['policyfile'],
+            'parser': service.options['parser'],
+            'policy': service.options['policy'],
+            'output': service.options['output'],
+        }
+        self._reply(200, json.dumps(status, sort_keys=True),
+                    'application/json')
+
+    def do_POST(self):
+        path = urlparse.urlparse(self.path).path
+        if path not in ['/render', '/run']:
+            return self._reply(404, 'Not found\n')
+
+        length = int(self.headers.getheader('content-length') or 0)
+        config = self.rfile.read(length)
+        service = self.server.service
+        try:
+            if path == '/render':
+                return self._reply(200, service.render(config,
+                                                       self._params()))
+            success, printed = service.run(config, self._params())
+            body = json.dumps({'success': success, 'output': printed},
+                              sort_keys=True)
+            return self._reply(200 if success else 500, body,
+                               'application/json')
+        except PMCFException, exc:
+            return self._reply(400, '%s\n' % exc.message)
+
+
+class PMCFHTTPServer(BaseHTTPServer.HTTPServer):
+    """
+    Single-threaded HTTP server bound to a TCP port.  Requests are handled
+    one at a time, as the output layer writes to stdout.
+    """
+
+    def __init__(self, address, service):
+        self.service = service
+        BaseHTTPServer.HTTPServer.__init__(self, address, PMCFRequestHandler)
+
+
+class PMCFUnixHTTPServer(PMCFHTTPServer):
+    """
+    Single-threaded HTTP server bound to a UNIX domain socket.
+    """
+
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        SocketServer.TCPServer.server_bind(self)
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+
+def make_server(args, service):
+    """
+    Creates a server listening where the command line asked for.
+
+    :param args: Parsed command line arguments
+    :type args: :class:`argparse.Namespace`
+    :param service: Service to handle requests with
+    :type service: :class:`PMCFService`
+    :returns: :class:`PMCFHTTPServer`
+    """
+
+    if args.socket:
+        return PMCFUnixHTTPServer(args.socket, service)
+    host, _, port = args.listen.rpartition(':')
+    return PMCFHTTPServer((host or '127.0.0.1', int(port)), service)
+
+
+def main(argv=None):
+    """
+    Reads command line arguments for server mode, loads configuration and
+    policy, and serves render requests until interrupted.
+
+    :param argv: Command line arguments, excluding the command name
+    :type argv: list.
+    :returns:  boolean
+    """
+
+    parser = add_common_arguments(argparse.ArgumentParser(prog='pmcf serve'))
+    parser.add_argument("-e", "--environment",
+                        default='dev',
+                        help="environment for requests that don't name one")
+    listen_group = parser.add_mutually_exclusive_group()
+    listen_group.add_argument("--listen",
+                              default='127.0.0.1:8080',
+                              help="[host:]port to listen on")
+    listen_group.add_argument("--socket",
+                              default=None,
+                              help="UNIX socket to listen on")
+    args = parser.parse_args(argv)
+
+    setup_logging(args)
+
+    try:
+        service = PMCFService(args)
+        server = make_server(args, service)
+    except PMCFException, exc:
+        LOG.error(exc.message)
+        return True
+    except (socket.error, ValueError), exc:
+        LOG.error('Unable to listen: %s', exc)
+        return True
+
+    LOG.info('Serving on %s', args.socket or args.listen)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+    return False
+
+
+__all__ = [
+    'main',
+    'make_server',
+    'PMCFHTTPServer',
+    'PMCFRequestHandler',
+    'PMCFService',
+    'PMCFUnixHTTPServer',
+]
@@ -0,0 +1,245 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+..  module:: pmcf.cli.watch
+    :platform: Unix
+    :synopsis: module for PMCF CLI programs - re-rendering on file changes
+
+..  moduleauthor:: Stephen Gran <stephen.gran@piksel.com>
+"""
+
+import copy
+import logging
+import os
+import time
+
+from pmcf.cli.cmd import load_policy
+from pmcf.exceptions import PMCFException
+from pmcf.utils import colourise_output, diff_resources, import_from_string
+from pmcf.utils.validation_cache import ValidationCache
+
+LOG = logging.getLogger(__name__)
+
+# Pipeline stages, in the order they run.  A change to an input of one
+# stage means that stage and every later one needs to run again.
+STAGES = ['parse', 'policy', 'render']
+
+
+def _mtime(fname):
+    """
+    Returns the modification time of a file, or None if it can't be read
+
+    :param fname: File name
+    :type fname: str.
+    :returns: float or None
+    """
+
+    try:
+        return os.stat(fname).st_mtime
+    except (OSError, TypeError):
+        return None
+
+
+class PMCFWatcher(object):
+    """
+    Re-runs the pipeline for one stack whenever its inputs change, and
+    reports which resources changed since the previous render.
+
+    Intermediate results are kept between runs, so that editing the policy
+    file does not re-parse the stack, and editing a provisioner script does
+    not re-parse or re-validate it.  Editing the stack only re-validates the
+    resources that changed.  The output layer's action is never run.
+    """
+
+    def __init__(self, cli, interval=0.5):
+        """
+        Constructor
+
+        :param cli: Pipeline to drive
+        :type cli: :class:`pmcf.cli.cmd.PMCFCLI`
+        :param interval: Seconds between checks for changed files
+        :type interval: float.
+        """
+
+        self.cli = cli
+        self.interval = interval
+        self.parsed = None
+        self.validated = None
+        self.rendered = None
+        self.validation_cache = ValidationCache()
+        self._mtimes = {}
+
+    def watched_files(self):
+        """
+        Maps each input file to the pipeline stage that reads it
+
+        :returns: dict.
+        """
+
+        files = {
+            self.cli.args['stackfile']: 'parse',
+            self.cli.args['policyfile']: 'policy',
+        }
+        for fname in self.cli.policy.input_files():
+            files.setdefault(fname, 'policy')
+        for fname in self.cli.parser.dependencies():
+            files.setdefault(fname, 'parse')
+        if self.parsed is None:
+            return files
+
+        providers = set()
+        for inst in self.parsed['resources'].get('instance', []):
+            providers.add(inst['provisioner']['provider'])
+        for provider in providers:
+            try:
+                provisioner = import_from_string('pmcf.provisioners',
+                                                 provider)()
+            except PMCFException:
+                # Reported when the stack is rendered
+                continue
+            for fname in provisioner.input_files():
+                files.setdefault(fname, 'render')
+        return files
+
+    def changed_stage(self):
+        """
+        Finds the earliest pipeline stage with a changed input
+
+        :returns: str or None
+        """
+
+        stages = []
+        for fname, stage in self.watched_files().iteritems():
+            if _mtime(fname) != self._mtimes.get(fname):
+                LOG.debug('%s changed', fname)
+                stages.append(STAGES.index(stage))
+        if stages:
+            return STAGES[min(stages)]
+        return None
+
+    def rebuild(self, stage):
+        """
+        Runs the pipeline from the given stage onwards, reusing the results
+        of earlier stages.
+
+        :param stage: First stage to run
+        :type stage: str.
+        :raises: :class:`pmcf.exceptions.PMCFException`
+        :returns: str.
+        """
+
+        args = self.cli.args
+        if stage == 'parse':
+            self.parsed = None
+            self.cli.parser = import_from_string('pmcf.parsers',
+                                                 args['parser'])()
+            self.parsed = copy.deepcopy(self.cli.parse())
+        if stage in ['parse', 'policy']:
+            self.validated = None
+            self.cli.policy = load_policy(args)
+            # Policy fills in defaults in place, so start from the parsed
+            # stack each time.
+            stack = copy.deepcopy(self.parsed)
+            self.cli.parser._stack = stack  # pylint: disable=protected-access
+            self.cli.validation_cache = self.validation_cache
+            self.cli.validate(stack)
+            self.validated = stack
+        # Provisioners modify their arguments while rendering
+        data = self.cli.render(copy.deepcopy(self.validated))[0]
+        return data
+
+    def report(self, old, new):
+        """
+        Prints a summary of the resources that differ between two renders
+
+        :param old: Previous output, or None for the first render
+        :type old: str.
+        :param new: Current output
+        :type new: str.
+        """
+
+        if old is None:
+            print 'Rendered %s' % self.cli.args['stackfile']
+            return
+        try:
+            changes = diff_resources(old, new)
+        except ValueError:
+            changes = None
+        if changes is None:
+            print 'Output changed' if old != new else 'No changes'
+            return
+        if not (changes['added'] or changes['removed'] or changes['changed']):
+            print 'No changes'
+            return
+        for key, colour, sign in [('added', 'green', '+'),
+                                  ('removed', 'red', '-'),
+                                  ('changed', 'yellow', '~')]:
+            for name in changes[key]:
+                print colourise_output(colour, '%s %s' % (sign, name))
+
+    def poll_once(self):
+        """
+        Checks the watched files once, and rebuilds and reports if any of
+        them changed.  Errors are logged rather than raised, so that the
+        next edit gets a chance to fix them.
+
+        :returns: boolean - whether anything was rebuilt
+        """
+
+        stage = self.changed_stage()
+        if stage is None:
+            return False
+        if self.parsed is None:
+            stage = 'parse'
+        elif self.validated is None and stage == 'render':
+            stage = 'policy'
+
+        start = time.time()
+        try:
+            data = self.rebuild(stage)
+        except PMCFException, exc:
+            LOG.error(exc.message)
+            data = None
+        finally:
+            self._mtimes = dict((fname, _mtime(fname))
+                                for fname in self.watched_files())
+        if data is None:
+            return True
+
+        LOG.info('Rebuilt from %s stage in %.3fs', stage, time.time() - start)
+        self.report(self.rendered, data)
+        self.rendered = data
+        return True
+
+    def watch(self):
+        """
+        Polls for changes until interrupted
+
+        :returns: boolean
+        """
+
+        LOG.info('Watching %s', self.cli.args['stackfile'])
+        try:
+            while True:
+                self.poll_once()
+                time.sleep(self.interval)
+        except KeyboardInterrupt:
+            pass
+        return False
+
+
+__all__ = [
+    'PMCFWatcher',
+]
@@ -67,12 +67,21 @@ class PMCFConfig(object):
             'poll': False,
             'quiet': None,
             'policyfile': None,
+            'policy_overlays': None,
             'stackfile': None,
+            'include_path': None,
+            'xsdfile': None,
             'accesskey': None,
             'secretkey': None,
             'instance_accesskey': None,
             'instance_secretkey': None,
             'region': None,
+            'max_regions': None,
+            'render_jobs': None,
+            'timings': None,
+            'cachedir': '~/.cache/pmcf',
+            'cache_size': 100,
+            'no_cache': None,
             'use_iam_profile': False,
             'environment': None,
         }
@@ -110,8 +119,36 @@ class PMCFConfig(object):
         options.update(profile_options)
         options.update(cli_options)
 
+        region_credentials = self._get_region_credentials(options['region'])
+        if region_credentials:
+            options['region_credentials'] = region_credentials
+
         return options
 
+    def _get_region_credentials(self, regions):
+        """
+        Reads credentials set for individual regions, as
+        ``accesskey.<region>`` and ``secretkey.<region>``, from the profile
+        or the default section
+
+        :param regions: Region name, or comma-separated list of region names
+        :type regions: str.
+        :returns: dict mapping region name to credentials
+        """
+
+        ret = {}
+        for region in (regions or '').split(','):
+            region = region.strip()
+            if not region:
+                continue
+            for opt, key in [('accesskey', 'access'), ('secretkey', 'secret')]:
+                name = '%s.%s' % (opt, region)
+                val = self._get_from_section(self.profile_name, name) or\
+                    self._get_from_section('default', name)
+                if val:
+                    ret.setdefault(region, {})[key] = val
+        return ret
+
     def _get_from_section(self, section, option):
         """
         Reads option out of section of ini file
@@ -21,11 +21,26 @@
 """
 
 
+def _rebuild(cls, args, state):
+    """
+    Recreates a pickled exception without calling its constructor, which
+    would add its prefix to the message again
+    """
+
+    exc = cls.__new__(cls)
+    Exception.__init__(exc, *args)
+    exc.__dict__.update(state)
+    return exc
+
+
 class PMCFException(Exception):
     """
     Base Exception class in PMCF
     """
-    pass
+
+    def __reduce__(self):
+        # Exceptions are pickled when raised in worker processes
+        return (_rebuild, (self.__class__, self.args, self.__dict__))
 
 
 class ParserFailure(PMCFException):
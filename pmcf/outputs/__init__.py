@@ -20,12 +20,18 @@
 ..  moduleauthor:: Stephen Gran <stephen.gran@piksel.com>
 """
 
-from pmcf.outputs.base_output import BaseOutput
-from pmcf.outputs.c4cloudformation import C4AWSCFNOutput
-from pmcf.outputs.cloudformation import AWSCFNOutput
-from pmcf.outputs.json_output import JSONOutput
-from pmcf.outputs.sequoiacloudformation import SequoiaAWSCFNOutput
-from pmcf.outputs.vagrant import VagrantOutput
+from pmcf.utils import lazy_package
+
+# Classes are imported from their modules the first time they are used,
+# so that only the implementations a run needs get loaded.
+lazy_package(__name__, {
+    'AWSCFNOutput': 'pmcf.outputs.cloudformation',
+    'BaseOutput': 'pmcf.outputs.base_output',
+    'C4AWSCFNOutput': 'pmcf.outputs.c4cloudformation',
+    'JSONOutput': 'pmcf.outputs.json_output',
+    'SequoiaAWSCFNOutput': 'pmcf.outputs.sequoiacloudformation',
+    'VagrantOutput': 'pmcf.outputs.vagrant',
+})
 
 
 __all__ = [
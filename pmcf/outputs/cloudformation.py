@@ -21,17 +21,53 @@
 """
 
 import boto
-import json
 import logging
+from multiprocessing.pool import ThreadPool
+import threading
 import time
 
-from pmcf.exceptions import AuditException, ProvisionerException
+from pmcf.exceptions import AuditException, PMCFException
+from pmcf.exceptions import ProvisionerException
 from pmcf.outputs.json_output import JSONOutput
 from pmcf.utils import import_from_string, make_diff
 from pmcf.utils import get_changed_keys_from_templates, is_term
+from pmcf.utils.template import as_template
+from pmcf.utils.timing import TimedProxy, timed
 
 LOG = logging.getLogger(__name__)
 
+# Default number of regions worked on at once
+MAX_REGIONS = 4
+
+# Region the current thread is working on, when running in several
+_CONTEXT = threading.local()
+
+# Only one region at a time may talk to the user
+_PROMPT_LOCK = threading.RLock()
+
+
+class _RegionLogAdapter(logging.LoggerAdapter):
+    """
+    Prefixes log messages with the region they are about
+    """
+
+    def process(self, msg, kwargs):
+        return '%s: %s' % (self.extra['region'], msg), kwargs
+
+
+def _log():
+    """
+    Logger for the current thread, prefixing messages with the region being
+    worked on when running in several regions at once
+
+    :returns: :class:`logging.Logger` or :class:`logging.LoggerAdapter`
+    """
+
+    region = getattr(_CONTEXT, 'region', None)
+    if region is None:
+        return LOG
+    return _RegionLogAdapter(LOG, {'region': region})
+
 
 class AWSCFNOutput(JSONOutput):
     """
@@ -46,7 +82,11 @@ class AWSCFNOutput(JSONOutput):
         Helper method to take input if input is a tty
         """
         if is_term():
-            return raw_input(prompt)
+            region = getattr(_CONTEXT, 'region', None)
+            if region is not None:
+                prompt = '%s: %s' % (region, prompt)
+            with _PROMPT_LOCK:
+                return raw_input(prompt)
         return 'y'
 
     def _get_difference(self, cfn, stack, data):
@@ -54,7 +94,7 @@ class AWSCFNOutput(JSONOutput):
         Helper method to find differences between two JSON documents
         """
         resp = cfn.get_template(stack)['GetTemplateResponse']
-        old_body = resp['GetTemplateResult']['TemplateBody']
+        old_body = as_template(resp['GetTemplateResult']['TemplateBody'])
         return get_changed_keys_from_templates(old_body, data)
 
     def _show_prompt(self, cfn, stack, data, allowed):
@@ -62,21 +102,28 @@ class AWSCFNOutput(JSONOutput):
         Helper method to create colourised diff outut and prompt for update
         """
         resp = cfn.get_template(stack)['GetTemplateResponse']
-        old_body = resp['GetTemplateResult']['TemplateBody']
+        # Parsed once for both the diff and the changed keys
+        old_body = as_template(resp['GetTemplateResult']['TemplateBody'])
         diff = make_diff(old_body, data)
         if len(diff):
-            print "Diff from previous:"
-            print diff
-            chkeys = get_changed_keys_from_templates(old_body, data)
-            chkeys = [k for k in chkeys if not allowed.match(k)]
-            print "Changed data:"
-            for k in sorted(chkeys):
-                print k
-            answer = self._get_input("Continue? [Yn]: ")
+            # Keep the diff and its question together when several regions
+            # are running
+            with _PROMPT_LOCK:
+                region = getattr(_CONTEXT, 'region', None)
+                if region is not None:
+                    print "Region %s:" % region
+                print "Diff from previous:"
+                print diff
+                chkeys = get_changed_keys_from_templates(old_body, data)
+                chkeys = [k for k in chkeys if not allowed.match(k)]
+                print "Changed data:"
+                for k in sorted(chkeys):
+                    print k
+                answer = self._get_input("Continue? [Yn]: ")
             if answer.lower().startswith('n'):
                 return False
         else:
-            LOG.warning('No difference, not updating')
+            _log().warning('No difference, not updating')
             return False
         return True
 
@@ -91,7 +138,7 @@ class AWSCFNOutput(JSONOutput):
         :returns: boolean
         """
 
-        LOG.info('Checking whether stack %s is able to be updated', stack)
+        _log().info('Checking whether stack %s is able to be updated', stack)
         try:
             ret = cfn.describe_stacks(stack)
             if len(ret) == 1:
@@ -115,7 +162,7 @@ class AWSCFNOutput(JSONOutput):
         :returns: boolean
         """
 
-        LOG.info('Checking for existance of stack %s', stack)
+        _log().info('Checking for existance of stack %s', stack)
         try:
             cfn.describe_stacks(stack)
             return True
@@ -131,11 +178,11 @@ class AWSCFNOutput(JSONOutput):
         IAM capabilities to the stack definition if present.
 
         :param data: Stack definition
-        :type data: str.
+        :type data: :class:`pmcf.utils.template.TemplateDocument`
         :returns: boolean
         """
 
-        json_data = json.loads(data)
+        json_data = data.data
         if not json_data.get('Resources'):
             return False
         for k in json_data['Resources'].keys():
@@ -158,8 +205,8 @@ class AWSCFNOutput(JSONOutput):
         :raises: :class:`pmcf.exceptions.ProvisionerException`
         """
 
-        LOG.info('uploading stack definition to s3://%s/%s',
-                 credentials['audit_output'], destination)
+        _log().info('uploading stack definition to s3://%s/%s',
+                    credentials['audit_output'], destination)
         try:
             s3conn = None
             if credentials.get('use_iam_profile'):
@@ -169,22 +216,88 @@ class AWSCFNOutput(JSONOutput):
                     aws_access_key_id=credentials['access'],
                     aws_secret_access_key=credentials['secret']
                 )
-            bucket = s3conn.get_bucket(credentials['audit_output'])
-            k = boto.s3.key.Key(bucket)
-            k.key = destination
-            k.set_contents_from_string(stack)
+            with timed('s3.upload'):
+                bucket = s3conn.get_bucket(credentials['audit_output'])
+                k = boto.s3.key.Key(bucket)
+                k.key = destination
+                k.set_contents_from_string(stack)
         except (boto.exception.S3ResponseError,
                 boto.exception.BotoServerError), exc:
             raise ProvisionerException(exc)
 
+    def _regions(self, region):
+        """
+        Splits a comma-separated list of regions
+
+        :param region: Region name, or comma-separated list of region names
+        :type region: str.
+        :returns: list of region names, in the order given
+        """
+
+        if isinstance(region, basestring):
+            region = region.split(',')
+        regions = []
+        for name in region:
+            name = name.strip()
+            if name and name not in regions:
+                regions.append(name)
+        return regions
+
+    def _region_metadata(self, metadata, region):
+        """
+        Builds the metadata for one region, overlaying any credentials
+        configured specifically for that region
+
+        :param metadata: Additional information for stack launch
+        :type metadata: dict.
+        :param region: Region name
+        :type region: str.
+        :returns: dict
+        """
+
+        metadata = dict(metadata)
+        metadata['region'] = region
+        credentials = metadata.get('region_credentials', {})
+        metadata.update(credentials.get(region, {}))
+        return metadata
+
+    def _connect(self, metadata):
+        """
+        Connects to the cloudformation API of the region in the metadata
+
+        :param metadata: Additional information for stack launch
+        :type metadata: dict.
+        :raises: :class:`pmcf.exceptions.ProvisionerException`
+        :returns: cloudformation connection object
+        """
+
+        cfn = None
+        for region in boto.regioninfo.get_regions('cloudformation'):
+            if region.name == metadata['region']:
+                if metadata.get('use_iam_profile'):
+                    cfn = boto.connect_cloudformation(region=region)
+                else:
+                    cfn = boto.connect_cloudformation(
+                        aws_access_key_id=metadata['access'],
+                        aws_secret_access_key=metadata['secret'],
+                        region=region
+                    )
+        if cfn is None:
+            raise ProvisionerException("Can't find a valid region")
+        return TimedProxy(cfn, 'cfn')
+
     def run(self, data, metadata=None, poll=False,
             action='create', upload=False):
         """
         Interfaces with public and private cloud providers - responsible for
         actual stack creation and update in AWS.
 
+        The region in the metadata may be a comma-separated list, in which
+        case the stack is launched in each region concurrently, up to
+        ``max_regions`` at a time, and the run fails if any region fails.
+
         :param data: Stack definition
-        :type data: str.
+        :type data: str or :class:`pmcf.utils.template.TemplateDocument`
         :param metadata: Additional information for stack launch (tags, etc).
         :type metadata: dict.
         :param poll: Whether to poll until completion
@@ -199,23 +312,75 @@ class AWSCFNOutput(JSONOutput):
 
         metadata = metadata or {}
         LOG.debug('metadata is %s', metadata)
+        # Regions share one document, so it is only serialised once
+        data = as_template(data).canonical()
 
-        if metadata.get('region', None) is None:
+        regions = self._regions(metadata.get('region', None) or [])
+        if len(regions) == 0:
             raise ProvisionerException('Need to supply region in metadata')
 
-        cfn = None
-        for region in boto.regioninfo.get_regions('cloudformation'):
-            if region.name == metadata['region']:
-                if metadata.get('use_iam_profile'):
-                    cfn = boto.connect_cloudformation(region=region)
-                else:
-                    cfn = boto.connect_cloudformation(
-                        aws_access_key_id=metadata['access'],
-                        aws_secret_access_key=metadata['secret'],
-                        region=region
-                    )
-        if cfn is None:
-            raise ProvisionerException("Can't find a valid region")
+        if len(regions) == 1:
+            return self.run_region(data,
+                                   self._region_metadata(metadata, regions[0]),
+                                   poll, action, upload)
+
+        try:
+            workers = int(metadata.get('max_regions', None) or MAX_REGIONS)
+        except ValueError:
+            raise ProvisionerException('max_regions must be a number, not %s'
+                                       % metadata['max_regions'])
+        workers = max(1, min(workers, len(regions)))
+        LOG.info('Running in %d regions, %d at a time',
+                 len(regions), workers)
+
+        def _run(region):
+            _CONTEXT.region = region
+            try:
+                return self.run_region(
+                    data, self._region_metadata(metadata, region),
+                    poll, action, upload)
+            except PMCFException, exc:
+                _log().error(exc.message)
+                return False
+            finally:
+                _CONTEXT.region = None
+
+        pool = ThreadPool(workers)
+        try:
+            results = pool.map(_run, regions)
+        finally:
+            pool.close()
+            pool.join()
+
+        failed = [region for region, ret in zip(regions, results) if not ret]
+        if failed:
+            LOG.error('Failed in %s', ', '.join(failed))
+            return False
+        return True
+
+    def run_region(self, data, metadata, poll=False,
+                   action='create', upload=False):
+        """
+        Creates, updates or deletes the stack in the single region named in
+        the metadata
+
+        :param data: Stack definition
+        :type data: str or :class:`pmcf.utils.template.TemplateDocument`
+        :param metadata: Additional information for stack launch (tags, etc).
+        :type metadata: dict.
+        :param poll: Whether to poll until completion
+        :type poll: boolean.
+        :param action: Action to take on the stack
+        :type action: str.
+        :param upload: Whether to upload stack definition to s3 before launch
+        :type upload: bool.
+        :raises: :class:`pmcf.exceptions.ProvisionerException`
+        :returns: boolean
+        """
+
+        log = _log()
+        cfn = self._connect(metadata)
+        data = as_template(data).canonical()
 
         strategy = import_from_string(
             'pmcf.strategy',
@@ -231,7 +396,7 @@ class AWSCFNOutput(JSONOutput):
         try:
             if action == 'delete':
                 if self._stack_exists(cfn, metadata['name']):
-                    LOG.info('stack %s exists, deleting', metadata['name'])
+                    log.info('stack %s exists, deleting', metadata['name'])
                     if strategy.should_prompt('delete'):
                         answer = self._get_input(
                             "Proceed with deletion of %s? [Yn]: " %
@@ -242,7 +407,7 @@ class AWSCFNOutput(JSONOutput):
                     cfn.delete_stack(metadata['name'])
                     return self.do_poll(cfn, metadata['name'], poll, action)
                 else:
-                    LOG.info("stack %s doesn't exist", metadata['name'])
+                    log.info("stack %s doesn't exist", metadata['name'])
                     return True
 
             if upload:
@@ -267,15 +432,14 @@ class AWSCFNOutput(JSONOutput):
                 dest = ''
                 url = ''
 
-            data = json.dumps(json.loads(data))
             if action == 'trigger':
                 if self._stack_updatable(cfn, metadata['name']):
-                    LOG.info('stack %s exists, triggering', metadata['name'])
+                    log.info('stack %s exists, triggering', metadata['name'])
                     allowed_update = strategy.allowed_update()
 
                     diff = self._get_difference(cfn, metadata['name'], data)
                     if len(diff) == 0:
-                        LOG.warning('No difference, not updating')
+                        log.warning('No difference, not updating')
                         return True
 
                     for change in diff:
@@ -293,15 +457,15 @@ class AWSCFNOutput(JSONOutput):
                                          capabilities=capabilities, tags=tags)
 
                 else:
-                    LOG.info("stack %s not updatable", metadata['name'])
+                    log.info("stack %s not updatable", metadata['name'])
                     return True
 
             elif action == 'create':
                 if self._stack_exists(cfn, metadata['name']):
-                    LOG.info("stack %s already exists", metadata['name'])
+                    log.info("stack %s already exists", metadata['name'])
                     return True
 
-                LOG.info("stack %s doesn't exist, creating", metadata['name'])
+                log.info("stack %s doesn't exist, creating", metadata['name'])
                 if upload:
                     self._upload_stack(data, dest, creds)
                     cfn.validate_template(template_url=url)
@@ -314,7 +478,7 @@ class AWSCFNOutput(JSONOutput):
 
             elif action == 'update':
                 if not self._stack_exists(cfn, metadata['name']):
-                    LOG.info("stack %s doesn't exist", metadata['name'])
+                    log.info("stack %s doesn't exist", metadata['name'])
                     return True
 
                 if self._stack_updatable(cfn, metadata['name']):
@@ -326,7 +490,7 @@ class AWSCFNOutput(JSONOutput):
 
                     diff = self._get_difference(cfn, metadata['name'], data)
                     if len(diff) == 0:
-                        LOG.warning('No difference, not updating')
+                        log.warning('No difference, not updating')
                         return True
 
                     changes = 0
@@ -335,7 +499,7 @@ class AWSCFNOutput(JSONOutput):
                             continue
                         changes += 1
                     if changes == 0:
-                        LOG.warning('No difference, not updating')
+                        log.warning('No difference, not updating')
                         return True
 
                     if strategy.should_prompt('update'):
@@ -346,7 +510,7 @@ class AWSCFNOutput(JSONOutput):
                                 allowed_update):
                             return True
 
-                    LOG.info("stack %s exists, updating",
+                    log.info("stack %s exists, updating",
                              metadata['name'])
                     if upload:
                         self._upload_stack(data, dest, creds)
@@ -358,7 +522,7 @@ class AWSCFNOutput(JSONOutput):
                         cfn.update_stack(metadata['name'], data,
                                          capabilities=capabilities, tags=tags)
                 else:
-                    LOG.info("stack %s not updateable", metadata['name'])
+                    log.info("stack %s not updateable", metadata['name'])
                     return True
 
             self.do_audit(data, metadata)
@@ -379,9 +543,10 @@ class AWSCFNOutput(JSONOutput):
         :type poll: boolean.
         """
 
+        log = _log()
         if poll:
-            LOG.info('Polling until %s is complete', name)
-            LOG.info('%20s | %35s | %20s | %s',
+            log.info('Polling until %s is complete', name)
+            log.info('%20s | %35s | %20s | %s',
                      'resource id',
                      'resource type',
                      'resource status',
@@ -389,12 +554,14 @@ class AWSCFNOutput(JSONOutput):
             seen_events = set()
             stack = None
             while True:
-                time.sleep(3)
+                with timed('cfn.poll_wait'):
+                    time.sleep(3)
                 try:
                     stack = cfn.describe_stacks(name)[0]
-                    all_events = stack.describe_events()
+                    with timed('cfn.describe_events'):
+                        all_events = stack.describe_events()
                 except boto.exception.BotoServerError, exc:
-                    LOG.info(exc.message)
+                    log.info(exc.message)
                     if action == 'delete' and \
                             exc.message.endswith('does not exist'):
                         return True
@@ -407,7 +574,7 @@ class AWSCFNOutput(JSONOutput):
                     if event.timestamp < self.start_time:
                         seen_events.add(event.event_id)
                         continue
-                    LOG.info('%20s | %35s | %20s | %s',
+                    log.info('%20s | %35s | %20s | %s',
                              event.logical_resource_id,
                              event.resource_type,
                              event.resource_status,
@@ -422,9 +589,9 @@ class AWSCFNOutput(JSONOutput):
                     stack.stack_status.startswith('DELETE'):
                 return False
             if len(stack.outputs) > 0:
-                LOG.info('Stack outputs')
+                log.info('Stack outputs')
                 for output in stack.outputs:
-                    LOG.info('%s: %s', output.description, output.value)
+                    log.info('%s: %s', output.description, output.value)
         return True
 
     def do_audit(self, data, metadata):
@@ -453,7 +620,7 @@ class AWSCFNOutput(JSONOutput):
                 time.strftime('%Y%m%dT%H%M%S'))
             audit.record_stack(data, dest, creds)
         except AuditException, exc:
-            LOG.error(exc)
+            _log().error(exc)
 
 
 __all__ = [
@@ -22,9 +22,12 @@
 
 import json
 import logging
+import multiprocessing
 import re
 from signal import signal, SIGPIPE, SIG_DFL
+import threading
 from troposphere import Base64, GetAtt, GetAZs, Output, Ref, Template
+from troposphere import awsencode
 
 from pmcf.outputs.base_output import BaseOutput
 from pmcf.resources.aws import autoscaling, ec2, iam, elasticloadbalancing
@@ -32,9 +35,46 @@ from pmcf.resources.aws import elasticache
 from pmcf.resources.aws import cloudformation as cfn
 from pmcf.resources.aws import cloudwatch, kinesis, route53, sqs
 from pmcf.utils import import_from_string
+from pmcf.utils.template import TemplateDocument, as_template
+from pmcf.utils.timing import timed
 
 LOG = logging.getLogger(__name__)
 
+# Set while instance groups are built by worker processes, which inherit it
+_GROUPS = {}
+_GROUPS_LOCK = threading.Lock()
+
+
+def _render_group(idx):
+    """
+    Builds the resources for one instance group.  This is the unit of work
+    handed to the worker pool.
+
+    :param idx: Index of the group in the instance definitions
+    :type idx: int.
+    :raises: :class:`pmcf.exceptions.ProvisionerException`
+    :returns: str. - JSON list of [title, resource] pairs
+    """
+
+    output, instances, config, sgs, lbs = _GROUPS['work']
+    resources = output._add_instance(  # pylint: disable=protected-access
+        instances[idx], config, sgs, lbs)
+    return json.dumps([[res.title, res] for res in resources],
+                      cls=awsencode)
+
+
+class _Fragment(object):
+    """
+    A resource built by a worker process, as it is written in the template
+    """
+
+    def __init__(self, title, resource):
+        self.title = title
+        self.resource = resource
+
+    def JSONrepr(self):
+        return self.resource
+
 
 class JSONOutput(BaseOutput):
     """
@@ -44,6 +84,10 @@ class JSONOutput(BaseOutput):
     cloudformation API, but does not itself make use of the API.
     """
 
+    # Worker processes building instance groups, set from the
+    # ``render_jobs`` option.  One builds them all in this process.
+    render_jobs = 1
+
     def _add_caches(self, data, caches, config, sgs):
         """
         Iterates and creates AWS Elasticache
@@ -421,7 +465,8 @@ class JSONOutput(BaseOutput):
                 SecurityGroupIngress=rules,
                 **sgargs
             )
-            LOG.debug('Adding sg: %s', sgs[name].JSONrepr())
+            if LOG.isEnabledFor(logging.DEBUG):
+                LOG.debug('Adding sg: %s', sgs[name].JSONrepr())
             data.add_resource(sgs[name])
         return sgs
 
@@ -547,470 +592,522 @@ class JSONOutput(BaseOutput):
                     Type="A"
                 ))
 
-            LOG.debug('Adding lb: %s', lbs[name].JSONrepr())
+            if LOG.isEnabledFor(logging.DEBUG):
+                LOG.debug('Adding lb: %s', lbs[name].JSONrepr())
             data.add_resource(lbs[name])
         return lbs
 
-    def _add_instances(self, data, instances, config, sgs, lbs):
+    def _add_instance(self, inst, config, sgs, lbs):
         """
-        Iterates and creates AWS ELBs
-
-        :param data: Template object
-        :type data: :class:`troposphere.Template`
-        :param instances: list of instance definitions
-        :type instances: list.
+        Creates the resources for one instance group: its launch config and
+        autoscaling group, and any EIPs, DNS records, IAM role and profile,
+        wait condition, scheduled actions, scaling policies and alarms.
+        Groups only share the security groups and load balancers they refer
+        to, so can be built in any order, or in other processes.
+
+        :param inst: Instance definition, which is modified
+        :type inst: dict.
         :param config: Config key/value pairs
         :type config: dict.
-        :param sgs: list of security group definitions
-        :type sgs: list.
-        :param lbs: list of load balancer definitions
-        :type lbs: list.
-        :returns: dict.
+        :param sgs: security group resources by name
+        :type sgs: dict.
+        :param lbs: load balancer resources by name
+        :type lbs: dict.
+        :returns: list of resources, in the order they were built
         :raises: :class:`pmcf.exceptions.ProvisionerException`
         """
 
-        for inst in instances:
-            udata = None
-            cfni = None
-            args = inst['provisioner']['args']
-            args.update({
-                'environment': config['environment'],
-                'name': inst['name'],
-                'stackname': config['name'],
-                'resource': "LC%s" % inst['name'],
-            })
-            args['appname'] = args.get('appname', config['name'])
-            if config.get("version", None):
-                args["version"] = config["version"]
-
-            if inst.get('nat'):
-                args['eip'] = []
-                records = []
-                for idx in range(0, inst['count']):
-                    eip = ec2.EIP(
-                        "EIP%s%s" % (inst['name'], idx),
-                        Domain='vpc',
-                    )
-                    args['eip'].append(eip)
-                    records.append(Ref(eip))
-                    data.add_resource(eip)
-
-                    data.add_resource(route53.RecordSetType(
-                        "EIPDNS%s%02d" % (inst['name'], idx + 1),
-                        HostedZoneName="%s.%s" % (
-                            config['environment'],
-                            inst['dnszone']
-                        ),
-                        Comment="EIP for %s in %s" % (
-                            inst['name'], config['environment']),
-                        Name="%s%02d.%s.%s" % (
-                            inst['name'], idx + 1,
-                            config['environment'],
-                            inst['dnszone']
-                        ),
-                        Type="A",
-                        TTL="300",
-                        ResourceRecords=[Ref(eip)],
-                    ))
+        resources = []
+        udata = None
+        cfni = None
+        args = inst['provisioner']['args']
+        args.update({
+            'environment': config['environment'],
+            'name': inst['name'],
+            'stackname': config['name'],
+            'resource': "LC%s" % inst['name'],
+        })
+        args['appname'] = args.get('appname', config['name'])
+        if config.get("version", None):
+            args["version"] = config["version"]
+
+        if inst.get('nat'):
+            args['eip'] = []
+            records = []
+            for idx in range(0, inst['count']):
+                eip = ec2.EIP(
+                    "EIP%s%s" % (inst['name'], idx),
+                    Domain='vpc',
+                )
+                args['eip'].append(eip)
+                records.append(Ref(eip))
+                resources.append(eip)
 
-                data.add_resource(route53.RecordSetType(
-                    "EIPDNS%s" % inst['name'],
+                resources.append(route53.RecordSetType(
+                    "EIPDNS%s%02d" % (inst['name'], idx + 1),
                     HostedZoneName="%s.%s" % (
                         config['environment'],
                         inst['dnszone']
                     ),
                     Comment="EIP for %s in %s" % (
                         inst['name'], config['environment']),
-                    Name="%s.%s.%s" % (
-                        inst['name'],
+                    Name="%s%02d.%s.%s" % (
+                        inst['name'], idx + 1,
                         config['environment'],
                         inst['dnszone']
                     ),
                     Type="A",
                     TTL="300",
-                    ResourceRecords=records,
+                    ResourceRecords=[Ref(eip)],
                 ))
 
-            provider = inst['provisioner']['provider']
-            provisioner = import_from_string('pmcf.provisioners',
-                                             provider)()
-            if provisioner.wants_wait():
-                waithandle = cfn.WaitConditionHandle(
-                    "Handle%s" % inst['name'],
-                )
-                args['WaitHandle'] = waithandle
-                data.add_resource(waithandle)
-                if inst['count'] > 0:
-                    cnt = 1
-                else:
-                    cnt = 0
-                data.add_resource(cfn.WaitCondition(
-                    "Wait%s" % inst['name'],
-                    DependsOn="ASG%s" % inst['name'],
-                    Handle=Ref(waithandle),
-                    Count=cnt,
-                    Timeout=3600
-                ))
+            resources.append(route53.RecordSetType(
+                "EIPDNS%s" % inst['name'],
+                HostedZoneName="%s.%s" % (
+                    config['environment'],
+                    inst['dnszone']
+                ),
+                Comment="EIP for %s in %s" % (
+                    inst['name'], config['environment']),
+                Name="%s.%s.%s" % (
+                    inst['name'],
+                    config['environment'],
+                    inst['dnszone']
+                ),
+                Type="A",
+                TTL="300",
+                ResourceRecords=records,
+            ))
 
-            if provisioner.wants_profile():
-                assume_policy_doc = {
-                    "Version": "2012-10-17",
-                    "Statement": [{
-                        "Effect": "Allow",
-                        "Principal": {
-                            "Service": ["ec2.amazonaws.com"]
-                        },
-                        "Action": ["sts:AssumeRole"]
-                    }]
-                }
+        provider = inst['provisioner']['provider']
+        provisioner = import_from_string('pmcf.provisioners',
+                                         provider)()
+        if provisioner.wants_wait():
+            waithandle = cfn.WaitConditionHandle(
+                "Handle%s" % inst['name'],
+            )
+            args['WaitHandle'] = waithandle
+            resources.append(waithandle)
+            if inst['count'] > 0:
+                cnt = 1
+            else:
+                cnt = 0
+            resources.append(cfn.WaitCondition(
+                "Wait%s" % inst['name'],
+                DependsOn="ASG%s" % inst['name'],
+                Handle=Ref(waithandle),
+                Count=cnt,
+                Timeout=3600
+            ))
 
-                iam_role = iam.Role(
-                    "Role%s" % inst['name'],
-                    AssumeRolePolicyDocument=assume_policy_doc,
-                    Path='/%s/%s/' % (inst['name'], config['environment'])
-                )
-                data.add_resource(iam_role)
-                args.update({'role': Ref(iam_role)})
-                policy_doc = provisioner.provisioner_policy(args)
-                if policy_doc:
-                    data.add_resource(iam.PolicyType(
-                        "Policy%s" % inst['name'],
-                        PolicyName='iam-%s-%s' % (
-                            inst['name'], config['environment']),
-                        PolicyDocument=policy_doc,
-                        Roles=[Ref(iam_role)]
-                    ))
+        if provisioner.wants_profile():
+            assume_policy_doc = {
+                "Version": "2012-10-17",
+                "Statement": [{
+                    "Effect": "Allow",
+                    "Principal": {
+                        "Service": ["ec2.amazonaws.com"]
+                    },
+                    "Action": ["sts:AssumeRole"]
+                }]
+            }
 
-                iip = iam.InstanceProfile(
-                    "Profile%s" % inst['name'],
-                    Path="/%s/%s/" % (
+            iam_role = iam.Role(
+                "Role%s" % inst['name'],
+                AssumeRolePolicyDocument=assume_policy_doc,
+                Path='/%s/%s/' % (inst['name'], config['environment'])
+            )
+            resources.append(iam_role)
+            args.update({'role': Ref(iam_role)})
+            policy_doc = provisioner.provisioner_policy(args)
+            if policy_doc:
+                resources.append(iam.PolicyType(
+                    "Policy%s" % inst['name'],
+                    PolicyName='iam-%s-%s' % (
                         inst['name'], config['environment']),
+                    PolicyDocument=policy_doc,
                     Roles=[Ref(iam_role)]
-                )
-                data.add_resource(iip)
-                args.update({'profile': Ref(iip)})
-
-            udata = provisioner.userdata(args)
-            cfni = provisioner.cfn_init(args)
-
-            lcargs = {
-                'ImageId': inst['image'],
-                'InstanceType': inst['size'],
-                'KeyName': inst['sshKey'],
-                'InstanceMonitoring': inst['monitoring'],
-            }
-
-            extra_disk_table = {
-                "c1.medium": 1,
-                "c1.xlarge": 4,
-                "c3.large": 2,
-                "c3.xlarge": 2,
-                "c3.2xlarge": 2,
-                "c3.4xlarge": 2,
-                "c3.8xlarge": 2,
-                "cc2.8xlarge": 4,
-                "cg1.4xlarge": 2,
-                "cr1.8xlarge": 2,
-                "g2.2xlarge": 1,
-                "hi1.4xlarge": 2,
-                "hs1.8xlarge": 24,
-                "i2.xlarge": 1,
-                "i2.2xlarge": 2,
-                "i2.4xlarge": 4,
-                "i2.8xlarge": 8,
-                "m1.small": 1,
-                "m1.medium": 1,
-                "m1.large": 2,
-                "m1.xlarge": 4,
-                "m2.xlarge": 1,
-                "m2.2xlarge": 1,
-                "m2.4xlarge": 2,
-                "m3.medium": 1,
-                "m3.large": 1,
-                "m3.xlarge": 2,
-                "m3.2xlarge": 2,
-                "r3.large": 1,
-                "r3.xlarge": 1,
-                "r3.2xlarge": 1,
-                "r3.4xlarge": 1,
-                "r3.8xlarge": 2,
-            }
-
-            block_devs = []
-            if inst['size'] in extra_disk_table.keys():
-                for disk in range(extra_disk_table[inst['size']]):
-                    # Magic Number - ASCII 'b' is 98
-                    block_devs.append(autoscaling.BlockDeviceMapping(
-                        VirtualName="ephemeral%d" % disk,
-                        DeviceName="/dev/xvd%s" % chr(98 + disk)
-                    ))
+                ))
 
-            for block_dev in inst.get('block_device', []):
+            iip = iam.InstanceProfile(
+                "Profile%s" % inst['name'],
+                Path="/%s/%s/" % (
+                    inst['name'], config['environment']),
+                Roles=[Ref(iam_role)]
+            )
+            resources.append(iip)
+            args.update({'profile': Ref(iip)})
+
+        udata = provisioner.userdata(args)
+        cfni = provisioner.cfn_init(args)
+
+        lcargs = {
+            'ImageId': inst['image'],
+            'InstanceType': inst['size'],
+            'KeyName': inst['sshKey'],
+            'InstanceMonitoring': inst['monitoring'],
+        }
+
+        extra_disk_table = {
+            "c1.medium": 1,
+            "c1.xlarge": 4,
+            "c3.large": 2,
+            "c3.xlarge": 2,
+            "c3.2xlarge": 2,
+            "c3.4xlarge": 2,
+            "c3.8xlarge": 2,
+            "cc2.8xlarge": 4,
+            "cg1.4xlarge": 2,
+            "cr1.8xlarge": 2,
+            "g2.2xlarge": 1,
+            "hi1.4xlarge": 2,
+            "hs1.8xlarge": 24,
+            "i2.xlarge": 1,
+            "i2.2xlarge": 2,
+            "i2.4xlarge": 4,
+            "i2.8xlarge": 8,
+            "m1.small": 1,
+            "m1.medium": 1,
+            "m1.large": 2,
+            "m1.xlarge": 4,
+            "m2.xlarge": 1,
+            "m2.2xlarge": 1,
+            "m2.4xlarge": 2,
+            "m3.medium": 1,
+            "m3.large": 1,
+            "m3.xlarge": 2,
+            "m3.2xlarge": 2,
+            "r3.large": 1,
+            "r3.xlarge": 1,
+            "r3.2xlarge": 1,
+            "r3.4xlarge": 1,
+            "r3.8xlarge": 2,
+        }
+
+        block_devs = []
+        if inst['size'] in extra_disk_table.keys():
+            for disk in range(extra_disk_table[inst['size']]):
+                # Magic Number - ASCII 'b' is 98
                 block_devs.append(autoscaling.BlockDeviceMapping(
-                    DeviceName=block_dev['device'],
-                    Ebs=autoscaling.EBSBlockDevice(
-                        VolumeSize=block_dev['size'],
-                        VolumeType=block_dev['type'],
-                    )
+                    VirtualName="ephemeral%d" % disk,
+                    DeviceName="/dev/xvd%s" % chr(98 + disk)
                 ))
 
-            if block_devs:
-                lcargs['BlockDeviceMappings'] = block_devs
+        for block_dev in inst.get('block_device', []):
+            block_devs.append(autoscaling.BlockDeviceMapping(
+                DeviceName=block_dev['device'],
+                Ebs=autoscaling.EBSBlockDevice(
+                    VolumeSize=block_dev['size'],
+                    VolumeType=block_dev['type'],
+                )
+            ))
 
-            inst_sgs = []
-            for secg in inst['sg']:
-                if sgs.get(secg):
-                    inst_sgs.append(Ref(sgs[secg]))
-                else:
-                    inst_sgs.append(secg)
-            lcargs['SecurityGroups'] = inst_sgs
-            if udata is not None:
-                lcargs['UserData'] = Base64(udata)
-            if cfni is not None:
-                lcargs['Metadata'] = cfni
-
-            if inst.get('public'):
-                lcargs['AssociatePublicIpAddress'] = True
-
-            if args.get('profile'):
-                lcargs['IamInstanceProfile'] = args['profile']
-            lcfg = autoscaling.LaunchConfiguration(
-                'LC%s' % inst['name'],
-                **lcargs
-            )
-            LOG.debug('Adding lc: %s', lcfg.JSONrepr())
-            data.add_resource(lcfg)
+        if block_devs:
+            lcargs['BlockDeviceMappings'] = block_devs
 
-            asgtags = [
-                autoscaling.Tag(
-                    key='Name',
-                    value='%s::%s::%s' % (
-                        config['name'],
-                        inst['name'],
-                        config['environment']
-                    ),
-                    propogate=True,
+        inst_sgs = []
+        for secg in inst['sg']:
+            if sgs.get(secg):
+                inst_sgs.append(Ref(sgs[secg]))
+            else:
+                inst_sgs.append(secg)
+        lcargs['SecurityGroups'] = inst_sgs
+        if udata is not None:
+            lcargs['UserData'] = Base64(udata)
+        if cfni is not None:
+            lcargs['Metadata'] = cfni
+
+        if inst.get('public'):
+            lcargs['AssociatePublicIpAddress'] = True
+
+        if args.get('profile'):
+            lcargs['IamInstanceProfile'] = args['profile']
+        lcfg = autoscaling.LaunchConfiguration(
+            'LC%s' % inst['name'],
+            **lcargs
+        )
+        if LOG.isEnabledFor(logging.DEBUG):
+            LOG.debug('Adding lc: %s', lcfg.JSONrepr())
+        resources.append(lcfg)
+
+        asgtags = [
+            autoscaling.Tag(
+                key='Name',
+                value='%s::%s::%s' % (
+                    config['name'],
+                    inst['name'],
+                    config['environment']
                 ),
+                propogate=True,
+            ),
+            autoscaling.Tag(
+                key='App',
+                value=inst['name'],
+                propogate=True,
+            )
+        ]
+        custom_tags = inst['provisioner']['args'].get('custom_tags', {})
+        for k, v in custom_tags.iteritems():
+            asgtags.append(
                 autoscaling.Tag(
-                    key='App',
-                    value=inst['name'],
+                    key=k,
+                    value=v,
                     propogate=True,
                 )
-            ]
-            custom_tags = inst['provisioner']['args'].get('custom_tags', {})
-            for k, v in custom_tags.iteritems():
-                asgtags.append(
-                    autoscaling.Tag(
-                        key=k,
-                        value=v,
-                        propogate=True,
-                    )
-                )
-            if inst.get('dns'):
-                dnstag = {
-                    'r': inst['dns'].get('record', inst['name']),
-                    'z': "%s.%s" % (
-                        config['environment'],
-                        inst['dns']['zone'],
-                    ),
-                    't': inst['dns']['type'],
-                }
-                asgtags.append(
-                    autoscaling.Tag(
-                        key='DNS',
-                        value=json.dumps(dnstag, sort_keys=True),
-                        propogate=True,
-                    ))
-
-            strategy = import_from_string(
-                'pmcf.strategy',
-                config.get('strategy', 'BlueGreen')
-            )()
-
-            inst['min'] = inst.get('min', inst['count'])
-            inst['max'] = inst.get('max', inst['count'])
-            asgargs = {
-                'AvailabilityZones': inst.get('zones', GetAZs('')),
-                'DesiredCapacity': inst['count'],
-                'LaunchConfigurationName': Ref(lcfg),
-                'MaxSize': inst['max'],
-                'MinSize': inst['min'],
-                'Tags': asgtags,
-                'HealthCheckType': inst.get('healthcheck', 'EC2'),
-                'HealthCheckGracePeriod': 600,
+            )
+        if inst.get('dns'):
+            dnstag = {
+                'r': inst['dns'].get('record', inst['name']),
+                'z': "%s.%s" % (
+                    config['environment'],
+                    inst['dns']['zone'],
+                ),
+                't': inst['dns']['type'],
             }
+            asgtags.append(
+                autoscaling.Tag(
+                    key='DNS',
+                    value=json.dumps(dnstag, sort_keys=True),
+                    propogate=True,
+                ))
 
-            if strategy.termination_policy() != ['Default']:
-                asgargs['TerminationPolicies'] = strategy.termination_policy()
-            if config.get('vpcid') and inst.get('subnets'):
-                asgargs['VPCZoneIdentifier'] = inst['subnets']
-            if inst.get('lb'):
-                asgargs['LoadBalancerNames'] = [
-                    Ref(lbs["ELB" + x]) for x in inst['lb']
+        strategy = import_from_string(
+            'pmcf.strategy',
+            config.get('strategy', 'BlueGreen')
+        )()
+
+        inst['min'] = inst.get('min', inst['count'])
+        inst['max'] = inst.get('max', inst['count'])
+        asgargs = {
+            'AvailabilityZones': inst.get('zones', GetAZs('')),
+            'DesiredCapacity': inst['count'],
+            'LaunchConfigurationName': Ref(lcfg),
+            'MaxSize': inst['max'],
+            'MinSize': inst['min'],
+            'Tags': asgtags,
+            'HealthCheckType': inst.get('healthcheck', 'EC2'),
+            'HealthCheckGracePeriod': 600,
+        }
+
+        if strategy.termination_policy() != ['Default']:
+            asgargs['TerminationPolicies'] = strategy.termination_policy()
+        if config.get('vpcid') and inst.get('subnets'):
+            asgargs['VPCZoneIdentifier'] = inst['subnets']
+        if inst.get('lb'):
+            asgargs['LoadBalancerNames'] = [
+                Ref(lbs["ELB" + x]) for x in inst['lb']
+            ]
+        if inst.get('depends'):
+            asgargs['DependsOn'] = inst['depends']
+        if inst.get('notify'):
+            ncfg = autoscaling.NotificationConfiguration(
+                TopicARN=inst['notify'],
+                NotificationTypes=[
+                    "autoscaling:EC2_INSTANCE_LAUNCH",
+                    "autoscaling:EC2_INSTANCE_LAUNCH_ERROR",
+                    "autoscaling:EC2_INSTANCE_TERMINATE",
+                    "autoscaling:EC2_INSTANCE_TERMINATE_ERROR"
                 ]
-            if inst.get('depends'):
-                asgargs['DependsOn'] = inst['depends']
-            if inst.get('notify'):
-                ncfg = autoscaling.NotificationConfiguration(
-                    TopicARN=inst['notify'],
-                    NotificationTypes=[
-                        "autoscaling:EC2_INSTANCE_LAUNCH",
-                        "autoscaling:EC2_INSTANCE_LAUNCH_ERROR",
-                        "autoscaling:EC2_INSTANCE_TERMINATE",
-                        "autoscaling:EC2_INSTANCE_TERMINATE_ERROR"
-                    ]
-                )
-                asgargs['NotificationConfiguration'] = ncfg
-            asg = autoscaling.AutoScalingGroup(
-                'ASG%s' % inst['name'],
-                **asgargs
             )
+            asgargs['NotificationConfiguration'] = ncfg
+        asg = autoscaling.AutoScalingGroup(
+            'ASG%s' % inst['name'],
+            **asgargs
+        )
+        if LOG.isEnabledFor(logging.DEBUG):
             LOG.debug('Adding asg: %s', asg.JSONrepr())
-            data.add_resource(asg)
+        resources.append(asg)
+
+        if inst.get('timed_scaling_policy'):
+            pol = inst['timed_scaling_policy']['up']
+            scaleuppolargs = {
+                "AutoScalingGroupName": Ref("ASG%s" % inst['name']),
+                "Recurrence": pol['recurrence'],
+            }
+            if pol.get('count', None) is not None:
+                scaleuppolargs['DesiredCapacity'] = pol['count']
+
+            if pol.get('min', None) is not None:
+                scaleuppolargs['MinSize'] = pol['min']
 
-            if inst.get('timed_scaling_policy'):
-                pol = inst['timed_scaling_policy']['up']
-                scaleuppolargs = {
+            if pol.get('max', None) is not None:
+                scaleuppolargs['MaxSize'] = pol['max']
+
+            resources.append(autoscaling.ScheduledAction(
+                "ASGTimedScaleUp%s" % inst['name'],
+                **scaleuppolargs
+            ))
+
+            pol = inst['timed_scaling_policy'].get('down', None)
+            if pol:
+                scaledownpolargs = {
                     "AutoScalingGroupName": Ref("ASG%s" % inst['name']),
-                    "Recurrence": pol['recurrence'],
+                    "Recurrence": pol['recurrence']
                 }
                 if pol.get('count', None) is not None:
-                    scaleuppolargs['DesiredCapacity'] = pol['count']
+                    scaledownpolargs['DesiredCapacity'] = pol['count']
 
                 if pol.get('min', None) is not None:
-                    scaleuppolargs['MinSize'] = pol['min']
+                    scaledownpolargs['MinSize'] = pol['min']
 
                 if pol.get('max', None) is not None:
-                    scaleuppolargs['MaxSize'] = pol['max']
+                    scaledownpolargs['MaxSize'] = pol['max']
 
-                data.add_resource(autoscaling.ScheduledAction(
-                    "ASGTimedScaleUp%s" % inst['name'],
-                    **scaleuppolargs
+                resources.append(autoscaling.ScheduledAction(
+                    "ASGTimedScaleDown%s" % inst['name'],
+                    **scaledownpolargs
                 ))
 
-                pol = inst['timed_scaling_policy'].get('down', None)
-                if pol:
-                    scaledownpolargs = {
-                        "AutoScalingGroupName": Ref("ASG%s" % inst['name']),
-                        "Recurrence": pol['recurrence']
-                    }
-                    if pol.get('count', None) is not None:
-                        scaledownpolargs['DesiredCapacity'] = pol['count']
+        if inst.get('scaling_policy'):
+            pol = inst['scaling_policy']
+            scaleuppolargs = {
+                "AutoScalingGroupName": Ref("ASG%s" % inst['name']),
+                "Cooldown": pol['up'].get('wait', 300),
+            }
+            amount = pol['up']['change']
+            if pol['up']['change'].find('%') != -1:
+                scaleuppolargs["AdjustmentType"] =\
+                    "PercentChangeInCapacity"
+                amount = amount.replace('%', '')
+            else:
+                scaleuppolargs["AdjustmentType"] = "ChangeInCapacity"
+            scaleuppolargs["ScalingAdjustment"] = amount
 
-                    if pol.get('min', None) is not None:
-                        scaledownpolargs['MinSize'] = pol['min']
+            resources.append(autoscaling.ScalingPolicy(
+                "ASGScaleUp%s" % inst['name'],
+                **scaleuppolargs
+            ))
 
-                    if pol.get('max', None) is not None:
-                        scaledownpolargs['MaxSize'] = pol['max']
+            scaledownpolargs = {
+                "AutoScalingGroupName": Ref("ASG%s" % inst['name']),
+                "Cooldown": pol['up'].get('wait', 300),
+            }
+            amount = pol['down']['change']
+            if pol['down']['change'].find('%') != -1:
+                scaledownpolargs["AdjustmentType"] =\
+                    "PercentChangeInCapacity"
+                amount = amount.replace('%', '')
+            else:
+                scaledownpolargs["AdjustmentType"] = "ChangeInCapacity"
+            scaledownpolargs["ScalingAdjustment"] = amount
 
-                    data.add_resource(autoscaling.ScheduledAction(
-                        "ASGTimedScaleDown%s" % inst['name'],
-                        **scaledownpolargs
-                    ))
+            resources.append(autoscaling.ScalingPolicy(
+                "ASGScaleDown%s" % inst['name'],
+                **scaledownpolargs
+            ))
 
-            if inst.get('scaling_policy'):
-                pol = inst['scaling_policy']
-                scaleuppolargs = {
-                    "AutoScalingGroupName": Ref("ASG%s" % inst['name']),
-                    "Cooldown": pol['up'].get('wait', 300),
+            def str_cond(cond):
+                """Helper method used locally"""
+                # expect '>= 40'
+                cond = cond.split()[0]
+                lookup = {
+                    '>=': 'GreaterThanOrEqualToThreshold',
+                    '>': 'GreaterThanThreshold',
+                    '<': 'LessThanThreshold',
+                    '<=': 'LessThanOrEqualToThreshold',
                 }
-                amount = pol['up']['change']
-                if pol['up']['change'].find('%') != -1:
-                    scaleuppolargs["AdjustmentType"] =\
-                        "PercentChangeInCapacity"
-                    amount = amount.replace('%', '')
-                else:
-                    scaleuppolargs["AdjustmentType"] = "ChangeInCapacity"
-                scaleuppolargs["ScalingAdjustment"] = amount
+                return lookup[cond]
+
+            upalarmargs = {
+                "ActionsEnabled": True,
+                "AlarmActions": [Ref("ASGScaleUp%s" % inst['name'])],
+                "ComparisonOperator": str_cond(pol['up']['condition']),
+                "Namespace": ('/').join(pol['metric'].split('/')[:2]),
+                "MetricName": pol['metric'].split('/')[2],
+                "Dimensions": [
+                    cloudwatch.MetricDimension(
+                        Name="AutoScalingGroupName",
+                        Value=Ref("ASG%s" % inst['name']),
+                    )
+                ],
+                "EvaluationPeriods": pol.get('wait', 5),
+                "Statistic": pol['up']['stat'],
+                "Threshold": pol['up']['condition'].split()[1],
+                "Unit": pol['unit'],
+            }
+            if inst['monitoring']:
+                upalarmargs['Period'] = 60
+            else:
+                upalarmargs['Period'] = 300
 
-                data.add_resource(autoscaling.ScalingPolicy(
-                    "ASGScaleUp%s" % inst['name'],
-                    **scaleuppolargs
-                ))
+            resources.append(cloudwatch.Alarm(
+                "CloudwatchUp%s" % inst['name'],
+                **upalarmargs
+            ))
 
-                scaledownpolargs = {
-                    "AutoScalingGroupName": Ref("ASG%s" % inst['name']),
-                    "Cooldown": pol['up'].get('wait', 300),
-                }
-                amount = pol['down']['change']
-                if pol['down']['change'].find('%') != -1:
-                    scaledownpolargs["AdjustmentType"] =\
-                        "PercentChangeInCapacity"
-                    amount = amount.replace('%', '')
-                else:
-                    scaledownpolargs["AdjustmentType"] = "ChangeInCapacity"
-                scaledownpolargs["ScalingAdjustment"] = amount
+            downalarmargs = {
+                "ActionsEnabled": True,
+                "OKActions": [Ref("ASGScaleDown%s" % inst['name'])],
+                "ComparisonOperator": str_cond(pol['down']['condition']),
+                "Namespace": ('/').join(pol['metric'].split('/')[:2]),
+                "MetricName": pol['metric'].split('/')[2],
+                "Dimensions": [
+                    cloudwatch.MetricDimension(
+                        Name="AutoScalingGroupName",
+                        Value=Ref("ASG%s" % inst['name']),
+                    )
+                ],
+                "EvaluationPeriods": pol.get('wait', 5),
+                "Statistic": pol['down']['stat'],
+                "Threshold": pol['down']['condition'].split()[1],
+                "Unit": pol['unit'],
+            }
+            if inst['monitoring']:
+                downalarmargs['Period'] = 60
+            else:
+                downalarmargs['Period'] = 300
 
-                data.add_resource(autoscaling.ScalingPolicy(
-                    "ASGScaleDown%s" % inst['name'],
-                    **scaledownpolargs
-                ))
+            resources.append(cloudwatch.Alarm(
+                "CloudwatchDown%s" % inst['name'],
+                **downalarmargs
+            ))
 
-                def str_cond(cond):
-                    """Helper method used locally"""
-                    # expect '>= 40'
-                    cond = cond.split()[0]
-                    lookup = {
-                        '>=': 'GreaterThanOrEqualToThreshold',
-                        '>': 'GreaterThanThreshold',
-                        '<': 'LessThanThreshold',
-                        '<=': 'LessThanOrEqualToThreshold',
-                    }
-                    return lookup[cond]
-
-                upalarmargs = {
-                    "ActionsEnabled": True,
-                    "AlarmActions": [Ref("ASGScaleUp%s" % inst['name'])],
-                    "ComparisonOperator": str_cond(pol['up']['condition']),
-                    "Namespace": ('/').join(pol['metric'].split('/')[:2]),
-                    "MetricName": pol['metric'].split('/')[2],
-                    "Dimensions": [
-                        cloudwatch.MetricDimension(
-                            Name="AutoScalingGroupName",
-                            Value=Ref("ASG%s" % inst['name']),
-                        )
-                    ],
-                    "EvaluationPeriods": pol.get('wait', 5),
-                    "Statistic": pol['up']['stat'],
-                    "Threshold": pol['up']['condition'].split()[1],
-                    "Unit": pol['unit'],
-                }
-                if inst['monitoring']:
-                    upalarmargs['Period'] = 60
-                else:
-                    upalarmargs['Period'] = 300
+        return resources
 
-                data.add_resource(cloudwatch.Alarm(
-                    "CloudwatchUp%s" % inst['name'],
-                    **upalarmargs
-                ))
+    def _add_instances(self, data, instances, config, sgs, lbs):
+        """
+        Iterates and creates AWS instance groups.  With ``render_jobs`` above
+        one, groups are built by a pool of worker processes and added to the
+        template in order, giving the same template as building them here,
+        though the instance definitions are then only modified in the
+        workers.
 
-                downalarmargs = {
-                    "ActionsEnabled": True,
-                    "OKActions": [Ref("ASGScaleDown%s" % inst['name'])],
-                    "ComparisonOperator": str_cond(pol['down']['condition']),
-                    "Namespace": ('/').join(pol['metric'].split('/')[:2]),
-                    "MetricName": pol['metric'].split('/')[2],
-                    "Dimensions": [
-                        cloudwatch.MetricDimension(
-                            Name="AutoScalingGroupName",
-                            Value=Ref("ASG%s" % inst['name']),
-                        )
-                    ],
-                    "EvaluationPeriods": pol.get('wait', 5),
-                    "Statistic": pol['down']['stat'],
-                    "Threshold": pol['down']['condition'].split()[1],
-                    "Unit": pol['unit'],
-                }
-                if inst['monitoring']:
-                    downalarmargs['Period'] = 60
-                else:
-                    downalarmargs['Period'] = 300
+        :param data: Template object
+        :type data: :class:`troposphere.Template`
+        :param instances: list of instance definitions
+        :type instances: list.
+        :param config: Config key/value pairs
+        :type config: dict.
+        :param sgs: list of security group definitions
+        :type sgs: list.
+        :param lbs: list of load balancer definitions
+        :type lbs: list.
+        :raises: :class:`pmcf.exceptions.ProvisionerException`
+        """
 
-                data.add_resource(cloudwatch.Alarm(
-                    "CloudwatchDown%s" % inst['name'],
-                    **downalarmargs
-                ))
+        jobs = min(self.render_jobs or 1, len(instances))
+        # Daemonic processes, such as batch workers, may not start their own
+        if jobs < 2 or multiprocessing.current_process().daemon:
+            for inst in instances:
+                for resource in self._add_instance(inst, config, sgs, lbs):
+                    data.add_resource(resource)
+            return
+
+        LOG.info('Building %d instance groups with %d workers',
+                 len(instances), jobs)
+        with _GROUPS_LOCK:
+            _GROUPS['work'] = (self, instances, config, sgs, lbs)
+            pool = multiprocessing.Pool(processes=jobs)
+            try:
+                fragments = pool.map(_render_group, range(len(instances)))
+            finally:
+                pool.close()
+                pool.join()
+                _GROUPS.clear()
+
+        for fragment in fragments:
+            for title, resource in json.loads(fragment):
+                data.add_resource(_Fragment(title, resource))
 
     def add_resources(self, resources, config):
         """
@@ -1021,7 +1118,7 @@ class JSONOutput(BaseOutput):
         :type resources: dict.
         :param config: Config key/value pairs
         :type config: dict.
-        :returns: string
+        :returns: :class:`pmcf.utils.template.TemplateDocument`
         :raises: :class:`pmcf.exceptions.ProvisionerException`
         """
 
@@ -1031,24 +1128,34 @@ class JSONOutput(BaseOutput):
         data.add_description(desc)
         data.add_version()
 
-        self._add_streams(data, resources.get('stream', []), config)
-        self._add_queues(data, resources.get('queue', []), config)
-        self._add_nets(data, resources.get('network', []), config)
-        sgs = self._add_secgroups(data, resources['secgroup'], config)
-        self._add_caches(data, resources.get('cache', []), config, sgs)
-        lbs = self._add_lbs(data,
-                            resources['load_balancer'],
-                            config,
-                            sgs,
-                            resources['instance'])
-        self._add_instances(data,
-                            resources['instance'],
-                            config,
-                            sgs,
-                            lbs)
+        with timed('render._add_streams'):
+            self._add_streams(data, resources.get('stream', []), config)
+        with timed('render._add_queues'):
+            self._add_queues(data, resources.get('queue', []), config)
+        with timed('render._add_nets'):
+            self._add_nets(data, resources.get('network', []), config)
+        with timed('render._add_secgroups'):
+            sgs = self._add_secgroups(data, resources['secgroup'], config)
+        with timed('render._add_caches'):
+            self._add_caches(data, resources.get('cache', []), config, sgs)
+        with timed('render._add_lbs'):
+            lbs = self._add_lbs(data,
+                                resources['load_balancer'],
+                                config,
+                                sgs,
+                                resources['instance'])
+        with timed('render._add_instances'):
+            self._add_instances(data,
+                                resources['instance'],
+                                config,
+                                sgs,
+                                lbs)
+        with timed('render.to_json'):
+            # troposphere writes the compact form, with keys sorted
+            ret = TemplateDocument(data.to_json(indent=None), canonical=True)
 
         LOG.info('Finished building template')
-        return data.to_json(indent=None)
+        return ret
 
     def run(self, data, metadata=None, poll=False,
             action='create', upload=False):
@@ -1056,7 +1163,7 @@ class JSONOutput(BaseOutput):
         Pretty-prints stack definition as json-formatted string
 
         :param data: Stack definition
-        :type data: str.
+        :type data: str or :class:`pmcf.utils.template.TemplateDocument`
         :param metadata: Additional information for stack launch (tags, etc).
         :type metadata: dict.
         :param poll: Whether to poll until completion
@@ -1070,11 +1177,12 @@ class JSONOutput(BaseOutput):
 
         LOG.info('Start running data')
         metadata = metadata or {}
-        indent = None
-        if LOG.isEnabledFor(logging.DEBUG):
-            indent = 4
+        data = as_template(data)
         signal(SIGPIPE, SIG_DFL)
-        print json.dumps(json.loads(data), indent=indent, sort_keys=True)
+        if LOG.isEnabledFor(logging.DEBUG):
+            print data.pretty
+        else:
+            print data.compact
 
         LOG.info('Finished running data')
         self.do_audit(data, metadata)
@@ -20,9 +20,13 @@
 ..  moduleauthor:: Stephen Gran <stephen.gran@piksel.com>
 """
 
-from pmcf.parsers.awsfw_parser import AWSFWParser
-from pmcf.parsers.base_parser import BaseParser
-from pmcf.parsers.yaml_parser import YamlParser
+from pmcf.utils import lazy_package
+
+lazy_package(__name__, {
+    'AWSFWParser': 'pmcf.parsers.awsfw_parser',
+    'BaseParser': 'pmcf.parsers.base_parser',
+    'YamlParser': 'pmcf.parsers.yaml_parser',
+})
 
 __all__ = [
     'BaseParser',
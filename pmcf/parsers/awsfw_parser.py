@@ -28,6 +28,8 @@ from xml.parsers.expat import ExpatError
 
 from pmcf.exceptions import ParserFailure
 from pmcf.parsers.base_parser import BaseParser
+from pmcf.schema import xsd
+from pmcf.utils.timing import timed
 
 LOG = logging.getLogger(__name__)
 
@@ -127,6 +129,66 @@ class AWSFWParser(BaseParser):
         LOG.debug('Found healthcheck: %s', hck)
         return hck
 
+    def _build_lb(self, elb):
+        """
+        Builds internal representation of one loadbalancer from the
+        AWSFW native XML structure.  The name is only set if the ELB has a
+        suffix, as otherwise it comes from the farm name.
+
+        :param elb: ELB to parse
+        :type elb: dict.
+        :raises: :class:`pmcf.exceptions.ParserFailure`
+        :returns: dict
+        """
+
+        ldb = {
+            'listener': [],
+            'policy': []
+        }
+        for listener in self._listify(elb['listener']):
+            hck = listener.get('healthCheck')
+            if hck:
+                ldb['healthcheck'] = self._build_hc(hck)
+            lstnr = {
+                'protocol': listener['protocol'],
+                'lb_port': int(listener['port']),
+                'instance_port': int(listener['instancePort']),
+            }
+            if listener['protocol'].upper() == 'HTTPS':
+                if not listener.get('sslCert'):
+                    raise ParserFailure('an HTTPS listener needs an '
+                                        'sslCert')
+                else:
+                    lstnr['sslCert'] = urllib.unquote(listener['sslCert'])
+            lstnr['instance_protocol'] = listener.get(
+                'instance_protocol',
+                listener['protocol'].upper()
+            )
+            if listener.get('instance_protocol'):
+                lstnr['instance_protocol'] = listener['instance_protocol']
+            else:
+                if listener['protocol'].upper() in ['HTTP', 'HTTPS']:
+                    lstnr['instance_protocol'] = 'HTTP'
+            LOG.debug('Found listener: %s', lstnr)
+            ldb['listener'].append(lstnr)
+        if elb.get('elb-logging'):
+            log_policy = {
+                'emit_interval': int(elb['elb-logging']['emitinterval']),
+                's3bucket': urllib.unquote(elb['elb-logging']['s3bucket']),
+                's3prefix': urllib.unquote(elb['elb-logging']['prefix']),
+                'enabled': True,
+            }
+            LOG.debug('Found log_policy: %s', log_policy)
+            ldb['policy'].append({
+                'type': 'log_policy',
+                'policy': log_policy
+            })
+
+        LOG.debug('Found loadbalancer: %s', ldb)
+        if elb.get('suffix'):
+            ldb['name'] = elb['suffix']
+        return ldb
+
     def build_lbs(self, farmname, elbs):
         """
         Builds internal representation of loadbalancers from the
@@ -140,55 +202,9 @@ class AWSFWParser(BaseParser):
         :returns: list
         """
 
-        for idx, elb in enumerate(elbs):
-            ldb = {
-                'listener': [],
-                'policy': []
-            }
-            for listener in self._listify(elbs[idx]['listener']):
-                hck = listener.get('healthCheck')
-                if hck:
-                    ldb['healthcheck'] = self._build_hc(hck)
-                lstnr = {
-                    'protocol': listener['protocol'],
-                    'lb_port': int(listener['port']),
-                    'instance_port': int(listener['instancePort']),
-                }
-                if listener['protocol'].upper() == 'HTTPS':
-                    if not listener.get('sslCert'):
-                        raise ParserFailure('an HTTPS listener needs an '
-                                            'sslCert')
-                    else:
-                        lstnr['sslCert'] = urllib.unquote(listener['sslCert'])
-                lstnr['instance_protocol'] = listener.get(
-                    'instance_protocol',
-                    listener['protocol'].upper()
-                )
-                if listener.get('instance_protocol'):
-                    lstnr['instance_protocol'] = listener['instance_protocol']
-                else:
-                    if listener['protocol'].upper() in ['HTTP', 'HTTPS']:
-                        lstnr['instance_protocol'] = 'HTTP'
-                LOG.debug('Found listener: %s', lstnr)
-                ldb['listener'].append(lstnr)
-            if elb.get('elb-logging'):
-                log_policy = {
-                    'emit_interval': int(elb['elb-logging']['emitinterval']),
-                    's3bucket': urllib.unquote(elb['elb-logging']['s3bucket']),
-                    's3prefix': urllib.unquote(elb['elb-logging']['prefix']),
-                    'enabled': True,
-                }
-                LOG.debug('Found log_policy: %s', log_policy)
-                ldb['policy'].append({
-                    'type': 'log_policy',
-                    'policy': log_policy
-                })
-
-            LOG.debug('Found loadbalancer: %s', ldb)
-            if elb.get('suffix'):
-                ldb['name'] = elb['suffix']
-            else:
-                ldb['name'] = farmname.replace('-', '')
+        for elb in elbs:
+            ldb = self._build_lb(elb)
+            ldb.setdefault('name', farmname.replace('-', ''))
             self._stack['resources']['load_balancer'].append(ldb)
         return self._stack['resources']['load_balancer']
 
@@ -225,6 +241,85 @@ class AWSFWParser(BaseParser):
         })
         return self._stack['resources']['secgroup']
 
+    def _build_instance(self, instance):
+        """
+        Builds internal representation of one instance from the AWSFW
+        native XML structure, along with its firewall rules.  Loadbalancers
+        are attached by :py:meth:`_set_lb`.
+
+        :param instance: Instance to parse
+        :type instance: dict.
+        :raises: :class:`pmcf.exceptions.ParserFailure`
+        :returns: dict
+        """
+
+        inst = {}
+        if instance.get('cname'):
+            inst['name'] = instance['cname']
+        else:
+            inst['name'] = instance['tier']
+        inst['image'] = instance['amiId']
+        inst['size'] = instance['size']
+        inst['count'] = int(instance['count'])
+        inst['sg'] = []
+        inst['block_device'] = []
+        if instance.get('role') and instance.get('app'):
+            inst['provisioner'] = {
+                'provider': 'AWSFWProvisioner',
+                'args': {
+                    'apps': self._listify(instance['app']),
+                    'roles': self._listify(instance['role'])
+                }
+            }
+        else:
+            inst['provisioner'] = {
+                'provider': instance['provisioner']['provider'],
+                'args': {
+                    'apps': self._listify(
+                        instance['provisioner']['args']['app']),
+                    'roles': self._listify(
+                        instance['provisioner']['args']['role'])
+                }
+            }
+        if instance.get('firewall'):
+            self.build_fw(inst['name'],
+                          self._listify(instance['firewall']['rule']))
+            inst['sg'].append(inst['name'])
+
+        if instance.get('volume'):
+            for vol in self._listify(instance['volume']):
+                data = {
+                    'size': int(vol['volumeSize']),
+                    'device': vol['volumeDevice']
+                }
+                inst['block_device'].append(data)
+
+        LOG.debug('Found instance: %s', inst)
+        return inst
+
+    def _set_lb(self, inst, elb):
+        """
+        Attaches an instance to the loadbalancer named by its ``elb``
+        element.  An empty element means the only loadbalancer in the farm.
+
+        :param inst: Instance to attach
+        :type inst: dict.
+        :param elb: Value of the instance's ``elb`` element, or 'missing'
+        :type elb: str.
+        :raises: :class:`pmcf.exceptions.ParserFailure`
+        """
+
+        if elb == 'missing':
+            return
+        lbs = self._stack['resources']['load_balancer']
+        if len(lbs) == 1:
+            inst['lb'] = [lbs[0]['name']]
+        elif len(lbs) > 1 and elb is not None:
+            inst['lb'] = [elb]
+        else:
+            raise ParserFailure('Bad stack: unclear loadbalancer '
+                                'to instance declaration')
+
     def build_instances(self, farmname, instances):
         """
         Builds internal representation of instances from the
@@ -239,78 +334,21 @@ class AWSFWParser(BaseParser):
         """
 
         for instance in instances:
-            inst = {}
-            if instance.get('cname'):
-                inst['name'] = instance['cname']
-            else:
-                inst['name'] = instance['tier']
-            inst['image'] = instance['amiId']
-            inst['size'] = instance['size']
-            inst['count'] = int(instance['count'])
-            inst['sg'] = []
-            inst['block_device'] = []
-            if instance.get('elb', 'missing') != 'missing':
-                if len(self._stack['resources']['load_balancer']) == 1:
-                    inst['lb'] =\
-                        [self._stack['resources']['load_balancer'][0]['name']]
-                elif len(self._stack['resources']['load_balancer']) > 1:
-                    if instance['elb'] is not None:
-                        inst['lb'] = [instance['elb']]
-                    else:
-                        raise ParserFailure('Bad stack: unclear loadbalancer '
-                                            'to instance declaration')
-                else:
-                    raise ParserFailure('Bad stack: unclear loadbalancer '
-                                        'to instance declaration')
-            if instance.get('role') and instance.get('app'):
-                inst['provisioner'] = {
-                    'provider': 'AWSFWProvisioner',
-                    'args': {
-                        'apps': self._listify(instance['app']),
-                        'roles': self._listify(instance['role'])
-                    }
-                }
-            else:
-                inst['provisioner'] = {
-                    'provider': instance['provisioner']['provider'],
-                    'args': {
-                        'apps': self._listify(
-                            instance['provisioner']['args']['app']),
-                        'roles': self._listify(
-                            instance['provisioner']['args']['role'])
-                    }
-                }
-            if instance.get('firewall'):
-                self.build_fw(inst['name'],
-                              self._listify(instance['firewall']['rule']))
-                inst['sg'].append(inst['name'])
-
-            if instance.get('volume'):
-                for vol in self._listify(instance['volume']):
-                    data = {
-                        'size': int(vol['volumeSize']),
-                        'device': vol['volumeDevice']
-                    }
-                    inst['block_device'].append(data)
-
-            LOG.debug('Found instance: %s', inst)
+            inst = self._build_instance(instance)
+            self._set_lb(inst, instance.get('elb', 'missing'))
             self._stack['resources']['instance'].append(inst)
         return self._stack['resources']['instance']
 
-    def build_ds(self, dat, args=None):
+    def _build_config(self, dat, args):
         """
-        Builds internal representation of data from the
-        AWSFW native XML structure.
+        Builds the stack config from the farm level AWSFW elements.
 
-        :param dat: dictionary created by xmltodict from AWSFW XML
+        :param dat: Farm level elements
         :type dat: dict.
         :param args: Configuration parameters
         :type args: dict.
-        :raises: :class:`pmcf.exceptions.ParserFailure`
-        :returns: dict
         """
 
-        args = args or {}
         name_parts = dat['farmName'].split('-')
 
         self._stack['config'] = {
@@ -333,11 +371,13 @@ class AWSFWParser(BaseParser):
             self._stack['config']['instance_secretkey'] =\
                 args['instance_secretkey']
 
-        if dat.get('ELB'):
-            self.build_lbs(dat['farmName'], self._listify(dat['ELB']))
-        if dat.get('instances'):
-            self.build_instances(dat['farmName'],
-                                 self._listify(dat['instances']))
+    def _finish_instances(self, dat):
+        """
+        Applies the farm level AWSFW elements to every instance.
+
+        :param dat: Farm level elements
+        :type dat: dict.
+        """
 
         for inst in self._stack['resources']['instance']:
             inst['provisioner']['args']['platform_environment'] =\
@@ -361,29 +401,141 @@ class AWSFWParser(BaseParser):
             # if dat.get('noDefaultSG') returns 'None' which evaluates to false
             if dat.get('noDefaultSG', 'missing') == 'missing':
                 inst['sg'].append('default')
-        return self._stack
 
-    def parse(self, config, args=None):
+    def build_ds(self, dat, args=None):
         """
         Builds internal representation of data from the
         AWSFW native XML structure.
 
-        :param config: String representation of config from file
-        :type config: str.
+        :param dat: dictionary created by xmltodict from AWSFW XML
+        :type dat: dict.
         :param args: Configuration parameters
         :type args: dict.
         :raises: :class:`pmcf.exceptions.ParserFailure`
         :returns: dict
         """
 
-        LOG.info('Start parsing farm config')
         args = args or {}
+        self._build_config(dat, args)
+
+        if dat.get('ELB'):
+            self.build_lbs(dat['farmName'], self._listify(dat['ELB']))
+        if dat.get('instances'):
+            self.build_instances(dat['farmName'],
+                                 self._listify(dat['instances']))
+
+        self._finish_instances(dat)
+        return self._stack
+
+    @staticmethod
+    def _streamed_item(path, item):
+        """
+        Turns an element handed over by xmltodict when streaming into what
+        it would have been in a whole document.  When streaming, xmltodict
+        does not strip whitespace from the text of the elements it hands
+        over, and drops their attributes.
+
+        :param path: xmltodict path of (name, attributes) to the element
+        :type path: list.
+        :param item: Element as handed over by xmltodict
+        :type item: object.
+        :returns: object
+        """
+
+        attrs = path[-1][1]
+        if isinstance(item, basestring):
+            item = item.strip() or None
+        if attrs:
+            text = item
+            item = item if isinstance(item, dict) else {}
+            for key, value in attrs.items():
+                item['@' + key] = value
+            if isinstance(text, basestring):
+                item['#text'] = text
+        return item
+
+    def _stream(self, config):
+        """
+        Parses AWSFW XML one element of the farm at a time.  ELBs and
+        instances are built as each one closes, so the document is never
+        held in memory as a whole.  Everything else at the farm level is
+        small, and is returned as xmltodict would have given it.
+
+        Anything that depends on elements that may come later in the file
+        waits until the end: ELBs without a suffix are named after the
+        farm, and instances are attached to their ELBs.
+
+        :param config: String representation of config from file
+        :type config: str.
+        :raises: :class:`pmcf.exceptions.ParserFailure`
+        :returns: dict
+        """
+
+        farm = {}
+        pending = []
+
+        def _item(path, item):
+            if path[0][0] != 'c4farm':
+                raise ParserFailure('Not an AWSFW farm: root element is %s' %
+                                    path[0][0])
+            name = path[-1][0]
+            item = self._streamed_item(path, item)
+            if name == 'ELB':
+                if item:
+                    self._stack['resources']['load_balancer'].append(
+                        self._build_lb(item))
+            elif name == 'instances':
+                if item:
+                    inst = self._build_instance(item)
+                    pending.append((inst, item.get('elb', 'missing')))
+                    self._stack['resources']['instance'].append(inst)
+            elif name in farm:
+                # Repeated elements become lists, as they do in xmltodict
+                if not isinstance(farm[name], list):
+                    farm[name] = [farm[name]]
+                farm[name].append(item)
+            else:
+                farm[name] = item
+            return True
+
         try:
-            data = xmltodict.parse(config)
+            xmltodict.parse(config, item_depth=2, item_callback=_item)
         except ExpatError, exc:
             raise ParserFailure(exc.message)
+        if not farm.get('farmName'):
+            raise ParserFailure('Farm config has no farmName')
+
+        for ldb in self._stack['resources']['load_balancer']:
+            if 'name' not in ldb:
+                ldb['name'] = farm['farmName'].replace('-', '')
+        for inst, elb in pending:
+            self._set_lb(inst, elb)
+        return farm
 
-        self.build_ds(data['c4farm'], args)
+    def parse(self, config, args=None):
+        """
+        Builds internal representation of data from the
+        AWSFW native XML structure.  If ``xsdfile`` is set in args, the
+        document is first validated against it.
+
+        :param config: String representation of config from file
+        :type config: str.
+        :param args: Configuration parameters
+        :type args: dict.
+        :raises: :class:`pmcf.exceptions.ParserFailure`
+        :returns: dict
+        """
+
+        LOG.info('Start parsing farm config')
+        args = args or {}
+        self._dependencies = []
+        if args.get('xsdfile'):
+            with timed('parse.xsd'):
+                xsd.validate(config, args['xsdfile'])
+            self._dependencies.append(args['xsdfile'])
+        farm = self._stream(config)
+        self._build_config(farm, args)
+        self._finish_instances(farm)
         LOG.debug('stack: %s', self._stack)
         LOG.info('Finished parsing farm config')
         return self._stack
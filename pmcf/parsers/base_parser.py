@@ -23,10 +23,9 @@
 import abc
 import logging
 import jsonschema
-import yaml
 
 from pmcf.exceptions import ParserFailure
-from pmcf.schema.base import schema as base_schema
+from pmcf.schema import validator
 
 LOG = logging.getLogger(__name__)
 
@@ -45,6 +44,14 @@ class BaseParser(object):
     __metaclass__ = abc.ABCMeta
 
     def __init__(self):
+        self._dependencies = []
+        self.reset()
+
+    def reset(self):
+        """
+        Empties the internal data storage, ready to build another stack.
+        """
+
         self._stack = {
             'resources': {
                 'instance': [],
@@ -72,6 +79,50 @@ class BaseParser(object):
 
         raise NotImplementedError
 
+    def load(self, config, args=None):
+        """
+        Reads a stack definition into a form that :py:meth:`resolve` can build
+        the stack for any environment from.  Parsers that can not separate the
+        two steps return the text unchanged, and :py:meth:`resolve` parses it
+        again for each environment.
+
+        :param config: String representation of config from file
+        :type config: str.
+        :param args: Configuration parameters
+        :type args: dict.
+        :raises: :class:`pmcf.exceptions.ParserFailure`
+        :returns: variable
+        """
+
+        return config
+
+    def resolve(self, raw, args=None):
+        """
+        Builds the stack for the environment in args from the output of
+        :py:meth:`load`.  May be called repeatedly with the same input.
+
+        :param raw: Output of :py:meth:`load`
+        :type raw: variable
+        :param args: Configuration parameters
+        :type args: dict.
+        :raises: :class:`pmcf.exceptions.ParserFailure`
+        :returns: dict.
+        """
+
+        self.reset()
+        return self.parse(raw, args)
+
+    def environments(self, raw):
+        """
+        Lists the environments a stack definition declares.
+
+        :param raw: Output of :py:meth:`load`
+        :type raw: variable
+        :returns: list.
+        """
+
+        return []
+
     def stack(self):
         """
         Accessor method for internal data storage.
@@ -81,6 +132,32 @@ class BaseParser(object):
 
         return self._stack
 
+    def set_stack(self, stack, dependencies=None):
+        """
+        Replaces the internal data storage with an already built stack, such
+        as one read from a cache.
+
+        :param stack: Stack, as returned by :py:meth:`parse`
+        :type stack: dict.
+        :param dependencies: Files the stack was built from, as returned by
+                             :py:meth:`dependencies`
+        :type dependencies: list.
+        """
+
+        self._stack = stack
+        self._dependencies = list(dependencies or [])
+
+    def dependencies(self):
+        """
+        Lists the files other than the stack definition itself that the last
+        call to :py:meth:`parse` read.  A cached stack is rebuilt when any of
+        them change.
+
+        :returns: list.
+        """
+
+        return list(self._dependencies)
+
     def parse_file(self, fname, args=None):
         """
         Wrapper method for :py:meth:`parse` to pass in file contents
@@ -93,27 +170,53 @@ class BaseParser(object):
         :returns: dict.
         """
 
-        args = args or {}
+        # Files the stack includes are looked for next to it
+        args = dict(args or {})
+        args['stackfile'] = fname
+        return self.parse(self.read_file(fname), args)
+
+    def read_file(self, fname):
+        """
+        Reads the contents of a stack definition file
+
+        :param fname: Filename
+        :type fname: str.
+        :raises: :class:`pmcf.exceptions.ParserFailure`
+        :returns: str.
+        """
+
         try:
             with open(fname) as fld:
-                return self.parse(fld.read(), args)
+                return fld.read()
         except IOError, exc:
             raise ParserFailure(str(exc))
 
-    def validate(self):
+    def validate(self, skip=None):
         """
         Validate resulting data structure against the internal
         :class:`pmcf.schema.base_schema.BaseSchema schema`
 
+        :param skip: ids of resource dicts already known to be valid
+        :type skip: set.
         :raises: :class:`pmcf.exceptions.ParserFailure`
         """
         LOG.info('Start validation of stack')
         try:
-            jsonschema.validate(self._stack, yaml.load(base_schema))
+            validator.validate(self._stack, skip)
         except jsonschema.exceptions.ValidationError, exc:
             raise ParserFailure(str(exc))
         LOG.info('Finished validation of stack')
 
+    def errors(self):
+        """
+        Validates the resulting data structure like :py:meth:`validate`, but
+        returns every problem found instead of raising on the first.
+
+        :returns: list of :class:`jsonschema.ValidationError`
+        """
+
+        return validator.errors(self._stack)
+
 
 __all__ = [
     'BaseParser',
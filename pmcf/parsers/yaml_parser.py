@@ -22,14 +22,88 @@
 
 import copy
 import logging
-import yaml
+import os
 
 from pmcf.exceptions import ParserFailure
 from pmcf.parsers.base_parser import BaseParser
 from pmcf.utils import split_subnets
+from pmcf.utils import yaml_loader
+from pmcf.utils.rules import compact_rules
+from pmcf.utils.timing import TIMINGS
 
 LOG = logging.getLogger(__name__)
 
+# Fields that may be given per environment, as a mapping of environment name
+# to value with an optional 'default', listed as paths from the resource
+ENV_FIELDS = {
+    'config': [
+        ('vpcid',),
+        ('defaultsg',),
+        ('subnets',),
+        ('notify',),
+    ],
+    'instance': [
+        ('size',),
+        ('count',),
+        ('min',),
+        ('max',),
+        ('image',),
+        ('sg',),
+        ('monitoring',),
+        ('block_device',),
+        ('healthcheck',),
+        ('subnets',),
+        ('lb',),
+        ('provisioner', 'args', 'bucket'),
+        ('provisioner', 'args', 'metrics'),
+        ('provisioner', 'args', 'custom_profile'),
+    ],
+    'load_balancer': [
+        ('policy',),
+        ('subnets',),
+    ],
+}
+
+# Security group rule fields that may be given per environment.  Each
+# source in a list gets its own copy of the rule.
+RULE_ENV_FIELDS = ['source_group', 'source_cidr']
+
+# Resource types that may be limited to some environments with 'stages',
+# with the name used for them in log messages
+STAGED = {
+    'instance': 'instance',
+    'load_balancer': 'lb',
+    'secgroup': 'secgroup',
+}
+
+# Resource types built in order, each with a _build_<type> method.  Instances
+# come last, as they may add security groups.
+BUILD_ORDER = ['network', 'secgroup', 'load_balancer', 'instance']
+
+
+def _group_fields(paths):
+    """
+    Groups field paths by the path to the dictionary holding them, so that
+    each dictionary is only looked up once per resource
+
+    :param paths: Field paths
+    :type paths: list.
+    :returns: list of (parent path, field names) tuples
+    """
+
+    groups = []
+    for path in paths:
+        if groups and groups[-1][0] == path[:-1]:
+            groups[-1][1].append(path[-1])
+        else:
+            groups.append((path[:-1], [path[-1]]))
+    return groups
+
+
+# ENV_FIELDS grouped for YamlParser._resolve_fields
+_FIELD_GROUPS = dict((rtype, _group_fields(paths))
+                     for rtype, paths in ENV_FIELDS.items())
+
 
 class YamlParser(BaseParser):
     """
@@ -39,6 +113,15 @@ class YamlParser(BaseParser):
     the supported internal schema.
     """
 
+    def reset(self):
+        """
+        Empties the internal data storage, ready to build another stack.
+        """
+
+        super(YamlParser, self).reset()
+        # Security group rules merged away building the last stack
+        self.rules_saved = 0
+
     def _get_value_for_env(self, data, environment, field):
         """
         Searches a dictionary for data for the current environment, and
@@ -67,10 +150,16 @@ class YamlParser(BaseParser):
         raise ParserFailure("Can't find environment-specific data for %s" %
                             field)
 
-    def parse(self, config, args=None):
+    def load(self, config, args=None):
         """
-        Builds internal representation of data from the
-        YAML representation
+        Reads the YAML representation without resolving anything for an
+        environment.
+
+        ``!include`` tags are replaced by the files they name, and the
+        partial stacks listed in a top level ``imports`` key are merged in.
+        Relative names are looked up next to the including file, or the
+        stack file in args, then in each directory of the ``include_path``
+        option.  The files read are listed by :py:meth:`dependencies`.
 
         :param config: String representation of config from file
         :type config: str.
@@ -80,13 +169,183 @@ class YamlParser(BaseParser):
         :returns: dict
         """
 
-        LOG.info('Start parsing config')
         args = args or {}
+        basedir = None
+        if args.get('stackfile'):
+            basedir = os.path.dirname(args['stackfile'])
+        search_path = args.get('include_path', None) or []
+        if isinstance(search_path, basestring):
+            search_path = [path.strip() for path in search_path.split(',')
+                           if path.strip()]
+
+        files = []
         try:
-            data = yaml.load(config)
+            data = yaml_loader.load(config, basedir=basedir,
+                                    search_path=search_path, files=files)
+            data = self._import(data, basedir, search_path, files)
+        except ParserFailure:
+            raise
         except Exception, exc:
             raise ParserFailure(exc)
 
+        self._dependencies = []
+        for fname, _ in files:
+            if fname not in self._dependencies:
+                self._dependencies.append(fname)
+        return data
+
+    def _import(self, data, basedir, search_path, files, chain=()):
+        """
+        Merges the partial stacks listed in ``imports`` into a stack.  The
+        config sections are merged in order, then resources are added,
+        with a resource replacing any earlier one of the same type and name.
+        Imported files may themselves have imports.
+
+        :param data: Loaded stack, modified in place
+        :type data: dict.
+        :param basedir: Directory of the file data was read from
+        :type basedir: str.
+        :param search_path: Other directories to look for imports in
+        :type search_path: list.
+        :param files: List to add (file name, signature) tuples to
+        :type files: list.
+        :raises: :class:`pmcf.exceptions.ParserFailure`
+        :returns: dict
+        """
+
+        if not isinstance(data, dict) or 'imports' not in data:
+            return data
+        imports = data.pop('imports') or []
+        if isinstance(imports, basestring):
+            imports = [imports]
+
+        parts = []
+        for name in imports:
+            fname = os.path.abspath(
+                yaml_loader.find_file(name, basedir, search_path))
+            if fname in chain:
+                raise ParserFailure('Import loop: %s' %
+                                    ' -> '.join(chain + (fname,)))
+            part = yaml_loader.load_file(fname, search_path=search_path,
+                                         files=files)
+            if not isinstance(part, dict):
+                raise ParserFailure('%s must hold a mapping' % fname)
+            parts.append(self._import(part, os.path.dirname(fname),
+                                      search_path, files, chain + (fname,)))
+        parts.append(data)
+
+        config = {}
+        resources = {}
+        for part in parts:
+            config.update(part.get('config', None) or {})
+            for rtype, items in (part.get('resources', None) or {}).items():
+                names = set(item.get('name') for item in items or []
+                            if isinstance(item, dict))
+                resources[rtype] = [
+                    item for item in resources.get(rtype, [])
+                    if item.get('name') not in names
+                ] + list(items or [])
+        data['config'] = config
+        data['resources'] = resources
+        return data
+
+    def environments(self, raw):
+        """
+        Lists the environments in the config section of a loaded stack
+
+        :param raw: Output of :py:meth:`load`
+        :type raw: dict.
+        :returns: list.
+        """
+
+        try:
+            return list(raw['config'].get('environments', None) or [])
+        except (AttributeError, KeyError, TypeError):
+            return []
+
+    def resolve(self, raw, args=None):
+        """
+        Builds internal representation of data for one environment from an
+        already loaded YAML representation, leaving it untouched so that it
+        can be resolved again for another environment
+
+        :param raw: Output of :py:meth:`load`
+        :type raw: dict.
+        :param args: Configuration parameters
+        :type args: dict.
+        :raises: :class:`pmcf.exceptions.ParserFailure`
+        :returns: dict
+        """
+
+        LOG.info('Start resolving config')
+        self.reset()
+        return self._build(raw, args or {}, copy_data=True)
+
+    def parse(self, config, args=None):
+        """
+        Builds internal representation of data from the
+        YAML representation
+
+        :param config: String representation of config from file
+        :type config: str.
+        :param args: Configuration parameters
+        :type args: dict.
+        :raises: :class:`pmcf.exceptions.ParserFailure`
+        :returns: dict
+        """
+
+        LOG.info('Start parsing config')
+        return self._build(self.load(config, args), args or {})
+
+    def _resolve_fields(self, data, fields, environment):
+        """
+        Replaces environment-specific values in a resource with the value
+        for one environment
+
+        :param data: Resource to resolve, modified in place
+        :type data: dict.
+        :param fields: Fields that may be given per environment, grouped by
+                       :py:func:`_group_fields`
+        :type fields: list.
+        :param environment: Name of the environment to resolve for
+        :type environment: str.
+        :raises: :class:`pmcf.exceptions.ParserFailure`
+        """
+
+        for parent_path, names in fields:
+            parent = data
+            for key in parent_path:
+                parent = parent.get(key, None)
+                if not parent:
+                    break
+            else:
+                for field in names:
+                    item = parent.get(field, None)
+                    if item:
+                        parent[field] = self._get_value_for_env(
+                            item, environment, field)
+
+    def _build(self, data, args, copy_data=False):
+        """
+        Resolves a loaded YAML representation for the environment in args.
+
+        Each resource is visited once: resources not present in the
+        environment are dropped, the fields listed in :data:`ENV_FIELDS`
+        are resolved, and then the per resource type step fills in
+        anything derived from the rest of the stack.
+
+        :param data: Output of :py:meth:`load`
+        :type data: dict.
+        :param args: Configuration parameters
+        :type args: dict.
+        :param copy_data: Whether to leave data untouched, copying only the
+                          resources that are kept, rather than modifying it
+                          in place
+        :type copy_data: bool.
+        :raises: :class:`pmcf.exceptions.ParserFailure`
+        :returns: dict
+        """
+
         try:
             self._stack['config'] = {
                 'name': data['config']['name'],
@@ -95,19 +354,20 @@ class YamlParser(BaseParser):
         except KeyError, exc:
             raise ParserFailure(exc)
 
-        for field in ['vpcid', 'defaultsg', 'subnets', 'notify']:
-            item = data['config'].get(field, None)
-            if item:
-                data['config'][field] = self._get_value_for_env(
-                    item, args['environment'], field)
-        self._stack['config'].update(data['config'])
-        if data['config'].get('environments', None):
+        environment = args['environment']
+        self.rules_saved = 0
+        config = data['config']
+        if copy_data:
+            config = copy.deepcopy(config)
+        self._resolve_fields(config, _FIELD_GROUPS['config'], environment)
+        self._stack['config'].update(config)
+        if config.get('environments', None):
             self._stack['config'].pop('environments', None)
-            if args['environment'] not in data['config']['environments']:
+            if environment not in config['environments']:
                 if args['action'] != 'delete':
                     raise ParserFailure('environment %s not in %s' %
-                                        (args['environment'],
-                                         data['config']['environments']))
+                                        (environment,
+                                         config['environments']))
 
         if args.get('accesskey') and args.get('secretkey'):
             self._stack['config']['access'] = args['accesskey']
@@ -118,225 +378,221 @@ class YamlParser(BaseParser):
             self._stack['config']['instance_secret'] =\
                 args['instance_secretkey']
 
-        for idx, net in enumerate(data['resources'].get('network', [])):
-            zones = net['zones']
-            netrange = net['netrange']
-            netname = net['name']
-            net['public'] = net.get('public', True)
-            if not net.get('subnets', None):
-                subnets = []
-                numsubnets = len(zones)
-                subcidrs = split_subnets(netrange, numsubnets)
-                settings = []
-                if net['public']:
-                    for zone in zones:
-                        settings.append('public')
-                else:
-                    for zone in zones:
-                        settings.append('private')
-
-                for net in range(0, numsubnets):
-                    zidx = net % len(zones)
-                    subnname = "%s-%s-%s" % (
-                        netname,
-                        zones[zidx],
-                        settings[net]
-                    )
-                    subnets.append({
-                        'cidr': str(subcidrs[net]),
-                        'name': subnname,
-                        'public': settings[net] == 'public',
-                        'zone': zones[zidx],
-                    })
-
-                data['resources']['network'][idx]['subnets'] = subnets
-
-        dropped = []
-        for idx, secg in enumerate(data['resources'].get('secgroup', [])):
-            stages = secg.pop('stages', [])
-            if stages:
-                if args['environment'] not in stages:
-                    LOG.debug('Found secgroup not present in %s: %s',
-                              args['environment'],
-                              secg['name'])
-                    dropped.insert(0, idx)
-        for drop in dropped:
-            data['resources']['secgroup'].pop(drop)
-
-        dropped = []
-        for idx, instance in enumerate(data['resources'].get('instance', [])):
-            stages = instance.pop('stages', [])
-            if stages:
-                if args['environment'] not in stages:
-                    LOG.debug('Found instance not present in %s: %s',
-                              args['environment'],
-                              instance['name'])
-                    dropped.insert(0, idx)
-        for drop in dropped:
-            data['resources']['instance'].pop(drop)
-
-        dropped = []
-        for idx, ldb in enumerate(data['resources'].get('load_balancer', [])):
-            stages = ldb.pop('stages', [])
-            if stages:
-                if args['environment'] not in stages:
-                    LOG.debug('Found lb not present in %s: %s',
-                              args['environment'],
-                              ldb['name'])
-                    dropped.insert(0, idx)
-        for drop in dropped:
-            data['resources']['load_balancer'].pop(drop)
-
-        for instance in data['resources'].get('instance', []):
-            if instance.get('public', None) is None:
-                instance['public'] = False
-
-            if instance.get('dns'):
-                if not instance['dns'].get('zone', '').endswith('.'):
-                    raise ParserFailure("DNS zone must end with '.' on %s" %
-                                        instance['name'])
-
-            for field in ['size', 'count', 'min', 'max', 'image', 'sg',
-                          'monitoring', 'block_device', 'healthcheck',
-                          'subnets', 'lb']:
-                item = instance.get(field, None)
-                if item:
-                    instance[field] =\
-                        self._get_value_for_env(item,
-                                                args['environment'],
-                                                field)
-            item = instance.get('scaling_policy', None)
-            if item:
-                if instance.get('nat'):
-                    raise ParserFailure("instances with ElasticIPs and "
-                                        "ScalingPolicies are not supported")
-
-                instance['scaling_policy'] = self._get_value_for_env(
-                    item,
-                    args['environment'],
-                    'scaling_policy')
-                if instance['scaling_policy'] == []:
-                    instance.pop('scaling_policy', None)
-
-            if instance.get('provisioner'):
-                if instance['provisioner'].get('args'):
-                    for field in ['bucket', 'metrics']:
-                        item = instance['provisioner']['args'].get(field, None)
-                        if item:
-                            instance['provisioner']['args'][field] =\
-                                self._get_value_for_env(item,
-                                                        args['environment'],
-                                                        field)
-
-        for ldb in data['resources'].get('load_balancer', []):
-            for field in ['policy', 'subnets']:
-                item = ldb.get(field, None)
-                if item:
-                    ldb[field] =\
-                        self._get_value_for_env(item,
-                                                args['environment'],
-                                                field)
-
-        for secg in data['resources'].get('secgroup', []):
-            if not secg.get('vpcid', None) and data['config'].get('vpcid'):
-                secg['vpcid'] = data['config']['vpcid']
-
-            new_rules = []
-            for rule in secg['rules']:
-                for field in ['source_group', 'source_cidr']:
-                    item = rule.get(field, None)
-                    if item:
-                        rule[field] =\
-                            self._get_value_for_env(item,
-                                                    args['environment'],
-                                                    field)
-                        if isinstance(rule[field], list):
-                            saved_list = rule[field]
-                            rule[field] = saved_list.pop()
-                            for source in saved_list:
-                                new_rule = copy.deepcopy(rule)
-                                new_rule.update({field: source})
-                                new_rules.append(new_rule)
-            secg['rules'].extend(new_rules)
-
-        for ldb in data['resources'].get('load_balancer', []):
-            if data['config'].get('subnets'):
-                ldb['subnets'] = ldb.get('subnets', data['config']['subnets'])
-            ldb['policy'] = copy.deepcopy(ldb.get('policy', []))
-            for idx, policy in enumerate(ldb['policy']):
-                if policy['type'] == 'log_policy':
-                    prefix = policy['policy']['s3prefix']
-                    prefix = "%s/%s" % (
-                        args['environment'],
-                        policy['policy']['s3prefix'],
-                    )
-                    schema = 'external'
-                    if ldb.get('internal'):
-                        schema = 'internal'
-                    prefix = "%s/%s" % (prefix, schema)
-                    policy['policy']['s3prefix'] = prefix
-                    ldb['policy'][idx] = policy
-
-        self._stack['resources'].update(data['resources'])
-
-        for instance in self._stack['resources']['instance']:
-            if data['config'].get('subnets'):
-                instance['subnets'] = instance.get(
-                    'subnets',
-                    data['config']['subnets'])
-                if not data['config'].get('vpcid'):
-                    raise ParserFailure("subnets without vpcid is invalid")
-
-            if self._stack['config'].get('notify', None):
-                instance['notify'] = instance.get(
-                    'notify',
-                    self._stack['config']['notify'])
-
-            if not instance.get('provisioner', None):
-                if self._stack['config'].get('provisioner', '') ==\
-                        'PuppetProvisioner':
-                    bucket = self._stack['config'].get(
-                        'bucket',
-                        self._stack['config']['audit_output'])
-                    instance['provisioner'] = {
-                        'provider': 'PuppetProvisioner',
-                        'args': {
-                            'bucket': bucket,
-                            'infrastructure': "%s.tar.gz" % instance['name'],
-                        }
-                    }
-
-            if instance['provisioner'].get('args', {}).get('custom_profile'):
-                instance['provisioner']['args']['custom_profile'] =\
-                    self._get_value_for_env(
-                        instance['provisioner']['args']['custom_profile'],
-                        args['environment'],
-                        'custom_profile')
-
-            if instance.get('sg', []) == []:
-                sgs = self._stack['resources']['secgroup']
-                found = instance['name'] in [x['name'] for x in sgs]
-                if not found:
-                    self._stack['resources']['secgroup'].insert(0, {
-                        'name': instance['name'],
-                        'rules': []
-                    })
-                    if data['config'].get('vpcid'):
-                        self._stack['resources']['secgroup'][0]['vpcid'] =\
-                            data['config']['vpcid']
-                    instance['sg'] = instance.get('sg', [])
-                    instance['sg'].append(instance['name'])
-            if not self._stack['config'].get('nodefaultsg'):
-                if data['config'].get('vpcid') and \
-                        data['config'].get('defaultsg'):
-                    instance['sg'].append(data['config']['defaultsg'])
-                else:
-                    instance['sg'].append('default')
-
+        resources = self._stack['resources']
+        for rtype, items in data['resources'].items():
+            if rtype not in BUILD_ORDER:
+                if copy_data:
+                    items = copy.deepcopy(items)
+                resources[rtype] = items
+
+        for rtype in BUILD_ORDER:
+            if rtype not in data['resources']:
+                continue
+            fields = _FIELD_GROUPS.get(rtype, [])
+            step = getattr(self, '_build_%s' % rtype)
+            kept = []
+            # Set before building, as building an instance may add a
+            # security group
+            resources[rtype] = kept
+            for item in data['resources'][rtype]:
+                if rtype in STAGED:
+                    stages = item.get('stages', None)
+                    if stages and environment not in stages:
+                        LOG.debug('Found %s not present in %s: %s',
+                                  STAGED[rtype], environment, item['name'])
+                        continue
+                if copy_data:
+                    item = copy.deepcopy(item)
+                if rtype in STAGED:
+                    item.pop('stages', None)
+                self._resolve_fields(item, fields, environment)
+                step(item, config, environment)
+                kept.append(item)
+
+        if self.rules_saved:
+            LOG.info('Merged %d security group rules', self.rules_saved)
+        TIMINGS.annotations['secgroup_rules_merged'] = self.rules_saved
         LOG.debug('stack: %s', self._stack)
         LOG.info('Finished parsing config')
         return self._stack
 
+    def _build_network(self, net, config, environment):
+        """
+        Splits a network into a subnet per zone, unless they are given
+
+        :param net: Network, modified in place
+        :type net: dict.
+        :param config: Resolved stack config section
+        :type config: dict.
+        :param environment: Name of the environment being built
+        :type environment: str.
+        """
+
+        zones = net['zones']
+        net['public'] = net.get('public', True)
+        if net.get('subnets', None):
+            return
+
+        setting = 'private'
+        if net['public']:
+            setting = 'public'
+        subnets = []
+        numsubnets = len(zones)
+        subcidrs = split_subnets(net['netrange'], numsubnets)
+        for idx in range(0, numsubnets):
+            zone = zones[idx % len(zones)]
+            subnets.append({
+                'cidr': str(subcidrs[idx]),
+                'name': '%s-%s-%s' % (net['name'], zone, setting),
+                'public': setting == 'public',
+                'zone': zone,
+            })
+        net['subnets'] = subnets
+
+    def _build_secgroup(self, secg, config, environment):
+        """
+        Fills in the VPC of a security group, and resolves rule sources,
+        adding a copy of the rule for each source in a list.  The rules are
+        then compacted with :py:func:`pmcf.utils.rules.compact_rules`.
+
+        :param secg: Security group, modified in place
+        :type secg: dict.
+        :param config: Resolved stack config section
+        :type config: dict.
+        :param environment: Name of the environment being built
+        :type environment: str.
+        :raises: :class:`pmcf.exceptions.ParserFailure`
+        """
+
+        if not secg.get('vpcid', None) and config.get('vpcid'):
+            secg['vpcid'] = config['vpcid']
+
+        rules = []
+        new_rules = []
+        for rule in secg['rules']:
+            for field in RULE_ENV_FIELDS:
+                item = rule.get(field, None)
+                if item:
+                    rule[field] = self._get_value_for_env(item, environment,
+                                                          field)
+                    if isinstance(rule[field], list):
+                        # Rules only hold scalars, so shallow copies will do
+                        sources = rule[field]
+                        rule[field] = sources[-1]
+                        for source in sources[:-1]:
+                            new_rule = dict(rule)
+                            new_rule[field] = source
+                            new_rules.append(new_rule)
+            rules.append(rule)
+        rules.extend(new_rules)
+
+        secg['rules'], saved = compact_rules(rules)
+        if saved:
+            LOG.info('Merged %d rules in security group %s',
+                     saved, secg['name'])
+            self.rules_saved += saved
+
+    def _build_load_balancer(self, ldb, config, environment):
+        """
+        Fills in the subnets of a load balancer, and places its access logs
+        under the environment, unless the log policy sets ``fullprefix``
+
+        :param ldb: Load balancer, modified in place
+        :type ldb: dict.
+        :param config: Resolved stack config section
+        :type config: dict.
+        :param environment: Name of the environment being built
+        :type environment: str.
+        """
+
+        if config.get('subnets'):
+            ldb['subnets'] = ldb.get('subnets', config['subnets'])
+        ldb['policy'] = copy.deepcopy(ldb.get('policy', []))
+        for policy in ldb['policy']:
+            if policy['type'] == 'log_policy':
+                if policy['policy'].pop('fullprefix', False):
+                    continue
+                schema = 'external'
+                if ldb.get('internal'):
+                    schema = 'internal'
+                policy['policy']['s3prefix'] = '%s/%s/%s' % (
+                    environment, policy['policy']['s3prefix'], schema)
+
+    def _build_instance(self, instance, config, environment):
+        """
+        Checks an instance and fills in its defaults from the stack config,
+        adding a security group for it if it has none
+
+        :param instance: Instance, modified in place
+        :type instance: dict.
+        :param config: Resolved stack config section
+        :type config: dict.
+        :param environment: Name of the environment being built
+        :type environment: str.
+        :raises: :class:`pmcf.exceptions.ParserFailure`
+        """
+
+        if instance.get('public', None) is None:
+            instance['public'] = False
+
+        if instance.get('dns'):
+            if not instance['dns'].get('zone', '').endswith('.'):
+                raise ParserFailure("DNS zone must end with '.' on %s" %
+                                    instance['name'])
+
+        item = instance.get('scaling_policy', None)
+        if item:
+            if instance.get('nat'):
+                raise ParserFailure("instances with ElasticIPs and "
+                                    "ScalingPolicies are not supported")
+
+            instance['scaling_policy'] = self._get_value_for_env(
+                item, environment, 'scaling_policy')
+            if instance['scaling_policy'] == []:
+                instance.pop('scaling_policy', None)
+
+        if config.get('subnets'):
+            instance['subnets'] = instance.get('subnets', config['subnets'])
+            if not config.get('vpcid'):
+                raise ParserFailure("subnets without vpcid is invalid")
+
+        if self._stack['config'].get('notify', None):
+            instance['notify'] = instance.get(
+                'notify',
+                self._stack['config']['notify'])
+
+        if not instance.get('provisioner', None):
+            if self._stack['config'].get('provisioner', '') ==\
+                    'PuppetProvisioner':
+                bucket = self._stack['config'].get(
+                    'bucket',
+                    self._stack['config']['audit_output'])
+                instance['provisioner'] = {
+                    'provider': 'PuppetProvisioner',
+                    'args': {
+                        'bucket': bucket,
+                        'infrastructure': "%s.tar.gz" % instance['name'],
+                    }
+                }
+
+        if instance.get('sg', []) == []:
+            sgs = self._stack['resources']['secgroup']
+            found = instance['name'] in [x['name'] for x in sgs]
+            if not found:
+                sgs.insert(0, {
+                    'name': instance['name'],
+                    'rules': []
+                })
+                if config.get('vpcid'):
+                    sgs[0]['vpcid'] = config['vpcid']
+                instance['sg'] = instance.get('sg', [])
+                instance['sg'].append(instance['name'])
+        if not self._stack['config'].get('nodefaultsg'):
+            if config.get('vpcid') and config.get('defaultsg'):
+                instance['sg'].append(config['defaultsg'])
+            else:
+                instance['sg'].append('default')
+
 
 __all__ = [
     'YamlParser',
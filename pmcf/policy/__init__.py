@@ -20,8 +20,12 @@
 ..  moduleauthor:: Stephen Gran <stephen.gran@piksel.com>
 """
 
-from pmcf.policy.base_policy import BasePolicy
-from pmcf.policy.json_policy import JSONPolicy
+from pmcf.utils import lazy_package
+
+lazy_package(__name__, {
+    'BasePolicy': 'pmcf.policy.base_policy',
+    'JSONPolicy': 'pmcf.policy.json_policy',
+})
 
 
 __all__ = [
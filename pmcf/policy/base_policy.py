@@ -23,6 +23,8 @@
 import abc
 import logging
 
+from pmcf.exceptions import PolicyException
+
 LOG = logging.getLogger(__name__)
 
 # pylint: disable=abstract-class-little-used
@@ -41,7 +43,8 @@ class BasePolicy(object):
     __metaclass__ = abc.ABCMeta
 
     @abc.abstractmethod
-    def validate_resource(self, resource_type, resource_data):
+    def validate_resource(self, resource_type, resource_data,
+                          environment=None):
         """
         Validates resource against local policy.
 
@@ -49,12 +52,83 @@ class BasePolicy(object):
         :type resource_type: str.
         :param resource_data: Resource to validate
         :type resource_data: dict.
+        :param environment: Environment, for environment specific rules
+        :type environment: str.
         :raises: :class:`NotImplementedError`
         :returns: dict
         """
 
         raise NotImplementedError
 
+    def validate_stack(self, stack):
+        """
+        Validates every resource in a stack against local policy.  This
+        default calls :py:meth:`validate_resource` for each one; policy
+        classes that can do the whole stack more cheaply should override it.
+
+        :param stack: Parsed stack
+        :type stack: dict.
+        :raises: :class:`pmcf.exceptions.PolicyException`
+        """
+
+        environment = stack['config'].get('environment')
+        for rtype, resources in stack['resources'].iteritems():
+            for data in resources:
+                self.validate_resource(rtype, data, environment=environment)
+
+    def input_files(self):
+        """
+        Lists the files and directories the policy was built from, so that
+        long running processes can tell when to reload it
+
+        :returns: list.
+        """
+
+        return []
+
+    def version(self):
+        """
+        Identifies the rules currently in force, so that validation results
+        can be remembered until they change.  Policy classes that can not
+        tell return None, and their results are never remembered.
+
+        :returns: str, or None
+        """
+
+        return None
+
+    def violations(self, resource_type, resource_data, environment=None):
+        """
+        Applies local policy to a resource like :py:meth:`validate_resource`,
+        but returns the problems found instead of raising.
+
+        Each problem is a dict with the offending ``field`` (or None when the
+        policy class can not tell), its ``value``, a ``message``, and the
+        values the policy would have ``allowed`` (or None).  This default
+        can only report the first problem; policy classes that can do better
+        should override it.
+
+        :param resource_type: Type of resource to validate
+        :type resource_type: str.
+        :param resource_data: Resource to validate
+        :type resource_data: dict.
+        :param environment: Environment, for environment specific rules
+        :type environment: str.
+        :returns: list of dicts
+        """
+
+        try:
+            self.validate_resource(resource_type, resource_data,
+                                   environment=environment)
+        except PolicyException, exc:
+            return [{
+                'field': None,
+                'value': None,
+                'message': exc.message,
+                'allowed': None,
+            }]
+        return []
+
 
 __all__ = [
     'BasePolicy',
@@ -20,31 +20,303 @@
 ..  moduleauthor:: Stephen Gran <stephen.gran@piksel.com>
 """
 
+import copy
+import hashlib
 import json
 import logging
+import numbers
+import os
+import re
+import sys
 
 from pmcf.exceptions import PolicyException
+from pmcf.policy import layers
 from pmcf.policy.base_policy import BasePolicy
+from pmcf.utils.cache import DiskCache, file_signature
 
 LOG = logging.getLogger(__name__)
 
 
+def _is_number(value):
+    return isinstance(value, numbers.Number) and not isinstance(value, bool)
+
+
+class PolicyRule(object):
+    """
+    The policy for one field of one resource type, compiled so that
+    checking a value is cheap.  Supports:
+
+    ``default``
+        value used when the field is not set
+    ``constraints``
+        list of allowed values
+    ``minimum``, ``maximum``
+        inclusive numeric range
+    ``pattern``
+        regular expression the value must match
+    """
+
+    def __init__(self, resource_type, field, spec):
+        """
+        Constructor
+
+        :param resource_type: Type of resource the rule applies to
+        :type resource_type: str.
+        :param field: Field the rule applies to
+        :type field: str.
+        :param spec: Rule, as written in the policy file
+        :type spec: dict.
+        :raises: :class:`pmcf.exceptions.PolicyException`
+        """
+
+        self.resource_type = resource_type
+        self.field = field
+        self.has_default = 'default' in spec
+        self.default = spec.get('default')
+        self.copy_default = isinstance(self.default, (dict, list))
+
+        self.constraints = spec.get('constraints') or None
+        self._allowed = None
+        if self.constraints is not None:
+            try:
+                self._allowed = frozenset(self.constraints)
+            except TypeError:
+                # Lists or dicts among the allowed values
+                self._allowed = tuple(self.constraints)
+
+        self.minimum = spec.get('minimum')
+        self.maximum = spec.get('maximum')
+        for bound in [self.minimum, self.maximum]:
+            if bound is not None and not _is_number(bound):
+                raise PolicyException("Range for `%s' field `%s' must be "
+                                      "numeric" % (resource_type, field))
+
+        self.pattern = spec.get('pattern')
+        self._regex = None
+        if self.pattern is not None:
+            try:
+                self._regex = re.compile(self.pattern)
+            except (re.error, TypeError), exc:
+                raise PolicyException("Bad pattern for `%s' field `%s': %s" %
+                                      (resource_type, field, exc))
+
+    def _problem(self, value, reason, allowed=None):
+        return {
+            'field': self.field,
+            'value': value,
+            'message': "Data field `%s' with value `%s' %s for `%s'" % (
+                self.field, value, reason, self.resource_type),
+            'allowed': allowed,
+        }
+
+    def check(self, value):
+        """
+        Checks a value against the rule
+
+        :param value: Value of the field
+        :type value: variable
+        :returns: dict describing the problem, or None
+        """
+
+        if self._allowed is not None:
+            try:
+                allowed = value in self._allowed
+            except TypeError:
+                allowed = False
+            if not allowed:
+                return self._problem(value, 'not allowed', self.constraints)
+        if self.minimum is not None or self.maximum is not None:
+            if not _is_number(value):
+                return self._problem(value, 'is not a number')
+            if self.minimum is not None and value < self.minimum:
+                return self._problem(value, 'is below %s' % self.minimum)
+            if self.maximum is not None and value > self.maximum:
+                return self._problem(value, 'is above %s' % self.maximum)
+        if self._regex is not None:
+            if not isinstance(value, basestring) or\
+                    not self._regex.search(value):
+                return self._problem(value, "does not match `%s'" %
+                                     self.pattern)
+        return None
+
+
 class JSONPolicy(BasePolicy):
     """
     JSON Policy class.
 
     This is the only supported policy class.
+
+    The policy file maps resource types to fields to rules, as described in
+    :class:`PolicyRule`.  A rule may also override any of its settings for
+    particular environments, under ``environments``::
+
+        {
+            "instance": {
+                "size": {
+                    "default": "m1.small",
+                    "constraints": ["m1.small", "m1.medium"],
+                    "environments": {
+                        "prod": {"constraints": ["m1.large"]}
+                    }
+                }
+            }
+        }
+
+    Overlays may be layered over the base policy file, as described in
+    :py:func:`pmcf.policy.layers.policy_files`.
+
+    The rules are compiled into per resource type, per environment tables
+    whenever :py:attr:`json_policy` is set, so must be replaced rather than
+    changed in place.  Given a cache directory, the merged and compiled
+    policy is kept there and reused until one of its files changes.
     """
 
-    def __init__(self, json_file='/etc/pmcf/policy.json'):
-        try:
-            with open(json_file) as fld:
-                self.json_policy = json.loads(fld.read())
-        except (IOError, ValueError), exc:
-            raise PolicyException("Can't load policy file %s: %s" %
-                                  (json_file, exc))
+    def __init__(self, json_file='/etc/pmcf/policy.json', overlays=None,
+                 cachedir=None):
+        """
+        Constructor
 
-    def validate_resource(self, resource_type, resource_data):
+        :param json_file: Base policy file
+        :type json_file: str.
+        :param overlays: Extra overlay files, or a comma-separated string
+                         of them
+        :type overlays: list.
+        :param cachedir: Directory to cache the compiled policy in, or None
+        :type cachedir: str.
+        :raises: :class:`pmcf.exceptions.PolicyException`
+        """
+
+        self._json_policy = None
+        self._tables = {None: {}}
+        self._version = None
+        self.json_file = json_file
+        self.files = layers.policy_files(json_file, overlays)
+
+        cache = key = None
+        if cachedir:
+            cache = DiskCache(cachedir)
+            key = DiskCache.key(
+                'policy',
+                [fname for fname, _ in self.files],
+                # The cache holds compiled rules, so changes to how rules
+                # are compiled invalidate it
+                file_signature(sys.modules[__name__].__file__),
+            )
+            cached = cache.get(key)
+            if cached is not None:
+                LOG.debug('Using cached policy for %s', json_file)
+                self._json_policy, self._tables, self._version = cached
+                return
+
+        self.json_policy = layers.load(self.files)
+        if cache is not None:
+            cache.set(key, (self._json_policy, self._tables, self._version),
+                      [fname for fname, _ in self.files])
+
+    def input_files(self):
+        """
+        Lists the files and directories the policy was, or would be, built
+        from, so that callers can tell when to reload it
+
+        :returns: list.
+        """
+
+        directory = layers.overlay_dir(self.json_file)
+        return [fname for fname, _ in self.files] + [
+            directory, os.path.join(directory, 'environments')]
+
+    @property
+    def json_policy(self):
+        """
+        The policy, as loaded from the policy file
+        """
+
+        return self._json_policy
+
+    @json_policy.setter
+    def json_policy(self, policy):
+        self._tables = self._compile(policy)
+        self._version = hashlib.sha1(json.dumps(policy,
+                                                sort_keys=True)).hexdigest()
+        self._json_policy = policy
+
+    @staticmethod
+    def _compile(policy):
+        """
+        Builds the rule tables for a policy
+
+        :param policy: Policy, as loaded from the policy file
+        :type policy: dict.
+        :raises: :class:`pmcf.exceptions.PolicyException`
+        :returns: dict mapping environment (None for the default) to dict
+                  mapping resource type to list of :class:`PolicyRule`
+        """
+
+        if not isinstance(policy, dict):
+            raise PolicyException('Policy must be an object')
+        specs = {}
+        environments = set()
+        for rtype, fields in policy.items():
+            if not fields:
+                continue
+            if not isinstance(fields, dict):
+                raise PolicyException("Policy for `%s' must be an object" %
+                                      rtype)
+            for field, spec in fields.items():
+                if not isinstance(spec, dict):
+                    raise PolicyException("Policy for `%s' field `%s' must "
+                                          "be an object" % (rtype, field))
+                environments.update(spec.get('environments', {}).keys())
+                specs.setdefault(rtype, []).append((field, spec))
+
+        tables = {}
+        for environment in [None] + sorted(environments):
+            tables[environment] = {}
+            for rtype, fields in specs.items():
+                rules = []
+                for field, spec in sorted(fields):
+                    merged = dict(spec)
+                    merged.update(
+                        merged.pop('environments', {}).get(environment, {}))
+                    rules.append(PolicyRule(rtype, field, merged))
+                tables[environment][rtype] = rules
+        return tables
+
+    def _rules(self, resource_type, environment):
+        """
+        Rules for a resource type in an environment
+
+        :returns: list of :class:`PolicyRule`
+        """
+
+        table = self._tables.get(environment, self._tables[None])
+        return table.get(resource_type, ())
+
+    @staticmethod
+    def _apply(rules, resource_data):
+        """
+        Fills in defaults and checks every rule against a resource
+
+        :returns: list of dicts
+        """
+
+        problems = []
+        for rule in rules:
+            value = resource_data.get(rule.field)
+            if value is None:
+                if not rule.has_default:
+                    continue
+                value = rule.default
+                if rule.copy_default:
+                    value = copy.deepcopy(value)
+                resource_data[rule.field] = value
+            problem = rule.check(value)
+            if problem is not None:
+                problems.append(problem)
+        return problems
+
+    def validate_resource(self, resource_type, resource_data,
+                          environment=None):
         """
         Validates resource against local policy.
 
@@ -52,25 +324,66 @@ class JSONPolicy(BasePolicy):
         :type resource_type: str.
         :param resource_data: Resource to validate
         :type resource_data: dict.
-        :raises: :class:`NotImplementedError`
+        :param environment: Environment, for environment specific rules
+        :type environment: str.
+        :raises: :class:`pmcf.exceptions.PolicyException`
         :returns: dict
         """
 
-        if not self.json_policy.get(resource_type):
-            return True
-        policy = self.json_policy.get(resource_type)
-        for key in policy.keys():
-            if resource_data.get(key, None) is None:
-                resource_data[key] = policy[key]['default']
-            if policy[key].get('constraints'):
-                if resource_data[key] not in policy[key]['constraints']:
-                    raise PolicyException("Data field `%s' with value `%s' "
-                                          "not allowed for `%s'" %
-                                          (key, resource_data[key],
-                                           resource_type))
+        problems = self._apply(self._rules(resource_type, environment),
+                               resource_data)
+        if problems:
+            raise PolicyException(problems[0]['message'])
         return True
 
+    def validate_stack(self, stack):
+        """
+        Validates every resource in a stack against local policy, using the
+        rules for the stack's environment.
+
+        :param stack: Parsed stack
+        :type stack: dict.
+        :raises: :class:`pmcf.exceptions.PolicyException`
+        """
+
+        environment = stack['config'].get('environment')
+        for rtype, resources in stack['resources'].iteritems():
+            rules = self._rules(rtype, environment)
+            if not rules:
+                continue
+            for data in resources:
+                problems = self._apply(rules, data)
+                if problems:
+                    raise PolicyException(problems[0]['message'])
+
+    def version(self):
+        """
+        Identifies the rules currently in force
+
+        :returns: str.
+        """
+
+        return self._version
+
+    def violations(self, resource_type, resource_data, environment=None):
+        """
+        Applies local policy to a resource, filling in defaults, and returns
+        every field whose value the policy does not allow.
+
+        :param resource_type: Type of resource to validate
+        :type resource_type: str.
+        :param resource_data: Resource to validate
+        :type resource_data: dict.
+        :param environment: Environment, for environment specific rules
+        :type environment: str.
+        :returns: list of dicts
+        """
+
+        return self._apply(self._rules(resource_type, environment),
+                           resource_data)
+
 
 __all__ = [
     'JSONPolicy',
+    'PolicyRule',
 ]
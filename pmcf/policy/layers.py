@@ -0,0 +1,167 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+..  module:: pmcf.policy.layers
+    :platform: Unix
+    :synopsis: module finding and merging layered policy files
+
+..  moduleauthor:: Stephen Gran <stephen.gran@piksel.com>
+"""
+
+import glob
+import json
+import logging
+import os
+
+from pmcf.exceptions import PolicyException
+
+LOG = logging.getLogger(__name__)
+
+
+def overlay_dir(json_file):
+    """
+    Directory holding overlays for a base policy file: ``policy.d`` next to
+    ``policy.json``
+
+    :param json_file: Base policy file
+    :type json_file: str.
+    :returns: str.
+    """
+
+    return os.path.splitext(json_file)[0] + '.d'
+
+
+def policy_files(json_file, overlays=None):
+    """
+    Lists the files making up a policy, in the order they are merged:
+
+    #. the base policy file
+    #. ``*.json`` in the overlay directory, in name order
+    #. overlays named in the configuration, such as one per profile
+    #. ``environments/<environment>.json`` in the overlay directory, which
+       only apply to that environment
+
+    :param json_file: Base policy file
+    :type json_file: str.
+    :param overlays: Extra overlay files, or a comma-separated string of them
+    :type overlays: list.
+    :returns: list of (file name, environment or None) tuples
+    """
+
+    if isinstance(overlays, basestring):
+        overlays = [name.strip() for name in overlays.split(',')
+                    if name.strip()]
+    directory = overlay_dir(json_file)
+    files = [(json_file, None)]
+    for fname in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        files.append((fname, None))
+    for fname in overlays or []:
+        files.append((fname, None))
+    for fname in sorted(glob.glob(os.path.join(directory, 'environments',
+                                               '*.json'))):
+        environment = os.path.splitext(os.path.basename(fname))[0]
+        files.append((fname, environment))
+    return files
+
+
+def _read(fname):
+    """
+    Reads one policy file
+
+    :param fname: File name
+    :type fname: str.
+    :raises: :class:`pmcf.exceptions.PolicyException`
+    :returns: dict.
+    """
+
+    try:
+        with open(fname) as fld:
+            policy = json.loads(fld.read())
+    except (IOError, ValueError), exc:
+        raise PolicyException("Can't load policy file %s: %s" %
+                              (fname, exc))
+    if not isinstance(policy, dict):
+        raise PolicyException('Policy file %s must hold an object' % fname)
+    for rtype, fields in policy.items():
+        if fields and not isinstance(fields, dict):
+            raise PolicyException("Policy for `%s' in %s must be an object" %
+                                  (rtype, fname))
+        for field, spec in (fields or {}).items():
+            if not isinstance(spec, dict):
+                raise PolicyException("Policy for `%s' field `%s' in %s "
+                                      "must be an object" %
+                                      (rtype, field, fname))
+    return policy
+
+
+def merge(policy, overlay, environment=None):
+    """
+    Merges an overlay into a policy, in place.  Overlay settings replace
+    those for the same field in the policy; fields the policy does not
+    mention are added.  An environment overlay is merged into the rules'
+    ``environments`` settings instead, so it only applies there.
+
+    :param policy: Policy to merge into
+    :type policy: dict.
+    :param overlay: Policy to merge
+    :type overlay: dict.
+    :param environment: Environment the overlay applies to, or None
+    :type environment: str.
+    :returns: dict, the merged policy
+    """
+
+    for rtype, fields in overlay.items():
+        if not fields:
+            continue
+        if not policy.get(rtype):
+            policy[rtype] = {}
+        for field, spec in fields.items():
+            target = policy[rtype].setdefault(field, {})
+            if environment is not None:
+                target = target.setdefault('environments', {}).setdefault(
+                    environment, {})
+            for key, value in spec.items():
+                if key == 'environments' and isinstance(value, dict):
+                    envs = target.setdefault('environments', {})
+                    for env, settings in value.items():
+                        envs.setdefault(env, {}).update(settings)
+                else:
+                    target[key] = value
+    return policy
+
+
+def load(files):
+    """
+    Reads and merges policy files
+
+    :param files: Output of :py:func:`policy_files`
+    :type files: list.
+    :raises: :class:`pmcf.exceptions.PolicyException`
+    :returns: dict.
+    """
+
+    policy = _read(files[0][0])
+    for fname, environment in files[1:]:
+        LOG.debug('Merging policy overlay %s', fname)
+        merge(policy, _read(fname), environment)
+    return policy
+
+
+__all__ = [
+    'load',
+    'merge',
+    'overlay_dir',
+    'policy_files',
+]
@@ -20,14 +20,18 @@
 ..  moduleauthor:: Stephen Gran <stephen.gran@piksel.com>
 """
 
-from pmcf.provisioners.awsfw import AWSFWProvisioner
-from pmcf.provisioners.base_provisioner import BaseProvisioner
-from pmcf.provisioners.block import BlockingProvisioner
-from pmcf.provisioners.ansible import AnsibleProvisioner
-from pmcf.provisioners.chef import ChefProvisioner
-from pmcf.provisioners.noop import NoopProvisioner
-from pmcf.provisioners.puppet import PuppetProvisioner
-from pmcf.provisioners.winpuppet import WindowsPuppetProvisioner
+from pmcf.utils import lazy_package
+
+lazy_package(__name__, {
+    'AWSFWProvisioner': 'pmcf.provisioners.awsfw',
+    'AnsibleProvisioner': 'pmcf.provisioners.ansible',
+    'BaseProvisioner': 'pmcf.provisioners.base_provisioner',
+    'BlockingProvisioner': 'pmcf.provisioners.block',
+    'ChefProvisioner': 'pmcf.provisioners.chef',
+    'NoopProvisioner': 'pmcf.provisioners.noop',
+    'PuppetProvisioner': 'pmcf.provisioners.puppet',
+    'WindowsPuppetProvisioner': 'pmcf.provisioners.winpuppet',
+})
 
 __all__ = [
     'AWSFWProvisioner',
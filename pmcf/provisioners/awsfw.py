@@ -35,6 +35,20 @@ class AWSFWProvisioner(BaseProvisioner):
     backwards-compatible manner with the existing AWSFW standalone installer.
     """
 
+    def input_files(self):
+        """
+        Local files read by :py:meth:`userdata`
+
+        :returns: list.
+        """
+
+        return [
+            'scripts/awsfw/part-handler',
+            'scripts/awsfw/cloud-config',
+            'scripts/awsfw/s3curl.pl',
+            'scripts/awsfw/bootstrap.sh',
+        ]
+
     def userdata(self, args):
         """
         Validates resource against local policy.
@@ -91,6 +91,16 @@ class BaseProvisioner(object):
 
         return False
 
+    def input_files(self):
+        """
+        Local files a provisioner implementation reads to build userdata or
+        metadata.  Used to decide when output needs to be rebuilt.
+
+        :returns: list.
+        """
+
+        return []
+
     def wants_wait(self):
         """
         Whether a provisioner implementation wants a wait condition created
@@ -0,0 +1,340 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+..  module:: pmcf.schema.codegen
+    :platform: Unix
+    :synopsis: module compiling the schema into python validation functions
+
+..  moduleauthor:: Stephen Gran <stephen.gran@piksel.com>
+"""
+
+import logging
+import numbers
+
+LOG = logging.getLogger(__name__)
+
+# Python checks for each draft 4 type, matching jsonschema's, which does not
+# count booleans as numbers
+TYPE_CHECKS = {
+    'array': 'isinstance(%(var)s, list)',
+    'boolean': 'isinstance(%(var)s, bool)',
+    'integer': '(isinstance(%(var)s, (int, long)) and '
+               'not isinstance(%(var)s, bool))',
+    'null': '%(var)s is None',
+    'number': '(isinstance(%(var)s, numbers.Number) and '
+              'not isinstance(%(var)s, bool))',
+    'object': 'isinstance(%(var)s, dict)',
+    'string': 'isinstance(%(var)s, basestring)',
+}
+
+# Keywords that never affect validation
+IGNORED = set(['$schema', 'definitions', 'description', 'id', 'title'])
+
+
+class SchemaCompiler(object):
+    """
+    Compiles a draft 4 JSON schema into python functions that only answer
+    whether a document is valid.  They do no more work than they must and
+    stop at the first problem, so are much quicker than a general purpose
+    validator, but give no reasons: use jsonschema to explain a failure.
+
+    Only the keywords the pmcf schema uses are supported.  ``oneOf`` over
+    object schemas that each require a fixed value for the same property,
+    such as the provisioner ``provider``, looks the value up rather than
+    trying every branch.
+    """
+
+    def __init__(self, schema):
+        """
+        Constructor
+
+        :param schema: Schema to compile
+        :type schema: dict.
+        """
+
+        self.schema = schema
+        self.lines = []
+        self.tail = []
+        self.constants = {}
+        self.functions = {}
+        self._count = 0
+
+    def _name(self, prefix):
+        self._count += 1
+        return '_%s%d' % (prefix, self._count)
+
+    def _constant(self, value):
+        """
+        Makes a value available to the generated code under a new name
+        """
+
+        name = self._name('c')
+        self.constants[name] = value
+        return name
+
+    def _ref(self, ref):
+        """
+        Name of the function validating a local ``#/definitions/`` reference,
+        compiling it on first use
+        """
+
+        if ref not in self.functions:
+            if not ref.startswith('#/definitions/'):
+                raise NotImplementedError('Unsupported $ref %s' % ref)
+            definition = ref[len('#/definitions/'):]
+            self.functions[ref] = '_def_%s' % definition.replace('-', '_')
+            self._function(self.schema['definitions'][definition],
+                           self.functions[ref])
+        return self.functions[ref]
+
+    def _expression(self, schema, var):
+        """
+        Builds a python expression that is true when ``var`` is valid under
+        the schema, compiling a function for anything more than a type or
+        enum check
+        """
+
+        keys = set(schema.keys()) - IGNORED
+        if not keys:
+            return 'True'
+        if '$ref' in schema:
+            # Draft 4 ignores everything else alongside a $ref
+            return '%s(%s)' % (self._ref(schema['$ref']), var)
+        if keys <= set(['type', 'enum']):
+            checks = []
+            if 'type' in schema:
+                checks.append(self._type(schema['type'], var))
+            if 'enum' in schema:
+                checks.append('%s in %s' % (
+                    var, self._constant(tuple(schema['enum']))))
+            return ' and '.join(checks)
+        name = self._name('f')
+        self._function(schema, name)
+        return '%s(%s)' % (name, var)
+
+    def _type(self, types, var):
+        if isinstance(types, basestring):
+            types = [types]
+        return '(%s)' % ' or '.join(TYPE_CHECKS[t] % {'var': var}
+                                    for t in types)
+
+    def _discriminator(self, branches):
+        """
+        Finds a property every branch of a oneOf requires to be one of a set
+        of values, so that the branch can be picked by that value
+
+        :returns: tuple of (property, mapping of value to branch indices), or
+                  None
+        """
+
+        resolved = []
+        for branch in branches:
+            while '$ref' in branch:
+                branch = self.schema['definitions'][
+                    branch['$ref'][len('#/definitions/'):]]
+            resolved.append(branch)
+
+        for prop in resolved[0].get('required', []):
+            mapping = {}
+            for idx, branch in enumerate(resolved):
+                enum = branch.get('properties', {}).get(prop, {}).get('enum')
+                if branch.get('type') != 'object' or enum is None or\
+                        prop not in branch.get('required', []):
+                    break
+                for value in enum:
+                    try:
+                        mapping.setdefault(value, []).append(idx)
+                    except TypeError:
+                        break
+                else:
+                    continue
+                break
+            else:
+                return prop, mapping
+        return None
+
+    def _function(self, schema, name):
+        """
+        Emits a function named ``name`` validating one value
+        """
+
+        unknown = set(schema.keys()) - IGNORED - set([
+            '$ref', 'additionalProperties', 'anyOf', 'enum', 'items',
+            'minItems', 'minimum', 'oneOf', 'properties', 'required', 'type'])
+        if unknown:
+            raise NotImplementedError('Unsupported keywords %s' %
+                                      ', '.join(sorted(unknown)))
+
+        body = []
+        if '$ref' in schema:
+            body.append('return %s' % self._expression(schema, 'data'))
+            self._emit(name, body)
+            return
+
+        if 'type' in schema:
+            body.append('if not %s:' % self._type(schema['type'], 'data'))
+            body.append('    return False')
+        if 'enum' in schema:
+            body.append('if data not in %s:' %
+                        self._constant(tuple(schema['enum'])))
+            body.append('    return False')
+
+        obj = []
+        for prop in schema.get('required', []):
+            obj.append('if %r not in data:' % prop)
+            obj.append('    return False')
+        props = schema.get('properties', {})
+        extra = schema.get('additionalProperties', True)
+        if extra is False:
+            allowed = self._constant(frozenset(props.keys()))
+            obj.append('for key in data:')
+            obj.append('    if key not in %s:' % allowed)
+            obj.append('        return False')
+        elif isinstance(extra, dict):
+            allowed = self._constant(frozenset(props.keys()))
+            obj.append('for key in data:')
+            obj.append('    if key not in %s and not %s:' % (
+                allowed, self._expression(extra, 'data[key]')))
+            obj.append('        return False')
+        for prop in sorted(props.keys()):
+            check = self._expression(props[prop], 'value')
+            if check == 'True':
+                continue
+            obj.append('value = data.get(%r, _MISSING)' % prop)
+            obj.append('if value is not _MISSING and not (%s):' % check)
+            obj.append('    return False')
+        if obj:
+            body.append('if isinstance(data, dict):')
+            body.extend('    ' + line for line in obj)
+
+        arr = []
+        if 'minItems' in schema:
+            arr.append('if len(data) < %d:' % schema['minItems'])
+            arr.append('    return False')
+        if isinstance(schema.get('items'), dict):
+            check = self._expression(schema['items'], 'item')
+            if check != 'True':
+                arr.append('for item in data:')
+                arr.append('    if not (%s):' % check)
+                arr.append('        return False')
+        elif 'items' in schema:
+            raise NotImplementedError('Unsupported tuple items')
+        if arr:
+            body.append('if isinstance(data, list):')
+            body.extend('    ' + line for line in arr)
+
+        if 'minimum' in schema:
+            body.append('if %s and data < %r:' % (
+                TYPE_CHECKS['number'] % {'var': 'data'}, schema['minimum']))
+            body.append('    return False')
+
+        if 'anyOf' in schema:
+            checks = [self._expression(sub, 'data')
+                      for sub in schema['anyOf']]
+            body.append('if not (%s):' % ' or '.join(
+                '(%s)' % check for check in checks))
+            body.append('    return False')
+
+        if 'oneOf' in schema:
+            found = self._discriminator(schema['oneOf'])
+            if found:
+                prop, mapping = found
+                funcs = []
+                for sub in schema['oneOf']:
+                    funcs.append(self._name('f'))
+                    self._function(sub, funcs[-1])
+                # Each value of the property maps to the branches that
+                # accept it; all other branches are bound to fail
+                table = self._name('t')
+                self.tail.append('%s = {' % table)
+                for value in sorted(mapping.keys()):
+                    self.tail.append('    %r: (%s,),' % (value, ', '.join(
+                        funcs[idx] for idx in mapping[value])))
+                self.tail.append('}')
+                body.append('if not isinstance(data, dict):')
+                body.append('    return False')
+                body.append('try:')
+                body.append('    candidates = %s.get(data.get(%r, _MISSING), '
+                            '())' % (table, prop))
+                body.append('except TypeError:')
+                body.append('    return False')
+                body.append('if sum(1 for func in candidates '
+                            'if func(data)) != 1:')
+                body.append('    return False')
+            else:
+                checks = [self._expression(sub, 'data')
+                          for sub in schema['oneOf']]
+                body.append('if sum(1 for valid in (%s) if valid) != 1:' %
+                            ', '.join(checks))
+                body.append('    return False')
+
+        body.append('return True')
+        self._emit(name, body)
+
+    def _emit(self, name, body):
+        self.lines.append('def %s(data):' % name)
+        self.lines.extend('    ' + line for line in body)
+        self.lines.append('')
+
+    def source(self):
+        """
+        Python source of the generated functions.  The entry point is named
+        ``validate``.
+
+        :raises: :class:`NotImplementedError` for unsupported schemas
+        :returns: str.
+        """
+
+        if not self.lines:
+            self._function(self.schema, 'validate')
+        return '\n'.join(self.lines + self.tail) + '\n'
+
+    def compile(self):
+        """
+        Compiles the schema
+
+        :raises: :class:`NotImplementedError` for unsupported schemas
+        :returns: function taking a document and returning whether it is
+                  valid
+        """
+
+        source = self.source()
+        namespace = {
+            '_MISSING': object(),
+            'numbers': numbers,
+        }
+        namespace.update(self.constants)
+        # pylint: disable=exec-used
+        exec compile(source, '<pmcf.schema.codegen>', 'exec') in namespace
+        return namespace['validate']
+
+
+def compile_schema(schema):
+    """
+    Compiles a schema into a function answering whether a document is valid
+
+    :param schema: Schema to compile
+    :type schema: dict.
+    :raises: :class:`NotImplementedError` for unsupported schemas
+    :returns: function.
+    """
+
+    return SchemaCompiler(schema).compile()
+
+
+__all__ = [
+    'compile_schema',
+    'SchemaCompiler',
+]
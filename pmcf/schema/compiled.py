@@ -0,0 +1,983 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+..  module:: pmcf.schema.compiled
+    :platform: Unix
+    :synopsis: pre-parsed form of the base schema
+
+..  moduleauthor:: Stephen Gran <stephen.gran@piksel.com>
+"""
+
+# Generated from pmcf/schema/base.py by tools/compile_schema.py - do not edit
+
+# pylint: disable=invalid-name
+
+schema = {
+    '$schema': 'http://json-schema.org/draft-04/schema#',
+    'additionalProperties': False,
+    'definitions': {
+        'ansibleprovisioner': {
+            'additionalProperties': False,
+            'properties': {
+                'args': {
+                    'additionalProperties': False,
+                    'properties': {
+                        'bucket': {
+                            'type': 'string',
+                        },
+                        'cfn_hup': {
+                            'additionalProperties': False,
+                            'properties': {
+                                'enabled': {
+                                    'type': 'boolean',
+                                },
+                                'interval': {
+                                    'type': 'integer',
+                                },
+                            },
+                            'required': [
+                                'enabled',
+                            ],
+                            'type': 'object',
+                        },
+                        'custom_facts': {
+                            'type': 'object',
+                        },
+                        'custom_tags': {
+                            'type': 'object',
+                        },
+                        'metrics': {
+                            'type': 'boolean',
+                        },
+                        'playbook': {
+                            'type': 'string',
+                        },
+                    },
+                    'required': [
+                        'bucket',
+                    ],
+                    'type': 'object',
+                },
+                'provider': {
+                    'enum': [
+                        'AnsibleProvisioner',
+                    ],
+                },
+            },
+            'required': [
+                'provider',
+                'args',
+            ],
+            'type': 'object',
+        },
+        'awsfwprovisioner': {
+            'additionalProperties': False,
+            'properties': {
+                'args': {
+                    'additionalProperties': False,
+                    'properties': {
+                        'AWS_ACCESS_KEY_ID': {
+                            'type': 'string',
+                        },
+                        'AWS_SECRET_ACCESS_KEY': {
+                            'type': 'string',
+                        },
+                        'appbucket': {
+                            'type': 'string',
+                        },
+                        'apps': {
+                            'type': 'array',
+                        },
+                        'platform_environment': {
+                            'type': 'string',
+                        },
+                        'rolebucket': {
+                            'type': 'string',
+                        },
+                        'roles': {
+                            'type': 'array',
+                        },
+                    },
+                    'required': [
+                        'apps',
+                        'roles',
+                        'appbucket',
+                        'rolebucket',
+                        'platform_environment',
+                    ],
+                    'type': 'object',
+                },
+                'provider': {
+                    'enum': [
+                        'AWSFWProvisioner',
+                    ],
+                },
+            },
+            'required': [
+                'provider',
+                'args',
+            ],
+            'type': 'object',
+        },
+        'block_storage': {
+            'additionalProperties': False,
+            'properties': {
+                'device': {
+                    'type': 'string',
+                },
+                'size': {
+                    'type': 'string',
+                },
+                'type': {
+                    'enum': [
+                        'io1',
+                        'gp2',
+                        'standard',
+                    ],
+                },
+            },
+            'required': [
+                'size',
+                'device',
+            ],
+        },
+        'blockprovisioner': {
+            'additionalProperties': False,
+            'properties': {
+                'args': {
+                    'type': 'object',
+                },
+                'provider': {
+                    'enum': [
+                        'BlockingProvisioner',
+                    ],
+                },
+            },
+            'required': [
+                'provider',
+            ],
+            'type': 'object',
+        },
+        'cache': {
+            'additionalProperties': False,
+            'properties': {
+                'count': {
+                    'type': 'integer',
+                },
+                'name': {
+                    'type': 'string',
+                },
+                'params': {
+                    '$ref': '#/definitions/cache_params',
+                },
+                'sg': {
+                    'minItems': 1,
+                    'type': 'array',
+                },
+                'size': {
+                    'type': 'string',
+                },
+                'type': {
+                    'type': 'string',
+                },
+            },
+            'required': [
+                'count',
+                'name',
+                'params',
+                'size',
+                'type',
+            ],
+        },
+        'cache_params': {
+            'additionalProperties': False,
+            'properties': {
+                'name': {
+                    'type': 'string',
+                },
+                'params': {
+                    'type': 'object',
+                },
+            },
+            'required': [
+                'name',
+            ],
+        },
+        'instance': {
+            'additionalProperties': False,
+            'properties': {
+                'block_device': {
+                    'items': {
+                        '$ref': '#/definitions/block_storage',
+                    },
+                    'type': 'array',
+                },
+                'count': {
+                    'type': 'integer',
+                },
+                'depends': {
+                    'type': 'string',
+                },
+                'dns': {
+                    'additionalProperties': False,
+                    'properties': {
+                        'record': {
+                            'type': 'string',
+                        },
+                        'type': {
+                            'enum': [
+                                'per-instance-private',
+                                'per-instance-public',
+                                'per-group-private',
+                                'per-group-public',
+                                'cname-public',
+                                'cname-private',
+                            ],
+                        },
+                        'zone': {
+                            'type': 'string',
+                        },
+                    },
+                    'required': [
+                        'type',
+                        'zone',
+                    ],
+                    'type': 'object',
+                },
+                'dnszone': {
+                    'type': 'string',
+                },
+                'healthcheck': {
+                    'type': 'string',
+                },
+                'image': {
+                    'type': 'string',
+                },
+                'lb': {
+                    'type': 'array',
+                },
+                'max': {
+                    'minimum': 1,
+                    'type': 'integer',
+                },
+                'min': {
+                    'type': 'integer',
+                },
+                'monitoring': {
+                    'type': 'boolean',
+                },
+                'name': {
+                    'type': 'string',
+                },
+                'nat': {
+                    'type': 'boolean',
+                },
+                'notify': {
+                    'type': 'string',
+                },
+                'provisioner': {
+                    'oneOf': [
+                        {
+                            '$ref': '#/definitions/winpuppetprovisioner',
+                        },
+                        {
+                            '$ref': '#/definitions/puppetprovisioner',
+                        },
+                        {
+                            '$ref': '#/definitions/ansibleprovisioner',
+                        },
+                        {
+                            '$ref': '#/definitions/awsfwprovisioner',
+                        },
+                        {
+                            '$ref': '#/definitions/noopprovisioner',
+                        },
+                        {
+                            '$ref': '#/definitions/blockprovisioner',
+                        },
+                    ],
+                    'type': 'object',
+                },
+                'public': {
+                    'type': 'boolean',
+                },
+                'scaling_policy': {
+                    '$ref': '#/definitions/scalingpolicy',
+                },
+                'sg': {
+                    'type': 'array',
+                },
+                'size': {
+                    'type': 'string',
+                },
+                'sshKey': {
+                    'type': 'string',
+                },
+                'subnets': {
+                    'minItems': 1,
+                    'type': 'array',
+                },
+                'timed_scaling_policy': {
+                    '$ref': '#/definitions/timedscalingpolicy',
+                },
+                'zones': {
+                    'type': 'array',
+                },
+            },
+            'required': [
+                'count',
+                'image',
+                'monitoring',
+                'name',
+                'provisioner',
+                'sg',
+                'sshKey',
+                'size',
+            ],
+        },
+        'listener': {
+            'additionalProperties': False,
+            'properties': {
+                'instance_port': {
+                    'type': 'integer',
+                },
+                'instance_protocol': {
+                    'enum': [
+                        'HTTP',
+                        'HTTPS',
+                        'TCP',
+                    ],
+                },
+                'lb_port': {
+                    'type': 'integer',
+                },
+                'protocol': {
+                    'enum': [
+                        'HTTP',
+                        'HTTPS',
+                        'TCP',
+                    ],
+                },
+                'sslCert': {
+                    'type': 'string',
+                },
+            },
+            'required': [
+                'instance_port',
+                'protocol',
+                'instance_protocol',
+                'lb_port',
+            ],
+        },
+        'load_balancer': {
+            'additionalProperties': False,
+            'properties': {
+                'dns': {
+                    'type': 'string',
+                },
+                'healthcheck': {
+                    'additionalProperties': False,
+                    'properties': {
+                        'path': {
+                            'type': 'string',
+                        },
+                        'port': {
+                            'type': 'integer',
+                        },
+                        'protocol': {
+                            'enum': [
+                                'HTTP',
+                                'HTTPS',
+                                'TCP',
+                            ],
+                        },
+                    },
+                    'required': [
+                        'protocol',
+                        'port',
+                    ],
+                    'type': 'object',
+                },
+                'internal': {
+                    'type': 'boolean',
+                },
+                'listener': {
+                    'items': {
+                        '$ref': '#/definitions/listener',
+                    },
+                    'minItems': 1,
+                    'type': 'array',
+                },
+                'name': {
+                    'type': 'string',
+                },
+                'policy': {
+                    'type': 'array',
+                },
+                'sg': {
+                    'type': 'array',
+                },
+                'subnets': {
+                    'minItems': 1,
+                    'type': 'array',
+                },
+            },
+            'required': [
+                'name',
+                'listener',
+                'healthcheck',
+            ],
+        },
+        'network': {
+            'additionalProperties': False,
+            'properties': {
+                'name': {
+                    'type': 'string',
+                },
+                'netrange': {
+                    'type': 'string',
+                },
+                'peers': {
+                    'items': {
+                        '$ref': '#/definitions/vpc_peer',
+                    },
+                    'minItems': 1,
+                    'type': 'array',
+                },
+                'public': {
+                    'type': 'boolean',
+                },
+                'routes': {
+                    'items': {
+                        '$ref': '#/definitions/vpc_route',
+                    },
+                    'minItems': 1,
+                    'type': 'array',
+                },
+                'subnets': {
+                    'items': {
+                        '$ref': '#/definitions/vpc_subnet',
+                    },
+                    'minItems': 1,
+                    'type': 'array',
+                },
+                'vpn': {
+                    'items': {
+                        '$ref': '#/definitions/vpc_vpn',
+                    },
+                    'minItems': 1,
+                    'type': 'array',
+                },
+                'zones': {
+                    'type': 'array',
+                },
+            },
+            'required': [
+                'name',
+                'netrange',
+                'subnets',
+            ],
+        },
+        'noopprovisioner': {
+            'additionalProperties': False,
+            'properties': {
+                'args': {
+                    'type': 'object',
+                },
+                'provider': {
+                    'enum': [
+                        'NoopProvisioner',
+                    ],
+                },
+            },
+            'required': [
+                'provider',
+            ],
+            'type': 'object',
+        },
+        'puppetprovisioner': {
+            'additionalProperties': False,
+            'properties': {
+                'args': {
+                    'additionalProperties': False,
+                    'properties': {
+                        'application': {
+                            'type': 'string',
+                        },
+                        'appname': {
+                            'type': 'string',
+                        },
+                        'bucket': {
+                            'type': 'string',
+                        },
+                        'custom_facts': {
+                            'type': 'object',
+                        },
+                        'custom_profile': {
+                            'type': 'array',
+                        },
+                        'custom_tags': {
+                            'type': 'object',
+                        },
+                        'find_nodes': {
+                            'type': 'boolean',
+                        },
+                        'infrastructure': {
+                            'type': 'string',
+                        },
+                        'metrics': {
+                            'type': 'boolean',
+                        },
+                    },
+                    'required': [
+                        'bucket',
+                    ],
+                    'type': 'object',
+                },
+                'provider': {
+                    'enum': [
+                        'PuppetProvisioner',
+                    ],
+                },
+            },
+            'required': [
+                'provider',
+                'args',
+            ],
+            'type': 'object',
+        },
+        'queue': {
+            'additionalProperties': False,
+            'properties': {
+                'name': {
+                    'type': 'string',
+                },
+                'retention': {
+                    'type': 'integer',
+                },
+            },
+            'required': [
+                'name',
+            ],
+        },
+        'scaledir': {
+            'additionalProperties': False,
+            'properties': {
+                'change': {
+                    'type': 'string',
+                },
+                'condition': {
+                    'type': 'string',
+                },
+                'interval': {
+                    'type': 'integer',
+                },
+                'stat': {
+                    'type': 'string',
+                },
+                'wait': {
+                    'type': 'integer',
+                },
+            },
+            'required': [
+                'stat',
+                'condition',
+                'change',
+            ],
+            'type': 'object',
+        },
+        'scaletime': {
+            'properties': {
+                'count': {
+                    'type': 'integer',
+                },
+                'max': {
+                    'type': 'integer',
+                },
+                'min': {
+                    'type': 'integer',
+                },
+                'recurrence': {
+                    'type': 'string',
+                },
+            },
+            'required': [
+                'count',
+                'recurrence',
+            ],
+            'type': 'object',
+        },
+        'scalingpolicy': {
+            'additionalProperties': False,
+            'properties': {
+                'down': {
+                    '$ref': '#/definitions/scaledir',
+                },
+                'metric': {
+                    'type': 'string',
+                },
+                'unit': {
+                    'type': 'string',
+                },
+                'up': {
+                    '$ref': '#/definitions/scaledir',
+                },
+            },
+            'required': [
+                'down',
+                'metric',
+                'unit',
+                'up',
+            ],
+            'type': 'object',
+        },
+        'secgroup': {
+            'additionalProperties': False,
+            'properties': {
+                'name': {
+                    'type': 'string',
+                },
+                'rules': {
+                    'items': {
+                        'anyOf': [
+                            {
+                                '$ref': '#/definitions/secgrouprule_group',
+                            },
+                            {
+                                '$ref': '#/definitions/secgrouprule_cidr',
+                            },
+                            {
+                                '$ref': (
+                                    '#/definitions/secgrouprule_group_port'),
+                            },
+                            {
+                                '$ref': '#/definitions/secgrouprule_cidr_port',
+                            },
+                        ],
+                    },
+                    'type': 'array',
+                },
+                'vpcid': {
+                    'type': 'string',
+                },
+            },
+            'required': [
+                'name',
+                'rules',
+            ],
+        },
+        'secgrouprule_cidr': {
+            'additionalProperties': False,
+            'properties': {
+                'from_port': {
+                    'type': 'integer',
+                },
+                'protocol': {
+                    'type': 'string',
+                },
+                'source_cidr': {
+                    'type': 'string',
+                },
+                'to_port': {
+                    'type': 'integer',
+                },
+            },
+            'required': [
+                'from_port',
+                'to_port',
+                'protocol',
+                'source_cidr',
+            ],
+        },
+        'secgrouprule_cidr_port': {
+            'additionalProperties': False,
+            'properties': {
+                'port': {
+                    'type': 'integer',
+                },
+                'protocol': {
+                    'type': 'string',
+                },
+                'source_cidr': {
+                    'type': 'string',
+                },
+            },
+            'required': [
+                'port',
+                'protocol',
+                'source_cidr',
+            ],
+        },
+        'secgrouprule_group': {
+            'additionalProperties': False,
+            'properties': {
+                'from_port': {
+                    'type': 'integer',
+                },
+                'protocol': {
+                    'type': 'string',
+                },
+                'source_group': {
+                    'type': 'string',
+                },
+                'to_port': {
+                    'type': 'integer',
+                },
+            },
+            'required': [
+                'from_port',
+                'to_port',
+                'protocol',
+                'source_group',
+            ],
+        },
+        'secgrouprule_group_port': {
+            'additionalProperties': False,
+            'properties': {
+                'port': {
+                    'type': 'integer',
+                },
+                'protocol': {
+                    'type': 'string',
+                },
+                'source_group': {
+                    'type': 'string',
+                },
+            },
+            'required': [
+                'port',
+                'protocol',
+                'source_group',
+            ],
+        },
+        'stream': {
+            'additionalProperties': False,
+            'properties': {
+                'name': {
+                    'type': 'string',
+                },
+                'shards': {
+                    'type': 'integer',
+                },
+            },
+            'required': [
+                'name',
+                'shards',
+            ],
+        },
+        'timedscalingpolicy': {
+            'properties': {
+                'down': {
+                    '$ref': '#/definitions/scaletime',
+                },
+                'up': {
+                    '$ref': '#/definitions/scaletime',
+                },
+            },
+            'required': [
+                'up',
+            ],
+            'type': 'object',
+        },
+        'vpc_peer': {
+            'additionalProperties': False,
+            'properties': {
+                'peerid': {
+                    'type': 'string',
+                },
+            },
+            'required': [
+                'peerid',
+            ],
+        },
+        'vpc_route': {
+            'additionalProperties': False,
+            'properties': {
+                'cidr': {
+                    'type': 'string',
+                },
+                'gateway': {
+                    'type': 'string',
+                },
+            },
+            'required': [
+                'cidr',
+                'gateway',
+            ],
+        },
+        'vpc_subnet': {
+            'additionalProperties': False,
+            'properties': {
+                'cidr': {
+                    'type': 'string',
+                },
+                'name': {
+                    'type': 'string',
+                },
+                'public': {
+                    'type': 'boolean',
+                },
+                'zone': {
+                    'type': 'string',
+                },
+            },
+            'required': [
+                'cidr',
+                'name',
+                'zone',
+            ],
+        },
+        'vpc_vpn': {
+            'additionalProperties': False,
+            'properties': {
+                'asn': {
+                    'type': 'integer',
+                },
+                'ip': {
+                    'type': 'string',
+                },
+            },
+            'required': [
+                'asn',
+                'ip',
+            ],
+        },
+        'winpuppetprovisioner': {
+            'additionalProperties': False,
+            'properties': {
+                'args': {
+                    'additionalProperties': False,
+                    'properties': {
+                        'application': {
+                            'type': 'string',
+                        },
+                        'appname': {
+                            'type': 'string',
+                        },
+                        'bucket': {
+                            'type': 'string',
+                        },
+                        'custom_facts': {
+                            'type': 'object',
+                        },
+                        'custom_profile': {
+                            'type': 'array',
+                        },
+                        'custom_tags': {
+                            'type': 'object',
+                        },
+                        'find_nodes': {
+                            'type': 'boolean',
+                        },
+                        'infrastructure': {
+                            'type': 'string',
+                        },
+                        'metrics': {
+                            'type': 'boolean',
+                        },
+                    },
+                    'required': [
+                        'bucket',
+                    ],
+                    'type': 'object',
+                },
+                'provider': {
+                    'enum': [
+                        'WindowsPuppetProvisioner',
+                    ],
+                },
+            },
+            'required': [
+                'provider',
+                'args',
+            ],
+            'type': 'object',
+        },
+    },
+    'properties': {
+        'config': {
+            'type': 'object',
+        },
+        'resources': {
+            'additionalProperties': False,
+            'properties': {
+                'cache': {
+                    'items': {
+                        '$ref': '#/definitions/cache',
+                    },
+                    'type': 'array',
+                },
+                'cdn': {
+                    'type': 'array',
+                },
+                'db': {
+                    'type': 'array',
+                },
+                'instance': {
+                    'items': {
+                        '$ref': '#/definitions/instance',
+                    },
+                    'type': 'array',
+                },
+                'load_balancer': {
+                    'items': {
+                        '$ref': '#/definitions/load_balancer',
+                    },
+                    'type': 'array',
+                },
+                'network': {
+                    'items': {
+                        '$ref': '#/definitions/network',
+                    },
+                    'type': 'array',
+                },
+                'queue': {
+                    'items': {
+                        '$ref': '#/definitions/queue',
+                    },
+                    'type': 'array',
+                },
+                'secgroup': {
+                    'items': {
+                        '$ref': '#/definitions/secgroup',
+                    },
+                    'type': 'array',
+                },
+                'stream': {
+                    'items': {
+                        '$ref': '#/definitions/stream',
+                    },
+                    'type': 'array',
+                },
+            },
+            'required': [
+                'cdn',
+                'db',
+                'instance',
+                'load_balancer',
+                'secgroup',
+            ],
+            'type': 'object',
+        },
+        'tags': {
+            'type': 'object',
+        },
+    },
+    'required': [
+        'config',
+        'resources',
+    ],
+    'type': 'object',
+}
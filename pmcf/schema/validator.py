@@ -0,0 +1,157 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+..  module:: pmcf.schema.validator
+    :platform: Unix
+    :synopsis: module containing the stack schema validator
+
+..  moduleauthor:: Stephen Gran <stephen.gran@piksel.com>
+"""
+
+import hashlib
+import json
+import jsonschema
+import logging
+
+from pmcf.schema.codegen import compile_schema
+from pmcf.schema.compiled import schema
+
+LOG = logging.getLogger(__name__)
+
+
+class CachingRefResolver(jsonschema.RefResolver):
+    """
+    Reference resolver that only walks each JSON pointer, such as
+    ``#/definitions/instance``, once.  The schema only refers to itself, so
+    a pointer always resolves to the same part of it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(CachingRefResolver, self).__init__(*args, **kwargs)
+        self._fragments = {}
+
+    def resolve_fragment(self, document, fragment):
+        """
+        Resolves a fragment within a document, remembering the result
+
+        :param document: The referenced document
+        :type document: dict.
+        :param fragment: URI fragment to resolve within it
+        :type fragment: str.
+        :raises: :class:`jsonschema.RefResolutionError`
+        :returns: dict.
+        """
+
+        key = (id(document), fragment)
+        if key not in self._fragments:
+            self._fragments[key] = super(
+                CachingRefResolver, self).resolve_fragment(document, fragment)
+        return self._fragments[key]
+
+
+# Built once, as building a validator and checking the schema against the
+# draft 4 meta-schema costs more than validating most stacks
+VALIDATOR = jsonschema.Draft4Validator(
+    schema,
+    resolver=CachingRefResolver.from_schema(schema)
+)
+
+# Identifies the schema, for caches of validation results
+SCHEMA_VERSION = hashlib.sha1(json.dumps(schema, sort_keys=True)).hexdigest()
+
+try:
+    FAST_VALIDATE = compile_schema(schema)
+except NotImplementedError, exc:
+    LOG.warning('Schema can not be compiled, using jsonschema only: %s', exc)
+    FAST_VALIDATE = None
+
+
+def _without(stack, skip):
+    """
+    Shallow copy of a stack leaving out some resources
+
+    :param stack: Stack
+    :type stack: dict.
+    :param skip: ids of the resource dicts to leave out
+    :type skip: set.
+    :returns: dict.
+    """
+
+    view = dict(stack)
+    resources = stack.get('resources')
+    if isinstance(resources, dict):
+        view['resources'] = {}
+        for rtype, items in resources.iteritems():
+            if isinstance(items, list):
+                items = [item for item in items if id(item) not in skip]
+            view['resources'][rtype] = items
+    return view
+
+
+def validate(stack, skip=None):
+    """
+    Validates a stack against the base schema
+
+    :param stack: Stack to validate
+    :type stack: dict.
+    :param skip: ids of resource dicts already known to be valid, which are
+                 not checked again.  Everything else in the stack is.
+    :type skip: set.
+    :raises: :class:`jsonschema.ValidationError`
+    """
+
+    if skip:
+        view = _without(stack, skip)
+        if FAST_VALIDATE is not None:
+            if FAST_VALIDATE(view):
+                return
+        elif VALIDATOR.is_valid(view):
+            return
+        # Validate everything, so that the error describes the real stack
+
+    # The generated validator settles valid stacks on its own.  It can not
+    # say what is wrong with an invalid one, so jsonschema does that, and
+    # the error is the same as it always was.
+    if FAST_VALIDATE is not None and FAST_VALIDATE(stack):
+        return
+    VALIDATOR.validate(stack)
+    if FAST_VALIDATE is not None:
+        LOG.debug('Generated validator rejected a stack jsonschema accepts')
+
+
+def errors(stack):
+    """
+    Finds every way in which a stack breaks the base schema, rather than
+    stopping at the first
+
+    :param stack: Stack to validate
+    :type stack: dict.
+    :returns: list of :class:`jsonschema.ValidationError`, in document order
+    """
+
+    if FAST_VALIDATE is not None and FAST_VALIDATE(stack):
+        return []
+    return sorted(VALIDATOR.iter_errors(stack),
+                  key=lambda error: list(error.path))
+
+
+__all__ = [
+    'CachingRefResolver',
+    'errors',
+    'FAST_VALIDATE',
+    'SCHEMA_VERSION',
+    'validate',
+    'VALIDATOR',
+]
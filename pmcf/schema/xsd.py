@@ -0,0 +1,170 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+..  module:: pmcf.schema.xsd
+    :platform: Unix
+    :synopsis: module validating XML stack definitions against an XSD
+
+..  moduleauthor:: Stephen Gran <stephen.gran@piksel.com>
+"""
+
+import logging
+import os
+import threading
+
+from pmcf.exceptions import ParserFailure
+from pmcf.utils.cache import file_signature
+
+LOG = logging.getLogger(__name__)
+
+
+def _etree():
+    """
+    Imports lxml, which is only needed when XSD validation is turned on
+
+    :raises: :class:`pmcf.exceptions.ParserFailure`
+    :returns: module.
+    """
+
+    try:
+        from lxml import etree
+    except ImportError:
+        raise ParserFailure('XSD validation needs lxml, which is not '
+                            'installed')
+    return etree
+
+
+class SchemaCache(object):
+    """
+    Compiled XSD schemas, kept for the life of the process.  Compiling a
+    schema takes far longer than validating a document against it, so each
+    file is only compiled again when it changes.
+
+    lxml schemas may not be used by more than one thread at once, so
+    :py:meth:`validate` holds a lock while it uses one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _schema(self, fname):
+        """
+        Looks up a compiled schema, compiling it if it is not known or the
+        file has changed.  Must be called with the lock held.
+
+        :param fname: Absolute file name of the XSD
+        :type fname: str.
+        :raises: :class:`pmcf.exceptions.ParserFailure`
+        :returns: :class:`lxml.etree.XMLSchema`
+        """
+
+        signature = file_signature(fname)
+        entry = self._entries.get(fname)
+        if entry is not None and entry[1] == signature:
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        etree = _etree()
+        try:
+            schema = etree.XMLSchema(etree.parse(fname))
+        except (IOError, etree.XMLSyntaxError,
+                etree.XMLSchemaParseError), exc:
+            raise ParserFailure('Unable to load XSD %s: %s' % (fname, exc))
+        LOG.debug('Compiled XSD %s', fname)
+        self._entries[fname] = (schema, signature)
+        return schema
+
+    def validate(self, config, fname):
+        """
+        Validates an XML document against an XSD
+
+        :param config: XML document
+        :type config: str.
+        :param fname: XSD file name
+        :type fname: str.
+        :raises: :class:`pmcf.exceptions.ParserFailure`
+        :returns: list of (line, message) tuples for every problem found
+        """
+
+        etree = _etree()
+        if isinstance(config, unicode):
+            config = config.encode('utf-8')
+        # Stack definitions may come from anywhere in server mode
+        parser = etree.XMLParser(resolve_entities=False, no_network=True)
+        try:
+            doc = etree.fromstring(config, parser)
+        except etree.XMLSyntaxError:
+            # The exception's own log holds errors from earlier documents
+            return [(error.line, error.message)
+                    for error in parser.error_log]
+
+        with self._lock:
+            schema = self._schema(os.path.abspath(fname))
+            try:
+                if schema.validate(doc):
+                    return []
+            except etree.XMLSchemaValidateError, exc:
+                # Such as for entities that were not resolved
+                return [(doc.sourceline, str(exc))]
+            return [(error.line, error.message)
+                    for error in schema.error_log]
+
+    def clear(self):
+        """
+        Forgets all compiled schemas
+        """
+
+        with self._lock:
+            self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Schemas compiled by this process
+SCHEMAS = SchemaCache()
+
+
+def validate(config, fname, cache=None):
+    """
+    Validates an XML stack definition against an XSD, reporting everything
+    wrong with it at once
+
+    :param config: XML document
+    :type config: str.
+    :param fname: XSD file name
+    :type fname: str.
+    :param cache: Compiled schemas, defaults to :data:`SCHEMAS`
+    :type cache: :class:`SchemaCache`
+    :raises: :class:`pmcf.exceptions.ParserFailure`
+    """
+
+    if cache is None:
+        cache = SCHEMAS
+    errors = cache.validate(config, fname)
+    if errors:
+        raise ParserFailure('stack definition does not match %s:\n%s' % (
+            fname, '\n'.join('  line %s: %s' % error for error in errors)))
+
+
+__all__ = [
+    'SCHEMAS',
+    'SchemaCache',
+    'validate',
+]
@@ -20,10 +20,14 @@
 ..  moduleauthor:: Stephen Gran <stephen.gran@piksel.com>
 """
 
-from pmcf.strategy.base_strategy import BaseStrategy
-from pmcf.strategy.bluegreen import BlueGreen
-from pmcf.strategy.inplace import InPlace
-from pmcf.strategy.prompt_inplace import PromptInPlace
+from pmcf.utils import lazy_package
+
+lazy_package(__name__, {
+    'BaseStrategy': 'pmcf.strategy.base_strategy',
+    'BlueGreen': 'pmcf.strategy.bluegreen',
+    'InPlace': 'pmcf.strategy.inplace',
+    'PromptInPlace': 'pmcf.strategy.prompt_inplace',
+})
 
 __all__ = [
     'BaseStrategy',
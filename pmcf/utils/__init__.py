@@ -20,15 +20,15 @@
 ..  moduleauthor:: Stephen Gran <stephen.gran@piksel.com>
 """
 
-import curses
 import difflib
 import json
 import logging
-from netaddr import IPNetwork
 import os
 import sys
+import types
 
 from pmcf.exceptions import PropertyException
+from pmcf.utils.template import as_template
 
 LOG = logging.getLogger(__name__)
 
@@ -53,6 +53,72 @@ def import_from_string(module, klass):
         raise PropertyException(exc.message)
 
 
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a package module that imports the classes the package
+    exports the first time they are used, rather than when the package is
+    imported.  This keeps optional and expensive dependencies, such as boto,
+    out of runs that never use the classes needing them.
+
+    Anything not in the class map is looked up on the original module.
+    """
+
+    def __init__(self, module, classes):
+        """
+        Constructor
+
+        :param module: Package module being replaced
+        :type module: module.
+        :param classes: Map of exported class name to defining module name
+        :type classes: dict.
+        """
+
+        types.ModuleType.__init__(self, module.__name__, module.__doc__)
+        # Python 2 clears a module's globals when the module object is
+        # freed, so hold on to it for the names we don't handle.
+        self._module = module
+        self._classes = classes
+        self.__file__ = module.__file__
+        self.__path__ = module.__path__
+        self.__package__ = module.__name__
+
+    def __getattr__(self, name):
+        # Only called for names not already set on this module
+        classes = self.__dict__.get('_classes', {})
+        if name in classes:
+            mod = __import__(classes[name], fromlist=[name])
+            value = getattr(mod, name)
+            setattr(self, name, value)
+            return value
+        if '_module' not in self.__dict__:
+            raise AttributeError(name)
+        return getattr(self.__dict__['_module'], name)
+
+    def __dir__(self):
+        return sorted(set(self.__dict__.keys()) |
+                      set(self._classes.keys()) |
+                      set(dir(self._module)))
+
+
+def lazy_package(name, classes):
+    """
+    Replaces an already imported package with a :class:`LazyModule`.  Meant
+    to be called from the package's ``__init__``::
+
+        lazy_package(__name__, {'JSONOutput': 'pmcf.outputs.json_output'})
+
+    :param name: Package name
+    :type name: str.
+    :param classes: Map of exported class name to defining module name
+    :type classes: dict.
+    :returns: :class:`LazyModule`
+    """
+
+    module = LazyModule(sys.modules[name], classes)
+    sys.modules[name] = module
+    return module
+
+
 def init_error(msg, res_type, res_title):
     """
     Wrapper for common resource error messages
@@ -152,6 +218,9 @@ def colourise_output(start, line, end='reset'):
     if not is_term():
         return line
 
+    # Imported here so that curses is only loaded when output is coloured
+    import curses
+
     if colourise_output.init == 0:
         curses.setupterm()
         colourise_output.init = 1
@@ -176,16 +245,16 @@ def get_changed_keys_from_templates(old, new):
     """
     Returns a list of changed keys in two templates
 
-    :param old: String to diff from
-    :type old: str.
-    :param new: String to diff to
-    :type new: str.
+    :param old: Template to diff from
+    :type old: str or :class:`pmcf.utils.template.TemplateDocument`
+    :param new: Template to diff to
+    :type new: str or :class:`pmcf.utils.template.TemplateDocument`
     :returns: list.
     """
 
     ret = []
-    old_data = json.loads(old)
-    new_data = json.loads(new)
+    old_data = as_template(old).data
+    new_data = as_template(new).data
     if old_data == new_data:
         return ret
     ret = valchange(old_data, new_data)
@@ -227,24 +296,21 @@ def make_diff(old, new):
     """
     Creates coloured diff output from 2 strings.
 
-    :param old: String to diff from
-    :type old: str.
-    :param new: String to diff to
-    :type new: str.
+    :param old: Template to diff from
+    :type old: str or :class:`pmcf.utils.template.TemplateDocument`
+    :param new: Template to diff to
+    :type new: str or :class:`pmcf.utils.template.TemplateDocument`
     :returns: str.
     """
 
     ret = ''
-    old_data = json.loads(old)
-    new_data = json.loads(new)
-    if old_data == new_data:
+    old = as_template(old)
+    new = as_template(new)
+    if old.data == new.data:
         return ret
 
-    old = json.dumps(old_data, indent=4, sort_keys=True)
-    new = json.dumps(new_data, indent=4, sort_keys=True)
-
-    diff = list(difflib.unified_diff(old.splitlines(1),
-                                     new.splitlines(1),
+    diff = list(difflib.unified_diff(old.pretty.splitlines(1),
+                                     new.pretty.splitlines(1),
                                      fromfile='LiveTemplate',
                                      tofile='NewTemplate',
                                      n=100000))
@@ -258,6 +324,80 @@ def make_diff(old, new):
     return ret
 
 
+def diff_resources(old, new):
+    """
+    Compares the resources in two JSON templates by logical name.
+
+    :param old: Template to diff from
+    :type old: str or :class:`pmcf.utils.template.TemplateDocument`
+    :param new: Template to diff to
+    :type new: str or :class:`pmcf.utils.template.TemplateDocument`
+    :raises: :class:`ValueError`
+    :returns: dict of 'added', 'removed' and 'changed' lists.
+    """
+
+    old = as_template(old)
+    new = as_template(new)
+    ret = {
+        'added': [],
+        'removed': [],
+        'changed': [],
+    }
+    if old.digest == new.digest:
+        return ret
+    old_res = old.data.get('Resources', {})
+    new_res = new.data.get('Resources', {})
+    for name in sorted(set(old_res.keys()) | set(new_res.keys())):
+        if name not in old_res:
+            ret['added'].append(name)
+        elif name not in new_res:
+            ret['removed'].append(name)
+        elif old_res[name] != new_res[name]:
+            ret['changed'].append(name)
+    return ret
+
+
+def environment_drift(templates):
+    """
+    Compares the resources in JSON templates rendered for several
+    environments of the same stack by logical name.
+
+    :param templates: Mapping of environment name to template, as str or
+                      :class:`pmcf.utils.template.TemplateDocument`
+    :type templates: dict.
+    :raises: :class:`ValueError`
+    :returns: dict mapping each resource that differs to a dict of
+              'missing' (environments without it) and 'properties' (names
+              of properties whose values differ between environments)
+    """
+
+    found = {}
+    for environment, template in templates.items():
+        resources = as_template(template).data.get('Resources', {})
+        for name, res in resources.items():
+            found.setdefault(name, {})[environment] = res.get('Properties', {})
+
+    drift = {}
+    for name, props in found.items():
+        missing = sorted(set(templates.keys()) - set(props.keys()))
+        keys = set()
+        for prop in props.values():
+            keys.update(prop.keys())
+        changed = []
+        for key in sorted(keys):
+            values = set()
+            for prop in props.values():
+                values.add(json.dumps(prop.get(key), sort_keys=True))
+            if len(values) > 1:
+                changed.append(key)
+        if missing or changed:
+            drift[name] = {
+                'missing': missing,
+                'properties': changed,
+            }
+    return drift
+
+
 def split_subnets(cidr, split):
     """
     Finds the nearest power of two to the number of desired subnets,
@@ -277,6 +417,8 @@ def split_subnets(cidr, split):
     if split == 1:
         return [cidr]
 
+    from netaddr import IPNetwork
+
     power = 0
     while split > 0:
         split >>= 1
@@ -293,11 +435,15 @@ def split_subnets(cidr, split):
 
 __all__ = [
     'colourise_output',
+    'diff_resources',
+    'environment_drift',
     'error',
     'get_changed_keys_from_templates',
     'import_from_string',
     'init_error',
     'is_term',
+    'lazy_package',
+    'LazyModule',
     'make_diff',
     'split_subnets',
     'valchange',
@@ -0,0 +1,221 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+..  module:: pmcf.utils.cache
+    :platform: Unix
+    :synopsis: module containing the on-disk cache
+
+..  moduleauthor:: Stephen Gran <stephen.gran@piksel.com>
+"""
+
+import cPickle as pickle
+import errno
+import hashlib
+import json
+import logging
+import os
+import stat
+import tempfile
+
+LOG = logging.getLogger(__name__)
+
+# Bump this when the layout of cached entries changes
+CACHE_VERSION = 1
+
+
+def file_signature(fname):
+    """
+    Cheap signature of a file's current state, used to tell whether a file
+    an entry depends on has changed since the entry was stored
+
+    :param fname: File name
+    :type fname: str.
+    :returns: tuple of (mtime, size), or None if the file is missing
+    """
+
+    try:
+        stat = os.stat(fname)
+    except OSError:
+        return None
+    return (stat.st_mtime, stat.st_size)
+
+
+class DiskCache(object):
+    """
+    Content-addressed cache of pickled python objects in a directory.
+
+    Entries are written atomically and readable only by their owner, since
+    they may contain credentials.  Unpickling an entry can run code, so the
+    cache is neither read nor written if its directory belongs to another
+    user or can be written to by anyone else.  Reading an entry marks it as
+    recently used, and the least recently used entries are removed once the
+    cache grows beyond its size limit.  Each entry may list files it was
+    built from, and is ignored if any of them have changed since.
+    """
+
+    def __init__(self, cachedir, max_size=100 * 1024 * 1024):
+        """
+        Constructor
+
+        :param cachedir: Directory to keep entries in, created if missing
+        :type cachedir: str.
+        :param max_size: Maximum total size of entries in bytes
+        :type max_size: int.
+        """
+
+        self.cachedir = os.path.expanduser(cachedir)
+        self.max_size = max_size
+
+    @staticmethod
+    def key(*parts):
+        """
+        Builds a cache key from any number of JSON-serialisable values
+
+        :returns: str.
+        """
+
+        return hashlib.sha256(
+            json.dumps([CACHE_VERSION] + list(parts), sort_keys=True)
+        ).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cachedir, '%s.pickle' % key)
+
+    def _trusted(self):
+        """
+        Whether the cache directory belongs to this user and nobody else
+        can write to it
+
+        :returns: bool.
+        """
+
+        try:
+            info = os.stat(self.cachedir)
+        except OSError:
+            return False
+        if info.st_uid != os.getuid() or \
+                info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            LOG.warning('Not using cache %s: it must belong to this user '
+                        'and not be writable by others', self.cachedir)
+            return False
+        return True
+
+    def get(self, key):
+        """
+        Looks up an entry
+
+        :param key: Cache key
+        :type key: str.
+        :returns: cached value, or None if missing or out of date
+        """
+
+        if not self._trusted():
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as fld:
+                entry = pickle.load(fld)
+            os.utime(path, None)
+        except (IOError, OSError):
+            return None
+        except Exception, exc:
+            LOG.debug('Ignoring unreadable cache entry %s: %s', path, exc)
+            return None
+
+        for fname, signature in entry['dependencies']:
+            if file_signature(fname) != signature:
+                LOG.debug('Cache entry %s is stale, %s changed', key, fname)
+                return None
+        LOG.debug('Cache hit for %s', key)
+        return entry['value']
+
+    def set(self, key, value, dependencies=None):
+        """
+        Stores an entry, then evicts old entries if the cache is too big.
+        Failures are logged and otherwise ignored.
+
+        :param key: Cache key
+        :type key: str.
+        :param value: Picklable value to store
+        :type value: object.
+        :param dependencies: Files the value was built from
+        :type dependencies: list.
+        """
+
+        entry = {
+            'value': value,
+            'dependencies': [(fname, file_signature(fname))
+                             for fname in dependencies or []],
+        }
+        try:
+            if not os.path.isdir(self.cachedir):
+                os.makedirs(self.cachedir, 0700)
+            if not self._trusted():
+                return
+            # mkstemp creates the file readable by its owner only
+            fld, tmpname = tempfile.mkstemp(dir=self.cachedir,
+                                            suffix='.tmp')
+            try:
+                with os.fdopen(fld, 'wb') as tmp:
+                    pickle.dump(entry, tmp, pickle.HIGHEST_PROTOCOL)
+                os.rename(tmpname, self._path(key))
+            except Exception:
+                os.unlink(tmpname)
+                raise
+        except (IOError, OSError, pickle.PicklingError), exc:
+            LOG.warning('Unable to write to cache %s: %s', self.cachedir, exc)
+            return
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache is within its
+        size limit
+        """
+
+        entries = []
+        total = 0
+        try:
+            names = os.listdir(self.cachedir)
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith('.pickle'):
+                continue
+            path = os.path.join(self.cachedir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.unlink(path)
+            except OSError, exc:
+                if exc.errno != errno.ENOENT:
+                    LOG.warning('Unable to remove %s: %s', path, exc)
+                    continue
+            LOG.debug('Evicted %s from cache', path)
+            total -= size
+
+
+__all__ = [
+    'DiskCache',
+    'file_signature',
+]
@@ -0,0 +1,171 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+..  module:: pmcf.utils.profiling
+    :platform: Unix
+    :synopsis: module containing profiler support
+
+..  moduleauthor:: Stephen Gran <stephen.gran@piksel.com>
+"""
+
+import cProfile
+import logging
+import pstats
+
+from pmcf.utils.timing import TIMINGS
+
+LOG = logging.getLogger(__name__)
+
+# Phases of the pipeline that profiling can be restricted to.  These are the
+# names recorded by :mod:`pmcf.utils.timing`.
+PHASES = ['parse', 'policy', 'validate', 'render', 'run']
+
+
+def _label(func):
+    """
+    Name of a profiled function as shown by callgrind tools
+
+    :param func: pstats function key of (file, line, name)
+    :type func: tuple.
+    :returns: str.
+    """
+
+    if func[0] == '~':
+        return func[2]
+    return '%s:%d' % (func[2], func[1])
+
+
+def write_callgrind(stats, fld):
+    """
+    Writes profile statistics in the callgrind format read by tools such as
+    kcachegrind.  Costs are in microseconds.
+
+    :param stats: Profile statistics
+    :type stats: :class:`pstats.Stats`
+    :param fld: File to write to
+    :type fld: file.
+    """
+
+    # pstats records callers; callgrind wants each function's callees
+    callees = {}
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, info in callers.items():
+            callees.setdefault(caller, []).append((func, info))
+
+    fld.write('events: Microseconds\n')
+    for func in sorted(stats.stats.keys()):
+        totaltime = stats.stats[func][2]
+        fld.write('\nfl=%s\nfn=%s\n' % (func[0], _label(func)))
+        fld.write('%d %d\n' % (func[1], int(totaltime * 1000000)))
+        for callee, info in sorted(callees.get(func, [])):
+            # cProfile gives (calls, primitive calls, time, cumulative time)
+            if isinstance(info, tuple):
+                calls, cumtime = info[0], info[3]
+            else:
+                calls, cumtime = info, 0
+            fld.write('cfl=%s\ncfn=%s\n' % (callee[0], _label(callee)))
+            fld.write('calls=%d %d\n' % (calls, callee[1]))
+            fld.write('%d %d\n' % (func[1], int(cumtime * 1000000)))
+
+
+class Profiler(object):
+    """
+    Runs cProfile over either everything between :py:meth:`start` and
+    :py:meth:`stop`, or only over one phase of the pipeline, and saves the
+    result.
+    """
+
+    def __init__(self, phase=None, timings=None):
+        """
+        Constructor
+
+        :param phase: Only profile this phase, or everything if None
+        :type phase: str.
+        :param timings: Registry whose phases are watched, defaults to
+                        :data:`pmcf.utils.timing.TIMINGS`
+        :type timings: :class:`pmcf.utils.timing.Timings`
+        """
+
+        self.phase = phase
+        self.timings = timings or TIMINGS
+        self.profile = cProfile.Profile()
+        self._depth = 0
+
+    def _hook(self, name, entering):
+        """
+        Switches the profiler on and off as the chosen phase starts and ends
+
+        :param name: Phase name
+        :type name: str.
+        :param entering: Whether the phase is starting
+        :type entering: bool.
+        """
+
+        if name != self.phase:
+            return
+        if entering:
+            if self._depth == 0:
+                self.profile.enable()
+            self._depth += 1
+        else:
+            self._depth -= 1
+            if self._depth == 0:
+                self.profile.disable()
+
+    def start(self):
+        """
+        Starts profiling, or waiting for the chosen phase
+        """
+
+        if self.phase is None:
+            self.profile.enable()
+        else:
+            self.timings.add_hook(self._hook)
+
+    def stop(self):
+        """
+        Stops profiling
+        """
+
+        if self.phase is None:
+            self.profile.disable()
+        else:
+            self.timings.remove_hook(self._hook)
+
+    def save(self, fname, fmt='pstats'):
+        """
+        Writes the profile to a file
+
+        :param fname: File name
+        :type fname: str.
+        :param fmt: One of 'pstats' or 'callgrind'
+        :type fmt: str.
+        :raises: :class:`IOError`
+        """
+
+        self.profile.create_stats()
+        if fmt == 'callgrind':
+            with open(fname, 'w') as fld:
+                write_callgrind(pstats.Stats(self.profile), fld)
+        else:
+            self.profile.dump_stats(fname)
+        LOG.info('Wrote %s profile to %s', fmt, fname)
+
+
+__all__ = [
+    'PHASES',
+    'Profiler',
+    'write_callgrind',
+]
@@ -0,0 +1,202 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+..  module:: pmcf.utils.rules
+    :platform: Unix
+    :synopsis: module compacting security group rules
+
+..  moduleauthor:: Stephen Gran <stephen.gran@piksel.com>
+"""
+
+import logging
+
+LOG = logging.getLogger(__name__)
+
+# Protocols whose rules give a range of ports.  For others, such as icmp,
+# the "ports" are types and codes, and are never merged.
+PORT_PROTOCOLS = set(['tcp', 'udp'])
+
+INTEGERS = (int, long)
+
+
+def _ports(rule):
+    """
+    Port range of a rule
+
+    :param rule: Security group rule
+    :type rule: dict.
+    :returns: tuple of (from port, to port), or None if not numeric
+    """
+
+    if 'port' in rule:
+        low = high = rule['port']
+    else:
+        low, high = rule.get('from_port'), rule.get('to_port')
+    # Checking the exact type rules out booleans
+    if type(low) not in INTEGERS or type(high) not in INTEGERS:
+        return None
+    return low, high
+
+
+def _cidr_key(rule):
+    if not rule.get('source_cidr'):
+        return None
+    ports = _ports(rule)
+    if ports is None:
+        return None
+    return rule.get('protocol'), ports
+
+
+def _port_key(rule):
+    if str(rule.get('protocol')).lower() not in PORT_PROTOCOLS:
+        return None
+    if _ports(rule) is None:
+        return None
+    for field in ['source_cidr', 'source_group']:
+        if rule.get(field):
+            return rule['protocol'], field, rule[field]
+    return None
+
+
+def _set_ports(rule, low, high):
+    """
+    Copies a rule with a new port range
+    """
+
+    rule = dict(rule)
+    for field in ['port', 'from_port', 'to_port']:
+        rule.pop(field, None)
+    if low == high:
+        rule['port'] = low
+    else:
+        rule['from_port'] = low
+        rule['to_port'] = high
+    return rule
+
+
+def _merge_cidrs(group):
+    """
+    Merges rules that differ only by source CIDR, replacing adjacent and
+    overlapping CIDRs with the fewest that cover the same addresses
+
+    :param group: Rules with the same protocol and ports
+    :type group: list.
+    :returns: list.
+    """
+
+    from netaddr import AddrFormatError, IPNetwork, cidr_merge
+
+    try:
+        merged = cidr_merge([IPNetwork(rule['source_cidr'])
+                             for rule in group])
+    except (AddrFormatError, TypeError, ValueError), exc:
+        LOG.debug('Not merging rules for %s: %s', group[0]['source_cidr'],
+                  exc)
+        return group
+    if len(merged) >= len(group):
+        return group
+    rules = []
+    for net in merged:
+        rule = dict(group[0])
+        rule['source_cidr'] = str(net)
+        rules.append(rule)
+    return rules
+
+
+def _merge_ports(group):
+    """
+    Merges rules that differ only by port, replacing contiguous and
+    overlapping port ranges with one range
+
+    :param group: Rules with the same protocol and source
+    :type group: list.
+    :returns: list.
+    """
+
+    spans = []
+    for low, high in sorted(_ports(rule) for rule in group):
+        if spans and low <= spans[-1][1] + 1:
+            spans[-1][1] = max(spans[-1][1], high)
+        else:
+            spans.append([low, high])
+    if len(spans) >= len(group):
+        return group
+    return [_set_ports(group[0], low, high) for low, high in spans]
+
+
+def _regroup(rules, key, merge):
+    """
+    Merges groups of rules sharing a key.  Each merged group takes the place
+    of its first rule; other rules are left where they are.
+
+    :param rules: Security group rules
+    :type rules: list.
+    :param key: Function giving the group key for a rule, or None
+    :type key: callable.
+    :param merge: Function merging a group of at least two rules, returning
+                  the group itself if it can not be reduced
+    :type merge: callable.
+    :returns: list.
+    """
+
+    groups = {}
+    keys = []
+    for rule in rules:
+        rkey = key(rule)
+        keys.append(rkey)
+        if rkey is not None:
+            groups.setdefault(rkey, []).append(rule)
+
+    merged = {}
+    for rkey, group in groups.items():
+        if len(group) > 1:
+            result = merge(group)
+            if result is not group:
+                merged[rkey] = result
+
+    ret = []
+    for rule, rkey in zip(rules, keys):
+        if rkey not in merged:
+            ret.append(rule)
+        elif merged[rkey] is not None:
+            ret.extend(merged[rkey])
+            # The rest of the group was merged into these
+            merged[rkey] = None
+    return ret
+
+
+def compact_rules(rules):
+    """
+    Reduces the number of rules in a security group without changing what
+    it allows: tcp and udp rules for the same source have contiguous port
+    ranges merged, then rules for the same protocol and ports have their
+    source CIDRs merged with :py:func:`netaddr.cidr_merge`.  Groups of rules
+    that can not be reduced are left as written.
+
+    :param rules: Security group rules
+    :type rules: list.
+    :returns: tuple of (list of rules, number of rules saved)
+    """
+
+    # Merging ports first means an allowlist repeated for several ports is
+    # only merged once
+    compacted = _regroup(rules, _port_key, _merge_ports)
+    compacted = _regroup(compacted, _cidr_key, _merge_cidrs)
+    return compacted, len(rules) - len(compacted)
+
+
+__all__ = [
+    'compact_rules',
+]
@@ -0,0 +1,160 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+..  module:: pmcf.utils.template
+    :platform: Unix
+    :synopsis: module holding a rendered template and its serialisations
+
+..  moduleauthor:: Stephen Gran <stephen.gran@piksel.com>
+"""
+
+import hashlib
+import json
+import logging
+
+LOG = logging.getLogger(__name__)
+
+
+class TemplateDocument(str):
+    """
+    A rendered JSON template, handed from the output layer to everything
+    that reads it.  The parsed structure, the canonical compact and pretty
+    serialisations and a content hash are each worked out the first time
+    they are asked for and kept, so a template is parsed and serialised at
+    most once per form however many consumers look at it.
+
+    It is a string of the template as rendered, so code expecting the
+    string it used to be given keeps working.
+    """
+
+    def __new__(cls, text, canonical=False):
+        """
+        Constructor
+
+        :param text: JSON template
+        :type text: str or unicode.
+        :param canonical: Whether the text is already in the compact
+                          canonical form, as troposphere renders it
+        :type canonical: bool.
+        """
+
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        doc = str.__new__(cls, text)
+        doc._canonical = canonical
+        doc._data = None
+        doc._compact = None
+        doc._pretty = None
+        doc._digest = None
+        return doc
+
+    def __reduce__(self):
+        # Only the text travels to other processes: the rest is cheaper to
+        # work out again than to pickle
+        return (TemplateDocument, (str(self), self._canonical))
+
+    @property
+    def data(self):
+        """
+        The parsed template.  It is shared, so must not be modified.
+
+        :raises: :class:`ValueError`
+        :returns: dict.
+        """
+
+        if self._data is None:
+            self._data = json.loads(self)
+        return self._data
+
+    @property
+    def compact(self):
+        """
+        The template on one line, with keys sorted
+
+        :raises: :class:`ValueError`
+        :returns: str.
+        """
+
+        # troposphere renders the compact form already
+        if self._canonical:
+            return self
+        if self._compact is None:
+            self._compact = json.dumps(self.data, sort_keys=True)
+        return self._compact
+
+    def canonical(self):
+        """
+        The same template as a document whose text is the compact form, for
+        sending to services that are given the string
+
+        :raises: :class:`ValueError`
+        :returns: :class:`TemplateDocument`
+        """
+
+        if self._canonical:
+            return self
+        doc = TemplateDocument(self.compact, canonical=True)
+        doc._data = self._data
+        doc._pretty = self._pretty
+        doc._digest = self._digest
+        return doc
+
+    @property
+    def pretty(self):
+        """
+        The template indented for people to read, with keys sorted
+
+        :raises: :class:`ValueError`
+        :returns: str.
+        """
+
+        if self._pretty is None:
+            self._pretty = json.dumps(self.data, indent=4, sort_keys=True)
+        return self._pretty
+
+    @property
+    def digest(self):
+        """
+        SHA-1 of the compact form.  Templates with the same content have the
+        same digest however they were written.
+
+        :raises: :class:`ValueError`
+        :returns: str.
+        """
+
+        if self._digest is None:
+            self._digest = hashlib.sha1(self.compact).hexdigest()
+        return self._digest
+
+
+def as_template(template):
+    """
+    Wraps a JSON string as a :class:`TemplateDocument`, unless it already is
+    one
+
+    :param template: JSON template
+    :type template: str.
+    :returns: :class:`TemplateDocument`
+    """
+
+    if isinstance(template, TemplateDocument):
+        return template
+    return TemplateDocument(template)
+
+
+__all__ = [
+    'as_template',
+    'TemplateDocument',
+]
@@ -0,0 +1,235 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+..  module:: pmcf.utils.timing
+    :platform: Unix
+    :synopsis: module containing timing instrumentation
+
+..  moduleauthor:: Stephen Gran <stephen.gran@piksel.com>
+"""
+
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+
+LOG = logging.getLogger(__name__)
+
+
+def _cpu_time():
+    """
+    User plus system CPU time used by this process so far
+
+    :returns: float.
+    """
+
+    times = os.times()
+    return times[0] + times[1]
+
+
+class Timings(object):
+    """
+    Thread-safe registry of how long named phases took.  Repeated phases
+    are aggregated, and reported in the order they were first seen.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._order = []
+        self._phases = {}
+        self._hooks = []
+        self.annotations = {}
+
+    def add_hook(self, hook):
+        """
+        Registers a callable to be told when phases start and finish.  It is
+        called as ``hook(name, True)`` on entry and ``hook(name, False)`` on
+        exit.
+
+        :param hook: Callable
+        :type hook: callable.
+        """
+
+        with self._lock:
+            self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        """
+        Unregisters a callable added with :py:meth:`add_hook`
+
+        :param hook: Callable
+        :type hook: callable.
+        """
+
+        with self._lock:
+            if hook in self._hooks:
+                self._hooks.remove(hook)
+
+    def reset(self):
+        """
+        Forgets everything recorded so far
+        """
+
+        with self._lock:
+            self._order = []
+            self._phases = {}
+            self.annotations = {}
+
+    def record(self, name, wall, cpu):
+        """
+        Adds one measurement for a phase
+
+        :param name: Phase name
+        :type name: str.
+        :param wall: Elapsed wall clock time in seconds
+        :type wall: float.
+        :param cpu: CPU time used in seconds
+        :type cpu: float.
+        """
+
+        with self._lock:
+            if name not in self._phases:
+                self._order.append(name)
+                self._phases[name] = {
+                    'name': name,
+                    'calls': 0,
+                    'wall': 0.0,
+                    'cpu': 0.0,
+                    'max': 0.0,
+                }
+            phase = self._phases[name]
+            phase['calls'] += 1
+            phase['wall'] += wall
+            phase['cpu'] += cpu
+            phase['max'] = max(phase['max'], wall)
+
+    @contextlib.contextmanager
+    def timed(self, name):
+        """
+        Context manager recording the wall and CPU time of its body
+
+        :param name: Phase name
+        :type name: str.
+        """
+
+        with self._lock:
+            hooks = list(self._hooks)
+        for hook in hooks:
+            hook(name, True)
+        wall = time.time()
+        cpu = _cpu_time()
+        try:
+            yield
+        finally:
+            wall = time.time() - wall
+            cpu = _cpu_time() - cpu
+            for hook in hooks:
+                hook(name, False)
+            LOG.debug('%s took %.3fs', name, wall)
+            self.record(name, wall, cpu)
+
+    def phases(self):
+        """
+        Returns aggregated measurements, in the order phases were first seen
+
+        :returns: list of dicts.
+        """
+
+        with self._lock:
+            return [dict(self._phases[name]) for name in self._order]
+
+    def report(self, fmt='table'):
+        """
+        Formats the measurements for display
+
+        :param fmt: One of 'table' or 'json'
+        :type fmt: str.
+        :returns: str.
+        """
+
+        if fmt == 'json':
+            return json.dumps({
+                'phases': self.phases(),
+                'annotations': self.annotations,
+            }, indent=4, sort_keys=True) + '\n'
+
+        lines = ['%-40s %6s %10s %10s %10s' % ('phase', 'calls', 'wall (s)',
+                                                'cpu (s)', 'max (s)')]
+        for phase in self.phases():
+            lines.append('%-40s %6d %10.3f %10.3f %10.3f' % (
+                phase['name'], phase['calls'], phase['wall'], phase['cpu'],
+                phase['max']))
+        for key in sorted(self.annotations.keys()):
+            lines.append('%s: %s' % (key, self.annotations[key]))
+        return '\n'.join(lines) + '\n'
+
+
+class TimedProxy(object):
+    """
+    Wraps an API connection object so that every method call on it is
+    recorded as a phase named ``<prefix>.<method>``.
+    """
+
+    def __init__(self, obj, prefix, timings=None):
+        """
+        Constructor
+
+        :param obj: Object to wrap
+        :type obj: object.
+        :param prefix: Prefix for phase names
+        :type prefix: str.
+        :param timings: Registry to record in, defaults to :data:`TIMINGS`
+        :type timings: :class:`Timings`
+        """
+
+        self._obj = obj
+        self._prefix = prefix
+        self._timings = timings or TIMINGS
+
+    def __getattr__(self, name):
+        attr = getattr(self._obj, name)
+        if not callable(attr):
+            return attr
+
+        def wrapper(*args, **kwargs):
+            with self._timings.timed('%s.%s' % (self._prefix, name)):
+                return attr(*args, **kwargs)
+        return wrapper
+
+
+# Registry used by the pmcf pipeline
+TIMINGS = Timings()
+
+
+def timed(name):
+    """
+    Records the time taken by the body of a with statement in the default
+    registry
+
+    :param name: Phase name
+    :type name: str.
+    """
+
+    return TIMINGS.timed(name)
+
+
+__all__ = [
+    'TimedProxy',
+    'timed',
+    'Timings',
+    'TIMINGS',
+]
@@ -0,0 +1,150 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+..  module:: pmcf.utils.validation_cache
+    :platform: Unix
+    :synopsis: module remembering which resources already passed validation
+
+..  moduleauthor:: Stephen Gran <stephen.gran@piksel.com>
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import threading
+
+LOG = logging.getLogger(__name__)
+
+
+class ValidationCache(object):
+    """
+    In-memory record of resources that passed policy and schema validation,
+    for processes such as ``pmcf --watch`` and ``pmcf serve`` that validate
+    much the same stack over and over.
+
+    Entries are keyed on the content of a resource as parsed, before policy
+    fills in its defaults, together with the versions of the schema and
+    policy it was checked against.  Each entry holds the defaults policy
+    added, so that a cached resource ends up exactly as if policy had run.
+    """
+
+    def __init__(self, max_entries=20000):
+        """
+        Constructor
+
+        :param max_entries: Number of resources to remember
+        :type max_entries: int.
+        """
+
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._clock = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(resource_type, resource, schema_version, policy_version):
+        """
+        Builds the key for a resource
+
+        :param resource_type: Type of resource
+        :type resource_type: str.
+        :param resource: Resource, before policy is applied
+        :type resource: dict.
+        :param schema_version: Version of the schema
+        :type schema_version: str.
+        :param policy_version: Version of the policy
+        :type policy_version: str.
+        :returns: str.
+        """
+
+        # Sorting keys makes equal resources share a key, and hashing keeps
+        # a copy of each resource out of the cache.  Anything JSON can not
+        # write, such as dates from YAML, is written as its repr.
+        return hashlib.sha1(json.dumps(
+            [schema_version, policy_version, resource_type, resource],
+            sort_keys=True, default=repr)).hexdigest()
+
+    def get(self, key):
+        """
+        Looks up a resource that passed validation before
+
+        :param key: Key from :py:meth:`key`
+        :type key: str.
+        :returns: dict of defaults policy added, or None if not cached
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._clock += 1
+            entry[0] = self._clock
+            defaults = entry[1]
+        if entry[2]:
+            return copy.deepcopy(defaults)
+        return dict(defaults)
+
+    def set(self, key, defaults):
+        """
+        Records that a resource passed validation
+
+        :param key: Key from :py:meth:`key`
+        :type key: str.
+        :param defaults: Fields policy added to the resource
+        :type defaults: dict.
+        """
+
+        with self._lock:
+            self._clock += 1
+            self._entries[key] = [
+                self._clock,
+                copy.deepcopy(defaults),
+                # Only containers need copying on the way out
+                any(isinstance(value, (dict, list))
+                    for value in defaults.itervalues()),
+            ]
+            if len(self._entries) > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        """
+        Forgets the least recently used tenth of the entries.  Called with
+        the lock held.
+        """
+
+        by_age = sorted(self._entries.items(), key=lambda item: item[1][0])
+        for key, _ in by_age[:max(1, len(by_age) // 10)]:
+            del self._entries[key]
+
+    def clear(self):
+        """
+        Forgets everything
+        """
+
+        with self._lock:
+            self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+
+__all__ = [
+    'ValidationCache',
+]
@@ -0,0 +1,198 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+..  module:: pmcf.utils.violations
+    :platform: Unix
+    :synopsis: module collecting schema and policy violations for reporting
+
+..  moduleauthor:: Stephen Gran <stephen.gran@piksel.com>
+"""
+
+import json
+import logging
+
+LOG = logging.getLogger(__name__)
+
+
+def json_path(parts):
+    """
+    Formats a path into a document as a JSON path, such as
+    ``$.resources.instance[0].size``
+
+    :param parts: Keys and list indices, from the top of the document down
+    :type parts: list.
+    :returns: str.
+    """
+
+    path = '$'
+    for part in parts:
+        if isinstance(part, (int, long)):
+            path += '[%d]' % part
+        else:
+            path += '.%s' % part
+    return path
+
+
+def resource_label(stack, parts):
+    """
+    Names the resource a path into a stack falls within, such as
+    ``instance app``
+
+    :param stack: Stack
+    :type stack: dict.
+    :param parts: Keys and list indices, from the top of the stack down
+    :type parts: list.
+    :returns: str, or None when the path is not within a resource
+    """
+
+    if len(parts) < 3 or parts[0] != 'resources' or\
+            not isinstance(parts[2], (int, long)):
+        return None
+    try:
+        resource = stack['resources'][parts[1]][parts[2]]
+    except (KeyError, IndexError, TypeError):
+        return None
+    name = None
+    if isinstance(resource, dict):
+        name = resource.get('name')
+    if not isinstance(name, basestring):
+        name = '#%d' % parts[2]
+    return '%s %s' % (parts[1], name)
+
+
+def _allowed(error):
+    """
+    Values that would have satisfied the schema keyword that failed, when
+    they can be listed
+
+    :param error: Schema error
+    :type error: :class:`jsonschema.ValidationError`
+    :returns: list, or None
+    """
+
+    if error.validator == 'enum':
+        return list(error.validator_value)
+    if error.validator == 'type':
+        if isinstance(error.validator_value, basestring):
+            return [error.validator_value]
+        return list(error.validator_value)
+    if error.validator == 'additionalProperties':
+        return sorted(error.schema.get('properties', {}).keys())
+    if error.validator in ['oneOf', 'anyOf']:
+        # Such as the provisioner branches, each allowing one provider
+        allowed = []
+        for sub in error.context or []:
+            if sub.validator == 'enum' and list(sub.path):
+                for value in sub.validator_value:
+                    if value not in allowed:
+                        allowed.append(value)
+        return allowed or None
+    return None
+
+
+def schema_violations(stack, errors):
+    """
+    Describes schema errors in a stack
+
+    :param stack: Stack the errors were found in
+    :type stack: dict.
+    :param errors: Schema errors
+    :type errors: list of :class:`jsonschema.ValidationError`
+    :returns: list of dicts
+    """
+
+    violations = []
+    for error in errors:
+        parts = list(error.path)
+        violations.append({
+            'source': 'schema',
+            'path': json_path(parts),
+            'resource': resource_label(stack, parts),
+            'message': error.message,
+            'allowed': _allowed(error),
+        })
+    return violations
+
+
+def policy_violations(policy, stack):
+    """
+    Applies policy to every resource in a stack, filling in defaults as
+    :py:meth:`pmcf.policy.BasePolicy.validate_resource` does, and describes
+    everything the policy does not allow
+
+    :param policy: Policy
+    :type policy: :class:`pmcf.policy.BasePolicy`
+    :param stack: Stack
+    :type stack: dict.
+    :returns: list of dicts
+    """
+
+    violations = []
+    environment = stack['config'].get('environment')
+    for rtype in sorted(stack['resources'].keys()):
+        for idx, data in enumerate(stack['resources'][rtype]):
+            parts = ['resources', rtype, idx]
+            for problem in policy.violations(rtype, data,
+                                             environment=environment):
+                field = problem.get('field')
+                violations.append({
+                    'source': 'policy',
+                    'path': json_path(
+                        parts + ([field] if field is not None else [])),
+                    'resource': resource_label(stack, parts),
+                    'message': problem['message'],
+                    'allowed': problem.get('allowed'),
+                })
+    return violations
+
+
+def format_violations(violations, fmt='text'):
+    """
+    Formats violations for display
+
+    :param violations: Violations
+    :type violations: list of dicts.
+    :param fmt: One of 'text' or 'json'
+    :type fmt: str.
+    :returns: str.
+    """
+
+    if fmt == 'json':
+        return json.dumps(violations, indent=4, sort_keys=True) + '\n'
+
+    if not violations:
+        return 'No violations found\n'
+    lines = []
+    for violation in violations:
+        where = violation['path']
+        if violation['resource']:
+            where += ' (%s)' % violation['resource']
+        lines.append('%s: %s: %s' % (violation['source'], where,
+                                     violation['message']))
+        if violation['allowed']:
+            lines.append('    allowed: %s' % ', '.join(
+                str(value) for value in violation['allowed']))
+    lines.append('%d violation%s found' % (
+        len(violations), '' if len(violations) == 1 else 's'))
+    return '\n'.join(lines) + '\n'
+
+
+__all__ = [
+    'format_violations',
+    'json_path',
+    'policy_violations',
+    'resource_label',
+    'schema_violations',
+]
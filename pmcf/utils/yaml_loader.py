@@ -0,0 +1,255 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+..  module:: pmcf.utils.yaml_loader
+    :platform: Unix
+    :synopsis: module containing the YAML loader used by pmcf
+
+..  moduleauthor:: Stephen Gran <stephen.gran@piksel.com>
+"""
+
+import copy
+import errno
+import logging
+import os
+import threading
+import yaml
+
+from pmcf.utils.cache import file_signature
+from pmcf.utils.timing import TIMINGS
+
+LOG = logging.getLogger(__name__)
+
+# The libyaml loader is several times faster, but is only there if PyYAML was
+# built against libyaml.  Both only construct plain data types.
+try:
+    Loader = yaml.CSafeLoader
+except AttributeError:
+    Loader = yaml.SafeLoader
+
+LOADER_NAME = Loader.__name__
+
+
+class FragmentCache(object):
+    """
+    Parsed YAML files included by stacks, kept for the life of the process
+    so that a library of fragments shared by many stacks is only parsed
+    once.  An entry is reused until the file, or any file it includes,
+    changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, fname):
+        """
+        Looks up a parsed file
+
+        :param fname: Absolute file name
+        :type fname: str.
+        :returns: tuple of (data, list of (file name, signature) tuples for
+                  every file read), or None.  The data must not be modified.
+        """
+
+        with self._lock:
+            entry = self._entries.get(fname)
+            if entry is not None:
+                for dep, signature in entry[1]:
+                    if file_signature(dep) != signature:
+                        LOG.debug('%s changed', dep)
+                        entry = None
+                        break
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry
+
+    def set(self, fname, data, files):
+        """
+        Stores a parsed file
+
+        :param fname: Absolute file name
+        :type fname: str.
+        :param data: Parsed data, which is not copied
+        :type data: variable
+        :param files: (file name, signature) tuples for every file read
+        :type files: list.
+        """
+
+        with self._lock:
+            self._entries[fname] = (data, files)
+
+    def clear(self):
+        """
+        Forgets all parsed files
+        """
+
+        with self._lock:
+            self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Fragments parsed by this process
+FRAGMENTS = FragmentCache()
+
+# Loader subclasses understanding !include, by base loader class
+_INCLUDING = {}
+
+
+def _construct_include(loader, node):
+    name = loader.construct_scalar(node)
+    if isinstance(name, unicode):
+        name = name.encode('utf-8')
+    return loader.pmcf_include(name)
+
+
+def _including(loader):
+    """
+    Subclass of a loader class with a constructor for ``!include`` tags
+
+    :param loader: Loader class
+    :type loader: class.
+    :returns: class.
+    """
+
+    klass = _INCLUDING.get(loader)
+    if klass is None:
+        klass = type('Including%s' % loader.__name__, (loader,), {})
+        klass.add_constructor('!include', _construct_include)
+        _INCLUDING[loader] = klass
+    return klass
+
+
+def find_file(name, basedir=None, search_path=None):
+    """
+    Finds an included file, looking first in the directory of the file
+    including it, then in each directory of the search path
+
+    :param name: File name as given
+    :type name: str.
+    :param basedir: Directory of the including file, or None for the
+                    current directory
+    :type basedir: str.
+    :param search_path: Other directories to look in
+    :type search_path: list.
+    :raises: :class:`IOError`
+    :returns: str.
+    """
+
+    if os.path.isabs(name):
+        return name
+    dirs = [basedir or '.'] + list(search_path or [])
+    for directory in dirs:
+        fname = os.path.join(directory, name)
+        if os.path.exists(fname):
+            return fname
+    raise IOError(errno.ENOENT, "Can't find %s in %s" %
+                  (name, ', '.join(dirs)))
+
+
+def load_file(fname, loader=None, search_path=None, files=None,
+              cache=None, _chain=()):
+    """
+    Parses a YAML file that may include others, reusing the result of an
+    earlier call while none of the files have changed
+
+    :param fname: File name
+    :type fname: str.
+    :param loader: Loader class, defaults to :data:`Loader`
+    :type loader: class.
+    :param search_path: Directories to look for included files in
+    :type search_path: list.
+    :param files: List to add (file name, signature) tuples for every file
+                  read to
+    :type files: list.
+    :param cache: Cache of parsed files, defaults to :data:`FRAGMENTS`
+    :type cache: :class:`FragmentCache`
+    :raises: :class:`yaml.YAMLError`, :class:`IOError`
+    :returns: variable, a copy that the caller may modify
+    """
+
+    cache = FRAGMENTS if cache is None else cache
+    fname = os.path.abspath(fname)
+    if fname in _chain:
+        raise yaml.YAMLError('Include loop: %s' %
+                             ' -> '.join(_chain + (fname,)))
+    entry = cache.get(fname)
+    if entry is None:
+        signature = file_signature(fname)
+        with open(fname) as fld:
+            text = fld.read()
+        deps = [(fname, signature)]
+        data = load(text, loader, os.path.dirname(fname), search_path, deps,
+                    _chain + (fname,))
+        entry = (data, deps)
+        cache.set(fname, data, deps)
+    if files is not None:
+        files.extend(entry[1])
+    return copy.deepcopy(entry[0])
+
+
+def load(text, loader=None, basedir=None, search_path=None, files=None,
+         _chain=()):
+    """
+    Parses a YAML document into plain python data types.  A scalar tagged
+    ``!include`` is replaced by the contents of the YAML file it names.
+
+    :param text: YAML document
+    :type text: str.
+    :param loader: Loader class, defaults to :data:`Loader`
+    :type loader: class.
+    :param basedir: Directory included files are relative to, or None for
+                    the current directory
+    :type basedir: str.
+    :param search_path: Other directories to look for included files in
+    :type search_path: list.
+    :param files: List to add (file name, signature) tuples for every
+                  included file to
+    :type files: list.
+    :raises: :class:`yaml.YAMLError`, :class:`IOError`
+    :returns: variable
+    """
+
+    loader = loader or Loader
+    LOG.debug('Loading YAML with %s', loader.__name__)
+    TIMINGS.annotations['yaml_loader'] = loader.__name__
+
+    def _include(name):
+        return load_file(find_file(name, basedir, search_path), loader,
+                         search_path, files, _chain=_chain)
+
+    instance = _including(loader)(text)
+    instance.pmcf_include = _include
+    try:
+        return instance.get_single_data()
+    finally:
+        instance.dispose()
+
+
+__all__ = [
+    'find_file',
+    'FragmentCache',
+    'FRAGMENTS',
+    'load',
+    'load_file',
+    'Loader',
+    'LOADER_NAME',
+]
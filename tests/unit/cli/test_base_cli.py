@@ -12,11 +12,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import json
+import logging
 import mock
+import StringIO
 from nose.tools import assert_equals
 import sys
 
-from pmcf.cli.cli import main
+from pmcf.cli.cli import ColourFormatter, main
 from pmcf.exceptions import PropertyException
 
 
@@ -42,6 +45,12 @@ def _mock_run_fails(self):
     raise PropertyException('test')
 
 
+def _mock_get_config_timings(self):
+    config = _mock_get_config(self)
+    config['timings'] = 'json'
+    return config
+
+
 def _mock_setupterm():
     pass
 
@@ -129,3 +138,30 @@ class TestBaseCLI(object):
                     'tests/data/awsfw/ais-stage-farm.xml']
         assert_equals(True, main())
         sys.argv = old_argv
+
+    @mock.patch('pmcf.cli.cli.colourise_output',
+                lambda colour, msg: '<%s>%s' % (colour, msg))
+    def test_colour_formatter_colours_level_name(self):
+        fmt = ColourFormatter('%(levelname)s %(message)s')
+        record = logging.LogRecord('test', logging.ERROR, __file__, 1,
+                                   'msg', None, None)
+        assert_equals(fmt.format(record), '<red> ERROR  msg')
+        assert_equals(record.levelname, 'ERROR')
+
+    @mock.patch('pmcf.config.config.PMCFConfig.get_config',
+                _mock_get_config_timings)
+    @mock.patch('pmcf.cli.cmd.PMCFCLI.__init__', _mock_cli_init)
+    @mock.patch('pmcf.cli.cmd.PMCFCLI.run', _mock_run_succeeds)
+    @mock.patch('sys.stderr', new_callable=StringIO.StringIO)
+    def test_main_reports_timings(self, stderr):
+        old_argv = sys.argv
+        sys.argv = ['test.py', '-c', 'tests/data/etc/pmcf.conf',
+                    '-P', 'tests/data/etc/policy.json',
+                    '-p', 'c4', '--timings', 'json',
+                    'tests/data/awsfw/ais-stage-farm.xml']
+        try:
+            assert_equals(False, main())
+        finally:
+            sys.argv = old_argv
+        names = [p['name'] for p in json.loads(stderr.getvalue())['phases']]
+        assert_equals('total' in names, True)
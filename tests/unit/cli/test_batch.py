@@ -0,0 +1,201 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import argparse
+import mock
+from nose.tools import assert_equals
+import os
+import shutil
+import sys
+import tempfile
+
+from pmcf.cli import batch
+from pmcf.cli.cli import main
+from pmcf.exceptions import PropertyException
+
+
+def _mock_get_config(self):
+    return {
+        'parser': 'YamlParser',
+        'policy': 'JSONPolicy',
+        'policyfile': 'tests/data/etc/policy.json',
+        'output': 'JSONOutput',
+        'stackfile': self.args.stackfile,
+        'environment': self.args.environment,
+    }
+
+
+def _mock_cli_init(self, options):
+    self.args = options
+
+
+def _mock_run_succeeds(self):
+    print '%s %s' % (self.args['stackfile'], self.args['environment'])
+    return False
+
+
+def _mock_run_fails_in_prod(self):
+    return self.args['environment'] == 'prod'
+
+
+def _mock_run_raises(self):
+    raise PropertyException('test')
+
+
+def _mock_run_breaks_in_prod(self):
+    if self.args['environment'] == 'prod':
+        raise KeyError('test')
+    return False
+
+
+class TestBatch(object):
+
+    def __init__(self):
+        self.outdir = None
+
+    def setup(self):
+        self.outdir = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.outdir)
+
+    def _argv(self, *extra):
+        argv = ['-c', 'tests/data/etc/pmcf.conf',
+                '-P', 'tests/data/etc/policy.json',
+                '-j', '1', '-o', self.outdir]
+        argv.extend(extra)
+        return argv
+
+    def test_expand_stackfiles_glob(self):
+        files = batch.expand_stackfiles(['tests/data/yaml/ais-test-farm*'])
+        assert_equals(files, [
+            'tests/data/yaml/ais-test-farm-defaultsg.yaml',
+            'tests/data/yaml/ais-test-farm-stage.yaml',
+            'tests/data/yaml/ais-test-farm.yaml',
+        ])
+
+    def test_expand_stackfiles_no_match_passes_through(self):
+        files = batch.expand_stackfiles(['missing.yaml', 'missing.yaml'])
+        assert_equals(files, ['missing.yaml'])
+
+    def test_output_path(self):
+        path = batch.output_path('out', 'stacks/ais.yaml', 'prod', 'json')
+        assert_equals(path, 'out/ais-prod.json')
+
+    def test_output_path_keeps_directory_below_root(self):
+        root = os.path.abspath('stacks')
+        path = batch.output_path('out', 'stacks/a/web.yaml', 'prod', 'json',
+                                 root)
+        assert_equals(path, 'out/a/web-prod.json')
+
+    def test_common_root(self):
+        root = batch.common_root(['stacks/a/web.yaml', 'stacks/ab/web.yaml',
+                                  'stacks/a/b/db.yaml'])
+        assert_equals(root, os.path.abspath('stacks'))
+
+    def test_common_root_single_directory(self):
+        root = batch.common_root(['stacks/a/web.yaml', 'stacks/a/db.yaml'])
+        assert_equals(root, os.path.abspath('stacks/a'))
+
+    @mock.patch('pmcf.config.config.PMCFConfig.get_config', _mock_get_config)
+    @mock.patch('pmcf.cli.cmd.PMCFCLI.__init__', _mock_cli_init)
+    @mock.patch('pmcf.cli.cmd.PMCFCLI.run', _mock_run_succeeds)
+    def test_main_same_name_in_different_directories(self):
+        stackdir = tempfile.mkdtemp()
+        try:
+            for subdir in ('a', 'b'):
+                os.mkdir(os.path.join(stackdir, subdir))
+                with open(os.path.join(stackdir, subdir, 'web.yaml'),
+                          'w') as fld:
+                    fld.write('')
+            argv = self._argv(os.path.join(stackdir, '*', 'web.yaml'))
+            assert_equals(False, batch.main(argv))
+        finally:
+            shutil.rmtree(stackdir)
+        assert_equals(sorted(os.listdir(self.outdir)), ['a', 'b'])
+        with open(os.path.join(self.outdir, 'b', 'web-dev.json')) as fld:
+            assert_equals(fld.read(), '%s/b/web.yaml dev\n' % stackdir)
+
+    @mock.patch('pmcf.config.config.PMCFConfig.get_config', _mock_get_config)
+    @mock.patch('pmcf.cli.cmd.PMCFCLI.__init__', _mock_cli_init)
+    @mock.patch('pmcf.cli.cmd.PMCFCLI.run', _mock_run_succeeds)
+    def test_main_writes_output_per_stack_and_environment(self):
+        argv = self._argv('-e', 'dev', '-e', 'prod',
+                          'tests/data/yaml/test*.yaml')
+        assert_equals(False, batch.main(argv))
+        assert_equals(sorted(os.listdir(self.outdir)), [
+            'test-dev.json',
+            'test-prod.json',
+            'test-stack-lb-stage-dev.json',
+            'test-stack-lb-stage-prod.json',
+        ])
+        with open(os.path.join(self.outdir, 'test-prod.json')) as fld:
+            assert_equals(fld.read(), 'tests/data/yaml/test.yaml prod\n')
+
+    @mock.patch('pmcf.config.config.PMCFConfig.get_config', _mock_get_config)
+    @mock.patch('pmcf.cli.cmd.PMCFCLI.__init__', _mock_cli_init)
+    @mock.patch('pmcf.cli.cmd.PMCFCLI.run', _mock_run_fails_in_prod)
+    def test_run_batch_aggregates_failures_per_stack(self):
+        args = argparse.Namespace(configfile='tests/data/etc/pmcf.conf',
+                                  profile='default', jobs=1, suffix='json',
+                                  output_dir=self.outdir)
+        stacks = ['tests/data/yaml/test.yaml', 'tests/data/yaml/ais.yaml']
+        failures = batch.run_batch(args, stacks, ['dev', 'prod'])
+        assert_equals(failures, {
+            'tests/data/yaml/test.yaml': ['prod'],
+            'tests/data/yaml/ais.yaml': ['prod'],
+        })
+
+    @mock.patch('pmcf.config.config.PMCFConfig.get_config', _mock_get_config)
+    @mock.patch('pmcf.cli.cmd.PMCFCLI.__init__', _mock_cli_init)
+    @mock.patch('pmcf.cli.cmd.PMCFCLI.run', _mock_run_fails_in_prod)
+    def test_main_fails_if_any_environment_fails(self):
+        argv = self._argv('-e', 'dev', '-e', 'prod',
+                          'tests/data/yaml/test.yaml')
+        assert_equals(True, batch.main(argv))
+
+    @mock.patch('pmcf.config.config.PMCFConfig.get_config', _mock_get_config)
+    @mock.patch('pmcf.cli.cmd.PMCFCLI.__init__', _mock_cli_init)
+    @mock.patch('pmcf.cli.cmd.PMCFCLI.run', _mock_run_raises)
+    def test_main_exception_fails(self):
+        argv = self._argv('tests/data/yaml/test.yaml')
+        assert_equals(True, batch.main(argv))
+
+    @mock.patch('pmcf.config.config.PMCFConfig.get_config', _mock_get_config)
+    @mock.patch('pmcf.cli.cmd.PMCFCLI.__init__', _mock_cli_init)
+    @mock.patch('pmcf.cli.cmd.PMCFCLI.run', _mock_run_breaks_in_prod)
+    def test_run_batch_unexpected_error_fails_job(self):
+        args = argparse.Namespace(configfile='tests/data/etc/pmcf.conf',
+                                  profile='default', jobs=1, suffix='json',
+                                  output_dir=self.outdir)
+        stacks = ['tests/data/yaml/test.yaml']
+        failures = batch.run_batch(args, stacks, ['dev', 'prod'])
+        assert_equals(failures, {'tests/data/yaml/test.yaml': ['prod']})
+
+    def test_main_missing_output_dir_fails(self):
+        argv = ['-o', os.path.join(self.outdir, 'missing'),
+                'tests/data/yaml/test.yaml']
+        assert_equals(True, batch.main(argv))
+
+    @mock.patch('pmcf.config.config.PMCFConfig.get_config', _mock_get_config)
+    @mock.patch('pmcf.cli.cmd.PMCFCLI.__init__', _mock_cli_init)
+    @mock.patch('pmcf.cli.cmd.PMCFCLI.run', _mock_run_succeeds)
+    def test_cli_main_dispatches_batch(self):
+        old_argv = sys.argv
+        sys.argv = ['pmcf', 'batch'] + self._argv('tests/data/yaml/test.yaml')
+        try:
+            assert_equals(False, main())
+        finally:
+            sys.argv = old_argv
+        assert_equals(os.listdir(self.outdir), ['test-dev.json'])
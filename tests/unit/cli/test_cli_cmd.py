@@ -12,11 +12,20 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import copy
+import json
 import mock
 from nose.tools import assert_equals, assert_raises
+import os
+import shutil
+import StringIO
+import sys
+import tempfile
 
 from pmcf.cli.cmd import PMCFCLI
-from pmcf.exceptions import PropertyException
+from pmcf.exceptions import ParserFailure, PMCFException, PolicyException,\
+    PropertyException
+from pmcf.utils.validation_cache import ValidationCache
 
 
 def _mock_add_resources(self, resource, config):
@@ -27,7 +36,7 @@ def _mock_cli_init_no_options(self):
     pass
 
 
-def _mock_cli_init_jsonfile_option(self, json_file):
+def _mock_cli_init_jsonfile_option(self, json_file, **kwargs):
     pass
 
 
@@ -53,6 +62,10 @@ def _mock_validate(self):
     pass
 
 
+def _mock_validate_stack(self, stack):
+    pass
+
+
 def _mock_run_succeeds(self, data, metadata, poll, action):
     return True
 
@@ -82,6 +95,31 @@ class TestCliCmd(object):
         cli = PMCFCLI(options)
         assert_equals(cli.args['policyfile'], 'tests/data/etc/policy.json')
 
+    @mock.patch('pmcf.policy.JSONPolicy.__init__',
+                _mock_cli_init_jsonfile_option)
+    def test_render_jobs_set_on_output(self):
+        options = {
+            'parser': 'AWSFWParser',
+            'policy': 'JSONPolicy',
+            'policyfile': 'tests/data/etc/policy.json',
+            'output': 'JSONOutput',
+            'render_jobs': '4',
+        }
+        cli = PMCFCLI(options)
+        assert_equals(4, cli.output.render_jobs)
+
+    @mock.patch('pmcf.policy.JSONPolicy.__init__',
+                _mock_cli_init_jsonfile_option)
+    def test_render_jobs_not_number_raises(self):
+        options = {
+            'parser': 'AWSFWParser',
+            'policy': 'JSONPolicy',
+            'policyfile': 'tests/data/etc/policy.json',
+            'output': 'JSONOutput',
+            'render_jobs': 'many',
+        }
+        assert_raises(ParserFailure, PMCFCLI, options)
+
     @mock.patch('pmcf.policy.JSONPolicy.__init__',
                 _mock_cli_init_jsonfile_option)
     @mock.patch('pmcf.provisioners.AWSFWProvisioner.__init__',
@@ -107,8 +145,8 @@ class TestCliCmd(object):
                 _mock_parse_file)
     @mock.patch('pmcf.policy.JSONPolicy.__init__',
                 _mock_cli_init_jsonfile_option)
-    @mock.patch('pmcf.policy.JSONPolicy.validate_resource',
-                _mock_parse_file)
+    @mock.patch('pmcf.policy.JSONPolicy.validate_stack',
+                _mock_validate_stack)
     @mock.patch('pmcf.provisioners.AWSFWProvisioner.__init__',
                 _mock_cli_init_no_options)
     @mock.patch('pmcf.outputs.JSONOutput.__init__',
@@ -147,8 +185,8 @@ class TestCliCmd(object):
                 _mock_validate)
     @mock.patch('pmcf.policy.JSONPolicy.__init__',
                 _mock_cli_init_jsonfile_option)
-    @mock.patch('pmcf.policy.JSONPolicy.validate_resource',
-                _mock_parse_file)
+    @mock.patch('pmcf.policy.JSONPolicy.validate_stack',
+                _mock_validate_stack)
     @mock.patch('pmcf.provisioners.AWSFWProvisioner.__init__',
                 _mock_cli_init_no_options)
     @mock.patch('pmcf.outputs.JSONOutput.__init__',
@@ -179,8 +217,8 @@ class TestCliCmd(object):
                 _mock_validate)
     @mock.patch('pmcf.policy.JSONPolicy.__init__',
                 _mock_cli_init_jsonfile_option)
-    @mock.patch('pmcf.policy.JSONPolicy.validate_resource',
-                _mock_parse_file)
+    @mock.patch('pmcf.policy.JSONPolicy.validate_stack',
+                _mock_validate_stack)
     @mock.patch('pmcf.provisioners.AWSFWProvisioner.__init__',
                 _mock_cli_init_no_options)
     @mock.patch('pmcf.outputs.JSONOutput.__init__',
@@ -216,8 +254,8 @@ class TestCliCmd(object):
                 _mock_validate)
     @mock.patch('pmcf.policy.JSONPolicy.__init__',
                 _mock_cli_init_jsonfile_option)
-    @mock.patch('pmcf.policy.JSONPolicy.validate_resource',
-                _mock_parse_file)
+    @mock.patch('pmcf.policy.JSONPolicy.validate_stack',
+                _mock_validate_stack)
     @mock.patch('pmcf.provisioners.AWSFWProvisioner.__init__',
                 _mock_cli_init_no_options)
     @mock.patch('pmcf.outputs.JSONOutput.__init__',
@@ -244,3 +282,346 @@ class TestCliCmd(object):
         }
         cli = PMCFCLI(options)
         assert_equals(True, cli.run())
+
+
+class TestPMCFCLIEnvironments(object):
+
+    def __init__(self):
+        self.options = None
+        self.outdir = None
+
+    def setup(self):
+        self.outdir = tempfile.mkdtemp()
+        self.options = {
+            'parser': 'YamlParser',
+            'policy': 'JSONPolicy',
+            'policyfile': 'tests/data/etc/policy.json',
+            'output': 'JSONOutput',
+            'stackfile': 'tests/data/yaml/multi-env.yaml',
+            'environment': 'dev',
+            'accesskey': '1234',
+            'secretkey': '3456',
+            'region': 'eu-west-1',
+            'action': 'create',
+            'poll': False,
+        }
+
+    def teardown(self):
+        shutil.rmtree(self.outdir)
+
+    # Provisioners embed the current time in the rendered template
+    @mock.patch('time.time', lambda: 1400000000.0)
+    def test_render_environments_renders_each_environment(self):
+        cli = PMCFCLI(self.options)
+        results = cli.render_environments()
+        assert_equals(['dev', 'prod'], [res[0] for res in results])
+        assert_equals(['dev', 'prod'],
+                      [res[2]['environment'] for res in results])
+        for environment, data, metadata in results:
+            single = PMCFCLI(dict(self.options, environment=environment))
+            stack = single.parse()
+            single.validate(stack)
+            assert_equals(json.loads(single.render(stack)[0]),
+                          json.loads(data))
+
+    def test_render_environments_parses_once(self):
+        cli = PMCFCLI(self.options)
+        with mock.patch.object(cli.parser, 'load',
+                               wraps=cli.parser.load) as load:
+            cli.render_environments()
+        assert_equals(1, load.call_count)
+
+    def test_run_environments_writes_templates_and_drift(self):
+        cli = PMCFCLI(self.options)
+        stdout = sys.stdout
+        sys.stdout = StringIO.StringIO()
+        try:
+            assert_equals(False, cli.run_environments(self.outdir))
+            report = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        assert_equals(['multienv-dev.json', 'multienv-prod.json'],
+                      sorted(os.listdir(self.outdir)))
+        assert_equals('sgdebug: missing in prod' in report, True)
+        assert_equals('LCapp: differs in' in report, True)
+
+    def test_run_environments_bad_output_dir_fails(self):
+        cli = PMCFCLI(self.options)
+        assert_equals(True, cli.run_environments(
+            os.path.join(self.outdir, 'missing')))
+
+    def test_run_environments_bad_stack_fails(self):
+        self.options['stackfile'] = 'missing.yaml'
+        cli = PMCFCLI(self.options)
+        assert_equals(True, cli.run_environments(self.outdir))
+
+
+STACK_IMPORTS = """
+imports: [common.yaml]
+config:
+  name: test
+resources: {}
+"""
+
+
+class TestPMCFCLICache(object):
+
+    def __init__(self):
+        self.options = None
+        self.cachedir = None
+
+    def setup(self):
+        self.cachedir = tempfile.mkdtemp()
+        self.options = {
+            'parser': 'YamlParser',
+            'policy': 'JSONPolicy',
+            'policyfile': 'tests/data/etc/policy.json',
+            'output': 'JSONOutput',
+            'stackfile': 'tests/data/yaml/multi-env.yaml',
+            'environment': 'dev',
+            'accesskey': '1234',
+            'secretkey': '3456',
+            'region': 'eu-west-1',
+            'action': 'create',
+            'poll': False,
+            'cachedir': self.cachedir,
+        }
+
+    def teardown(self):
+        shutil.rmtree(self.cachedir)
+
+    def test_parse_uses_cache(self):
+        expected = PMCFCLI(self.options).parse()
+        cli = PMCFCLI(self.options)
+        with mock.patch.object(cli.parser, 'parse') as parse:
+            stack = cli.parse()
+        assert_equals(0, parse.call_count)
+        assert_equals(expected, stack)
+        assert_equals(expected, cli.parser.stack())
+
+    def test_parse_cache_ignores_policy_changes(self):
+        cli = PMCFCLI(self.options)
+        expected = copy.deepcopy(cli.parse())
+        cli.validate(cli.parser.stack())
+        assert_equals(expected, PMCFCLI(self.options).parse())
+
+    def test_parse_cache_keyed_on_environment(self):
+        PMCFCLI(self.options).parse()
+        self.options['environment'] = 'prod'
+        stack = PMCFCLI(self.options).parse()
+        assert_equals('prod', stack['config']['environment'])
+        # One entry per environment, plus the compiled policy
+        assert_equals(3, len(os.listdir(self.cachedir)))
+
+    def test_parse_cache_follows_imports(self):
+        libdir = os.path.join(self.cachedir, 'lib')
+        os.makedirs(libdir)
+        common = os.path.join(libdir, 'common.yaml')
+        with open(common, 'w') as fld:
+            fld.write('config: {vpcid: vpc-1c50bd79}\n')
+        self.options['include_path'] = libdir
+        self.options['stackfile'] = 'tests/data/yaml/imports.yaml'
+        PMCFCLI(self.options).parse(STACK_IMPORTS)
+        cli = PMCFCLI(self.options)
+        with mock.patch.object(cli.parser, 'parse') as parse:
+            cli.parse(STACK_IMPORTS)
+        assert_equals(0, parse.call_count)
+        assert_equals([common], cli.parser.dependencies())
+
+        with open(common, 'w') as fld:
+            fld.write('config: {vpcid: vpc-12345678}\n')
+        mtime = os.stat(common).st_mtime + 10
+        os.utime(common, (mtime, mtime))
+        stack = PMCFCLI(self.options).parse(STACK_IMPORTS)
+        assert_equals('vpc-12345678', stack['config']['vpcid'])
+
+    def test_policy_uses_cache(self):
+        expected = PMCFCLI(self.options).policy.version()
+        with mock.patch('pmcf.policy.layers.load') as load:
+            cli = PMCFCLI(self.options)
+        assert_equals(0, load.call_count)
+        assert_equals(expected, cli.policy.version())
+
+    def test_parse_no_cache(self):
+        self.options['no_cache'] = True
+        PMCFCLI(self.options).parse()
+        assert_equals([], os.listdir(self.cachedir))
+
+    def test_parse_bad_cache_size_raises(self):
+        self.options['cache_size'] = 'big'
+        cli = PMCFCLI(self.options)
+        assert_raises(ParserFailure, cli.parse)
+
+
+class TestPMCFCLICheck(object):
+
+    def __init__(self):
+        self.options = None
+        self.tmpdir = None
+
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+        policyfile = os.path.join(self.tmpdir, 'policy.json')
+        with open(policyfile, 'w') as fld:
+            fld.write(json.dumps({
+                'instance': {
+                    'size': {
+                        'default': 'm1.small',
+                        'constraints': ['m1.small', 'm1.medium'],
+                    },
+                    'monitoring': {
+                        'default': False,
+                        'constraints': [False],
+                    },
+                },
+            }))
+        self.options = {
+            'parser': 'YamlParser',
+            'policy': 'JSONPolicy',
+            'policyfile': policyfile,
+            'output': 'JSONOutput',
+            'stackfile': 'tests/data/yaml/multi-env.yaml',
+            'environment': 'dev',
+            'accesskey': '1234',
+            'secretkey': '3456',
+            'region': 'eu-west-1',
+            'action': 'create',
+            'poll': False,
+        }
+
+    def teardown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _config(self):
+        with open(self.options['stackfile']) as fld:
+            config = fld.read()
+        return config.replace('count: 1', 'count: lots').replace(
+            'monitoring: False', 'monitoring: True\n      bogus: 1')
+
+    def test_check_clean_stack(self):
+        cli = PMCFCLI(self.options)
+        assert_equals([], cli.check(cli.parse()))
+
+    def test_check_reports_everything(self):
+        self.options['environment'] = 'prod'
+        cli = PMCFCLI(self.options)
+        violations = cli.check(cli.parse(self._config()))
+        assert_equals([
+            ('policy', '$.resources.instance[0].monitoring'),
+            ('policy', '$.resources.instance[0].size'),
+            ('schema', '$.resources.instance[0]'),
+            ('schema', '$.resources.instance[0].count'),
+        ], [(v['source'], v['path']) for v in violations])
+        for violation in violations:
+            assert_equals('instance app', violation['resource'])
+        assert_equals(['m1.small', 'm1.medium'], violations[1]['allowed'])
+
+    def test_check_matches_validate(self):
+        cli = PMCFCLI(self.options)
+        stack = cli.parse(self._config())
+        violations = cli.check(copy.deepcopy(stack))
+        try:
+            cli.validate(stack)
+        except PMCFException, exc:
+            assert_equals(True, violations[0]['message'] in exc.message)
+        else:
+            raise AssertionError('stack should be invalid')
+
+    def test_run_check_json(self):
+        cli = PMCFCLI(self.options)
+        stdout = sys.stdout
+        sys.stdout = StringIO.StringIO()
+        try:
+            assert_equals(True, cli.run_check('json', self._config()))
+            report = json.loads(sys.stdout.getvalue())
+        finally:
+            sys.stdout = stdout
+        assert_equals(3, len(report))
+
+    def test_run_check_clean(self):
+        cli = PMCFCLI(self.options)
+        stdout = sys.stdout
+        sys.stdout = StringIO.StringIO()
+        try:
+            assert_equals(False, cli.run_check())
+            report = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        assert_equals('No violations found\n', report)
+
+    def test_run_check_bad_stack_fails(self):
+        self.options['stackfile'] = 'missing.yaml'
+        cli = PMCFCLI(self.options)
+        assert_equals(True, cli.run_check())
+
+
+class TestPMCFCLIValidationCache(object):
+
+    def __init__(self):
+        self.options = None
+
+    def setup(self):
+        self.options = {
+            'parser': 'YamlParser',
+            'policy': 'JSONPolicy',
+            'policyfile': 'tests/data/etc/policy.json',
+            'output': 'JSONOutput',
+            'stackfile': 'tests/data/yaml/multi-env.yaml',
+            'environment': 'dev',
+            'accesskey': '1234',
+            'secretkey': '3456',
+            'region': 'eu-west-1',
+            'action': 'create',
+            'poll': False,
+        }
+
+    def _validate(self, cache, policy=None, edit=None):
+        cli = PMCFCLI(self.options, validation_cache=cache)
+        if policy is not None:
+            cli.policy.json_policy = policy
+        stack = cli.parse()
+        if edit:
+            edit(stack)
+        cli.validate(stack)
+        return cli, stack
+
+    def test_second_run_skips_policy(self):
+        cache = ValidationCache()
+        expected = self._validate(cache)[1]
+        assert_equals(3, len(cache))
+        with mock.patch('pmcf.policy.JSONPolicy.validate_resource') as pol:
+            stack = self._validate(cache)[1]
+        assert_equals(0, pol.call_count)
+        assert_equals(expected, stack)
+
+    def test_cached_resources_get_defaults(self):
+        policy = {'instance': {'dnszone': {'default': 'example.com'}}}
+        cache = ValidationCache()
+        expected = self._validate(None, policy)[1]
+        self._validate(cache, policy)
+        stack = self._validate(cache, policy)[1]
+        assert_equals(expected, stack)
+        assert_equals('example.com',
+                      stack['resources']['instance'][0]['dnszone'])
+
+    def test_changed_resource_revalidated(self):
+        cache = ValidationCache()
+        self._validate(cache)
+
+        def _edit(stack):
+            stack['resources']['instance'][0]['count'] = 'lots'
+        assert_raises(ParserFailure, self._validate, cache, None, _edit)
+
+    def test_policy_change_revalidates(self):
+        cache = ValidationCache()
+        self._validate(cache)
+        policy = {'instance': {'size': {'default': 'm1.small',
+                                        'constraints': ['m1.large']}}}
+        assert_raises(PolicyException, self._validate, cache, policy)
+
+    def test_policy_without_version_not_cached(self):
+        cache = ValidationCache()
+        with mock.patch('pmcf.policy.JSONPolicy.version',
+                        return_value=None):
+            self._validate(cache)
+        assert_equals(0, len(cache))
@@ -0,0 +1,223 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import mock
+from nose.tools import assert_equals
+import os
+import shutil
+import StringIO
+import sys
+import tempfile
+import yaml
+
+from pmcf.cli import convert
+from pmcf.cli.cli import main
+from pmcf.parsers.awsfw_parser import AWSFWParser
+from pmcf.parsers.yaml_parser import YamlParser
+
+OPTIONS = {
+    'policy': 'JSONPolicy',
+    'policyfile': 'tests/data/etc/policy.json',
+    'no_cache': True,
+}
+
+
+class TestConvert(object):
+
+    def __init__(self):
+        self.outdir = None
+
+    def setup(self):
+        self.outdir = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.outdir)
+
+    def _argv(self, *extra):
+        argv = ['-c', 'tests/data/etc/pmcf.conf',
+                '-P', 'tests/data/etc/policy.json', '--no-cache',
+                '-j', '1', '-o', self.outdir]
+        argv.extend(extra)
+        return argv
+
+    def test_find_farms_directory(self):
+        farms = convert.find_farms(['tests/data/awsfw'])
+        assert_equals(farms[0], ('tests/data/awsfw/4music-v59.xml',
+                                 '4music-v59.yaml'))
+        assert_equals(6, len(farms))
+
+    def test_find_farms_nested_directory(self):
+        os.makedirs(os.path.join(self.outdir, 'c4', 'ais'))
+        open(os.path.join(self.outdir, 'c4', 'ais', 'farm.xml'), 'w').close()
+        open(os.path.join(self.outdir, 'c4', 'README'), 'w').close()
+        farms = convert.find_farms([self.outdir])
+        assert_equals(farms, [(os.path.join(self.outdir, 'c4/ais/farm.xml'),
+                               'c4/ais/farm.yaml')])
+
+    def test_find_farms_file(self):
+        farms = convert.find_farms(['tests/data/awsfw/ais-test-farm.xml'])
+        assert_equals(farms, [('tests/data/awsfw/ais-test-farm.xml',
+                               'ais-test-farm.yaml')])
+
+    def test_stack_to_yaml_leaves_out_credentials(self):
+        args = {
+            'accesskey': 'wibble',
+            'secretkey': 'wobble',
+            'instance_accesskey': '12345',
+            'instance_secretkey': '23456',
+        }
+        stack = AWSFWParser().parse_file(
+            'tests/data/awsfw/ais-stage-farm.xml', args)
+        environment, text = convert.stack_to_yaml(stack)
+        assert_equals('stage', environment)
+        for secret in ['wibble', 'wobble', '12345', '23456']:
+            assert secret not in text
+        data = yaml.safe_load(text)
+        assert_equals(['stage'], data['config']['environments'])
+        assert_equals(True, data['config']['nodefaultsg'])
+        assert 'environment' not in data['config']
+        assert_equals(set(['instance', 'load_balancer', 'secgroup']),
+                      set(data['resources'].keys()))
+        # The stack itself is untouched
+        assert_equals('12345', stack['resources']['instance'][0][
+            'provisioner']['args']['AWS_ACCESS_KEY_ID'])
+
+    def test_differences(self):
+        left = {'Resources': {'a': 1, 'b': 2}, 'Outputs': {}}
+        right = {'Resources': {'a': 1, 'b': 3, 'c': 4}}
+        assert_equals(['Outputs', 'b', 'c'],
+                      convert.differences(left, right))
+
+    def test_run_convert_equivalent(self):
+        farms = convert.find_farms(['tests/data/awsfw/ais-test-farm.xml'])
+        results = convert.run_convert(OPTIONS, farms, self.outdir)
+        assert_equals('equivalent', results[0]['status'])
+        assert_equals([], results[0]['differences'])
+        assert_equals(os.path.join(self.outdir, 'ais-test-farm.yaml'),
+                      results[0]['output'])
+        assert os.path.exists(results[0]['output'])
+
+    def test_run_convert_elb_logging_equivalent(self):
+        farms = convert.find_farms(['tests/data/awsfw/ais-stage-farm.xml'])
+        results = convert.run_convert(OPTIONS, farms, self.outdir)
+        assert_equals('equivalent', results[0]['status'])
+        assert_equals([], results[0]['differences'])
+        with open(results[0]['output']) as fld:
+            data = yaml.safe_load(fld)
+        policy = data['resources']['load_balancer'][0]['policy'][0]
+        assert_equals('stage/ais', policy['policy']['s3prefix'])
+        assert_equals(True, policy['policy']['fullprefix'])
+
+    def test_stack_to_yaml_log_prefix_round_trips(self):
+        stack = AWSFWParser().parse_file(
+            'tests/data/awsfw/ais-stage-farm.xml', {})
+        policy = stack['resources']['load_balancer'][0]['policy'][0]
+        policy['policy']['s3prefix'] = 'stage/ais/external'
+        environment, text = convert.stack_to_yaml(stack)
+        data = yaml.safe_load(text)
+        written = data['resources']['load_balancer'][0]['policy'][0]
+        assert_equals('ais', written['policy']['s3prefix'])
+        assert 'fullprefix' not in written['policy']
+        # The stack itself is untouched
+        assert_equals('stage/ais/external', policy['policy']['s3prefix'])
+
+        converted = YamlParser().parse(text, {
+            'environment': environment,
+            'action': 'create',
+        })
+        assert_equals(
+            [policy],
+            converted['resources']['load_balancer'][0]['policy'])
+
+    @mock.patch('pmcf.cli.convert.differences',
+                mock.Mock(return_value=['ELBapp']))
+    def test_run_convert_reports_differences(self):
+        farms = convert.find_farms(['tests/data/awsfw/ais-stage-farm.xml'])
+        results = convert.run_convert(OPTIONS, farms, self.outdir)
+        assert_equals('different', results[0]['status'])
+        assert_equals(['ELBapp'], results[0]['differences'])
+
+    def test_run_convert_reports_failures(self):
+        farms = convert.find_farms([
+            'tests/data/awsfw/ais-stage-farm-broken.xml',
+            'tests/data/awsfw/su2c-v2.xml',
+            'tests/data/awsfw/missing.xml',
+        ])
+        results = convert.run_convert(OPTIONS, farms, self.outdir)
+        assert_equals(['failed', 'failed', 'failed'],
+                      [result['status'] for result in results])
+        assert_equals("KeyError: 'volumeSize'", results[1]['error'])
+
+    def test_run_convert_in_pool(self):
+        farms = convert.find_farms(['tests/data/awsfw'])
+        results = convert.run_convert(OPTIONS, farms, self.outdir, 3)
+        assert_equals([farm for farm, _ in farms],
+                      [result['farm'] for result in results])
+        assert_equals('equivalent', results[4]['status'])
+
+    def test_format_report_text(self):
+        results = [{
+            'farm': 'a.xml', 'output': 'a.yaml', 'status': 'equivalent',
+            'differences': [], 'error': None,
+        }, {
+            'farm': 'b.xml', 'output': 'b.yaml', 'status': 'different',
+            'differences': ['ELBapp', 'LCapp'], 'error': None,
+        }, {
+            'farm': 'c.xml', 'output': None, 'status': 'failed',
+            'differences': [], 'error': 'bad farm',
+        }]
+        assert_equals(convert.format_report(results), '\n'.join([
+            'a.xml -> a.yaml: equivalent',
+            'b.xml -> b.yaml: different (ELBapp, LCapp)',
+            'c.xml: failed: bad farm',
+            '3 farms: 1 equivalent, 1 different, 1 failed',
+        ]) + '\n')
+
+    def test_main_succeeds_when_equivalent(self):
+        argv = self._argv('tests/data/awsfw/ais-test-farm.xml')
+        assert_equals(False, convert.main(argv))
+        assert_equals(['ais-test-farm.yaml'], os.listdir(self.outdir))
+
+    @mock.patch('pmcf.cli.convert.differences',
+                mock.Mock(return_value=['ELBapp']))
+    def test_main_fails_when_different(self):
+        argv = self._argv('tests/data/awsfw/ais-stage-farm.xml')
+        assert_equals(True, convert.main(argv))
+
+    def test_main_json_report(self):
+        argv = self._argv('--report', 'json',
+                          'tests/data/awsfw/ais-test-farm.xml')
+        stdout = sys.stdout
+        sys.stdout = StringIO.StringIO()
+        try:
+            convert.main(argv)
+            report = json.loads(sys.stdout.getvalue())
+        finally:
+            sys.stdout = stdout
+        assert_equals('equivalent', report[0]['status'])
+
+    def test_main_bad_policy_fails(self):
+        argv = self._argv('tests/data/awsfw/ais-test-farm.xml')
+        argv[3] = 'tests/data/etc/bad.json'
+        assert_equals(True, convert.main(argv))
+
+    def test_cli_main_dispatches_convert(self):
+        old_argv = sys.argv
+        sys.argv = ['pmcf', 'convert'] +\
+            self._argv('tests/data/awsfw/ais-test-farm.xml')
+        try:
+            assert_equals(False, main())
+        finally:
+            sys.argv = old_argv
@@ -0,0 +1,191 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import argparse
+import json
+from nose.tools import assert_equals, assert_raises
+import os
+import shutil
+import tempfile
+import threading
+import urllib2
+
+from pmcf.cli import serve
+from pmcf.exceptions import ParserFailure, PolicyException
+
+STACK = """
+config:
+  name: test
+  environments:
+    - dev
+    - prod
+resources:
+  instance:
+    - name: app
+      count: 1
+      image: ami-896c96fe
+      sshKey: bootstrap
+      monitoring: False
+      size: m1.small
+      provisioner:
+        provider: NoopProvisioner
+        args: {}
+"""
+
+CONFIG = """
+[default]
+output = JSONOutput
+parser = YamlParser
+policy = JSONPolicy
+"""
+
+
+class TestServe(object):
+
+    def __init__(self):
+        self.tmpdir = None
+        self.args = None
+
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+        cfgfile = os.path.join(self.tmpdir, 'pmcf.conf')
+        polfile = os.path.join(self.tmpdir, 'policy.json')
+        with open(cfgfile, 'w') as fld:
+            fld.write(CONFIG)
+            fld.write('cachedir = %s\n' % os.path.join(self.tmpdir, 'cache'))
+        with open(polfile, 'w') as fld:
+            fld.write('{}')
+        self.args = argparse.Namespace(configfile=cfgfile,
+                                       policyfile=polfile,
+                                       profile='default',
+                                       environment='dev',
+                                       action='create',
+                                       poll=False)
+
+    def teardown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write_policy(self, policy):
+        polfile = self.args.policyfile
+        with open(polfile, 'w') as fld:
+            fld.write(json.dumps(policy))
+        mtime = os.stat(polfile).st_mtime + 10
+        os.utime(polfile, (mtime, mtime))
+
+    def test_render_returns_template(self):
+        service = serve.PMCFService(self.args)
+        data = json.loads(service.render(STACK))
+        assert_equals(data['Description'], 'test dev stack')
+        assert_equals('ASGapp' in data['Resources'], True)
+
+    def test_render_uses_request_environment(self):
+        service = serve.PMCFService(self.args)
+        data = json.loads(service.render(STACK, {'environment': 'prod'}))
+        assert_equals(data['Description'], 'test prod stack')
+
+    def test_render_bad_stack_raises(self):
+        service = serve.PMCFService(self.args)
+        assert_raises(ParserFailure, service.render, STACK,
+                      {'environment': 'qa'})
+
+    def test_policy_reloaded_on_change(self):
+        service = serve.PMCFService(self.args)
+        service.render(STACK)
+        self._write_policy({
+            'instance': {
+                'size': {'default': 'm1.small', 'constraints': ['m1.large']}
+            }
+        })
+        assert_raises(PolicyException, service.render, STACK)
+
+    def test_policy_reloaded_on_overlay(self):
+        service = serve.PMCFService(self.args)
+        service.render(STACK)
+        overlay = os.path.join(self.tmpdir, 'policy.d', 'size.json')
+        os.makedirs(os.path.dirname(overlay))
+        with open(overlay, 'w') as fld:
+            fld.write(json.dumps({
+                'instance': {'size': {'constraints': ['m1.large']}}
+            }))
+        assert_raises(PolicyException, service.render, STACK)
+
+    def test_validation_remembered_between_requests(self):
+        service = serve.PMCFService(self.args)
+        service.render(STACK)
+        remembered = len(service.validation_cache)
+        assert_equals(True, remembered > 0)
+        service.render(STACK)
+        assert_equals(remembered, service.validation_cache.hits)
+
+    def test_policy_change_forgets_validation(self):
+        service = serve.PMCFService(self.args)
+        service.render(STACK)
+        self._write_policy({'instance': {'size': {'default': 'm1.small'}}})
+        service.refresh()
+        assert_equals(0, len(service.validation_cache))
+
+    def test_policy_not_reloaded_when_unchanged(self):
+        service = serve.PMCFService(self.args)
+        policy = service.policy
+        service.render(STACK)
+        assert_equals(service.policy is policy, True)
+
+    def test_run_captures_output(self):
+        service = serve.PMCFService(self.args)
+        success, printed = service.run(STACK)
+        assert_equals(success, True)
+        assert_equals(json.loads(printed)['Description'], 'test dev stack')
+
+    def test_run_reports_failure(self):
+        service = serve.PMCFService(self.args)
+        success, printed = service.run(STACK, {'environment': 'qa'})
+        assert_equals(success, False)
+        assert_equals(printed, '')
+
+    def test_http_interface(self):
+        service = serve.PMCFService(self.args)
+        self.args.socket = None
+        self.args.listen = '127.0.0.1:0'
+        server = serve.make_server(self.args, service)
+        url = 'http://127.0.0.1:%d' % server.server_port
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            resp = urllib2.urlopen(url + '/render?environment=prod', STACK)
+            data = json.loads(resp.read())
+            assert_equals(data['Description'], 'test prod stack')
+
+            resp = urllib2.urlopen(url + '/status')
+            assert_equals(json.loads(resp.read())['parser'], 'YamlParser')
+
+            for path, code in [('/render?environment=qa', 400),
+                               ('/nothing', 404)]:
+                try:
+                    urllib2.urlopen(url + path, STACK)
+                    raise AssertionError('%s did not fail' % path)
+                except urllib2.HTTPError, exc:
+                    assert_equals(exc.code, code)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_unix_socket_server(self):
+        service = serve.PMCFService(self.args)
+        self.args.socket = os.path.join(self.tmpdir, 'pmcf.sock')
+        server = serve.make_server(self.args, service)
+        try:
+            assert_equals(os.path.exists(self.args.socket), True)
+        finally:
+            server.server_close()
@@ -0,0 +1,197 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import mock
+from nose.tools import assert_equals
+import os
+import shutil
+import StringIO
+import tempfile
+
+from pmcf.cli.cmd import PMCFCLI
+from pmcf.cli.watch import PMCFWatcher
+
+STACK = """
+config:
+  name: test
+  environments:
+    - dev
+resources:
+  instance:
+    - name: app
+      count: %d
+      image: ami-896c96fe
+      sshKey: bootstrap
+      monitoring: False
+      size: m1.small
+      provisioner:
+        provider: NoopProvisioner
+        args: {}
+"""
+
+
+class TestWatch(object):
+
+    def __init__(self):
+        self.tmpdir = None
+        self.watcher = None
+
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+        options = {
+            'parser': 'YamlParser',
+            'policy': 'JSONPolicy',
+            'policyfile': os.path.join(self.tmpdir, 'policy.json'),
+            'output': 'JSONOutput',
+            'stackfile': os.path.join(self.tmpdir, 'stack.yaml'),
+            'environment': 'dev',
+            'accesskey': None,
+            'secretkey': None,
+            'region': 'eu-west-1',
+            'action': 'create',
+            'poll': False,
+        }
+        self._write(options['policyfile'], '{}')
+        self._write(options['stackfile'], STACK % 1)
+        self.watcher = PMCFWatcher(PMCFCLI(options))
+
+    def teardown(self):
+        shutil.rmtree(self.tmpdir)
+
+    @staticmethod
+    def _write(fname, data):
+        mtime = None
+        if os.path.exists(fname):
+            mtime = os.stat(fname).st_mtime + 10
+        with open(fname, 'w') as fld:
+            fld.write(data)
+        if mtime:
+            os.utime(fname, (mtime, mtime))
+
+    def test_first_poll_renders(self):
+        assert_equals(True, self.watcher.poll_once())
+        data = json.loads(self.watcher.rendered)
+        assert_equals(data['Description'], 'test dev stack')
+
+    def test_unchanged_files_do_nothing(self):
+        self.watcher.poll_once()
+        assert_equals(False, self.watcher.poll_once())
+
+    def test_stack_change_reparses(self):
+        self.watcher.poll_once()
+        self._write(self.watcher.cli.args['stackfile'], STACK % 2)
+        with mock.patch.object(self.watcher, 'rebuild',
+                               wraps=self.watcher.rebuild) as rebuild:
+            assert_equals(True, self.watcher.poll_once())
+            rebuild.assert_called_once_with('parse')
+        data = json.loads(self.watcher.rendered)
+        assert_equals(
+            data['Resources']['ASGapp']['Properties']['MaxSize'], 2)
+
+    def test_policy_change_skips_parse(self):
+        self.watcher.poll_once()
+        parsed = self.watcher.parsed
+        self._write(self.watcher.cli.args['policyfile'], json.dumps({
+            'instance': {'size': {'default': 'm1.small'}}
+        }))
+        with mock.patch.object(self.watcher, 'rebuild',
+                               wraps=self.watcher.rebuild) as rebuild:
+            assert_equals(True, self.watcher.poll_once())
+            rebuild.assert_called_once_with('policy')
+        assert_equals(self.watcher.parsed is parsed, True)
+
+    def test_policy_overlay_change_skips_parse(self):
+        self.watcher.poll_once()
+        parsed = self.watcher.parsed
+        envdir = os.path.join(self.tmpdir, 'policy.d', 'environments')
+        os.makedirs(envdir)
+        self._write(os.path.join(envdir, 'dev.json'), json.dumps({
+            'instance': {'size': {'constraints': ['m1.large']}}
+        }))
+        with mock.patch.object(self.watcher, 'rebuild',
+                               wraps=self.watcher.rebuild) as rebuild:
+            self.watcher.poll_once()
+            rebuild.assert_called_once_with('policy')
+        assert_equals(self.watcher.parsed is parsed, True)
+        assert_equals(None, self.watcher.validated)
+
+    def test_import_change_reparses(self):
+        common = os.path.join(self.tmpdir, 'common.yaml')
+        self._write(common, 'config: {name: test}\n')
+        self._write(self.watcher.cli.args['stackfile'],
+                    'imports: [common.yaml]\n' +
+                    STACK.replace('  name: test\n', '', 1) % 1)
+        self.watcher.poll_once()
+        assert_equals('parse', self.watcher.watched_files()[common])
+        self._write(common, 'config: {name: other}\n')
+        with mock.patch.object(self.watcher, 'rebuild',
+                               wraps=self.watcher.rebuild) as rebuild:
+            assert_equals(True, self.watcher.poll_once())
+            rebuild.assert_called_once_with('parse')
+        assert_equals('other', self.watcher.parsed['config']['name'])
+
+    def test_stack_change_revalidates_changed_resources(self):
+        self.watcher.poll_once()
+        self._write(self.watcher.cli.args['stackfile'],
+                    STACK % 1 + STACK.split('instance:')[1].replace(
+                        'name: app', 'name: web') % 1)
+        self.watcher.poll_once()
+        policy = self.watcher.cli.policy
+        with mock.patch.object(policy, 'validate_resource',
+                               wraps=policy.validate_resource) as validate:
+            self.watcher.rebuild('policy')
+        assert_equals(0, validate.call_count)
+        self._write(self.watcher.cli.args['stackfile'],
+                    STACK % 2 + STACK.split('instance:')[1].replace(
+                        'name: app', 'name: web') % 1)
+        with mock.patch('pmcf.policy.JSONPolicy.validate_resource',
+                        autospec=True, return_value=True) as validate:
+            self.watcher.poll_once()
+        assert_equals(1, validate.call_count)
+        assert_equals(2, json.loads(self.watcher.rendered)[
+            'Resources']['ASGapp']['Properties']['MaxSize'])
+
+    def test_provisioner_files_are_watched(self):
+        self.watcher.poll_once()
+        self.watcher.parsed['resources']['instance'][0]['provisioner'] = {
+            'provider': 'AWSFWProvisioner',
+        }
+        files = self.watcher.watched_files()
+        assert_equals(files['scripts/awsfw/bootstrap.sh'], 'render')
+
+    def test_render_change_reuses_validated_stack(self):
+        self.watcher.poll_once()
+        validated = self.watcher.validated
+        self.watcher.rebuild('render')
+        assert_equals(self.watcher.validated is validated, True)
+
+    def test_errors_are_logged_and_watching_continues(self):
+        self.watcher.poll_once()
+        self._write(self.watcher.cli.args['stackfile'], 'config: {}')
+        assert_equals(True, self.watcher.poll_once())
+        self._write(self.watcher.cli.args['stackfile'], STACK % 3)
+        assert_equals(True, self.watcher.poll_once())
+        data = json.loads(self.watcher.rendered)
+        assert_equals(
+            data['Resources']['ASGapp']['Properties']['MaxSize'], 3)
+
+    @mock.patch('sys.stdout', new_callable=StringIO.StringIO)
+    def test_report_lists_changed_resources(self, stdout):
+        old = '{"Resources": {"a": {"Type": "x"}, "b": {"Type": "y"}}}'
+        new = '{"Resources": {"b": {"Type": "z"}, "c": {"Type": "x"}}}'
+        with mock.patch('pmcf.cli.watch.colourise_output',
+                        lambda colour, msg: msg):
+            self.watcher.report(old, new)
+        assert_equals(stdout.getvalue(), '+ c\n- a\n~ b\n')
@@ -36,8 +36,17 @@ class TestPMCFConfig(object):
             'provisioner': 'BaseProvisioner',
             'quiet': None,
             'region': None,
+            'max_regions': None,
+            'render_jobs': None,
             'secretkey': None,
+            'policy_overlays': None,
             'stackfile': None,
+            'include_path': None,
+            'xsdfile': None,
+            'timings': None,
+            'cachedir': '~/.cache/pmcf',
+            'cache_size': 100,
+            'no_cache': None,
             'environment': None,
             'verbose': None,
             'use_iam_profile': False,
@@ -67,8 +76,17 @@ class TestPMCFConfig(object):
             'provisioner': 'AWSFWProvisioner',
             'quiet': None,
             'region': None,
+            'max_regions': None,
+            'render_jobs': None,
             'secretkey': None,
+            'policy_overlays': None,
             'stackfile': None,
+            'include_path': None,
+            'xsdfile': None,
+            'timings': None,
+            'cachedir': '~/.cache/pmcf',
+            'cache_size': 100,
+            'no_cache': None,
             'environment': None,
             'verbose': None,
             'use_iam_profile': False,
@@ -87,3 +105,18 @@ class TestPMCFConfig(object):
         cfg.get_config()
         item = cfg._get_from_section('default', 'wibble')
         assert_equals(item, None)
+
+    def test_get_config_region_credentials(self):
+        cfg = PMCFConfig('tests/data/etc/pmcf.conf', 'multi', {})
+        opts = cfg.get_config()
+        assert_equals(opts['region'], 'eu-west-1, us-east-1')
+        assert_equals(opts['region_credentials'], {
+            'us-east-1': {
+                'access': 'wobble',
+                'secret': '4n0th3r_53kr3t',
+            },
+        })
+
+    def test_get_config_no_region_credentials(self):
+        cfg = PMCFConfig('tests/data/etc/pmcf.conf', 'c4', {})
+        assert_equals('region_credentials' in cfg.get_config(), False)
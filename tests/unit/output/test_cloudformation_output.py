@@ -22,6 +22,7 @@ import datetime
 
 from pmcf.exceptions import AuditException, ProvisionerException
 from pmcf.outputs import AWSCFNOutput
+from pmcf.outputs import cloudformation
 
 
 class Output(object):
@@ -1153,3 +1154,133 @@ class TestAWSCFNOutput(object):
             aws_secret_access_key='secret'
         )
         assert_equals(False, cfno.do_poll(cfn, 'test', True, 'create'))
+
+    def test__regions_splits_list(self):
+        cfno = AWSCFNOutput()
+        assert_equals(['eu-west-1', 'us-east-1'],
+                      cfno._regions('eu-west-1, us-east-1,,eu-west-1'))
+
+    def test__regions_single(self):
+        cfno = AWSCFNOutput()
+        assert_equals(['eu-west-1'], cfno._regions('eu-west-1'))
+
+    def test__region_metadata_overlays_credentials(self):
+        cfno = AWSCFNOutput()
+        metadata = {
+            'region': 'eu-west-1,us-east-1',
+            'access': '1234',
+            'secret': '2345',
+            'region_credentials': {
+                'us-east-1': {'access': 'abcd', 'secret': 'bcde'},
+            },
+        }
+        ret = cfno._region_metadata(metadata, 'us-east-1')
+        assert_equals('us-east-1', ret['region'])
+        assert_equals('abcd', ret['access'])
+        assert_equals('bcde', ret['secret'])
+        ret = cfno._region_metadata(metadata, 'eu-west-1')
+        assert_equals('eu-west-1', ret['region'])
+        assert_equals('1234', ret['access'])
+        assert_equals('eu-west-1,us-east-1', metadata['region'])
+
+    def test__log_prefixes_region(self):
+        cloudformation._CONTEXT.region = 'us-east-1'
+        try:
+            log = cloudformation._log()
+            assert_equals(('us-east-1: hello', {}), log.process('hello', {}))
+        finally:
+            cloudformation._CONTEXT.region = None
+        assert_equals(cloudformation.LOG, cloudformation._log())
+
+    def test_run_multi_region_runs_each_region(self):
+        seen = {}
+
+        def _run_region(self, data, metadata, poll, action, upload):
+            seen[metadata['region']] = (metadata['access'],
+                                        cloudformation._CONTEXT.region)
+            return True
+
+        cfno = AWSCFNOutput()
+        metadata = {
+            'region': 'eu-west-1,us-east-1',
+            'access': '1234',
+            'secret': '2345',
+            'region_credentials': {
+                'us-east-1': {'access': 'abcd', 'secret': 'bcde'},
+            },
+        }
+        with mock.patch.object(AWSCFNOutput, 'run_region', _run_region):
+            assert_equals(True, cfno.run('{"a": "b"}', metadata))
+        assert_equals({
+            'eu-west-1': ('1234', 'eu-west-1'),
+            'us-east-1': ('abcd', 'us-east-1'),
+        }, seen)
+
+    def test_run_multi_region_one_failure_returns_false(self):
+        def _run_region(self, data, metadata, poll, action, upload):
+            return metadata['region'] != 'us-east-1'
+
+        cfno = AWSCFNOutput()
+        metadata = {
+            'region': 'eu-west-1,us-east-1,ap-southeast-1',
+            'access': '1234',
+            'secret': '2345',
+        }
+        with mock.patch.object(AWSCFNOutput, 'run_region', _run_region):
+            assert_equals(False, cfno.run('{"a": "b"}', metadata))
+
+    def test_run_multi_region_exception_returns_false(self):
+        def _run_region(self, data, metadata, poll, action, upload):
+            if metadata['region'] == 'us-east-1':
+                raise ProvisionerException('nope')
+            return True
+
+        cfno = AWSCFNOutput()
+        metadata = {
+            'region': 'eu-west-1,us-east-1',
+            'access': '1234',
+            'secret': '2345',
+        }
+        with mock.patch.object(AWSCFNOutput, 'run_region', _run_region):
+            assert_equals(False, cfno.run('{"a": "b"}', metadata))
+
+    def test_run_multi_region_bounds_parallelism(self):
+        class FakePool(object):
+            def __init__(self, workers):
+                self.workers = workers
+
+            def map(self, func, items):
+                return [func(item) for item in items]
+
+            def close(self):
+                pass
+
+            def join(self):
+                pass
+
+        pools = []
+
+        def _pool(workers):
+            pools.append(FakePool(workers))
+            return pools[-1]
+
+        cfno = AWSCFNOutput()
+        metadata = {
+            'region': 'eu-west-1,us-east-1,ap-southeast-1',
+            'access': '1234',
+            'secret': '2345',
+            'max_regions': '2',
+        }
+        with mock.patch.object(AWSCFNOutput, 'run_region',
+                               lambda *args: True):
+            with mock.patch('pmcf.outputs.cloudformation.ThreadPool', _pool):
+                assert_equals(True, cfno.run('{"a": "b"}', metadata))
+        assert_equals(2, pools[0].workers)
+
+    def test_run_multi_region_bad_max_regions_raises(self):
+        cfno = AWSCFNOutput()
+        metadata = {
+            'region': 'eu-west-1,us-east-1',
+            'max_regions': 'lots',
+        }
+        assert_raises(ProvisionerException, cfno.run, '{"a": "b"}', metadata)
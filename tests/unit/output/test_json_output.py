@@ -14,10 +14,12 @@
 
 import json
 import mock
-from nose.tools import assert_equals
+import multiprocessing
+from nose.tools import assert_equals, assert_raises
 import sys
 
 from pmcf.outputs import JSONOutput
+from pmcf.utils.template import TemplateDocument
 
 
 def _mock_ud(self, args):
@@ -28,6 +30,67 @@ def _mock_tp(self):
     return ['OldestInstance']
 
 
+def _instance_groups(count):
+    """
+    Resources for a stack with several kinds of instance group
+    """
+
+    instances = []
+    for idx in range(count):
+        inst = {
+            'block_device': [],
+            'count': 2,
+            'image': 'ami-e97f849e',
+            'monitoring': bool(idx % 2),
+            'name': 'app%d' % idx,
+            'provisioner': {
+                'args': {
+                    'apps': ['ais-jetty/v2.54-02'],
+                    'appBucket': 'test',
+                    'roleBucket': 'test',
+                    'roles': ['jetty']
+                },
+                'provider': 'AWSFWProvisioner'},
+            'public': False,
+            'sg': [],
+            'size': 'm1.large',
+            'sshKey': 'bootstrap'
+        }
+        if idx % 3 == 0:
+            inst['lb'] = ['test']
+        if idx % 3 == 1:
+            inst['nat'] = True
+            inst['dnszone'] = 'test.example.com'
+        if idx % 2 == 0:
+            inst['scaling_policy'] = {
+                'metric': "Piksel/sequoiaidentity/nodejs_concurrents",
+                'unit': 'Count',
+                'up': {'stat': 'Average', 'condition': "> 50", 'change': '1'},
+                'down': {'stat': 'Average', 'condition': "> 35",
+                         'change': "-1"},
+            }
+        instances.append(inst)
+    return {
+        'load_balancer': [{
+            'listener': [{
+                'instance_port': 80,
+                'protocol': 'HTTP',
+                'lb_port': 80,
+                'instance_protocol': 'HTTP',
+            }],
+            'healthcheck': {
+                'path': '/healthcheck',
+                'protocol': 'HTTP',
+                'port': 80
+            },
+            'name': 'test',
+            'policy': [],
+        }],
+        'secgroup': [],
+        'instance': instances,
+    }
+
+
 class TestJSONOutput(object):
 
     def test_cache_valid(self):
@@ -6929,3 +6992,45 @@ class TestJSONOutput(object):
     def test_run(self):
         sys.stdout = open('/dev/null', 'w')
         assert_equals(True, JSONOutput().run('{}', {}))
+
+    @mock.patch('pmcf.provisioners.AWSFWProvisioner.userdata', _mock_ud)
+    def test_render_jobs_same_template(self):
+        cfg = {'name': 'test', 'environment': 'test'}
+        serial = JSONOutput().add_resources(_instance_groups(7), cfg)
+        out = JSONOutput()
+        out.render_jobs = 3
+        with mock.patch('multiprocessing.Pool',
+                        wraps=multiprocessing.Pool) as pool:
+            parallel = out.add_resources(_instance_groups(7), cfg)
+        assert_equals(1, pool.call_count)
+        assert_equals(serial, parallel)
+
+    @mock.patch('pmcf.provisioners.AWSFWProvisioner.userdata', _mock_ud)
+    def test_render_jobs_daemon_builds_in_process(self):
+        cfg = {'name': 'test', 'environment': 'test'}
+        serial = JSONOutput().add_resources(_instance_groups(3), cfg)
+        out = JSONOutput()
+        out.render_jobs = 3
+        with mock.patch('multiprocessing.current_process') as current:
+            current.return_value.daemon = True
+            with mock.patch('multiprocessing.Pool') as pool:
+                tmpl = out.add_resources(_instance_groups(3), cfg)
+        assert_equals(0, pool.call_count)
+        assert_equals(serial, tmpl)
+
+    def test_render_jobs_error_raised(self):
+        cfg = {'name': 'test', 'environment': 'test'}
+        res = _instance_groups(3)
+        res['instance'][2]['lb'] = ['missing']
+        out = JSONOutput()
+        out.render_jobs = 2
+        assert_raises(KeyError, out.add_resources, res, cfg)
+
+    def test_add_resources_returns_canonical_document(self):
+        out = JSONOutput()
+        cfg = {'name': 'test', 'environment': 'test'}
+        res = {'load_balancer': [], 'secgroup': [], 'instance': []}
+        tmpl = out.add_resources(res, cfg)
+        assert_equals(TemplateDocument, type(tmpl))
+        assert tmpl.compact is tmpl
+        assert_equals(json.dumps(json.loads(tmpl), sort_keys=True), tmpl)
@@ -14,17 +14,18 @@
 
 import jsonschema
 import mock
+import xmltodict
 from nose.tools import assert_equals, assert_raises
 
 from pmcf.parsers import awsfw_parser
 from pmcf.exceptions import ParserFailure
 
 
-def _mock_validate(stack, schema):
+def _mock_validate(stack, skip=None):
     return None
 
 
-def _mock_validate_raises(data, schema):
+def _mock_validate_raises(stack, skip=None):
     raise jsonschema.exceptions.ValidationError('error')
 
 
@@ -696,13 +697,93 @@ class TestParser(object):
         parser.build_ds(ds, {})
         assert_equals(parser._stack['resources']['instance'],  data)
 
-    @mock.patch('jsonschema.validate', _mock_validate)
+    @mock.patch('pmcf.schema.validator.validate', _mock_validate)
     def test_parse_invalid_xml_config_raises(self):
         parser = awsfw_parser.AWSFWParser()
         assert_raises(ParserFailure, parser.parse_file,
                       'tests/data/awsfw/ais-stage-farm-broken.xml')
 
-    @mock.patch('jsonschema.validate', _mock_validate_raises)
+    def test_parse_matches_build_ds(self):
+        args = {
+            'accesskey': '1234',
+            'secretkey': '2345',
+            'instance_accesskey': '12345',
+            'instance_secretkey': '23456'
+        }
+        for fname in ['tests/data/awsfw/4music-v59.xml',
+                      'tests/data/awsfw/ais-stage-farm.xml',
+                      'tests/data/awsfw/ais-stage-farm-noinstances.xml',
+                      'tests/data/awsfw/ais-test-farm.xml']:
+            with open(fname) as fld:
+                config = fld.read()
+            expected = awsfw_parser.AWSFWParser().build_ds(
+                xmltodict.parse(config)['c4farm'], args)
+            assert_equals(expected,
+                          awsfw_parser.AWSFWParser().parse(config, args))
+
+    def test_parse_elb_after_instances(self):
+        config = """<c4farm>
+            <instances>
+                <tier>app</tier>
+                <role>jetty</role>
+                <app>ais-jetty</app>
+                <count>1</count>
+                <amiId>ami-e97f849e</amiId>
+                <size>m1.large</size>
+                <elb/>
+            </instances>
+            <ELB>
+                <listener>
+                    <protocol>HTTP</protocol>
+                    <port>80</port>
+                    <instancePort>80</instancePort>
+                </listener>
+            </ELB>
+            <noDefaultSG/>
+            <farmName>ais-stage-v1</farmName>
+        </c4farm>"""
+        parser = awsfw_parser.AWSFWParser()
+        stack = parser.parse(config)
+        assert_equals('aisstagev1',
+                      stack['resources']['load_balancer'][0]['name'])
+        assert_equals(['aisstagev1'], stack['resources']['instance'][0]['lb'])
+        assert_equals([], stack['resources']['instance'][0]['sg'])
+
+    def test_parse_wrong_root_raises(self):
+        parser = awsfw_parser.AWSFWParser()
+        assert_raises(ParserFailure, parser.parse,
+                      '<farm><farmName>ais-stage-v1</farmName></farm>')
+
+    def test_parse_no_farm_name_raises(self):
+        parser = awsfw_parser.AWSFWParser()
+        assert_raises(ParserFailure, parser.parse, '<c4farm/>')
+
+    def test_parse_xsd_failure_raises(self):
+        parser = awsfw_parser.AWSFWParser()
+        with open('tests/data/awsfw/su2c-v2.xml') as fld:
+            config = fld.read()
+        assert_raises(ParserFailure, parser.parse, config,
+                      {'xsdfile': 'tests/data/awsfw/c4farm.xsd'})
+
+    def test_parse_xsd_is_dependency(self):
+        parser = awsfw_parser.AWSFWParser()
+        with open('tests/data/awsfw/ais-test-farm.xml') as fld:
+            config = fld.read()
+        parser.parse(config, {'xsdfile': 'tests/data/awsfw/c4farm.xsd'})
+        assert_equals(['tests/data/awsfw/c4farm.xsd'], parser.dependencies())
+
+    def test_streamed_item_attributes(self):
+        path = [('c4farm', None), ('key', {'type': 'ssh'})]
+        assert_equals({'@type': 'ssh', '#text': 'test'},
+                      awsfw_parser.AWSFWParser._streamed_item(
+                          path, '\n    test'))
+
+    def test_streamed_item_empty(self):
+        path = [('c4farm', None), ('noDefaultSG', None)]
+        assert_equals(None, awsfw_parser.AWSFWParser._streamed_item(
+            path, '\n    '))
+
+    @mock.patch('pmcf.schema.validator.validate', _mock_validate_raises)
     def test_schema_validation_failure_raises(self):
         parser = awsfw_parser.AWSFWParser()
         # Append empty instance
@@ -715,7 +796,7 @@ class TestParserData(object):
     def __init__(self):
         self.data = {}
 
-    @mock.patch('jsonschema.validate', _mock_validate)
+    @mock.patch('pmcf.schema.validator.validate', _mock_validate)
     def setup(self):
         args = {
             'environment': 'stage',
@@ -50,3 +50,15 @@ class TestBaseParser(object):
     def test_validate_fails_on_bad_schema(self):
         self.parser._stack['monkey'] = 'business'
         assert_raises(ParserFailure, self.parser.validate)
+
+    def test_load_returns_config(self):
+        assert_equals('foo', self.parser.load('foo'))
+
+    def test_environments_empty(self):
+        assert_equals([], self.parser.environments('foo'))
+
+    def test_resolve_parses_again(self):
+        assert_raises(NotImplementedError, self.parser.resolve, 'foo', {})
+
+    def test_read_file_missing_file_raises(self):
+        assert_raises(ParserFailure, self.parser.read_file, 'missing')
@@ -12,20 +12,203 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import copy
 import jsonschema
 import mock
+import os
+import shutil
+import tempfile
 from nose.tools import assert_equals, assert_raises
 
 from pmcf.parsers import yaml_parser
 from pmcf.exceptions import ParserFailure
 
 
-def _mock_validate_raises(data, schema):
+def _mock_validate_raises(stack, skip=None):
     raise jsonschema.exceptions.ValidationError('error')
 
 
 class TestParser(object):
 
+    def _args(self, environment):
+        return {
+            'environment': environment,
+            'accesskey': '1234',
+            'secretkey': '2345',
+            'instance_accesskey': '12345',
+            'instance_secretkey': '23456',
+            'action': 'create',
+        }
+
+    def test_environments_lists_declared_environments(self):
+        parser = yaml_parser.YamlParser()
+        raw = parser.load(parser.read_file('tests/data/yaml/multi-env.yaml'))
+        assert_equals(['dev', 'prod'], parser.environments(raw))
+
+    def test_environments_none_declared(self):
+        parser = yaml_parser.YamlParser()
+        assert_equals([], parser.environments({'config': {}}))
+        assert_equals([], parser.environments(None))
+
+    def test_load_invalid_yaml_raises(self):
+        parser = yaml_parser.YamlParser()
+        assert_raises(ParserFailure, parser.load, 'foo: [')
+
+    def test_resolve_matches_parse(self):
+        fname = 'tests/data/yaml/multi-env.yaml'
+        parser = yaml_parser.YamlParser()
+        raw = parser.load(parser.read_file(fname))
+        saved = copy.deepcopy(raw)
+        for environment in ['dev', 'prod']:
+            args = self._args(environment)
+            expected = yaml_parser.YamlParser().parse_file(fname, args)
+            assert_equals(expected, copy.deepcopy(parser.resolve(raw, args)))
+        assert_equals(saved, raw)
+
+    def test_resolve_drops_resources_per_environment(self):
+        parser = yaml_parser.YamlParser()
+        raw = parser.load(parser.read_file('tests/data/yaml/multi-env.yaml'))
+        dev = copy.deepcopy(parser.resolve(raw, self._args('dev')))
+        prod = parser.resolve(raw, self._args('prod'))
+        assert_equals(['app', 'debug'],
+                      [sg['name'] for sg in dev['resources']['secgroup']])
+        assert_equals(['app'],
+                      [sg['name'] for sg in prod['resources']['secgroup']])
+        assert_equals('m1.large', prod['resources']['instance'][0]['size'])
+
+    def test_resolve_sg_list_per_environment(self):
+        ds = """
+config:
+  name: ais
+  environments:
+      - dev
+      - prod
+resources:
+  secgroup:
+    - name: test
+      rules:
+        - port: 8000
+          protocol: tcp
+          source_cidr:
+            default:
+              - 10.0.0.0/8
+              - 192.168.0.0/16
+            prod: 54.76.250.234/32
+"""
+        parser = yaml_parser.YamlParser()
+        raw = parser.load(ds)
+        for _ in range(2):
+            dev = copy.deepcopy(parser.resolve(raw, self._args('dev')))
+            assert_equals(['192.168.0.0/16', '10.0.0.0/8'],
+                          [rule['source_cidr'] for rule in
+                           dev['resources']['secgroup'][0]['rules']])
+        prod = parser.resolve(raw, self._args('prod'))
+        assert_equals(['54.76.250.234/32'],
+                      [rule['source_cidr'] for rule in
+                       prod['resources']['secgroup'][0]['rules']])
+
+    def test_provisioner_args_per_environment(self):
+        ds = """
+config:
+  name: ais
+  environments:
+      - dev
+      - prod
+resources:
+  instance:
+    - name: app
+      image: ami-e97f849e
+      sshKey: bootstrap
+      provisioner:
+        provider: PuppetProvisioner
+        args:
+          infrastructure: app.tar.gz
+          bucket:
+            default: dev-bucket
+            prod: prod-bucket
+          custom_profile:
+            prod: prod-profile
+            default: profile
+"""
+        parser = yaml_parser.YamlParser()
+        raw = parser.load(ds)
+        args = parser.resolve(raw, self._args('prod'))['resources'][
+            'instance'][0]['provisioner']['args']
+        assert_equals('prod-bucket', args['bucket'])
+        assert_equals('prod-profile', args['custom_profile'])
+        args = parser.resolve(raw, self._args('dev'))['resources'][
+            'instance'][0]['provisioner']['args']
+        assert_equals('dev-bucket', args['bucket'])
+        assert_equals('profile', args['custom_profile'])
+
+    def test_imports_merged(self):
+        parser = yaml_parser.YamlParser()
+        stack = parser.parse_file('tests/data/yaml/imports.yaml',
+                                  self._args('prod'))
+        assert_equals('imports', stack['config']['name'])
+        assert_equals('vpc-1c50bd79', stack['config']['vpcid'])
+        assert_equals(['ssh', 'web'],
+                      [sg['name'] for sg in stack['resources']['secgroup']])
+        # The stack's own secgroup replaces the imported one
+        assert_equals([443], [rule['port'] for rule in
+                              stack['resources']['secgroup'][1]['rules']])
+        assert_equals(80, stack['resources']['load_balancer'][0][
+            'listener'][0]['lb_port'])
+        assert_equals('m1.large', stack['resources']['instance'][0]['size'])
+        assert_equals(sorted([
+            os.path.abspath('tests/data/yaml/lib/common.yaml'),
+            os.path.abspath('tests/data/yaml/lib/listener.yaml'),
+        ]), sorted(parser.dependencies()))
+        parser.validate()
+
+    def test_imports_resolve_matches_parse(self):
+        fname = 'tests/data/yaml/imports.yaml'
+        parser = yaml_parser.YamlParser()
+        args = self._args('dev')
+        args['stackfile'] = fname
+        raw = parser.load(parser.read_file(fname), args)
+        assert_equals(yaml_parser.YamlParser().parse_file(fname, args),
+                      parser.resolve(raw, args))
+
+    def test_imports_include_path(self):
+        ds = """
+imports: common.yaml
+config:
+  name: test
+resources: {}
+"""
+        parser = yaml_parser.YamlParser()
+        args = self._args('dev')
+        args['include_path'] = 'tests/data/nowhere, tests/data/yaml/lib'
+        stack = parser.parse(ds, args)
+        assert_equals('vpc-1c50bd79', stack['config']['vpcid'])
+        assert_equals(['ssh', 'web'],
+                      [sg['name'] for sg in stack['resources']['secgroup']])
+
+    def test_missing_import_raises(self):
+        ds = """
+imports: [nowhere.yaml]
+config:
+  name: test
+resources: {}
+"""
+        parser = yaml_parser.YamlParser()
+        assert_raises(ParserFailure, parser.parse, ds, self._args('dev'))
+
+    def test_import_loop_raises(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            for name, other in [('a', 'b'), ('b', 'a')]:
+                with open(os.path.join(tmpdir, '%s.yaml' % name), 'w') as fld:
+                    fld.write('imports: [%s.yaml]\n' % other)
+            ds = 'imports: [a.yaml]\nconfig: {name: test}\n'
+            args = self._args('dev')
+            args['include_path'] = [tmpdir]
+            assert_raises(ParserFailure, yaml_parser.YamlParser().parse, ds,
+                          args)
+        finally:
+            shutil.rmtree(tmpdir)
+
     def test__get_value_for_env_int_returns_int(self):
         parser = yaml_parser.YamlParser()
         data = 10
@@ -91,7 +274,7 @@ class TestParser(object):
         parser = yaml_parser.YamlParser()
         assert_raises(ParserFailure, parser.parse, config)
 
-    @mock.patch('jsonschema.validate', _mock_validate_raises)
+    @mock.patch('pmcf.schema.validator.validate', _mock_validate_raises)
     def test_schema_validation_failure_raises(self):
         parser = yaml_parser.YamlParser()
         # Append empty instance
@@ -159,6 +342,35 @@ resources:
         data = parser.parse(ds, args)
         assert_equals(len(data['resources']['secgroup'][0]['rules']), 5)
 
+    def test_sg_list_merged(self):
+        ds = """
+config:
+  name: ais
+  environments:
+      - dev
+resources:
+  secgroup:
+    - name: test
+      rules:
+        - port: 8000
+          protocol: tcp
+          source_cidr:
+            - 10.0.0.0/25
+            - 10.0.0.128/25
+            - 83.98.0.0/17
+        - port: 8001
+          protocol: tcp
+          source_cidr: 83.98.0.0/17
+"""
+        parser = yaml_parser.YamlParser()
+        data = parser.parse(ds, self._args('dev'))
+        assert_equals([
+            {'from_port': 8000, 'to_port': 8001, 'protocol': 'tcp',
+             'source_cidr': '83.98.0.0/17'},
+            {'port': 8000, 'protocol': 'tcp', 'source_cidr': '10.0.0.0/24'},
+        ], data['resources']['secgroup'][0]['rules'])
+        assert_equals(2, parser.rules_saved)
+
     def test_elb_prefix_multiple_lbs(self):
         ds = """
 config:
@@ -213,6 +425,42 @@ resources:
         assert_equals(prfxa, 'dev/ais/testelb/external')
         assert_equals(prfxb, 'dev/ais/testelb/internal')
 
+    def test_elb_fullprefix_used_as_written(self):
+        ds = """
+config:
+  name: ais
+  environments:
+      - dev
+resources:
+  load_balancer:
+    - name: testelb
+      listener:
+        - instance_port: 80
+          instance_protocol: HTTP
+          protocol: HTTP
+          lb_port: 80
+      policy:
+        - type: log_policy
+          policy:
+            emit_interval: 5
+            enabled: true
+            fullprefix: true
+            s3bucket: piksel-logging
+            s3prefix: logs/testelb
+      healthcheck:
+        protocol: HTTP
+        path: /
+        port: 80
+"""
+        data = yaml_parser.YamlParser().parse(ds, self._args('dev'))
+        policy = data['resources']['load_balancer'][0]['policy'][0]
+        assert_equals({
+            'emit_interval': 5,
+            'enabled': True,
+            's3bucket': 'piksel-logging',
+            's3prefix': 'logs/testelb',
+        }, policy['policy'])
+
     def test_instance_defaultsg(self):
         args = {
             'environment': 'stage',
@@ -12,8 +12,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-from nose.tools import assert_raises
+import mock
+from nose.tools import assert_equals, assert_raises
 
+from pmcf.exceptions import PolicyException
 from pmcf.policy import BasePolicy
 
 
@@ -30,3 +32,30 @@ class TestBasePolicy(object):
         assert_raises(NotImplementedError,
                       self.policy.validate_resource,
                       None, {})
+
+    def test_violations_reports_policy_exception(self):
+        with mock.patch.object(self.policy, 'validate_resource',
+                               side_effect=PolicyException('bad')):
+            violations = self.policy.violations('instance', {})
+        assert_equals(1, len(violations))
+        assert_equals('Policy violation: bad', violations[0]['message'])
+
+    def test_violations_empty_when_valid(self):
+        with mock.patch.object(self.policy, 'validate_resource',
+                               return_value=True):
+            assert_equals([], self.policy.violations('instance', {}))
+
+    def test_version_is_unknown(self):
+        assert_equals(None, self.policy.version())
+
+    def test_validate_stack_calls_validate_resource(self):
+        stack = {
+            'config': {'environment': 'dev'},
+            'resources': {'instance': [{'name': 'a'}, {'name': 'b'}]},
+        }
+        with mock.patch.object(self.policy, 'validate_resource',
+                               return_value=True) as validate:
+            self.policy.validate_stack(stack)
+        assert_equals(2, validate.call_count)
+        validate.assert_called_with('instance', {'name': 'b'},
+                                    environment='dev')
@@ -12,6 +12,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import copy
+import json
+import os
+import shutil
+import tempfile
+
+import mock
 from nose.tools import assert_equals, assert_raises
 
 from pmcf.exceptions import PolicyException
@@ -105,3 +112,261 @@ class TestJSONPolicy(object):
         policy = JSONPolicy(json_file='tests/data/etc/policy-instance.json')
         policy.validate_resource('instance', data)
         assert_equals(data['type'], 'm1.medium')
+
+    def test_violations_lists_every_field(self):
+        policy = JSONPolicy(json_file='tests/data/etc/policy-instance.json')
+        rules = copy.deepcopy(policy.json_policy)
+        rules['instance']['sshKey']['constraints'] = ['ioko']
+        policy.json_policy = rules
+        data = {'type': 'm2.xlarge', 'sshKey': 'other'}
+        violations = policy.violations('instance', data)
+        assert_equals(['sshKey', 'type'],
+                      sorted(v['field'] for v in violations))
+        for violation in violations:
+            assert_equals(data[violation['field']], violation['value'])
+        assert_equals('ami-e97f849e', data['image'])
+
+    def test_violations_clean_resource(self):
+        policy = JSONPolicy(json_file='tests/data/etc/policy-instance.json')
+        assert_equals([], policy.violations('instance', {}))
+        assert_equals([], policy.violations('wombat', {}))
+
+    def test_validate_resource_raises_first_violation(self):
+        policy = JSONPolicy(json_file='tests/data/etc/policy-instance.json')
+        try:
+            policy.validate_resource('instance', {'type': 'm2.xlarge'})
+        except PolicyException, exc:
+            assert_equals("Policy violation: Data field `type' with value "
+                          "`m2.xlarge' not allowed for `instance'",
+                          exc.message)
+        else:
+            raise AssertionError('resource should be invalid')
+
+    def test_version_follows_rules(self):
+        policy = JSONPolicy(json_file='tests/data/etc/policy-instance.json')
+        version = policy.version()
+        assert_equals(version, JSONPolicy(
+            json_file='tests/data/etc/policy-instance.json').version())
+        rules = copy.deepcopy(policy.json_policy)
+        rules['instance']['type']['default'] = 'm1.small'
+        policy.json_policy = rules
+        assert_equals(False, version == policy.version())
+
+    def _policy(self, rules):
+        policy = JSONPolicy(json_file='tests/data/etc/policy.json')
+        policy.json_policy = rules
+        return policy
+
+    def test_constraints_with_unhashable_values(self):
+        policy = self._policy({'instance': {'sg': {
+            'default': ['default'],
+            'constraints': [['default'], ['app']],
+        }}})
+        assert_equals([], policy.violations('instance', {'sg': ['app']}))
+        assert_equals(1, len(policy.violations('instance', {'sg': ['db']})))
+        assert_equals(1, len(policy.violations('instance', {'sg': {}})))
+
+    def test_unhashable_value_against_set(self):
+        policy = self._policy({'instance': {'size': {
+            'default': 'm1.small',
+            'constraints': ['m1.small'],
+        }}})
+        assert_equals(1, len(policy.violations('instance',
+                                               {'size': ['m1.small']})))
+
+    def test_defaults_are_not_shared(self):
+        policy = self._policy({'instance': {'sg': {'default': ['default']}}})
+        first = {}
+        second = {}
+        policy.validate_resource('instance', first)
+        policy.validate_resource('instance', second)
+        first['sg'].append('app')
+        assert_equals(['default'], second['sg'])
+
+    def test_no_default_and_unset_is_not_checked(self):
+        policy = self._policy({'instance': {'size': {
+            'constraints': ['m1.small'],
+        }}})
+        data = {}
+        assert_equals(True, policy.validate_resource('instance', data))
+        assert_equals({}, data)
+
+    def test_range(self):
+        policy = self._policy({'instance': {'count': {
+            'default': 1,
+            'minimum': 1,
+            'maximum': 10,
+        }}})
+        for value, ok in [(1, True), (10, True), (5.5, True), (0, False),
+                          (11, False), ('3', False), (True, False)]:
+            assert_equals(ok, not policy.violations('instance',
+                                                    {'count': value}))
+        try:
+            policy.validate_resource('instance', {'count': 11})
+        except PolicyException, exc:
+            assert_equals("Policy violation: Data field `count' with value "
+                          "`11' is above 10 for `instance'", exc.message)
+
+    def test_pattern(self):
+        policy = self._policy({'instance': {'image': {
+            'default': 'ami-00000000',
+            'pattern': '^ami-[0-9a-f]{8}$',
+        }}})
+        assert_equals([], policy.violations('instance',
+                                            {'image': 'ami-0bceb93b'}))
+        problems = policy.violations('instance', {'image': 'ubuntu'})
+        assert_equals("Data field `image' with value `ubuntu' does not "
+                      "match `^ami-[0-9a-f]{8}$' for `instance'",
+                      problems[0]['message'])
+        assert_equals(1, len(policy.violations('instance', {'image': 5})))
+
+    def test_bad_rules_raise(self):
+        for rules in [[], {'instance': ['size']}, {'instance': {'size': 'big'}},
+                      {'instance': {'count': {'minimum': 'one'}}},
+                      {'instance': {'image': {'pattern': '('}}}]:
+            assert_raises(PolicyException, self._policy, rules)
+
+    def test_environment_overrides(self):
+        policy = self._policy({'instance': {'size': {
+            'default': 'm1.small',
+            'constraints': ['m1.small', 'm1.medium'],
+            'environments': {
+                'prod': {
+                    'default': 'm1.large',
+                    'constraints': ['m1.large'],
+                },
+            },
+        }}})
+        data = {}
+        policy.validate_resource('instance', data, environment='prod')
+        assert_equals('m1.large', data['size'])
+        data = {}
+        policy.validate_resource('instance', data, environment='stage')
+        assert_equals('m1.small', data['size'])
+        assert_raises(PolicyException, policy.validate_resource,
+                      'instance', {'size': 'm1.small'}, 'prod')
+
+    def test_validate_stack(self):
+        policy = self._policy({'instance': {'size': {
+            'default': 'm1.small',
+            'constraints': ['m1.small', 'm1.large'],
+            'environments': {'prod': {'default': 'm1.large'}},
+        }}})
+        stack = {
+            'config': {'environment': 'prod'},
+            'resources': {
+                'instance': [{'name': 'a'}, {'name': 'b', 'size': 'm1.small'}],
+                'secgroup': [{'name': 'a'}],
+            },
+        }
+        policy.validate_stack(stack)
+        assert_equals(['m1.large', 'm1.small'],
+                      [inst['size'] for inst in stack['resources']['instance']])
+        assert_equals({'name': 'a'}, stack['resources']['secgroup'][0])
+        stack['resources']['instance'][0]['size'] = 'm1.medium'
+        assert_raises(PolicyException, policy.validate_stack, stack)
+
+    def test_validate_stack_matches_validate_resource(self):
+        policy = JSONPolicy(json_file='tests/data/etc/policy-instance.json')
+        stack = {
+            'config': {},
+            'resources': {'instance': [{'name': 'a'}, {'type': 'm1.small'}]},
+        }
+        expected = copy.deepcopy(stack)
+        for data in expected['resources']['instance']:
+            policy.validate_resource('instance', data)
+        policy.validate_stack(stack)
+        assert_equals(expected, stack)
+
+
+class TestJSONPolicyLayers(object):
+
+    def __init__(self):
+        self.tmpdir = None
+        self.base = None
+
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.base = os.path.join(self.tmpdir, 'policy.json')
+        self._write(self.base, {
+            'instance': {'size': {'default': 'm1.small'}}
+        })
+        self._write(os.path.join(self.tmpdir, 'policy.d', 'environments',
+                                 'prod.json'), {
+            'instance': {'size': {'default': 'm1.large'}}
+        })
+
+    def teardown(self):
+        shutil.rmtree(self.tmpdir)
+
+    @staticmethod
+    def _write(fname, data):
+        if not os.path.isdir(os.path.dirname(fname)):
+            os.makedirs(os.path.dirname(fname))
+        mtime = None
+        if os.path.exists(fname):
+            mtime = os.stat(fname).st_mtime + 10
+        with open(fname, 'w') as fld:
+            fld.write(json.dumps(data))
+        if mtime:
+            os.utime(fname, (mtime, mtime))
+
+    def test_environment_overlay_applies(self):
+        policy = JSONPolicy(json_file=self.base)
+        dev = {}
+        prod = {}
+        policy.validate_resource('instance', dev, environment='dev')
+        policy.validate_resource('instance', prod, environment='prod')
+        assert_equals('m1.small', dev['size'])
+        assert_equals('m1.large', prod['size'])
+
+    def test_overlays_option(self):
+        extra = os.path.join(self.tmpdir, 'extra.json')
+        self._write(extra, {'instance': {'size': {'default': 'm1.medium'}}})
+        policy = JSONPolicy(json_file=self.base, overlays=extra)
+        data = {}
+        policy.validate_resource('instance', data)
+        assert_equals('m1.medium', data['size'])
+
+    def test_input_files(self):
+        files = JSONPolicy(json_file=self.base).input_files()
+        assert_equals(self.base, files[0])
+        assert_equals(True, os.path.join(self.tmpdir, 'policy.d') in files)
+        assert_equals(True, os.path.join(self.tmpdir, 'policy.d',
+                                         'environments', 'prod.json') in files)
+
+    def test_compiled_policy_cached(self):
+        cachedir = os.path.join(self.tmpdir, 'cache')
+        expected = JSONPolicy(json_file=self.base, cachedir=cachedir)
+        with mock.patch('pmcf.policy.layers.load') as load:
+            policy = JSONPolicy(json_file=self.base, cachedir=cachedir)
+        assert_equals(0, load.call_count)
+        assert_equals(expected.json_policy, policy.json_policy)
+        assert_equals(expected.version(), policy.version())
+        data = {}
+        policy.validate_resource('instance', data, environment='prod')
+        assert_equals('m1.large', data['size'])
+
+    def test_cache_invalidated_by_overlay_change(self):
+        cachedir = os.path.join(self.tmpdir, 'cache')
+        before = JSONPolicy(json_file=self.base, cachedir=cachedir)
+        self._write(os.path.join(self.tmpdir, 'policy.d', 'environments',
+                                 'prod.json'), {
+            'instance': {'size': {'default': 'm1.xlarge'}}
+        })
+        after = JSONPolicy(json_file=self.base, cachedir=cachedir)
+        assert_equals(False, before.version() == after.version())
+        data = {}
+        after.validate_resource('instance', data, environment='prod')
+        assert_equals('m1.xlarge', data['size'])
+
+    def test_cache_invalidated_by_new_overlay(self):
+        cachedir = os.path.join(self.tmpdir, 'cache')
+        JSONPolicy(json_file=self.base, cachedir=cachedir)
+        self._write(os.path.join(self.tmpdir, 'policy.d', 'size.json'), {
+            'instance': {'size': {'default': 'm1.medium'}}
+        })
+        data = {}
+        JSONPolicy(json_file=self.base, cachedir=cachedir).validate_resource(
+            'instance', data)
+        assert_equals('m1.medium', data['size'])
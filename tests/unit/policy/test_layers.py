@@ -0,0 +1,149 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import os
+import shutil
+import tempfile
+
+from nose.tools import assert_equals, assert_raises
+
+from pmcf.exceptions import PolicyException
+from pmcf.policy import layers
+
+
+class TestLayers(object):
+
+    def __init__(self):
+        self.tmpdir = None
+        self.base = None
+
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.base = os.path.join(self.tmpdir, 'policy.json')
+        self._write(self.base, {
+            'instance': {
+                'size': {'default': 'm1.small'},
+                'monitoring': {'default': False},
+            }
+        })
+
+    def teardown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, fname, data):
+        fname = os.path.join(self.tmpdir, fname)
+        if not os.path.isdir(os.path.dirname(fname)):
+            os.makedirs(os.path.dirname(fname))
+        with open(fname, 'w') as fld:
+            fld.write(json.dumps(data))
+        return fname
+
+    def test_overlay_dir(self):
+        assert_equals('/etc/pmcf/policy.d',
+                      layers.overlay_dir('/etc/pmcf/policy.json'))
+
+    def test_base_file_only(self):
+        assert_equals([(self.base, None)], layers.policy_files(self.base))
+
+    def test_file_order(self):
+        second = self._write('policy.d/20-second.json', {})
+        first = self._write('policy.d/10-first.json', {})
+        prod = self._write('policy.d/environments/prod.json', {})
+        extra = self._write('extra.json', {})
+        assert_equals([
+            (self.base, None),
+            (first, None),
+            (second, None),
+            (extra, None),
+            (prod, 'prod'),
+        ], layers.policy_files(self.base, [extra]))
+
+    def test_overlays_as_string(self):
+        files = layers.policy_files(self.base, 'a.json, b.json,')
+        assert_equals([(self.base, None), ('a.json', None), ('b.json', None)],
+                      files)
+
+    def test_merge_replaces_field_settings(self):
+        policy = {'instance': {'size': {'default': 'm1.small',
+                                        'constraints': ['m1.small']}}}
+        layers.merge(policy, {
+            'instance': {
+                'size': {'constraints': ['m1.small', 'm1.large']},
+                'count': {'maximum': 10},
+            },
+            'secgroup': {'name': {'pattern': '^sg'}},
+        })
+        assert_equals({
+            'instance': {
+                'size': {
+                    'default': 'm1.small',
+                    'constraints': ['m1.small', 'm1.large'],
+                },
+                'count': {'maximum': 10},
+            },
+            'secgroup': {'name': {'pattern': '^sg'}},
+        }, policy)
+
+    def test_merge_environment_overlay(self):
+        policy = {'instance': {'size': {
+            'default': 'm1.small',
+            'environments': {'prod': {'constraints': ['m1.large']}},
+        }}}
+        layers.merge(policy, {'instance': {'size': {'default': 'm1.large'}}},
+                     'prod')
+        assert_equals({'instance': {'size': {
+            'default': 'm1.small',
+            'environments': {'prod': {'constraints': ['m1.large'],
+                                      'default': 'm1.large'}},
+        }}}, policy)
+
+    def test_merge_nested_environments(self):
+        policy = {'instance': {'size': {
+            'environments': {'prod': {'default': 'm1.large'}},
+        }}}
+        layers.merge(policy, {'instance': {'size': {
+            'environments': {'prod': {'constraints': ['m1.large']},
+                             'qa': {'default': 'm1.medium'}},
+        }}})
+        assert_equals({'prod': {'default': 'm1.large',
+                                'constraints': ['m1.large']},
+                       'qa': {'default': 'm1.medium'}},
+                      policy['instance']['size']['environments'])
+
+    def test_load(self):
+        self._write('policy.d/10-size.json', {
+            'instance': {'size': {'constraints': ['m1.small', 'm1.large']}}
+        })
+        self._write('policy.d/environments/prod.json', {
+            'instance': {'size': {'default': 'm1.large'}}
+        })
+        policy = layers.load(layers.policy_files(self.base))
+        assert_equals({
+            'default': 'm1.small',
+            'constraints': ['m1.small', 'm1.large'],
+            'environments': {'prod': {'default': 'm1.large'}},
+        }, policy['instance']['size'])
+        assert_equals({'default': False}, policy['instance']['monitoring'])
+
+    def test_missing_overlay_raises(self):
+        files = layers.policy_files(self.base, ['nonexistent.json'])
+        assert_raises(PolicyException, layers.load, files)
+
+    def test_bad_overlay_raises(self):
+        for data in [[], {'instance': ['size']},
+                     {'instance': {'size': 'm1.small'}}]:
+            self._write('policy.d/bad.json', data)
+            assert_raises(PolicyException, layers.load,
+                          layers.policy_files(self.base))
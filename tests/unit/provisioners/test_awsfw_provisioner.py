@@ -14,6 +14,7 @@
 
 import email
 from nose.tools import assert_equals
+import os
 
 from pmcf.provisioners.awsfw import AWSFWProvisioner
 
@@ -67,3 +68,13 @@ class TestAWSFWProvisioner(object):
                     vars_data[key] = val
 
         assert_equals(vars_data, self.config)
+
+    def test_input_files_match_userdata_files(self):
+        files = AWSFWProvisioner().input_files()
+        fnames = []
+        for part in self.message.walk():
+            if part.get_content_maintype() == 'multipart':
+                continue
+            fnames.append(part.get_filename())
+        assert_equals(sorted(os.path.basename(f) for f in files),
+                      sorted(f for f in fnames if f != 'vars'))
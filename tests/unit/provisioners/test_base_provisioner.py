@@ -39,6 +39,9 @@ class TestBaseProvisioner(object):
     def test_provisioner_wants_wait_returns_false(self):
         assert_equals(False, self.provisioner.wants_wait())
 
+    def test_provisioner_input_files_empty(self):
+        assert_equals([], self.provisioner.input_files())
+
     def test_parse_raises(self):
         assert_raises(NotImplementedError, self.provisioner.userdata, {})
 
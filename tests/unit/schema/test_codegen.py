@@ -0,0 +1,171 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import copy
+
+import jsonschema
+from jsonschema.exceptions import ValidationError
+import mock
+from nose.tools import assert_equals, assert_raises
+
+from pmcf.schema.codegen import compile_schema, SchemaCompiler
+from pmcf.schema.compiled import schema as compiled_schema
+from pmcf.schema import validator
+
+from tests.unit.schema.test_base_schema import TestBaseSchema
+from tests.unit.schema.test_validator import _stack
+
+FAST = compile_schema(compiled_schema)
+
+
+def _check_base_schema_case(name):
+    # Every document the base schema tests validate must get the same
+    # answer from the generated validator as from jsonschema
+    real = jsonschema.validate
+    seen = []
+
+    def _validate(data, schema, *args, **kwargs):
+        seen.append(data)
+        assert_equals(validator.VALIDATOR.is_valid(data), FAST(data))
+        return real(data, schema, *args, **kwargs)
+
+    with mock.patch('jsonschema.validate', side_effect=_validate):
+        getattr(TestBaseSchema(), name)()
+
+
+def test_base_schema_cases():
+    for name in sorted(dir(TestBaseSchema)):
+        if name.startswith('test_'):
+            yield _check_base_schema_case, name
+
+
+class TestSchemaCompiler(object):
+
+    def test_valid_stack(self):
+        assert_equals(True, FAST(_stack()))
+
+    def test_invalid_stacks(self):
+        for path, value in [('count', 'three'),
+                            ('count', True),
+                            ('provisioner', {'provider': 'Nope'}),
+                            ('provisioner', ['NoopProvisioner']),
+                            ('sg', 'app'),
+                            ('bogus', 1)]:
+            stack = _stack()
+            stack['resources']['instance'][0][path] = value
+            assert_equals(False, FAST(stack))
+            assert_equals(False, validator.VALIDATOR.is_valid(stack))
+
+    def test_not_a_stack(self):
+        for data in [None, [], 'stack', {}]:
+            assert_equals(False, FAST(data))
+
+    def test_types_match_jsonschema(self):
+        fast = compile_schema({
+            'type': 'object',
+            'properties': {
+                'int': {'type': 'integer'},
+                'num': {'type': 'number', 'minimum': 1},
+                'str': {'type': ['string', 'null']},
+            },
+        })
+        for data in [{'int': 1}, {'int': 1L}, {'int': True}, {'int': 1.5},
+                     {'num': 1.5}, {'num': False}, {'num': 0},
+                     {'str': u'x'}, {'str': None}, {'str': 1}]:
+            assert_equals(jsonschema.Draft4Validator({
+                'type': 'object',
+                'properties': {
+                    'int': {'type': 'integer'},
+                    'num': {'type': 'number', 'minimum': 1},
+                    'str': {'type': ['string', 'null']},
+                },
+            }).is_valid(data), fast(data))
+
+    def test_oneof_dispatches_on_provider(self):
+        schema = {
+            'definitions': {
+                'a': {
+                    'type': 'object',
+                    'required': ['provider', 'x'],
+                    'properties': {'provider': {'enum': ['A']}},
+                },
+                'b': {
+                    'type': 'object',
+                    'required': ['provider'],
+                    'properties': {'provider': {'enum': ['B', 'C']}},
+                },
+            },
+            'oneOf': [
+                {'$ref': '#/definitions/a'},
+                {'$ref': '#/definitions/b'},
+            ],
+        }
+        source = SchemaCompiler(schema).source()
+        assert_equals(True, "'B': (" in source)
+        fast = compile_schema(schema)
+        for data in [{'provider': 'A', 'x': 1}, {'provider': 'A'},
+                     {'provider': 'C'}, {'provider': 'D'}, {'provider': []},
+                     {}, []]:
+            assert_equals(jsonschema.Draft4Validator(schema).is_valid(data),
+                          fast(data))
+
+    def test_oneof_without_discriminator(self):
+        schema = {'oneOf': [{'type': 'integer'}, {'minimum': 2}]}
+        fast = compile_schema(schema)
+        for data in [1, 2, 2.5, 'x']:
+            assert_equals(jsonschema.Draft4Validator(schema).is_valid(data),
+                          fast(data))
+
+    def test_unsupported_keyword_raises(self):
+        assert_raises(NotImplementedError, compile_schema,
+                      {'type': 'string', 'pattern': '^a'})
+
+    def test_generated_stacks_match_jsonschema(self):
+        stack = _stack()
+        stack['resources']['instance'] = [
+            copy.deepcopy(stack['resources']['instance'][0])
+            for _ in range(50)]
+        assert_equals(True, FAST(stack))
+        stack['resources']['instance'][-1]['size'] = 1
+        assert_equals(False, FAST(stack))
+        assert_equals(False, validator.VALIDATOR.is_valid(stack))
+
+
+class TestValidate(object):
+
+    def test_valid_stack_skips_jsonschema(self):
+        with mock.patch.object(validator.VALIDATOR, 'validate') as jsv:
+            validator.validate(_stack())
+        assert_equals(False, jsv.called)
+
+    def test_invalid_stack_raises_jsonschema_error(self):
+        stack = _stack()
+        stack['resources']['instance'][0]['count'] = 'three'
+        try:
+            validator.VALIDATOR.validate(stack)
+        except ValidationError, exc:
+            expected = str(exc)
+        try:
+            validator.validate(stack)
+        except ValidationError, exc:
+            assert_equals(expected, str(exc))
+        else:
+            raise AssertionError('stack should be invalid')
+
+    def test_without_generated_validator(self):
+        stack = _stack()
+        with mock.patch.object(validator, 'FAST_VALIDATE', None):
+            assert_equals(None, validator.validate(stack))
+            stack.pop('config')
+            assert_raises(ValidationError, validator.validate, stack)
@@ -0,0 +1,132 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import jsonschema
+from jsonschema.exceptions import ValidationError
+import mock
+from nose.tools import assert_equals, assert_raises
+import yaml
+
+from pmcf.schema.base import schema as base_schema
+from pmcf.schema.compiled import schema as compiled_schema
+from pmcf.schema import validator
+
+
+def _stack():
+    return {
+        'config': {'name': 'test', 'environment': 'dev'},
+        'resources': {
+            'secgroup': [{
+                'name': 'app',
+                'rules': [{
+                    'port': 80,
+                    'protocol': 'tcp',
+                    'source_cidr': '0.0.0.0/0',
+                }],
+            }],
+            'load_balancer': [],
+            'db': [],
+            'cdn': [],
+            'instance': [{
+                'name': 'app',
+                'count': 1,
+                'image': 'ami-0bceb93b',
+                'monitoring': False,
+                'sshKey': 'bootstrap',
+                'size': 'm1.small',
+                'sg': ['app'],
+                'lb': [],
+                'provisioner': {'provider': 'NoopProvisioner', 'args': {}},
+            }],
+        },
+    }
+
+
+class TestValidator(object):
+
+    def test_compiled_schema_matches_yaml(self):
+        # Run tools/compile_schema.py if this fails
+        assert_equals(yaml.safe_load(base_schema), compiled_schema)
+
+    def test_compiled_schema_is_valid(self):
+        jsonschema.Draft4Validator.check_schema(compiled_schema)
+
+    def test_validate_succeeds(self):
+        assert_equals(None, validator.validate(_stack()))
+
+    def test_validate_errors_match_jsonschema(self):
+        for path, value in [('count', 'three'),
+                             ('provisioner', {'provider': 'Nope'}),
+                             ('sg', 'app')]:
+            stack = _stack()
+            stack['resources']['instance'][0][path] = value
+            try:
+                jsonschema.validate(stack, yaml.safe_load(base_schema))
+            except ValidationError, exc:
+                expected = str(exc)
+            try:
+                validator.validate(stack)
+            except ValidationError, exc:
+                assert_equals(expected, str(exc))
+            else:
+                raise AssertionError('%s should be invalid' % path)
+
+    def test_validate_missing_config_raises(self):
+        stack = _stack()
+        stack.pop('config')
+        assert_raises(ValidationError, validator.validate, stack)
+
+    def test_resolver_walks_each_pointer_once(self):
+        resolver = validator.CachingRefResolver.from_schema(compiled_schema)
+        walk = jsonschema.RefResolver.resolve_fragment
+        with mock.patch.object(jsonschema.RefResolver, 'resolve_fragment',
+                               autospec=True, side_effect=walk) as resolve:
+            jsonschema.Draft4Validator(
+                compiled_schema, resolver=resolver).validate(_stack())
+            calls = resolve.call_count
+            jsonschema.Draft4Validator(
+                compiled_schema, resolver=resolver).validate(_stack())
+        assert_equals(calls > 0, True)
+        assert_equals(calls, resolve.call_count)
+
+    def test_validate_skips_known_resources(self):
+        stack = _stack()
+        stack['resources']['instance'][0]['count'] = 'three'
+        known = set([id(stack['resources']['instance'][0])])
+        assert_equals(None, validator.validate(stack, known))
+        stack['resources']['secgroup'][0]['name'] = 5
+        assert_raises(ValidationError, validator.validate, stack, known)
+
+    def test_validate_skip_checks_stack(self):
+        stack = _stack()
+        known = set([id(stack['resources']['instance'][0])])
+        stack['bogus'] = True
+        assert_raises(ValidationError, validator.validate, stack, known)
+
+    def test_validate_skip_error_describes_whole_stack(self):
+        stack = _stack()
+        stack['resources']['instance'].insert(0, dict(
+            stack['resources']['instance'][0]))
+        stack['resources']['instance'][1]['count'] = 'three'
+        known = set([id(stack['resources']['instance'][0])])
+        try:
+            validator.VALIDATOR.validate(stack)
+        except ValidationError, exc:
+            expected = str(exc)
+        try:
+            validator.validate(stack, known)
+        except ValidationError, exc:
+            assert_equals(expected, str(exc))
+        else:
+            raise AssertionError('stack should be invalid')
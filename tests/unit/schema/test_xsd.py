@@ -0,0 +1,111 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import tempfile
+
+import mock
+from nose.tools import assert_equals, assert_raises
+
+from pmcf.exceptions import ParserFailure
+from pmcf.schema import xsd
+
+XSD = 'tests/data/awsfw/c4farm.xsd'
+
+
+def _read(fname):
+    with open('tests/data/awsfw/%s' % fname) as fld:
+        return fld.read()
+
+
+class TestXSD(object):
+
+    def setup(self):
+        self.cache = xsd.SchemaCache()
+
+    def test_valid(self):
+        assert_equals([], self.cache.validate(_read('ais-test-farm.xml'),
+                                              XSD))
+
+    def test_invalid_reports_lines(self):
+        errors = self.cache.validate(_read('su2c-v2.xml'), XSD)
+        assert_equals(1, len(errors))
+        assert_equals(3, errors[0][0])
+        assert 'farmName' in errors[0][1]
+
+    def test_syntax_error_reports_lines(self):
+        # Earlier failures must not leak into the report
+        self.cache.validate(_read('su2c-v2.xml'), XSD)
+        errors = self.cache.validate(_read('ais-stage-farm-broken.xml'), XSD)
+        assert_equals(1, len(errors))
+        assert_equals(4, errors[0][0])
+
+    def test_entities_not_resolved(self):
+        config = '<!DOCTYPE c4farm [<!ENTITY e SYSTEM "file:///etc/hosts">]>'\
+                 '<c4farm>&e;</c4farm>'
+        errors = self.cache.validate(config, XSD)
+        assert_equals(1, len(errors))
+
+    def test_unicode(self):
+        config = _read('ais-test-farm.xml').decode('utf-8')
+        assert_equals([], self.cache.validate(config, XSD))
+
+    def test_schema_compiled_once(self):
+        self.cache.validate(_read('ais-test-farm.xml'), XSD)
+        self.cache.validate(_read('su2c-v2.xml'), XSD)
+        assert_equals(1, len(self.cache))
+        assert_equals(1, self.cache.misses)
+        assert_equals(1, self.cache.hits)
+
+    def test_schema_recompiled_on_change(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            fname = os.path.join(tmpdir, 'farm.xsd')
+            shutil.copy(XSD, fname)
+            self.cache.validate(_read('ais-test-farm.xml'), fname)
+            with open(fname, 'a') as fld:
+                fld.write('\n')
+            self.cache.validate(_read('ais-test-farm.xml'), fname)
+            assert_equals(2, self.cache.misses)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_bad_schema_raises(self):
+        assert_raises(ParserFailure, self.cache.validate,
+                      _read('ais-test-farm.xml'),
+                      'tests/data/awsfw/ais-test-farm.xml')
+
+    def test_missing_schema_raises(self):
+        assert_raises(ParserFailure, self.cache.validate,
+                      _read('ais-test-farm.xml'), 'tests/data/missing.xsd')
+
+    @mock.patch.dict('sys.modules', {'lxml': None})
+    def test_no_lxml_raises(self):
+        assert_raises(ParserFailure, self.cache.validate,
+                      _read('ais-test-farm.xml'), XSD)
+
+    def test_validate_raises_with_every_error(self):
+        config = _read('ais-stage-farm-noinstances.xml')
+        try:
+            xsd.validate(config, XSD, self.cache)
+        except ParserFailure, exc:
+            assert 'line 10:' in exc.message
+            assert 'line 2:' in exc.message
+        else:
+            raise AssertionError('ParserFailure not raised')
+
+    def test_validate_valid(self):
+        assert_equals(None, xsd.validate(_read('ais-test-farm.xml'), XSD,
+                                         self.cache))
@@ -13,6 +13,8 @@
 #    under the License.
 
 from nose.tools import assert_equals
+import pickle
+
 from pmcf import exceptions
 
 
@@ -67,3 +69,10 @@ class TestException(object):
             raiser(msg)
         except exceptions.AuditException, e:
             assert_equals(e.message, "Error during audit logging: " + msg)
+
+    def test_pickled_message_unchanged(self):
+        exc = exceptions.ProvisionerException('test message')
+        copy = pickle.loads(pickle.dumps(exc, pickle.HIGHEST_PROTOCOL))
+        assert_equals(exceptions.ProvisionerException, type(copy))
+        assert_equals(exc.message, copy.message)
+        assert_equals(exc.args, copy.args)
@@ -12,13 +12,16 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import json
 import mock
 from nose.tools import assert_equals, assert_not_equal, assert_raises
+import subprocess
 import sys
 import tempfile
 
 from pmcf import exceptions
 from pmcf import utils
+from pmcf.utils.template import TemplateDocument
 
 
 def _mock_is_term():
@@ -144,6 +147,68 @@ class TestUtils(object):
         output = utils.valchange(a, b)
         assert_equals(True, len(output) == 1)
 
+    def test_diff_resources_same_data(self):
+        data = '{"Resources": {"a": {"Type": "x"}}}'
+        ret = utils.diff_resources(data, data)
+        assert_equals(ret, {'added': [], 'removed': [], 'changed': []})
+
+    def test_diff_resources_different_data(self):
+        old = '{"Resources": {"a": {"Type": "x"}, "b": {"Type": "y"}}}'
+        new = '{"Resources": {"b": {"Type": "z"}, "c": {"Type": "x"}}}'
+        ret = utils.diff_resources(old, new)
+        assert_equals(ret, {'added': ['c'], 'removed': ['a'],
+                            'changed': ['b']})
+
+    def test_diff_resources_same_digest_not_parsed(self):
+        old = TemplateDocument('{"Resources": {"a": {}}}')
+        new = TemplateDocument('{"Resources":{"a":{}}}')
+        with mock.patch('json.loads', wraps=json.loads) as loads:
+            ret = utils.diff_resources(old, new)
+            ret = utils.diff_resources(old, new)
+        assert_equals(ret, {'added': [], 'removed': [], 'changed': []})
+        assert_equals(2, loads.call_count)
+
+    def test_diff_resources_not_json_raises(self):
+        assert_raises(ValueError, utils.diff_resources, 'foo', '{}')
+
+    def test_environment_drift_same_data(self):
+        data = '{"Resources": {"a": {"Properties": {"b": 1}}}}'
+        ret = utils.environment_drift({'dev': data, 'prod': data})
+        assert_equals(ret, {})
+
+    def test_environment_drift_different_data(self):
+        dev = ('{"Resources": {"a": {"Properties": {"b": 1, "c": 2}}, '
+               '"d": {"Properties": {}}}}')
+        prod = '{"Resources": {"a": {"Properties": {"b": 1, "c": 3}}}}'
+        ret = utils.environment_drift({'dev': dev, 'prod': prod})
+        assert_equals(ret, {
+            'a': {'missing': [], 'properties': ['c']},
+            'd': {'missing': ['prod'], 'properties': []},
+        })
+
+    def test_environment_drift_not_json_raises(self):
+        assert_raises(ValueError, utils.environment_drift, {'dev': 'foo'})
+
+    def test_lazy_package_resolves_classes_on_use(self):
+        import pmcf.policy
+        assert_equals(isinstance(pmcf.policy, utils.LazyModule), True)
+        from pmcf.policy.json_policy import JSONPolicy
+        assert_equals(pmcf.policy.JSONPolicy is JSONPolicy, True)
+        assert_equals('JSONPolicy' in pmcf.policy.__all__, True)
+
+    def test_lazy_package_missing_class_raises(self):
+        assert_raises(exceptions.PropertyException, utils.import_from_string,
+                      'pmcf.outputs', 'NoSuchOutput')
+
+    def test_json_output_does_not_import_boto(self):
+        code = ('import sys; import pmcf.cli.cli; '
+                'from pmcf.outputs import JSONOutput; '
+                'print [m for m in ["boto", "curses", "jsonschema", '
+                '"netaddr"] if m in sys.modules]')
+        proc = subprocess.Popen([sys.executable, '-c', code],
+                                stdout=subprocess.PIPE)
+        assert_equals(proc.communicate()[0].strip(), '[]')
+
     def test_split_subnets_one(self):
         assert_equals(1, len(utils.split_subnets('10.0.0.0/8', 1)))
 
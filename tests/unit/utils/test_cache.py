@@ -0,0 +1,131 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from nose.tools import assert_equals
+import os
+import shutil
+import stat
+import tempfile
+import time
+
+from pmcf.utils.cache import DiskCache, file_signature
+
+
+class TestDiskCache(object):
+
+    def __init__(self):
+        self.tmpdir = None
+        self.cache = None
+
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = DiskCache(os.path.join(self.tmpdir, 'cache'))
+
+    def teardown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_key_is_stable(self):
+        assert_equals(DiskCache.key('a', {'b': 1, 'c': 2}),
+                      DiskCache.key('a', {'c': 2, 'b': 1}))
+
+    def test_key_differs(self):
+        assert_equals(DiskCache.key('a', 'b') == DiskCache.key('a', 'c'),
+                      False)
+
+    def test_get_missing_returns_none(self):
+        assert_equals(None, self.cache.get(DiskCache.key('a')))
+
+    def test_set_then_get(self):
+        key = DiskCache.key('a')
+        self.cache.set(key, {'resources': [1, 2]})
+        assert_equals({'resources': [1, 2]}, self.cache.get(key))
+
+    def test_entries_are_private(self):
+        key = DiskCache.key('a')
+        self.cache.set(key, 'secret')
+        mode = os.stat(self.cache._path(key)).st_mode
+        assert_equals(0, mode & (stat.S_IRWXG | stat.S_IRWXO))
+        mode = os.stat(self.cache.cachedir).st_mode
+        assert_equals(0, mode & (stat.S_IRWXG | stat.S_IRWXO))
+
+    def test_no_temporary_files_left(self):
+        self.cache.set(DiskCache.key('a'), 'a')
+        assert_equals([DiskCache.key('a') + '.pickle'],
+                      os.listdir(self.cache.cachedir))
+
+    def test_changed_dependency_invalidates(self):
+        dep = os.path.join(self.tmpdir, 'dep')
+        with open(dep, 'w') as fld:
+            fld.write('one')
+        key = DiskCache.key('a')
+        self.cache.set(key, 'value', [dep])
+        assert_equals('value', self.cache.get(key))
+        with open(dep, 'w') as fld:
+            fld.write('three')
+        assert_equals(None, self.cache.get(key))
+
+    def test_missing_dependency_invalidates(self):
+        dep = os.path.join(self.tmpdir, 'dep')
+        with open(dep, 'w') as fld:
+            fld.write('one')
+        key = DiskCache.key('a')
+        self.cache.set(key, 'value', [dep])
+        os.unlink(dep)
+        assert_equals(None, self.cache.get(key))
+
+    def test_corrupt_entry_ignored(self):
+        key = DiskCache.key('a')
+        self.cache.set(key, 'value')
+        with open(self.cache._path(key), 'w') as fld:
+            fld.write('garbage')
+        assert_equals(None, self.cache.get(key))
+
+    def test_evicts_least_recently_used(self):
+        keys = [DiskCache.key(i) for i in range(3)]
+        for idx, key in enumerate(keys):
+            self.cache.set(key, 'x' * 100)
+            old = time.time() - 100 + idx
+            os.utime(self.cache._path(key), (old, old))
+        self.cache.max_size = os.path.getsize(self.cache._path(keys[0])) * 2
+        # Reading the oldest entry makes it the most recently used
+        self.cache.get(keys[0])
+        self.cache.evict()
+        assert_equals(sorted([keys[0] + '.pickle', keys[2] + '.pickle']),
+                      sorted(os.listdir(self.cache.cachedir)))
+
+    def test_unwritable_cache_is_ignored(self):
+        blocker = os.path.join(self.tmpdir, 'file')
+        with open(blocker, 'w') as fld:
+            fld.write('')
+        cache = DiskCache(os.path.join(blocker, 'cache'))
+        cache.set(DiskCache.key('a'), 'value')
+        assert_equals(None, cache.get(DiskCache.key('a')))
+
+    def test_shared_cache_is_ignored(self):
+        key = DiskCache.key('a')
+        self.cache.set(key, 'value')
+        os.chmod(self.cache.cachedir, 0777)
+        assert_equals(None, self.cache.get(key))
+        self.cache.set(DiskCache.key('b'), 'value')
+        assert_equals([key + '.pickle'], os.listdir(self.cache.cachedir))
+
+    def test_cache_of_other_user_is_ignored(self):
+        key = DiskCache.key('a')
+        self.cache.set(key, 'value')
+        with mock.patch('os.getuid', return_value=os.getuid() + 1):
+            assert_equals(None, self.cache.get(key))
+
+    def test_file_signature_missing_file(self):
+        assert_equals(None, file_signature(os.path.join(self.tmpdir, 'nope')))
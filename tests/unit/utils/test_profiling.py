@@ -0,0 +1,97 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from nose.tools import assert_equals
+import os
+import pstats
+import shutil
+import tempfile
+
+from pmcf.utils import profiling
+from pmcf.utils.timing import Timings
+
+
+def _profiled_function():
+    return sum(range(10))
+
+
+def _unprofiled_function():
+    return sum(range(10))
+
+
+def _names(profiler):
+    profiler.profile.create_stats()
+    return [func[2] for func in pstats.Stats(profiler.profile).stats]
+
+
+class TestProfiling(object):
+
+    def __init__(self):
+        self.tmpdir = None
+        self.timings = None
+
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.timings = Timings()
+
+    def teardown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_profile_everything(self):
+        profiler = profiling.Profiler(timings=self.timings)
+        profiler.start()
+        _profiled_function()
+        profiler.stop()
+        assert_equals('_profiled_function' in _names(profiler), True)
+
+    def test_profile_one_phase(self):
+        profiler = profiling.Profiler('render', timings=self.timings)
+        profiler.start()
+        with self.timings.timed('validate'):
+            _unprofiled_function()
+        with self.timings.timed('render'):
+            _profiled_function()
+        profiler.stop()
+        names = _names(profiler)
+        assert_equals('_profiled_function' in names, True)
+        assert_equals('_unprofiled_function' in names, False)
+
+    def test_save_pstats(self):
+        fname = os.path.join(self.tmpdir, 'out.pstats')
+        profiler = profiling.Profiler(timings=self.timings)
+        profiler.start()
+        _profiled_function()
+        profiler.stop()
+        profiler.save(fname)
+        stats = pstats.Stats(fname)
+        names = [func[2] for func in stats.stats]
+        assert_equals('_profiled_function' in names, True)
+
+    def test_save_callgrind(self):
+        fname = os.path.join(self.tmpdir, 'callgrind.out')
+        profiler = profiling.Profiler(timings=self.timings)
+        profiler.start()
+        _profiled_function()
+        profiler.stop()
+        profiler.save(fname, 'callgrind')
+        with open(fname) as fld:
+            lines = fld.read().splitlines()
+        assert_equals(lines[0], 'events: Microseconds')
+        fns = [l for l in lines if l.startswith('fn=_profiled_function:')]
+        assert_equals(len(fns), 1)
+        idx = lines.index(fns[0])
+        assert_equals(lines[idx - 1], 'fl=%s' % __file__.replace('.pyc',
+                                                                 '.py'))
+        callees = [l for l in lines[idx:] if l.startswith('cfn=')]
+        assert_equals(any('sum' in l for l in callees), True)
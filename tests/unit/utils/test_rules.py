@@ -0,0 +1,103 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from nose.tools import assert_equals
+
+from pmcf.utils.rules import compact_rules
+
+
+def _cidr(cidr, port=22, protocol='tcp'):
+    return {'port': port, 'protocol': protocol, 'source_cidr': cidr}
+
+
+class TestCompactRules(object):
+
+    def test_nothing_to_merge_keeps_order(self):
+        rules = [
+            _cidr('10.0.0.0/24', 80),
+            _cidr('192.168.0.0/24', 443),
+            _cidr('172.16.0.0/24', 80),
+            {'port': 22, 'protocol': 'tcp', 'source_group': '=app'},
+        ]
+        assert_equals((rules, 0), compact_rules(list(rules)))
+
+    def test_adjacent_cidrs_merged(self):
+        rules = [
+            _cidr('10.0.0.0/25'),
+            _cidr('192.168.0.1/32', 80),
+            _cidr('10.0.0.128/25'),
+            _cidr('10.0.1.0/24'),
+        ]
+        assert_equals(([_cidr('10.0.0.0/23'), _cidr('192.168.0.1/32', 80)],
+                       2), compact_rules(rules))
+
+    def test_overlapping_and_duplicate_cidrs_merged(self):
+        rules = [
+            _cidr('10.0.0.0/8'),
+            _cidr('10.1.2.3/32'),
+            _cidr('10.0.0.0/8'),
+        ]
+        assert_equals(([_cidr('10.0.0.0/8')], 2), compact_rules(rules))
+
+    def test_cidrs_only_merged_for_same_ports(self):
+        rules = [
+            _cidr('10.0.0.0/25', 22),
+            _cidr('10.0.0.128/25', 80),
+            _cidr('10.0.0.128/25', 22, 'udp'),
+        ]
+        assert_equals((rules, 0), compact_rules(list(rules)))
+
+    def test_invalid_cidrs_left_alone(self):
+        rules = [_cidr('not-a-cidr'), _cidr('10.0.0.0/8')]
+        assert_equals((rules, 0), compact_rules(list(rules)))
+
+    def test_contiguous_ports_merged(self):
+        rules = [
+            _cidr('10.0.0.0/8', 8001),
+            _cidr('10.0.0.0/8', 8000),
+            {'from_port': 8002, 'to_port': 8010, 'protocol': 'tcp',
+             'source_cidr': '10.0.0.0/8'},
+            _cidr('10.0.0.0/8', 9000),
+        ]
+        assert_equals(([
+            {'from_port': 8000, 'to_port': 8010, 'protocol': 'tcp',
+             'source_cidr': '10.0.0.0/8'},
+            _cidr('10.0.0.0/8', 9000),
+        ], 2), compact_rules(rules))
+
+    def test_group_source_ports_merged(self):
+        rules = [
+            {'port': 80, 'protocol': 'tcp', 'source_group': '=web'},
+            {'port': 81, 'protocol': 'tcp', 'source_group': '=web'},
+            {'port': 82, 'protocol': 'tcp', 'source_group': '=api'},
+        ]
+        assert_equals(([
+            {'from_port': 80, 'to_port': 81, 'protocol': 'tcp',
+             'source_group': '=web'},
+            {'port': 82, 'protocol': 'tcp', 'source_group': '=api'},
+        ], 1), compact_rules(rules))
+
+    def test_icmp_ports_not_merged(self):
+        rules = [_cidr('10.0.0.0/8', 3, 'icmp'),
+                 _cidr('10.0.0.0/8', 4, 'icmp')]
+        assert_equals((rules, 0), compact_rules(list(rules)))
+
+    def test_allowlist_for_several_ports(self):
+        rules = []
+        for port in [8000, 8001]:
+            for idx in range(256):
+                rules.append(_cidr('10.0.%d.0/24' % idx, port))
+        assert_equals(([{'from_port': 8000, 'to_port': 8001,
+                         'protocol': 'tcp', 'source_cidr': '10.0.0.0/16'}],
+                       511), compact_rules(rules))
@@ -0,0 +1,108 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import mock
+import pickle
+
+from nose.tools import assert_equals, assert_not_equals, assert_raises
+
+from pmcf.utils.template import TemplateDocument, as_template
+
+TEMPLATE = {
+    'Resources': {
+        'b': {'Type': 'AWS::SQS::Queue'},
+        'a': {'Type': 'AWS::IAM::Role', 'Properties': {'Path': '/'}},
+    },
+}
+
+
+class TestTemplateDocument(object):
+
+    def test_is_the_text(self):
+        text = json.dumps(TEMPLATE, indent=2)
+        doc = TemplateDocument(text)
+        assert_equals(text, doc)
+        assert_equals(TEMPLATE, doc.data)
+
+    def test_unicode_encoded(self):
+        doc = TemplateDocument(u'{"a": "\u00e9"}')
+        assert_equals({'a': u'\xe9'}, doc.data)
+        assert_equals(str, type(str(doc)))
+
+    def test_forms_are_canonical(self):
+        doc = TemplateDocument(json.dumps(TEMPLATE, indent=2))
+        assert_equals(json.dumps(TEMPLATE, sort_keys=True), doc.compact)
+        assert_equals(json.dumps(TEMPLATE, indent=4, sort_keys=True),
+                      doc.pretty)
+
+    def test_forms_memoised(self):
+        doc = TemplateDocument(json.dumps(TEMPLATE))
+        with mock.patch('json.loads', wraps=json.loads) as loads:
+            with mock.patch('json.dumps', wraps=json.dumps) as dumps:
+                for _ in range(3):
+                    doc.data
+                    doc.compact
+                    doc.pretty
+                    doc.digest
+        assert_equals(1, loads.call_count)
+        assert_equals(2, dumps.call_count)
+
+    def test_canonical_text_not_serialised_again(self):
+        text = json.dumps(TEMPLATE, sort_keys=True)
+        doc = TemplateDocument(text, canonical=True)
+        with mock.patch('json.dumps') as dumps:
+            assert_equals(text, doc.compact)
+            doc.digest
+        assert_equals(0, dumps.call_count)
+        assert doc.canonical() is doc
+
+    def test_canonical_copy_keeps_parsed_data(self):
+        doc = TemplateDocument(json.dumps(TEMPLATE, indent=2))
+        data = doc.data
+        copy = doc.canonical()
+        assert_equals(doc.compact, copy)
+        assert copy.data is data
+        assert copy.compact is copy
+
+    def test_digest_ignores_layout(self):
+        left = TemplateDocument(json.dumps(TEMPLATE, indent=2))
+        right = TemplateDocument(json.dumps(TEMPLATE, sort_keys=True),
+                                 canonical=True)
+        assert_equals(left.digest, right.digest)
+        assert_not_equals(left.digest, TemplateDocument('{}').digest)
+
+    def test_not_json_raises(self):
+        assert_raises(ValueError, getattr, TemplateDocument('foo'), 'data')
+
+    def test_pickle_keeps_text(self):
+        doc = TemplateDocument(json.dumps(TEMPLATE), canonical=True)
+        doc.data
+        copy = pickle.loads(pickle.dumps(doc, pickle.HIGHEST_PROTOCOL))
+        assert_equals(TemplateDocument, type(copy))
+        assert_equals(doc, copy)
+        assert copy.compact is copy
+        assert_equals(None, copy._data)
+
+
+class TestAsTemplate(object):
+
+    def test_wraps_string(self):
+        doc = as_template('{}')
+        assert_equals(TemplateDocument, type(doc))
+        assert_equals({}, doc.data)
+
+    def test_document_returned_as_is(self):
+        doc = TemplateDocument('{}')
+        assert as_template(doc) is doc
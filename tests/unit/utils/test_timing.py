@@ -0,0 +1,91 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import mock
+from nose.tools import assert_equals, assert_raises
+import threading
+
+from pmcf.utils import timing
+
+
+class TestTimings(object):
+
+    def __init__(self):
+        self.timings = None
+
+    def setup(self):
+        self.timings = timing.Timings()
+
+    def test_record_aggregates_by_name(self):
+        self.timings.record('a', 1.0, 0.5)
+        self.timings.record('b', 2.0, 1.0)
+        self.timings.record('a', 3.0, 0.5)
+        assert_equals(self.timings.phases(), [
+            {'name': 'a', 'calls': 2, 'wall': 4.0, 'cpu': 1.0, 'max': 3.0},
+            {'name': 'b', 'calls': 1, 'wall': 2.0, 'cpu': 1.0, 'max': 2.0},
+        ])
+
+    def test_timed_records_on_exception(self):
+        def _raises():
+            with self.timings.timed('fails'):
+                raise ValueError('test')
+        assert_raises(ValueError, _raises)
+        assert_equals(self.timings.phases()[0]['calls'], 1)
+
+    @mock.patch('time.time')
+    def test_timed_measures_wall_time(self, mock_time):
+        mock_time.side_effect = [10.0, 12.5] + [13.0] * 5
+        with self.timings.timed('phase'):
+            pass
+        assert_equals(self.timings.phases()[0]['wall'], 2.5)
+
+    def test_record_is_thread_safe(self):
+        def _work():
+            for _ in range(1000):
+                self.timings.record('phase', 0.0, 0.0)
+        threads = [threading.Thread(target=_work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert_equals(self.timings.phases()[0]['calls'], 4000)
+
+    def test_report_json(self):
+        self.timings.record('a', 1.0, 0.5)
+        self.timings.annotations['loader'] = 'test'
+        data = json.loads(self.timings.report('json'))
+        assert_equals(data['phases'][0]['name'], 'a')
+        assert_equals(data['annotations'], {'loader': 'test'})
+
+    def test_report_table(self):
+        self.timings.record('a', 1.0, 0.5)
+        lines = self.timings.report().splitlines()
+        assert_equals(lines[0].split()[0], 'phase')
+        assert_equals(lines[1].split(), ['a', '1', '1.000', '0.500', '1.000'])
+
+    def test_reset(self):
+        self.timings.record('a', 1.0, 0.5)
+        self.timings.reset()
+        assert_equals(self.timings.phases(), [])
+
+    def test_timed_proxy_records_method_calls(self):
+        obj = mock.Mock()
+        obj.create_stack.return_value = 'id'
+        obj.region = 'eu-west-1'
+        proxy = timing.TimedProxy(obj, 'cfn', self.timings)
+        assert_equals(proxy.create_stack('test'), 'id')
+        assert_equals(proxy.region, 'eu-west-1')
+        obj.create_stack.assert_called_once_with('test')
+        assert_equals(self.timings.phases()[0]['name'], 'cfn.create_stack')
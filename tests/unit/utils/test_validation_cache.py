@@ -0,0 +1,92 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+from nose.tools import assert_equals
+
+from pmcf.utils.validation_cache import ValidationCache
+
+
+class TestValidationCache(object):
+
+    def test_key_depends_on_everything(self):
+        key = ValidationCache.key('instance', {'name': 'a'}, 's1', 'p1')
+        assert_equals(key, ValidationCache.key('instance', {'name': 'a'},
+                                               's1', 'p1'))
+        for other in [('secgroup', {'name': 'a'}, 's1', 'p1'),
+                      ('instance', {'name': 'b'}, 's1', 'p1'),
+                      ('instance', {'name': 'a'}, 's2', 'p1'),
+                      ('instance', {'name': 'a'}, 's1', 'p2'),
+                      ('instance', {'name': 'a', 'count': 1}, 's1', 'p1')]:
+            assert_equals(False, key == ValidationCache.key(*other))
+
+    def test_key_tells_types_apart(self):
+        assert_equals(False, ValidationCache.key('instance', {'count': 1},
+                                                 's', 'p') ==
+                      ValidationCache.key('instance', {'count': '1'},
+                                          's', 'p'))
+
+    def test_key_ignores_key_order(self):
+        # These keys collide, so the dicts iterate in insertion order
+        left = {}
+        right = {}
+        for field in ['a', 'i', 'q', 'y']:
+            left[field] = 1
+        for field in ['y', 'q', 'i', 'a']:
+            right[field] = 1
+        assert_equals(ValidationCache.key('instance', left, 's', 'p'),
+                      ValidationCache.key('instance', right, 's', 'p'))
+
+    def test_key_does_not_hold_resource(self):
+        key = ValidationCache.key('instance', {'name': 'a' * 1000}, 's', 'p')
+        assert_equals(40, len(key))
+
+    def test_key_writes_other_types(self):
+        when = datetime.date(2014, 1, 1)
+        assert_equals(False, ValidationCache.key('instance', {'at': when},
+                                                 's', 'p') ==
+                      ValidationCache.key('instance', {'at': '2014-01-01'},
+                                          's', 'p'))
+
+    def test_get_set(self):
+        cache = ValidationCache()
+        assert_equals(None, cache.get('a'))
+        cache.set('a', {'monitoring': False})
+        assert_equals({'monitoring': False}, cache.get('a'))
+        assert_equals(1, cache.hits)
+        assert_equals(1, cache.misses)
+
+    def test_get_returns_copies(self):
+        cache = ValidationCache()
+        defaults = {'sg': ['default']}
+        cache.set('a', defaults)
+        defaults['sg'].append('changed')
+        cache.get('a')['sg'].append('changed')
+        assert_equals({'sg': ['default']}, cache.get('a'))
+
+    def test_evicts_least_recently_used(self):
+        cache = ValidationCache(max_entries=10)
+        for idx in range(10):
+            cache.set(idx, {})
+        cache.get(0)
+        cache.set(10, {})
+        assert_equals(10, len(cache))
+        assert_equals({}, cache.get(0))
+        assert_equals(None, cache.get(1))
+
+    def test_clear(self):
+        cache = ValidationCache()
+        cache.set('a', {})
+        cache.clear()
+        assert_equals(0, len(cache))
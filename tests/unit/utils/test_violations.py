@@ -0,0 +1,106 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+
+import mock
+from nose.tools import assert_equals
+
+from pmcf.schema import validator
+from pmcf.utils import violations
+
+from tests.unit.schema.test_validator import _stack
+
+
+class TestViolations(object):
+
+    def test_json_path(self):
+        assert_equals('$', violations.json_path([]))
+        assert_equals('$.resources.instance[0].size', violations.json_path(
+            ['resources', 'instance', 0, 'size']))
+
+    def test_resource_label(self):
+        stack = _stack()
+        assert_equals('instance app', violations.resource_label(
+            stack, ['resources', 'instance', 0, 'sg', 0]))
+        assert_equals(None, violations.resource_label(stack, ['config']))
+        assert_equals(None, violations.resource_label(
+            stack, ['resources', 'instance', 5]))
+        stack['resources']['instance'][0].pop('name')
+        assert_equals('instance #0', violations.resource_label(
+            stack, ['resources', 'instance', 0]))
+
+    def test_schema_violations_all_found(self):
+        stack = _stack()
+        stack['resources']['instance'][0]['count'] = 'three'
+        stack['resources']['instance'][0]['sg'] = 'app'
+        stack['resources']['secgroup'][0]['name'] = 5
+        found = violations.schema_violations(stack, validator.errors(stack))
+        assert_equals([
+            '$.resources.instance[0].count',
+            '$.resources.instance[0].sg',
+            '$.resources.secgroup[0].name',
+        ], [v['path'] for v in found])
+        assert_equals(['integer'], found[0]['allowed'])
+        assert_equals('secgroup #0', found[2]['resource'])
+        assert_equals(['string'], found[2]['allowed'])
+
+    def test_schema_violations_oneof_lists_providers(self):
+        stack = _stack()
+        stack['resources']['instance'][0]['provisioner']['provider'] = 'Nope'
+        found = violations.schema_violations(stack, validator.errors(stack))
+        assert_equals(1, len(found))
+        assert_equals(True, 'NoopProvisioner' in found[0]['allowed'])
+
+    def test_policy_violations(self):
+        policy = mock.Mock()
+        policy.violations.side_effect = lambda rtype, data, environment: [{
+            'field': 'size',
+            'value': data.get('size'),
+            'message': 'bad size',
+            'allowed': ['m1.large'],
+        }] if rtype == 'instance' else []
+        found = violations.policy_violations(policy, _stack())
+        assert_equals([{
+            'source': 'policy',
+            'path': '$.resources.instance[0].size',
+            'resource': 'instance app',
+            'message': 'bad size',
+            'allowed': ['m1.large'],
+        }], found)
+
+    def test_format_text(self):
+        report = violations.format_violations([{
+            'source': 'policy',
+            'path': '$.resources.instance[0].size',
+            'resource': 'instance app',
+            'message': 'bad size',
+            'allowed': ['m1.large'],
+        }])
+        assert_equals('policy: $.resources.instance[0].size (instance app): '
+                      'bad size\n    allowed: m1.large\n'
+                      '1 violation found\n', report)
+        assert_equals('No violations found\n',
+                      violations.format_violations([]))
+
+    def test_format_json(self):
+        found = [{
+            'source': 'schema',
+            'path': '$',
+            'resource': None,
+            'message': "'config' is a required property",
+            'allowed': None,
+        }]
+        assert_equals(found, json.loads(
+            violations.format_violations(found, 'json')))
@@ -0,0 +1,145 @@
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import glob
+import mock
+from nose.tools import assert_equals, assert_raises
+import os
+import shutil
+import tempfile
+import yaml
+
+from pmcf.schema.base import schema as base_schema
+from pmcf.utils import yaml_loader
+from pmcf.utils.timing import Timings
+
+
+class TestYamlLoader(object):
+
+    def test_loader_is_safe(self):
+        assert_equals(yaml_loader.LOADER_NAME in ['CSafeLoader', 'SafeLoader'],
+                      True)
+
+    def test_load_matches_pure_python_loader(self):
+        docs = [base_schema]
+        for fname in sorted(glob.glob('tests/data/yaml/*.yaml')):
+            with open(fname) as fld:
+                docs.append(fld.read())
+        for doc in docs:
+            assert_equals(yaml_loader.load(doc, yaml.SafeLoader),
+                          yaml_loader.load(doc))
+
+    def test_load_refuses_python_objects(self):
+        assert_raises(yaml.YAMLError, yaml_loader.load,
+                      '!!python/object/apply:os.getcwd []')
+
+    def test_load_records_loader(self):
+        timings = Timings()
+        with mock.patch.object(yaml_loader, 'TIMINGS', timings):
+            yaml_loader.load('a: 1')
+        assert_equals(timings.annotations['yaml_loader'],
+                      yaml_loader.LOADER_NAME)
+
+
+class TestInclude(object):
+
+    def __init__(self):
+        self.tmpdir = None
+        self.cache = None
+
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = yaml_loader.FragmentCache()
+
+    def teardown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, name, text):
+        fname = os.path.join(self.tmpdir, name)
+        if not os.path.isdir(os.path.dirname(fname)):
+            os.makedirs(os.path.dirname(fname))
+        mtime = None
+        if os.path.exists(fname):
+            mtime = os.stat(fname).st_mtime + 10
+        with open(fname, 'w') as fld:
+            fld.write(text)
+        if mtime:
+            os.utime(fname, (mtime, mtime))
+        return fname
+
+    def test_include(self):
+        self._write('lb.yaml', 'name: web\nport: 80\n')
+        files = []
+        with mock.patch.object(yaml_loader, 'FRAGMENTS', self.cache):
+            data = yaml_loader.load('lbs:\n  - !include lb.yaml\n',
+                                    basedir=self.tmpdir, files=files)
+        assert_equals({'lbs': [{'name': 'web', 'port': 80}]}, data)
+        assert_equals([os.path.join(self.tmpdir, 'lb.yaml')],
+                      [fname for fname, _ in files])
+
+    def test_nested_include_relative_to_including_file(self):
+        self._write('lib/lb.yaml', 'listener: !include listener.yaml\n')
+        self._write('lib/listener.yaml', 'port: 80\n')
+        with mock.patch.object(yaml_loader, 'FRAGMENTS', self.cache):
+            data = yaml_loader.load('lb: !include lib/lb.yaml\n',
+                                    basedir=self.tmpdir)
+        assert_equals({'lb': {'listener': {'port': 80}}}, data)
+
+    def test_include_search_path(self):
+        self._write('lib/lb.yaml', 'port: 80\n')
+        with mock.patch.object(yaml_loader, 'FRAGMENTS', self.cache):
+            data = yaml_loader.load(
+                'lb: !include lb.yaml\n',
+                search_path=[os.path.join(self.tmpdir, 'lib')])
+        assert_equals({'lb': {'port': 80}}, data)
+
+    def test_missing_include_raises(self):
+        assert_raises(IOError, yaml_loader.load, 'lb: !include nowhere.yaml',
+                      basedir=self.tmpdir)
+
+    def test_include_loop_raises(self):
+        self._write('a.yaml', 'b: !include b.yaml\n')
+        self._write('b.yaml', 'a: !include a.yaml\n')
+        with mock.patch.object(yaml_loader, 'FRAGMENTS', self.cache):
+            assert_raises(yaml.YAMLError, yaml_loader.load,
+                          'a: !include a.yaml', basedir=self.tmpdir)
+
+    def test_fragment_parsed_once(self):
+        fname = self._write('lb.yaml', 'port: 80\n')
+        first = yaml_loader.load_file(fname, cache=self.cache)
+        first['port'] = 81
+        with mock.patch.object(yaml_loader, 'load') as load:
+            files = []
+            second = yaml_loader.load_file(fname, cache=self.cache,
+                                           files=files)
+        assert_equals(0, load.call_count)
+        assert_equals({'port': 80}, second)
+        assert_equals([fname], [dep for dep, _ in files])
+        assert_equals(1, self.cache.hits)
+
+    def test_fragment_reparsed_when_include_changes(self):
+        fname = self._write('lb.yaml', 'listener: !include listener.yaml\n')
+        self._write('listener.yaml', 'port: 80\n')
+        yaml_loader.load_file(fname, cache=self.cache)
+        self._write('listener.yaml', 'port: 8080\n')
+        assert_equals({'listener': {'port': 8080}},
+                      yaml_loader.load_file(fname, cache=self.cache))
+        assert_equals(0, self.cache.hits)
+
+    def test_cache_clear(self):
+        fname = self._write('lb.yaml', 'port: 80\n')
+        yaml_loader.load_file(fname, cache=self.cache)
+        assert_equals(1, len(self.cache))
+        self.cache.clear()
+        assert_equals(0, len(self.cache))
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Measures how the parse, policy, validate and render phases scale with the
+size of the stack, using synthetic stacks from ``stackgen.py``.
+
+Each run happens in a fresh process so that peak memory is measured per
+stack size.  For each phase the time and the growth in peak RSS are
+reported, along with the scaling exponent between the two largest stacks:
+about 1 is linear, and anything much above that is worth a look.
+
+Usage::
+
+    tools/with_venv.sh python tools/benchmarks/pipeline.py
+    tools/with_venv.sh python tools/benchmarks/pipeline.py -r 5 --json 10 100
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# pylint: disable=wrong-import-position
+import stackgen
+from pmcf.cli.cmd import PMCFCLI
+from pmcf.utils.timing import TIMINGS
+
+PHASES = ['parse', 'policy', 'validate', 'render']
+
+
+def _maxrss():
+    """
+    Peak resident set size of this process so far, in kB
+
+    :returns: int.
+    """
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_once(job):
+    """
+    Runs the pipeline once over a generated stack.  Meant to run in a
+    fresh worker process.
+
+    :param job: Tuple of (size, policy file)
+    :type job: tuple.
+    :returns: dict mapping phase to measurements
+    """
+
+    size, policyfile = job
+    text = stackgen.generate_yaml(size)
+    cli = PMCFCLI({
+        'parser': 'YamlParser',
+        'policy': 'JSONPolicy',
+        'policyfile': policyfile,
+        'output': 'JSONOutput',
+        'environment': 'dev',
+        'action': 'create',
+        'accesskey': None,
+        'secretkey': None,
+        'region': 'eu-west-1',
+    })
+
+    rss = {}
+
+    def _hook(name, entering):
+        if name in PHASES:
+            key = 'start' if entering else 'end'
+            rss.setdefault(name, {})[key] = _maxrss()
+
+    TIMINGS.reset()
+    TIMINGS.add_hook(_hook)
+    try:
+        stack = cli.parse(text)
+        cli.validate(stack)
+        data = cli.render(stack)[0]
+    finally:
+        TIMINGS.remove_hook(_hook)
+
+    results = {'_output_bytes': len(data)}
+    for phase in TIMINGS.phases():
+        results[phase['name']] = {
+            'wall': phase['wall'],
+            'cpu': phase['cpu'],
+        }
+        if phase['name'] in rss:
+            results[phase['name']]['rss_growth'] =\
+                rss[phase['name']]['end'] - rss[phase['name']]['start']
+            results[phase['name']]['rss_peak'] = rss[phase['name']]['end']
+    return results
+
+
+def benchmark(sizes, repeat):
+    """
+    Runs the pipeline ``repeat`` times for each stack size, keeping the
+    fastest time and the largest memory figures for each phase.
+
+    :param sizes: Stack sizes
+    :type sizes: list.
+    :param repeat: Runs per size
+    :type repeat: int.
+    :returns: dict mapping size to phase measurements
+    """
+
+    fld, policyfile = tempfile.mkstemp(suffix='.json')
+    os.write(fld, json.dumps(stackgen.POLICY))
+    os.close(fld)
+
+    pool = multiprocessing.Pool(1, maxtasksperchild=1)
+    try:
+        results = {}
+        for size in sizes:
+            runs = pool.map(run_once, [(size, policyfile)] * repeat)
+            best = {}
+            for run in runs:
+                for phase, data in run.items():
+                    if phase.startswith('_'):
+                        best[phase] = data
+                        continue
+                    if phase not in best:
+                        best[phase] = dict(data)
+                        continue
+                    for key, val in data.items():
+                        if key in ['wall', 'cpu']:
+                            best[phase][key] = min(best[phase][key], val)
+                        else:
+                            best[phase][key] = max(best[phase][key], val)
+            results[size] = best
+    finally:
+        pool.close()
+        pool.join()
+        os.unlink(policyfile)
+    return results
+
+
+def exponent(results, phase):
+    """
+    Scaling exponent of a phase's time between the two largest stacks, where
+    fixed start-up costs matter least: the slope of a line through them on a
+    log-log scale.
+
+    :param results: Output of :py:func:`benchmark`
+    :type results: dict.
+    :param phase: Phase name
+    :type phase: str.
+    :returns: float or None
+    """
+
+    sizes = sorted(results.keys())
+    if len(sizes) < 2:
+        return None
+    low = results[sizes[-2]][phase]['wall']
+    high = results[sizes[-1]][phase]['wall']
+    if low <= 0 or high <= 0:
+        return None
+    return math.log(high / low) / math.log(float(sizes[-1]) / sizes[-2])
+
+
+def report(results, phases):
+    """
+    Formats benchmark results as a table
+
+    :param results: Output of :py:func:`benchmark`
+    :type results: dict.
+    :param phases: Phases to show
+    :type phases: list.
+    :returns: str.
+    """
+
+    lines = ['%-28s' % 'phase' +
+             ''.join('%14s' % ('n=%d' % size) for size in sorted(results)) +
+             '%10s' % 'exponent']
+    for phase in phases:
+        row = '%-28s' % ('%s (ms)' % phase)
+        for size in sorted(results):
+            row += '%14.1f' % (results[size][phase]['wall'] * 1000)
+        exp = exponent(results, phase)
+        row += '%10s' % ('-' if exp is None else '%.2f' % exp)
+        lines.append(row)
+    for phase in PHASES:
+        row = '%-28s' % ('%s rss growth (kB)' % phase)
+        for size in sorted(results):
+            row += '%14d' % results[size][phase].get('rss_growth', 0)
+        lines.append(row)
+    row = '%-28s' % 'peak rss (kB)'
+    for size in sorted(results):
+        row += '%14d' % results[size]['render'].get('rss_peak', 0)
+    lines.append(row)
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-r", "--repeat",
+                        type=int,
+                        default=3,
+                        help="runs per stack size")
+    parser.add_argument("--json",
+                        default=False,
+                        action="store_true",
+                        help="print raw results as JSON")
+    parser.add_argument("--detail",
+                        default=False,
+                        action="store_true",
+                        help="also show each step of rendering")
+    parser.add_argument("sizes",
+                        type=int,
+                        nargs='*',
+                        default=[10, 50, 100, 500, 1000, 5000],
+                        help="numbers of resources to generate")
+    args = parser.parse_args()
+
+    results = benchmark(sorted(args.sizes), max(args.repeat, 1))
+    if args.json:
+        print json.dumps(results, indent=4, sort_keys=True)
+        return
+
+    phases = list(PHASES)
+    if args.detail:
+        sample = results[max(results)]
+        phases.extend(sorted(p for p in sample
+                             if p.startswith('render.')))
+    print report(results, phases)
+
+
+if __name__ == '__main__':
+    main()
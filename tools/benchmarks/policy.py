@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Compares applying policy to synthetic stacks from ``stackgen.py`` the old
+way, walking the policy for every resource and searching lists of allowed
+values, with :py:meth:`pmcf.policy.JSONPolicy.validate_stack` and its
+compiled rule tables.  The policy allows a few hundred images and sizes, as
+real policy files do.
+
+Usage::
+
+    tools/with_venv.sh python tools/benchmarks/policy.py [-r RUNS] [SIZE ...]
+"""
+
+import argparse
+import copy
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# pylint: disable=wrong-import-position
+import stackgen
+from pmcf.cli.cmd import PMCFCLI
+from pmcf.exceptions import PolicyException
+
+
+def big_policy(count):
+    """
+    The stackgen policy, with ``count`` extra allowed images and sizes
+
+    :param count: Number of extra values
+    :type count: int.
+    :returns: dict.
+    """
+
+    policy = copy.deepcopy(stackgen.POLICY)
+    policy['instance']['size']['constraints'] = [
+        'x%d.large' % idx for idx in range(count)
+    ] + policy['instance']['size']['constraints']
+    policy['instance']['image'] = {
+        'default': 'ami-0bceb93b',
+        'constraints': ['ami-%08x' % idx for idx in range(count)] +
+                       ['ami-0bceb93b'],
+    }
+    return policy
+
+
+def uncompiled(policy, stack):
+    """
+    Policy as it was applied before the rules were compiled
+
+    :param policy: Policy, as loaded from the policy file
+    :type policy: dict.
+    :param stack: Parsed stack
+    :type stack: dict.
+    """
+
+    for rtype, resources in stack['resources'].iteritems():
+        for data in resources:
+            if not policy.get(rtype):
+                continue
+            rules = policy.get(rtype)
+            for key in rules.keys():
+                if data.get(key, None) is None:
+                    data[key] = rules[key]['default']
+                if rules[key].get('constraints'):
+                    if data[key] not in rules[key]['constraints']:
+                        raise PolicyException(key)
+
+
+def best_time(func, stack, runs):
+    """
+    Fastest of several calls, each on a fresh copy of the stack
+
+    :param func: Function taking the stack
+    :type func: callable.
+    :param stack: Parsed stack
+    :type stack: dict.
+    :param runs: Number of calls
+    :type runs: int.
+    :returns: float, seconds
+    """
+
+    best = None
+    for _ in range(runs):
+        copied = copy.deepcopy(stack)
+        start = time.time()
+        func(copied)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-r", "--runs",
+                        type=int,
+                        default=3,
+                        help="runs per size")
+    parser.add_argument("--values",
+                        type=int,
+                        default=500,
+                        help="allowed images and sizes in the policy")
+    parser.add_argument("sizes",
+                        type=int,
+                        nargs='*',
+                        default=[100, 1000, 5000],
+                        help="numbers of resources to generate")
+    args = parser.parse_args()
+
+    policy = big_policy(args.values)
+    fld, policyfile = tempfile.mkstemp(suffix='.json')
+    os.write(fld, json.dumps(policy))
+    os.close(fld)
+
+    print '%8s %14s %14s %8s' % ('size', 'before (ms)', 'after (ms)',
+                                 'speedup')
+    try:
+        cli = PMCFCLI({
+            'parser': 'YamlParser',
+            'policy': 'JSONPolicy',
+            'policyfile': policyfile,
+            'output': 'JSONOutput',
+            'environment': 'dev',
+            'action': 'create',
+        })
+        for size in args.sizes:
+            stack = cli.parse(stackgen.generate_yaml(size))
+            before = best_time(lambda data: uncompiled(policy, data), stack,
+                               args.runs)
+            after = best_time(cli.policy.validate_stack, stack, args.runs)
+            print '%8d %14.1f %14.1f %7.1fx' % (size, before * 1000,
+                                                after * 1000, before / after)
+    finally:
+        os.unlink(policyfile)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Generates synthetic YAML stack definitions of a given size for benchmarking.
+
+The resources are split between instances, security groups, load balancers
+and networks.  Security groups reference each other, instances reference
+security groups and load balancers, half the instances have scaling
+policies, and networks peer with their neighbour, so that the cross-resource
+lookups in the renderer are exercised as well as the per-resource work.
+
+Usage::
+
+    tools/with_venv.sh python tools/benchmarks/stackgen.py 500 > big.yaml
+"""
+
+import argparse
+import json
+import yaml
+
+# Share of the requested resources given to each resource type
+MIX = [
+    ('instance', 4),
+    ('secgroup', 3),
+    ('load_balancer', 2),
+    ('network', 1),
+]
+
+POLICY = {
+    'instance': {
+        'size': {
+            'default': 'm1.small',
+            'constraints': ['m1.small', 'm1.medium', 'm1.large'],
+        },
+        'monitoring': {
+            'default': False,
+        },
+    },
+}
+
+
+def counts(size):
+    """
+    Splits a total number of resources between the resource types
+
+    :param size: Total number of resources
+    :type size: int.
+    :returns: dict.
+    """
+
+    total = sum(share for _, share in MIX)
+    ret = {}
+    for rtype, share in MIX:
+        ret[rtype] = max(1, size * share // total)
+    return ret
+
+
+def _instance(idx, num):
+    inst = {
+        'name': 'app%d' % idx,
+        'count': 1 + idx % 3,
+        'image': 'ami-0bceb93b',
+        'sshKey': 'bootstrap',
+        'size': ['m1.small', 'm1.medium', 'm1.large'][idx % 3],
+        'sg': ['sg%d' % (idx % num['secgroup'])],
+        'lb': ['lb%d' % (idx % num['load_balancer'])],
+        'provisioner': {
+            'provider': 'NoopProvisioner',
+            'args': {},
+        },
+    }
+    if idx % 2:
+        inst['scaling_policy'] = {
+            'default': {
+                'metric': 'Piksel/bench/requests',
+                'unit': 'Count',
+                'up': {
+                    'stat': 'Average',
+                    'condition': '> 50',
+                    'change': '1',
+                },
+                'down': {
+                    'stat': 'Average',
+                    'condition': '< 10',
+                    'change': '-1',
+                },
+            },
+        }
+    return inst
+
+
+def _secgroup(idx, _):
+    rules = [{
+        'port': 22,
+        'protocol': 'tcp',
+        'source_cidr': '10.%d.%d.0/24' % (idx // 256 % 256, idx % 256),
+    }]
+    if idx > 0:
+        # Groups can only refer to groups defined before them
+        rules.append({
+            'port': 8000 + idx % 1000,
+            'protocol': 'tcp',
+            'source_group': '=sg%d' % (idx - 1),
+        })
+    return {
+        'name': 'sg%d' % idx,
+        'rules': rules,
+    }
+
+
+def _load_balancer(idx, _):
+    return {
+        'name': 'lb%d' % idx,
+        'listener': [{
+            'protocol': 'HTTP',
+            'lb_port': 80,
+            'instance_protocol': 'HTTP',
+            'instance_port': 8080,
+        }],
+        'healthcheck': {
+            'protocol': 'HTTP',
+            'port': 8080,
+            'path': '/status',
+        },
+    }
+
+
+def _network(idx, _):
+    net = {
+        'name': 'net%d' % idx,
+        'netrange': '10.%d.%d.0/24' % (100 + idx // 256, idx % 256),
+        'zones': ['eu-west-1a', 'eu-west-1b', 'eu-west-1c'],
+        'public': bool(idx % 2),
+    }
+    if idx > 0:
+        net['peers'] = [{'peerid': '=net%d' % (idx - 1)}]
+    return net
+
+
+BUILDERS = {
+    'instance': _instance,
+    'secgroup': _secgroup,
+    'load_balancer': _load_balancer,
+    'network': _network,
+}
+
+
+def generate(size, name='bench'):
+    """
+    Builds a stack definition with roughly ``size`` resources
+
+    :param size: Total number of resources
+    :type size: int.
+    :param name: Stack name
+    :type name: str.
+    :returns: dict.
+    """
+
+    num = counts(size)
+    resources = {}
+    for rtype, _ in MIX:
+        resources[rtype] = [BUILDERS[rtype](idx, num)
+                            for idx in range(num[rtype])]
+    return {
+        'config': {
+            'name': name,
+            'environments': ['dev'],
+            'vpcid': 'vpc-12345678',
+            'subnets': ['subnet-12345678', 'subnet-23456789'],
+            'defaultsg': 'sg-12345678',
+        },
+        'resources': resources,
+    }
+
+
+def generate_yaml(size, name='bench'):
+    """
+    Builds a stack definition with roughly ``size`` resources as YAML
+
+    :param size: Total number of resources
+    :type size: int.
+    :param name: Stack name
+    :type name: str.
+    :returns: str.
+    """
+
+    return yaml.safe_dump(generate(size, name), default_flow_style=False)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--policy",
+                        default=False,
+                        action="store_true",
+                        help="print the matching policy file instead")
+    parser.add_argument("size",
+                        type=int,
+                        nargs='?',
+                        default=100,
+                        help="number of resources to generate")
+    args = parser.parse_args()
+    if args.policy:
+        print json.dumps(POLICY, indent=4)
+    else:
+        print generate_yaml(args.size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Measures how long a fresh python process takes to get from start-up to
+having the pmcf CLI and one output class loaded, and which heavy
+dependencies that drags in.
+
+Usage::
+
+    tools/with_venv.sh python tools/benchmarks/startup.py [-n RUNS] [OUTPUT]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+PROBE = """
+import json, sys, time
+start = time.time()
+import pmcf.cli.cli
+from pmcf.utils import import_from_string
+import_from_string('pmcf.outputs', %r)
+elapsed = time.time() - start
+print json.dumps({
+    'elapsed': elapsed,
+    'modules': len(sys.modules),
+    'loaded': [m for m in %r if m in sys.modules],
+})
+"""
+
+WATCHED = ['boto', 'curses', 'netaddr', 'troposphere', 'xmltodict']
+
+
+def probe(output):
+    """
+    Runs one start-up in a fresh interpreter
+
+    :param output: Output class to load
+    :type output: str.
+    :returns: dict.
+    """
+
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+    proc = subprocess.Popen([sys.executable, '-c', PROBE % (output, WATCHED)],
+                            stdout=subprocess.PIPE, cwd=root)
+    out = proc.communicate()[0]
+    if proc.returncode != 0:
+        raise SystemExit('probe failed for %s' % output)
+    return json.loads(out)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--runs",
+                        type=int,
+                        default=10,
+                        help="number of start-ups to time")
+    parser.add_argument("outputs",
+                        nargs='*',
+                        default=['JSONOutput', 'VagrantOutput', 'AWSCFNOutput'],
+                        help="output classes to load")
+    args = parser.parse_args()
+
+    print '%-20s %10s %10s %8s  %s' % ('output', 'best (ms)', 'mean (ms)',
+                                       'modules', 'loaded')
+    for output in args.outputs:
+        results = [probe(output) for _ in range(args.runs)]
+        times = [res['elapsed'] * 1000 for res in results]
+        print '%-20s %10.1f %10.1f %8d  %s' % (
+            output, min(times), sum(times) / len(times),
+            results[-1]['modules'], ', '.join(results[-1]['loaded']))
+
+
+if __name__ == '__main__':
+    main()
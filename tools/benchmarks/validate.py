@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Compares schema validation of synthetic stacks from ``stackgen.py`` the old
+way, loading the YAML schema and building a validator on every call, with
+the prebuilt jsonschema validator in :mod:`pmcf.schema.validator` and with
+the generated python validator from :mod:`pmcf.schema.codegen` that
+:py:func:`pmcf.schema.validator.validate` now tries first.
+
+Usage::
+
+    tools/with_venv.sh python tools/benchmarks/validate.py [-r RUNS] [SIZE ...]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import jsonschema
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# pylint: disable=wrong-import-position
+import stackgen
+from pmcf.cli.cmd import PMCFCLI
+from pmcf.schema.base import schema as base_schema
+from pmcf.schema import validator
+
+
+def uncached(stack):
+    """
+    Validation as it was done before the validator was prebuilt
+
+    :param stack: Parsed stack
+    :type stack: dict.
+    """
+
+    jsonschema.validate(stack, yaml.load(base_schema))
+
+
+def build_stack(size, policyfile):
+    """
+    Parses a generated stack and applies policy to it, leaving it ready for
+    schema validation
+
+    :param size: Number of resources
+    :type size: int.
+    :param policyfile: Policy file for generated stacks
+    :type policyfile: str.
+    :returns: dict.
+    """
+
+    cli = PMCFCLI({
+        'parser': 'YamlParser',
+        'policy': 'JSONPolicy',
+        'policyfile': policyfile,
+        'output': 'JSONOutput',
+        'environment': 'dev',
+        'action': 'create',
+    })
+    stack = cli.parse(stackgen.generate_yaml(size))
+    cli.policy.validate_stack(stack)
+    return stack
+
+
+def best_time(func, stack, runs):
+    """
+    Fastest of several calls
+
+    :param func: Validation function
+    :type func: callable.
+    :param stack: Parsed stack
+    :type stack: dict.
+    :param runs: Number of calls
+    :type runs: int.
+    :returns: float, seconds
+    """
+
+    best = None
+    for _ in range(runs):
+        start = time.time()
+        func(stack)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-r", "--runs",
+                        type=int,
+                        default=3,
+                        help="validations per size")
+    parser.add_argument("sizes",
+                        type=int,
+                        nargs='*',
+                        default=[0, 10, 100, 1000],
+                        help="numbers of resources to generate")
+    args = parser.parse_args()
+
+    fld, policyfile = tempfile.mkstemp(suffix='.json')
+    os.write(fld, json.dumps(stackgen.POLICY))
+    os.close(fld)
+
+    print '%8s %14s %14s %14s %8s' % ('size', 'before (ms)',
+                                      'prebuilt (ms)', 'generated (ms)',
+                                      'speedup')
+    try:
+        for size in args.sizes:
+            stack = build_stack(size, policyfile)
+            before = best_time(uncached, stack, args.runs)
+            prebuilt = best_time(validator.VALIDATOR.validate, stack,
+                                 args.runs)
+            after = best_time(validator.validate, stack, args.runs)
+            print '%8d %14.1f %14.1f %14.1f %7.1fx' % (
+                size, before * 1000, prebuilt * 1000, after * 1000,
+                before / after)
+    finally:
+        os.unlink(policyfile)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Compares the pure python and libyaml safe loaders on synthetic stacks from
+``stackgen.py``, and checks that they produce the same data.
+
+Usage::
+
+    tools/with_venv.sh python tools/benchmarks/yaml_load.py [-r RUNS] [SIZE ...]
+"""
+
+import argparse
+import os
+import sys
+import time
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# pylint: disable=wrong-import-position
+import stackgen
+from pmcf.utils import yaml_loader
+
+
+def best_time(text, loader, runs):
+    """
+    Fastest of several loads of a document
+
+    :param text: YAML document
+    :type text: str.
+    :param loader: Loader class
+    :type loader: class.
+    :param runs: Number of loads
+    :type runs: int.
+    :returns: float, seconds
+    """
+
+    best = None
+    for _ in range(runs):
+        start = time.time()
+        yaml_loader.load(text, loader)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-r", "--runs",
+                        type=int,
+                        default=3,
+                        help="loads per loader and size")
+    parser.add_argument("sizes",
+                        type=int,
+                        nargs='*',
+                        default=[100, 1000, 5000],
+                        help="numbers of resources to generate")
+    args = parser.parse_args()
+
+    loaders = [yaml.SafeLoader]
+    if getattr(yaml, 'CSafeLoader', None):
+        loaders.append(yaml.CSafeLoader)
+    else:
+        print 'libyaml is not available, pmcf uses SafeLoader'
+
+    print '%8s %10s ' % ('size', 'kB') +\
+        ''.join('%18s' % ('%s (ms)' % l.__name__) for l in loaders)
+    for size in args.sizes:
+        text = stackgen.generate_yaml(size)
+        results = [yaml_loader.load(text, l) for l in loaders]
+        if results[1:] and results[0] != results[-1]:
+            raise SystemExit('loaders disagree for size %d' % size)
+        print '%8d %10d ' % (size, len(text) / 1024) +\
+            ''.join('%18.1f' % (best_time(text, l, args.runs) * 1000)
+                    for l in loaders)
+
+
+if __name__ == '__main__':
+    main()
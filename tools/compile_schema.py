@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Regenerates ``pmcf/schema/compiled.py``, the pre-parsed form of the YAML
+schema in ``pmcf/schema/base.py``.  Run it after every change to the schema;
+the unit tests fail until the two agree.
+
+Usage::
+
+    tools/with_venv.sh python tools/compile_schema.py
+"""
+
+import os
+import sys
+import yaml
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+# pylint: disable=wrong-import-position
+from pmcf.schema.base import schema
+
+MAX_LINE = 79
+
+HEADER = '''# Copyright (c) 2014 Piksel
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+..  module:: pmcf.schema.compiled
+    :platform: Unix
+    :synopsis: pre-parsed form of the base schema
+
+..  moduleauthor:: Stephen Gran <stephen.gran@piksel.com>
+"""
+
+# Generated from pmcf/schema/base.py by tools/compile_schema.py - do not edit
+
+# pylint: disable=invalid-name
+
+schema = '''
+
+
+def literal(obj, indent=0):
+    """
+    Formats plain data as a python literal, one item per line
+
+    :param obj: Data to format
+    :type obj: variable
+    :param indent: Current indentation
+    :type indent: int.
+    :returns: str.
+    """
+
+    pad = ' ' * (indent + 4)
+    if isinstance(obj, dict):
+        if not obj:
+            return '{}'
+        items = []
+        for key in sorted(obj):
+            value = literal(obj[key], indent + 4)
+            item = '%s%r: %s,' % (pad, key, value)
+            if len(item) > MAX_LINE and '\n' not in value:
+                # Move the value to a line of its own to stay within pep8
+                item = '%s%r: (\n%s    %s),' % (pad, key, pad, value)
+            items.append(item + '\n')
+        return '{\n' + ''.join(items) + ' ' * indent + '}'
+    if isinstance(obj, list):
+        if not obj:
+            return '[]'
+        items = ['%s%s,\n' % (pad, literal(item, indent + 4)) for item in obj]
+        return '[\n' + ''.join(items) + ' ' * indent + ']'
+    return repr(obj)
+
+
+def main():
+    data = yaml.load(schema, Loader=yaml.SafeLoader)
+    fname = os.path.join(ROOT, 'pmcf', 'schema', 'compiled.py')
+    with open(fname, 'w') as fld:
+        fld.write(HEADER)
+        fld.write(literal(data))
+        fld.write('\n')
+    print 'Wrote %s' % fname
+
+
+if __name__ == '__main__':
+    main()